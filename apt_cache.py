@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === FLEET APT PACKAGE CACHE (v1.0) ===
+# === WSPÓLNY BUFOR PAKIETÓW APT FLOTY (v1.0) ===
+# =====================================================================================
+#
+# English: Optional apt-cacher-ng proxy shared by the whole fleet, so docker-ce, containerd,
+#          clamav, wireguard, zip, ... are downloaded from the Ubuntu and Docker mirrors once
+#          instead of once per VM. The cache runs on the admin machine (reached over the
+#          WireGuard tunnel on vpn.admin_ip) or on one designated VM (reached on its internal
+#          VPC address). The installers add an 'apt-proxy' step in front of their apt steps:
+#          apt asks a small detect script for the proxy, which answers DIRECT when the cache
+#          is unreachable, so a stopped cache or a down tunnel never breaks an install.
+#          Docker's HTTPS repository is fetched through an apt-cacher-ng remap, so the
+#          Docker packages are cached too (apt still checks every package signature).
+# Polski:  Opcjonalny serwer proxy apt-cacher-ng wspólny dla całej floty, dzięki któremu
+#          docker-ce, containerd, clamav, wireguard, zip, ... są pobierane z mirrorów Ubuntu
+#          i Dockera raz, a nie raz na każdą maszynę. Bufor działa na maszynie admina
+#          (osiągalnej przez tunel WireGuard pod vpn.admin_ip) lub na jednej wskazanej VM
+#          (osiągalnej pod jej wewnętrznym adresem VPC). Instalatory dodają krok 'apt-proxy'
+#          przed swoimi krokami apt: apt pyta mały skrypt wykrywający o proxy, a ten odpowiada
+#          DIRECT, gdy bufor jest nieosiągalny, więc zatrzymany bufor lub nieaktywny tunel nigdy
+#          nie psuje instalacji. Repozytorium HTTPS Dockera jest pobierane przez przemapowanie
+#          apt-cacher-ng, więc pakiety Dockera też są buforowane (apt nadal sprawdza podpisy).
+
+import os
+import sys
+import shlex
+import subprocess
+import config_store
+import remote_steps
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+CONFIG_FILE = 'config.yaml'
+
+# English: Defaults for GLOBAL_SETTINGS.apt_cache; host is 'admin' or a VM key (e.g. VM1)
+# Polski: Domyślne ustawienia GLOBAL_SETTINGS.apt_cache; host to 'admin' lub klucz VM (np. VM1)
+SETTINGS_DEFAULTS = {
+    'enabled': False,
+    'host': 'admin',
+    'port': 3142,
+}
+ADMIN_HOST = 'admin'
+
+PROXY_DETECT_PATH = '/usr/local/sbin/blox-apt-proxy'
+APT_CONF_PATH = '/etc/apt/apt.conf.d/01blox-proxy'
+SERVER_CONF_PATH = '/etc/apt-cacher-ng/zz_blox.conf'
+DETECT_TIMEOUT = 2   # seconds / sekundy
+
+DOCKER_REPO_HTTPS = 'https://download.docker.com/linux/ubuntu'
+# English: Plain-HTTP name of the Docker repository; apt-cacher-ng remaps it to HTTPS upstream
+# Polski: Nazwa HTTP repozytorium Dockera; apt-cacher-ng przemapowuje ją na HTTPS u źródła
+DOCKER_REPO_CACHED = 'http://download.docker.com/linux/ubuntu'
+
+
+# =====================================================================================
+# === SETTINGS ===
+# === USTAWIENIA ===
+# =====================================================================================
+
+def get_settings(config):
+    # English: Merge GLOBAL_SETTINGS.apt_cache over defaults
+    # Polski: Nałóż GLOBAL_SETTINGS.apt_cache na wartości domyślne
+    settings = dict(SETTINGS_DEFAULTS)
+    apt_cache = (config.get('GLOBAL_SETTINGS', {}) or {}).get('apt_cache', {}) or {}
+    settings.update({k: v for k, v in apt_cache.items() if v is not None})
+    settings['host'] = str(settings['host']).strip()
+    if settings['host'].lower() == ADMIN_HOST:
+        settings['host'] = ADMIN_HOST
+    else:
+        settings['host'] = settings['host'].upper()
+    settings['port'] = int(settings['port'])
+    return settings
+
+
+def cache_address(config, settings=None):
+    """
+    English: IP the cache listens on: vpn.admin_ip for the admin machine, internal_ip for a VM.
+             None when it cannot be determined.
+    Polski:  IP, na którym nasłuchuje bufor: vpn.admin_ip dla maszyny admina, internal_ip dla VM.
+             None, gdy nie da się go ustalić.
+    """
+    settings = settings or get_settings(config)
+    if settings['host'] == ADMIN_HOST:
+        admin_ip = ((config.get('GLOBAL_SETTINGS', {}) or {}).get('vpn', {}) or {}).get('admin_ip', '')
+        return admin_ip.split('/')[0] or None
+    return (config.get(settings['host']) or {}).get('internal_ip') or None
+
+
+def proxy_url(config):
+    """
+    English: 'http://<ip>:<port>' when the cache is enabled and its address is known, else None.
+    Polski:  'http://<ip>:<port>', gdy bufor jest włączony i jego adres jest znany, inaczej None.
+    """
+    settings = get_settings(config)
+    if not settings['enabled']:
+        return None
+    address = cache_address(config, settings)
+    return f"http://{address}:{settings['port']}" if address else None
+
+
+def docker_repo(proxy):
+    return DOCKER_REPO_CACHED if proxy else DOCKER_REPO_HTTPS
+
+
+# =====================================================================================
+# === REMOTE SCRIPTS ===
+# === SKRYPTY ZDALNE ===
+# =====================================================================================
+
+def build_client_script(proxy):
+    """
+    English: Points apt at the cache through a detect script (Acquire::http::Proxy-Auto-Detect)
+             that falls back to DIRECT when the cache does not answer. Idempotent.
+    Polski:  Kieruje apt do bufora przez skrypt wykrywający (Acquire::http::Proxy-Auto-Detect),
+             który wraca do DIRECT, gdy bufor nie odpowiada. Idempotentne.
+    """
+    host_port = proxy.split('://', 1)[-1]
+    host, _, port = host_port.partition(':')
+    return f"""
+echo "--- apt proxy: {proxy} ---"
+sudo tee {PROXY_DETECT_PATH} > /dev/null <<'BLOX_APT_PROXY'
+#!/bin/bash
+# Generated by apt_cache.py - fleet apt cache, DIRECT when unreachable
+# Wygenerowany przez apt_cache.py - bufor apt floty, DIRECT gdy nieosiągalny
+if timeout {DETECT_TIMEOUT} bash -c '< /dev/tcp/{host}/{port}' 2> /dev/null; then echo {proxy}; else echo DIRECT; fi
+BLOX_APT_PROXY
+sudo chmod 755 {PROXY_DETECT_PATH}
+echo 'Acquire::http::Proxy-Auto-Detect "{PROXY_DETECT_PATH}";' | sudo tee {APT_CONF_PATH} > /dev/null
+if [ -f /etc/apt/sources.list.d/docker.list ]; then
+    sudo sed -i 's#{DOCKER_REPO_HTTPS}#{DOCKER_REPO_CACHED}#' /etc/apt/sources.list.d/docker.list
+fi
+"""
+
+
+def build_client_removal_script():
+    return f"""
+echo "--- apt proxy: removed / usunięty ---"
+sudo rm -f {APT_CONF_PATH} {PROXY_DETECT_PATH}
+if [ -f /etc/apt/sources.list.d/docker.list ]; then
+    sudo sed -i 's#{DOCKER_REPO_CACHED}#{DOCKER_REPO_HTTPS}#' /etc/apt/sources.list.d/docker.list
+fi
+"""
+
+
+def build_server_script(bind_ip, port):
+    """
+    English: Installs apt-cacher-ng listening on localhost and bind_ip, with the Docker remap.
+    Polski:  Instaluje apt-cacher-ng nasłuchujący na localhost i bind_ip, z przemapowaniem Dockera.
+    """
+    return f"""
+set -e
+export DEBIAN_FRONTEND=noninteractive
+echo "--- Installing apt-cacher-ng / Instalacja apt-cacher-ng ---"
+if ! dpkg -s apt-cacher-ng > /dev/null 2>&1; then
+    echo 'apt-cacher-ng apt-cacher-ng/tunnelenable boolean false' | debconf-set-selections
+    apt-get update -y && apt-get install -y apt-cacher-ng
+fi
+cat > {SERVER_CONF_PATH} <<'BLOX_ACNG'
+# Generated by apt_cache.py / Wygenerowany przez apt_cache.py
+Port: {port}
+BindAddress: localhost {bind_ip}
+Remap-bloxdocker: {DOCKER_REPO_CACHED.rsplit('/linux', 1)[0]} ; {DOCKER_REPO_HTTPS.rsplit('/linux', 1)[0]}
+BLOX_ACNG
+systemctl enable apt-cacher-ng
+systemctl restart apt-cacher-ng
+echo "✅ apt-cacher-ng listening on {bind_ip}:{port}"
+"""
+
+
+def with_proxy(steps, proxy):
+    """
+    English: Puts an 'apt-proxy' step in front of the installer steps. It runs only when some
+             other step runs (a fully installed server stays a one-probe no-op).
+    Polski:  Dodaje krok 'apt-proxy' przed krokami instalatora. Wykonuje się tylko wtedy, gdy
+             wykonuje się inny krok (w pełni zainstalowany serwer pozostaje jedną sondą).
+    """
+    if not proxy:
+        return steps
+    proxy_step = remote_steps.Step('apt-proxy', not remote_steps.missing(steps), build_client_script(proxy))
+    return [proxy_step] + list(steps)
+
+
+# =====================================================================================
+# === HELPER FUNCTIONS ===
+# === FUNKCJE POMOCNICZE ===
+# =====================================================================================
+
+@tracing.traced('local_sudo')
+def run_local_sudo(script, password):
+    """
+    English: Runs a root script on the admin machine with a single 'sudo -S'.
+    Polski:  Uruchamia skrypt roota na maszynie admina jednym 'sudo -S'.
+    """
+    try:
+        process = subprocess.Popen(['sudo', '-S', '-p', '', 'bash', '-c', script], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+        process.stdin.write((password or '') + '\n')
+        process.stdin.close()
+        for line in process.stdout:
+            print(f"   {line.rstrip()}")
+        return process.wait()
+    except FileNotFoundError:
+        print("❌ ERROR: Command 'sudo' not found. / BŁĄD: Nie znaleziono polecenia 'sudo'.")
+        return 1
+
+
+@tracing.traced('ssh')
+def run_ssh_command(host_ip, user, command):
+    # English: Execute a command via SSH, streaming the output
+    # Polski: Wykonaj polecenie przez SSH, przesyłając wyjście na bieżąco
+    try:
+        process = subprocess.Popen(['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{host_ip}', command],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+        for line in process.stdout:
+            if line.strip() and "perl: warning" not in line and "LC_" not in line:
+                print(f"   [{host_ip}] {line.rstrip()}")
+        return process.wait()
+    except FileNotFoundError:
+        print("❌ ERROR: Command 'ssh' not found. / BŁĄD: Nie znaleziono polecenia 'ssh'.")
+        return 1
+
+
+def cache_status(address, port):
+    """
+    English: (reachable, statistics line) from the apt-cacher-ng report page.
+    Polski:  (osiągalny, linia statystyk) ze strony raportu apt-cacher-ng.
+    """
+    try:
+        res = subprocess.run(['curl', '-sf', '--max-time', '5', f"http://{address}:{port}/acng-report.html"],
+                             capture_output=True, text=True, encoding='utf-8')
+    except FileNotFoundError:
+        return False, "curl not found / nie znaleziono curl"
+    if res.returncode != 0:
+        return False, f"no answer / brak odpowiedzi (curl exit {res.returncode})"
+    return True, f"{len(res.stdout)} bytes report / bajtów raportu"
+
+
+# =====================================================================================
+# === MAIN SCRIPT LOGIC ===
+# === GŁÓWNA LOGIKA SKRYPTU ===
+# =====================================================================================
+
+def main():
+    os.system("clear || cls")
+    print("=" * 60)
+    print("=== FLEET APT PACKAGE CACHE (v1.0) ===")
+    print("=== WSPÓLNY BUFOR PAKIETÓW APT FLOTY (v1.0) ===")
+    print("=" * 60)
+
+    if not os.path.exists(CONFIG_FILE):
+        print(f"❌ Config file '{CONFIG_FILE}' not found.")
+        print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
+        return 1
+    config = config_store.load(CONFIG_FILE)
+    settings = get_settings(config)
+    address = cache_address(config, settings)
+    admin_user = ((config.get('GLOBAL_SETTINGS', {}) or {}).get('vm', {}) or {}).get('admin_user',
+                                                                                       'blox_tak_server_admin')
+
+    print(f"\nEnabled / Włączony: {settings['enabled']}")
+    print(f"Host:               {settings['host']}")
+    print(f"Proxy:              http://{address or '?'}:{settings['port']}")
+    if not address:
+        print(f"\n❌ ERROR: No address for cache host '{settings['host']}' (vpn.admin_ip or <VM>.internal_ip).")
+        print(f"❌ BŁĄD: Brak adresu hosta bufora '{settings['host']}' (vpn.admin_ip lub <VM>.internal_ip).")
+        return 1
+
+    print("\n  1. Set up / update the cache server / Zainstaluj / zaktualizuj serwer bufora")
+    print("  2. Check the cache / Sprawdź bufor")
+    print("  3. Remove the proxy from a VM / Usuń proxy z maszyny")
+    choice = input("> ").strip()
+
+    if choice == '1':
+        script = build_server_script(address, settings['port'])
+        if settings['host'] == ADMIN_HOST:
+            print(f"\n🔄 Installing on the admin machine / Instalacja na maszynie admina ({address})...")
+            print("ℹ️  The WireGuard tunnel must be up so the address can be bound.")
+            print("ℹ️  Tunel WireGuard musi być aktywny, aby można było nasłuchiwać na adresie.")
+            password = (config.get('LOCAL_CONFIG', {}) or {}).get('password')
+            code = run_local_sudo(script, password)
+        else:
+            print(f"\n🔄 Installing on / Instalacja na {settings['host']} ({address})...")
+            code = run_ssh_command(address, admin_user, f"sudo bash -c {shlex.quote(script)}")
+        if code != 0:
+            print(f"❌ Cache setup failed (exit {code}). / Instalacja bufora nie powiodła się (kod {code}).")
+            return 1
+        print("\n✅ Cache ready. Set GLOBAL_SETTINGS.apt_cache.enabled: true to use it in the installers.")
+        print("✅ Bufor gotowy. Ustaw GLOBAL_SETTINGS.apt_cache.enabled: true, aby instalatory go używały.")
+    elif choice == '2':
+        reachable, detail = cache_status(address, settings['port'])
+        print(f"\n{'✅' if reachable else '❌'} http://{address}:{settings['port']} - {detail}")
+        if not reachable:
+            return 1
+    elif choice == '3':
+        vms = {k: v for k, v in config.items() if isinstance(v, dict) and 'name' in v}
+        for key, data in vms.items():
+            print(f"  - {key}: {data['name']}")
+        vm_key = input("\nVM key / Klucz VM:\n> ").strip().upper()
+        if vm_key not in vms or not vms[vm_key].get('internal_ip'):
+            print(f"❌ ERROR: Unknown VM or missing internal_ip: '{vm_key}'.")
+            print(f"❌ BŁĄD: Nieznana maszyna lub brak internal_ip: '{vm_key}'.")
+            return 1
+        return 0 if run_ssh_command(vms[vm_key]['internal_ip'], admin_user, build_client_removal_script()) == 0 else 1
+    else:
+        print("Operation cancelled / Operacja anulowana.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
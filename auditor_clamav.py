@@ -3,10 +3,17 @@
 
 import os
 import subprocess
-import yaml
+import config_store
 import datetime
 import glob
-from fpdf import FPDF, XPos, YPos
+import gzip
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fpdf import XPos, YPos
+from clamav_scheduler import (get_scheduler_settings, build_throttled_scan_script, build_reset_script,
+                              parse_marker)
+import tracing
+from report_toolkit import ReportPDF
 try:
     from pypdf import PdfReader, PdfWriter
 except ImportError:
@@ -14,12 +21,59 @@ except ImportError:
     exit(1)
 
 CONFIG_FILE = 'config.yaml'
-FONTS = {'R': "UbuntuMono-Regular.ttf", 'B': "UbuntuMono-Bold.ttf"}
+
+# English: Print a progress line every N parsed log lines.
+# Polski:  Drukuj linię postępu co N przetworzonych linii logu.
+PROGRESS_EVERY = 2000
+
+# English: Sample paths kept per error category (the rest is only counted).
+# Polski:  Przykładowe ścieżki zachowane dla kategorii błędu (reszta jest tylko liczona).
+ERROR_SAMPLES = 3
+
+SUMMARY_HEADER = "----------- SCAN SUMMARY -----------"
+
+# English: Known clamd per-file error messages ("<path>: <message> ERROR"); messages may contain
+#          ': ' themselves, so the path ends where one of these starts.
+# Polski:  Znane komunikaty błędów clamd dla plików ("<ścieżka>: <komunikat> ERROR"); komunikaty
+#          same mogą zawierać ': ', więc ścieżka kończy się tam, gdzie zaczyna się jeden z nich.
+CLAMD_ERROR_MESSAGES = ("lstat() failed", "Access denied", "Can't open file or directory", "Can't access file",
+                        "Not supported file type", "File path check failure", "Excluded", "Permission denied",
+                        "Failed to", "Size limit reached", "Not a regular file")
+
+# English: Prefixes of host-level lines (no file path); 'ssh:' comes from the merged ssh stderr.
+#          ERROR:/ssh: lines (clamd unreachable, connection refused) fail the scan, WARNING: does not.
+# Polski:  Prefiksy linii na poziomie hosta (bez ścieżki); 'ssh:' pochodzi ze scalonego stderr ssh.
+#          Linie ERROR:/ssh: (clamd nieosiągalny, odmowa połączenia) oznaczają nieudany skan, WARNING: nie.
+HOST_ERROR_PREFIXES = ('WARNING:', 'ERROR:', 'ssh:')
+HOST_FAILURE_PREFIXES = ('ERROR:', 'ssh:')
+
+# English: ssh exits 255 when the connection fails. clamdscan exits 0 (clean), 1 (virus found) or
+#          2 whenever any file error was logged - routine on a full scan (/proc, /sys, ...), so 2
+#          with a parsed SCAN SUMMARY is a finished scan.
+# Polski:  ssh kończy się kodem 255, gdy połączenie się nie uda. clamdscan zwraca 0 (czysto),
+#          1 (wirus) lub 2, gdy zalogowano jakikolwiek błąd pliku - rutynowe przy pełnym skanie
+#          (/proc, /sys, ...), więc 2 z odczytanym SCAN SUMMARY to ukończony skan.
+SSH_FAILURE_EXIT = 255
 
 # --- TEXT CONSTANTS (PL/EN) ---
 TEXTS = {
     'PL': {
         'title': "ZAŁĄCZNIK C: SKAN ANTYWIRUSOWY (CLAMAV)",
+        'sec_summary': "1. PODSUMOWANIE SKANU",
+        'sec_threats': "2. WYKRYTE ZAGROŻENIA",
+        'sec_errors': "3. BŁĘDY SKANOWANIA (WG KATEGORII)",
+        'sec_raw': "4. PEŁNY LOG SKANU (ARCHIWUM)",
+        'col_file': "PLIK", 'col_sig': "SYGNATURA",
+        'col_msg': "KOMUNIKAT", 'col_loc': "LOKALIZACJA", 'col_count': "LICZBA",
+        'col_key': "POZYCJA", 'col_val': "WARTOŚĆ",
+        'no_threats': "Nie wykryto zagrożeń.",
+        'no_errors': "Brak błędów skanowania.",
+        'raw_name': "Plik archiwum:", 'raw_hash': "SHA-256:", 'raw_lines': "Linie logu:",
+        'fleet_title': "PODSUMOWANIE FLOTY: SKAN ANTYWIRUSOWY (CLAMAV)",
+        'fleet_sec_hosts': "1. STATUS SKANU WG SERWERA",
+        'fleet_sec_threats': "2. ZAGROŻENIA W CAŁEJ FLOCIE",
+        'col_vm': "SERWER", 'col_status': "STATUS", 'col_infected': "ZAINF.", 'col_errors': "BŁĘDY",
+        'col_time': "CZAS [s]",
         'box_title': "UWAGA: ANALIZA FAŁSZYWYCH ALARMÓW I BŁĘDÓW SYSTEMOWYCH",
         'box_body': (
             "1. WYKRYTE ZAGROŻENIA (False Positive): Pliki w ścieżkach zawierających 'Neo23x0_signature-base' "
@@ -33,6 +87,21 @@ TEXTS = {
     },
     'EN': {
         'title': "APPENDIX C: ANTIVIRUS SECURITY SCAN (CLAMAV)",
+        'sec_summary': "1. SCAN SUMMARY",
+        'sec_threats': "2. DETECTED THREATS",
+        'sec_errors': "3. SCAN ERRORS (BY CATEGORY)",
+        'sec_raw': "4. FULL SCAN LOG (ARCHIVE)",
+        'col_file': "FILE", 'col_sig': "SIGNATURE",
+        'col_msg': "MESSAGE", 'col_loc': "LOCATION", 'col_count': "COUNT",
+        'col_key': "ITEM", 'col_val': "VALUE",
+        'no_threats': "No threats detected.",
+        'no_errors': "No scan errors.",
+        'raw_name': "Archive file:", 'raw_hash': "SHA-256:", 'raw_lines': "Log lines:",
+        'fleet_title': "FLEET SUMMARY: ANTIVIRUS SECURITY SCAN (CLAMAV)",
+        'fleet_sec_hosts': "1. SCAN STATUS PER SERVER",
+        'fleet_sec_threats': "2. THREATS ACROSS THE FLEET",
+        'col_vm': "SERVER", 'col_status': "STATUS", 'col_infected': "INFECTED", 'col_errors': "ERRORS",
+        'col_time': "TIME [s]",
         'box_title': "NOTE: ANALYSIS OF FALSE POSITIVES AND SYSTEM ERRORS",
         'box_body': (
             "1. DETECTED THREATS (False Positive): Files located in 'Neo23x0_signature-base' paths are YARA "
@@ -47,173 +116,472 @@ TEXTS = {
 
 def load_config():
     if not os.path.exists(CONFIG_FILE): return None
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return yaml.safe_load(f)
+    return config_store.load(CONFIG_FILE)
 
+@tracing.traced('ssh')
 def run_ssh_task(host_ip, user, cmd):
-    print(f"\n🔄 Executing remote scan on {host_ip} (Turbo Mode - FULL SYSTEM)...")
-    print(f"🔄 Wykonywanie zdalnego skanowania na {host_ip} (Tryb Turbo - PEŁNY SYSTEM)...")
     ssh = ['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{host_ip}', cmd]
     try:
-        # Increase timeout significantly for full scan
         res = subprocess.run(ssh, capture_output=True, text=True)
         return res.stdout.strip()
     except Exception as e:
         print(f"❌ SSH Error: {e}")
         return None
 
-class ClamReportPDF(FPDF):
-    def __init__(self, lang='EN'):
+# --- STREAMING RESULT PARSER ---
+# --- STRUMIENIOWY PARSER WYNIKÓW ---
+
+class ClamScanParser:
+    """
+    English: Incremental parser for clamdscan output. Each fed line becomes at most one event
+             ('found', 'error', 'summary', 'marker', 'progress'); the parser keeps only the
+             findings, per-category error counters and summed summary counters in memory.
+    Polski:  Przyrostowy parser wyjścia clamdscan. Każda linia daje co najwyżej jedno zdarzenie
+             ('found', 'error', 'summary', 'marker', 'progress'); w pamięci przechowywane są
+             tylko znaleziska, liczniki błędów wg kategorii i zsumowane liczniki podsumowania.
+    """
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.findings = []
+        self.errors = {}
+        self.summary = {}
+        self.status = None
+        self.returncode = None
+        self.summary_seen = False
+        self.host_failures = 0
+        self.lines = 0
+        self.error_total = 0
+        self._in_summary = False
+
+    def _emit(self, event):
+        if self.on_event: self.on_event(event)
+        return event
+
+    def feed(self, line):
+        line = line.rstrip('\r\n')
+        if not line.strip(): return None
+
+        marker = parse_marker(line)
+        if marker:
+            text, status = marker
+            if status: self.status = status
+            return self._emit({'type': 'marker', 'text': text})
+
+        self.lines += 1
+        event = self._parse_line(line.strip())
+        if event: self._emit(event)
+        if self.lines % PROGRESS_EVERY == 0:
+            self._emit({'type': 'progress', 'lines': self.lines,
+                        'infected': len(self.findings), 'errors': self.error_total})
+        return event
+
+    def _parse_line(self, line):
+        if line == SUMMARY_HEADER:
+            self._in_summary = True
+            self.summary_seen = True
+            return None
+
+        # Summary block: "Key: value" (multiple blocks are summed - throttled mode)
+        # Blok podsumowania: "Klucz: wartość" (wiele bloków jest sumowanych - tryb dławiony)
+        if self._in_summary and ':' in line and not line.startswith('/'):
+            key, value = [p.strip() for p in line.split(':', 1)]
+            if value.isdigit():
+                self.summary[key] = self.summary.get(key, 0) + int(value)
+            elif key == 'Time':
+                seconds = value.split()[0]
+                try:
+                    self.summary[key] = round(self.summary.get(key, 0.0) + float(seconds), 3)
+                except ValueError:
+                    self.summary[key] = value
+            elif value.endswith(' MB') and value[:-3].replace('.', '', 1).isdigit():
+                total = float(str(self.summary.get(key, '0 MB')).split()[0]) + float(value[:-3])
+                self.summary[key] = f"{total:.2f} MB"
+            elif key == 'Start Date' and key in self.summary:
+                pass
+            else:
+                self.summary[key] = value
+            return {'type': 'summary', 'key': key, 'value': self.summary[key]}
+        self._in_summary = False
+
+        if line.endswith(' FOUND'):
+            path, _, rest = line.rpartition(': ')
+            finding = {'path': path, 'signature': rest[:-len(' FOUND')].strip()}
+            self.findings.append(finding)
+            return dict(finding, type='found')
+
+        if line.endswith(' ERROR') or line.startswith(HOST_ERROR_PREFIXES):
+            # Host-level lines ("ERROR: Could not connect to clamd ...") have no path
+            # Linie na poziomie hosta ("ERROR: Could not connect to clamd ...") nie mają ścieżki
+            if line.startswith(HOST_FAILURE_PREFIXES):
+                self.host_failures += 1
+            if line.startswith(HOST_ERROR_PREFIXES):
+                path, message = '', line.split(':', 1)[1].strip()
+            else:
+                path, message = split_error_line(line[:-len(' ERROR')])
+                message = message.strip().rstrip('.')
+            location = '/' + path.split('/')[1] if path.startswith('/') and path.count('/') > 1 else (path or '-')
+            bucket = self.errors.setdefault((message, location), {'count': 0, 'samples': []})
+            bucket['count'] += 1
+            if len(bucket['samples']) < ERROR_SAMPLES: bucket['samples'].append(path)
+            self.error_total += 1
+            return {'type': 'error', 'path': path, 'message': message}
+
+        return None
+
+    def final_status(self, require_marker=False):
+        """
+        English: 'complete', 'paused' or 'error' once the stream has ended. An ssh failure (255),
+                 a host-level ERROR:/ssh: line, a scan error marker or a missing SCAN SUMMARY
+                 block is an error - an unreachable host or a dead clamd is never reported as
+                 clean. Per-file errors (clamdscan exit 2) are only counted.
+        Polski:  'complete', 'paused' lub 'error' po zakończeniu strumienia. Błąd ssh (255), linia
+                 ERROR:/ssh: na poziomie hosta, znacznik błędu skanu lub brak bloku SCAN SUMMARY
+                 to błąd - nieosiągalny host lub martwy clamd nigdy nie jest raportowany jako
+                 czysty. Błędy pojedynczych plików (kod 2 clamdscan) są tylko liczone.
+        """
+        if self.status == 'error' or self.returncode == SSH_FAILURE_EXIT or self.host_failures:
+            return 'error'
+        if self.status == 'paused':
+            return 'paused'
+        if not self.summary_seen or (require_marker and self.status != 'complete'):
+            return 'error'
+        return 'complete'
+
+    def error_categories(self):
+        # Largest categories first
+        # Największe kategorie najpierw
+        rows = [(msg, loc, b['count']) for (msg, loc), b in self.errors.items()]
+        return sorted(rows, key=lambda r: (-r[2], r[0], r[1]))
+
+def split_error_line(text):
+    """
+    English: '<path>: <message>' -> (path, message), splitting before the first known clamd
+             message; otherwise at the first ': ' (paths rarely contain it, messages often do).
+    Polski:  '<ścieżka>: <komunikat>' -> (ścieżka, komunikat), podział przed pierwszym znanym
+             komunikatem clamd; w przeciwnym razie na pierwszym ': ' (rzadko w ścieżkach, często w komunikatach).
+    """
+    start = text.find(': ')
+    pos = start
+    while pos != -1:
+        if text[pos + 2:].startswith(CLAMD_ERROR_MESSAGES):
+            return text[:pos], text[pos + 2:]
+        pos = text.find(': ', pos + 1)
+    if start == -1:
+        return '', text
+    return text[:start], text[start + 2:]
+
+def print_scan_event(host_ip, event):
+    # Console progress for streamed events
+    # Postęp w konsoli dla zdarzeń strumieniowych
+    if event['type'] == 'found':
+        print(f"   [{host_ip}] 🦠 FOUND {event['signature']} -> {event['path']}")
+    elif event['type'] == 'marker':
+        print(f"   [{host_ip}] {event['text']}")
+    elif event['type'] == 'progress':
+        print(f"   [{host_ip}] … {event['lines']} lines | infected: {event['infected']} | errors: {event['errors']}")
+
+def stream_ssh_scan(host_ip, user, cmd, raw_log_path, on_event=None):
+    """
+    English: Runs the scan over SSH, archives every raw line to a gzip log and feeds the
+             parser line by line. Returns the parser (with the ssh exit code in .returncode),
+             or None when SSH could not be started.
+    Polski:  Uruchamia skan przez SSH, archiwizuje każdą surową linię do logu gzip i zasila
+             parser linia po linii. Zwraca parser (z kodem wyjścia ssh w .returncode) lub None,
+             gdy nie udało się uruchomić SSH.
+    """
+    print(f"\n🔄 Executing remote scan on {host_ip}...")
+    print(f"🔄 Wykonywanie zdalnego skanowania na {host_ip}...")
+    ssh = ['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{host_ip}', cmd]
+    parser = ClamScanParser(on_event)
+    os.makedirs(os.path.dirname(raw_log_path), exist_ok=True)
+    try:
+        with gzip.open(raw_log_path, 'wt', encoding='utf-8') as raw, \
+             subprocess.Popen(ssh, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                              encoding='utf-8', errors='replace') as process:
+            for line in process.stdout:
+                raw.write(line)
+                parser.feed(line)
+        parser.returncode = process.returncode
+        return parser
+    except Exception as e:
+        print(f"❌ SSH Error: {e}")
+        return None
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b""): sha.update(block)
+    return sha.hexdigest()
+
+class ClamReportPDF(ReportPDF):
+    def __init__(self, lang='EN', title=None):
         super().__init__()
         self.lang = lang
+        self.title_text = title or TEXTS[lang]['title']
 
     def header(self):
-        if os.path.exists(FONTS['R']):
-            self.add_font('UbuntuMono', '', FONTS['R'])
-            self.add_font('UbuntuMono', 'B', FONTS['B'])
-            self.set_font('UbuntuMono', 'B', 14)
-        else:
-            self.set_font('Courier', 'B', 14)
-        
-        title_text = TEXTS[self.lang]['title']
-        self.cell(0, 10, title_text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+        self.set_font(self.report_font, 'B', 14)
+
+        self.cell(0, 10, self.title_text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
         self.ln(5)
 
-def generate_pdf_for_lang(lang, output_data, filename):
+@tracing.traced('pdf.report')
+def generate_pdf_for_lang(lang, parser, raw_log_path, raw_log_hash, filename):
+    t = TEXTS[lang]
     pdf = ClamReportPDF(lang)
     pdf.add_page()
-    
-    # Use smaller font to fit more errors per page
-    if os.path.exists(FONTS['R']):
-        pdf.set_font('UbuntuMono', '', 8) 
+
+    def section(title):
+        pdf.ln(4)
+        pdf.set_font('', 'B', 11)
+        pdf.cell(0, 8, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # 1. SUMMARY COUNTERS
+    section(t['sec_summary'])
+    pdf.set_font('', 'B', 9)
+    pdf.print_row([t['col_key'], t['col_val']], [70, 120], fill=True)
+    pdf.set_font('', '', 9)
+    for key, value in parser.summary.items():
+        highlight = (255, 0, 0) if key == 'Infected files' and value else None
+        pdf.print_row([key, value], [70, 120], color=highlight)
+
+    # 2. THREATS
+    section(t['sec_threats'])
+    if parser.findings:
+        pdf.set_font('', 'B', 9)
+        pdf.print_row([t['col_file'], t['col_sig']], [130, 60], fill=True)
+        pdf.set_font('', '', 8)
+        for f in parser.findings:
+            pdf.print_row([f['path'], f['signature']], [130, 60], color=(255, 0, 0))
     else:
-        pdf.set_font('Courier', '', 8)
-    
-    # 1. ADD SCAN CONTENT
-    summary_started = False
-    for line in output_data.split('\n'):
-        line = line.strip()
-        if not line: continue
-
-        # Header for summary - Bold
-        if "----------- SCAN SUMMARY -----------" in line:
-            summary_started = True
-            pdf.ln(5)
-            pdf.set_font('', 'B', 10)
-            pdf.cell(0, 8, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_font('', '', 8)
-            continue
-        
-        # Determine color and wrap logic
-        if summary_started:
-            # Summary lines are short, cell is fine, but let's use multi_cell for consistency
-            pdf.multi_cell(0, 4, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        elif "FOUND" in line:
-            # Threats in RED
-            pdf.set_text_color(255, 0, 0)
-            pdf.multi_cell(0, 4, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_text_color(0, 0, 0)
-        elif "Infected files:" in line:
-             pdf.set_font('', 'B', 10)
-             pdf.multi_cell(0, 6, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-             pdf.set_font('', '', 8)
-        else:
-            # WARNINGS / ERRORS / NORMAL LINES
-            # FORCE WRAPPING FOR EVERYTHING using multi_cell
-            pdf.multi_cell(0, 4, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font('', '', 9)
+        pdf.cell(0, 6, t['no_threats'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # 3. ERRORS (grouped, not line by line)
+    section(t['sec_errors'])
+    categories = parser.error_categories()
+    if categories:
+        pdf.set_font('', 'B', 9)
+        pdf.print_row([t['col_msg'], t['col_loc'], t['col_count']], [110, 50, 30], fill=True)
+        pdf.set_font('', '', 8)
+        for message, location, count in categories:
+            pdf.print_row([message, location, count], [110, 50, 30])
+    else:
+        pdf.set_font('', '', 9)
+        pdf.cell(0, 6, t['no_errors'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
-    # 2. ADD EXPLANATORY FRAME (RAMKA)
-    pdf.add_page() 
+    # 4. RAW LOG REFERENCE
+    section(t['sec_raw'])
+    pdf.set_font('', '', 9)
+    for label, value in [(t['raw_name'], os.path.basename(raw_log_path)),
+                         (t['raw_hash'], raw_log_hash),
+                         (t['raw_lines'], parser.lines)]:
+        pdf.print_row([label, value], [40, 150])
+
+    # 5. ADD EXPLANATORY FRAME (RAMKA)
+    pdf.add_page()
     pdf.ln(5)
-    
+
     # Title of the box
     pdf.set_font('', 'B', 11)
-    pdf.multi_cell(0, 6, TEXTS[lang]['box_title'], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-    
+    pdf.multi_cell(0, 6, t['box_title'], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+
     # Content of the box
     pdf.set_font('', '', 10)
     pdf.ln(2)
-    
+
     # Create a visual box (border=1) with multi-line explanation
-    pdf.multi_cell(0, 6, TEXTS[lang]['box_body'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-    
+    pdf.multi_cell(0, 6, t['box_body'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
     pdf.output(filename)
 
-def main():
-    os.system("clear || cls")
-    print("=" * 60)
-    print("=== SMART AUDITOR: CLAMAV (v2.5 FINAL) ===")
-    print("=" * 60)
+def generate_fleet_summary_pdf(lang, results, filename):
+    # One fleet-level page set: per-server status table and all threats with their server
+    # Zestaw stron dla floty: tabela statusu serwerów i wszystkie zagrożenia z serwerem
+    t = TEXTS[lang]
+    pdf = ClamReportPDF(lang, title=t['fleet_title'])
+    pdf.add_page()
 
-    config = load_config()
-    if not config: return
-    vms = {k: v for k, v in config.items() if isinstance(v, dict) and 'name' in v}
-    
-    print("\nAvailable VMs / Dostępne VM:")
-    for k, v in vms.items(): print(f" [{k}] {v['name']}")
-    key = input("\nSelect VM Key / Wybierz Klucz VM:\n> ").strip().upper()
-    if key not in vms: return
-    
-    vm = vms[key]
+    pdf.set_font('', 'B', 11)
+    pdf.cell(0, 8, t['fleet_sec_hosts'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    widths = [60, 40, 30, 30, 30]
+    pdf.set_font('', 'B', 9)
+    pdf.print_row([t['col_vm'], t['col_status'], t['col_infected'], t['col_errors'], t['col_time']], widths, fill=True)
+    pdf.set_font('', '', 9)
+    for r in results:
+        parser = r['parser']
+        status = r['status'].upper()
+        if r['status'] == 'error' and parser and parser.returncode == SSH_FAILURE_EXIT:
+            status += f" (exit {parser.returncode})"
+        # A failed scan without findings proves nothing - never show it as 0
+        # Nieudany skan bez znalezisk nic nie dowodzi - nigdy nie pokazuj go jako 0
+        infected = len(parser.findings) if parser and (r['status'] != 'error' or parser.findings) else '-'
+        errors = parser.error_total if parser else '-'
+        seconds = parser.summary.get('Time', '-') if parser else '-'
+        color = (255, 0, 0) if (parser and parser.findings) or r['status'] not in ('complete', 'paused') else None
+        pdf.print_row([f"{r['key']}: {r['name']}", status, infected, errors, seconds], widths, color=color)
+
+    pdf.ln(4)
+    pdf.set_font('', 'B', 11)
+    pdf.cell(0, 8, t['fleet_sec_threats'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    findings = [(r['key'], f) for r in results if r['parser'] for f in r['parser'].findings]
+    if findings:
+        pdf.set_font('', 'B', 9)
+        pdf.print_row([t['col_vm'], t['col_file'], t['col_sig']], [25, 110, 55], fill=True)
+        pdf.set_font('', '', 8)
+        for key, f in findings:
+            pdf.print_row([key, f['path'], f['signature']], [25, 110, 55], color=(255, 0, 0))
+    else:
+        pdf.set_font('', '', 9)
+        pdf.cell(0, 6, t['no_threats'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    pdf.output(filename)
+
+def scan_vm(key, vm, scan_cmd, evidence_dir, ts, strict_status):
+    """
+    English: Scans one VM (safe to run in a worker thread) and returns a structured result.
+    Polski:  Skanuje jedną VM (bezpieczne w wątku roboczym) i zwraca ustrukturyzowany wynik.
+    """
     user = vm.get('admin_user', 'blox_tak_server_admin')
     ip = vm.get('internal_ip')
+    result = {'key': key, 'name': vm['name'], 'ip': ip, 'status': 'error',
+              'parser': None, 'raw_log_path': None, 'raw_log_hash': None}
+    if not ip:
+        print(f"❌ [{key}] Missing 'internal_ip' / Brak 'internal_ip'")
+        return result
 
-    log_file = f"/root/clam_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt"
-    
-    # FULL SCAN on '/'
-    scan_cmd = (
-        f"sudo clamdscan --multiscan --fdpass "
-        f"--log='{log_file}' /; "
-        f"sudo cat {log_file}"
-    )
-
-    # Execute Scan
-    output = run_ssh_task(ip, user, scan_cmd)
-    if not output: 
-        print("❌ No output / Brak danych")
-        return
+    raw_log_path = os.path.join(evidence_dir, vm['name'], 'clamav', f"clamav_{ts}.log.gz")
+    parser = stream_ssh_scan(ip, user, scan_cmd, raw_log_path, lambda e: print_scan_event(ip, e))
+    if parser is None or (parser.lines == 0 and parser.status is None):
+        print(f"❌ [{key}] No output / Brak danych")
+        return result
 
-    print("✅ Scan Complete. Generating PDF assets...")
+    result['parser'] = parser
+    result['raw_log_path'] = raw_log_path
+    result['raw_log_hash'] = file_sha256(raw_log_path)
+    result['status'] = parser.final_status(require_marker=strict_status)
+    if result['status'] == 'error':
+        # Show why, instead of an empty "clean" result
+        # Pokaż przyczynę zamiast pustego "czystego" wyniku
+        print(f"❌ [{key}] Scan failed (exit {parser.returncode}) / Skan nieudany (kod {parser.returncode})")
+        for message, location, count in parser.error_categories()[:ERROR_SAMPLES]:
+            print(f"   [{key}] {message} ({location}, x{count})")
+    print(f"🏁 [{key}] {result['status'].upper()} | infected: {len(parser.findings)} | errors: {parser.error_total}")
+    return result
 
-    # Generate Temp PDFs
-    temp_pl = "temp_clamav_PL.pdf"
-    temp_en = "temp_clamav_EN.pdf"
-    
-    generate_pdf_for_lang('PL', output, temp_pl)
-    generate_pdf_for_lang('EN', output, temp_en)
+def append_to_reports(result):
+    # Per-VM Appendix C merged into that VM's existing reports
+    # Załącznik C dla VM scalany z istniejącymi raportami tej VM
+    vm_name = result['name']
+    temps = {}
+    for lang in ('PL', 'EN'):
+        temps[lang] = f"temp_clamav_{vm_name}_{lang}.pdf"
+        generate_pdf_for_lang(lang, result['parser'], result['raw_log_path'], result['raw_log_hash'], temps[lang])
 
-    # Merge Logic
-    files = glob.glob(f"*{vm['name']}*.pdf")
+    # Merge Logic - only this VM's reports (REPORT_/RAPORT_<name>_...): 'vm1' must not match 'vm10'
+    # Logika scalania - tylko raporty tej VM (REPORT_/RAPORT_<nazwa>_...): 'vm1' nie może pasować do 'vm10'
+    files = glob.glob(f"*PORT_{vm_name}_*.pdf")
     if not files:
-        print("⚠️  No reports found to append to.")
+        print(f"⚠️  No reports found to append to ({vm_name}).")
 
     for report_file in files:
-        if "temp_clamav" in report_file: continue
-        
         # Detect Language
-        if "_PL" in report_file:
-            source_temp = temp_pl
-            lang_detected = "PL"
-        else:
-            source_temp = temp_en
-            lang_detected = "EN"
+        lang_detected = "PL" if "_PL" in report_file else "EN"
+        source_temp = temps[lang_detected]
 
         print(f"\n📎 Appending [{lang_detected}] to: {report_file}")
-        
+
         try:
             reader_base = PdfReader(report_file)
             reader_clam = PdfReader(source_temp)
             writer = PdfWriter()
-            
+
             for p in reader_base.pages: writer.add_page(p)
             for p in reader_clam.pages: writer.add_page(p)
-            
+
             with open(report_file, "wb") as f_out: writer.write(f_out)
             print("✅ Success")
         except Exception as e: print(f"❌ Merge Error: {e}")
 
     # Cleanup
-    if os.path.exists(temp_pl): os.remove(temp_pl)
-    if os.path.exists(temp_en): os.remove(temp_en)
+    for temp in temps.values():
+        if os.path.exists(temp): os.remove(temp)
+
+def main():
+    os.system("clear || cls")
+    print("=" * 60)
+    print("=== SMART AUDITOR: CLAMAV (v3.1 FLEET) ===")
+    print("=" * 60)
+
+    config = load_config()
+    if not config: return
+    vms = {k: v for k, v in config.items() if isinstance(v, dict) and 'name' in v}
+
+    print("\nAvailable VMs / Dostępne VM:")
+    for k, v in vms.items(): print(f" [{k}] {v['name']}")
+    key = input("\nSelect VM Key or ALL for a fleet sweep / Wybierz Klucz VM lub ALL dla całej floty:\n> ").strip().upper()
+    if key == 'ALL':
+        targets = vms
+    elif key in vms:
+        targets = {key: vms[key]}
+    else:
+        return
+
+    print("\nScan mode / Tryb skanowania:")
+    print(" [1] Turbo - full system, maximum speed / pełny system, maksymalna prędkość")
+    print(" [2] Throttled - cgroup limits, adaptive, resumable / limity cgroup, adaptacyjny, wznawialny")
+    print(" [3] Reset throttled scan checkpoint / Resetuj punkt kontrolny skanu dławionego")
+    mode = input("> ").strip() or '1'
+
+    if mode == '3':
+        for vm in targets.values():
+            run_ssh_task(vm.get('internal_ip'), vm.get('admin_user', 'blox_tak_server_admin'), build_reset_script())
+        print("✅ Checkpoint cleared / Punkt kontrolny wyczyszczony.")
+        return
+
+    settings = get_scheduler_settings(config)
+    if mode == '2':
+        print(f"   CPUQuota: {settings['cpu_quota']}% | IOWeight: {settings['io_weight']} | "
+              f"Window / Okno: {settings['window_minutes']} min")
+        scan_cmd = build_throttled_scan_script(settings)
+    else:
+        log_file = f"/root/clam_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt"
+
+        # FULL SCAN on '/' - results stream on stdout, server keeps its own log copy
+        # PEŁNY SKAN '/' - wyniki strumieniowane na stdout, serwer zachowuje własną kopię logu
+        scan_cmd = f"sudo clamdscan --multiscan --fdpass --log='{log_file}' /"
+
+    # Raw logs are archived next to the other evidence, not rendered into the PDF
+    # Surowe logi są archiwizowane obok innych dowodów, a nie wstawiane do PDF
+    evidence_dir = (config.get('LOCAL_PATHS') or {}).get('evidence_output_dir', 'evidence')
+    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Scans run concurrently (capped), PDF work stays sequential afterwards
+    # Skany działają równolegle (z limitem), praca nad PDF pozostaje sekwencyjna
+    workers = max(1, min(int(settings['max_parallel_scans']), len(targets)))
+    if len(targets) > 1:
+        print(f"\n🚀 Fleet sweep: {len(targets)} VMs, {workers} at a time")
+        print(f"🚀 Skan floty: {len(targets)} VM, {workers} jednocześnie")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_vm, k, vm, scan_cmd, evidence_dir, ts, mode == '2') for k, vm in targets.items()]
+        results = [f.result() for f in futures]
+
+    print("✅ Scans finished. Generating PDF assets...")
+    for r in results:
+        if r['status'] == 'paused':
+            print(f"\n⏸️  [{r['key']}] Maintenance window ended. Progress is checkpointed - run again to resume.")
+            print(f"⏸️  [{r['key']}] Okno serwisowe zakończone. Postęp zapisany - uruchom ponownie, aby wznowić.")
+        elif r['status'] == 'complete':
+            print(f"\n📂 [{r['key']}] Raw log archived / Surowy log zarchiwizowany: {r['raw_log_path']}")
+            append_to_reports(r)
+        else:
+            print(f"\n❌ [{r['key']}] Scan failed - no Appendix C appended / Skan nieudany - Załącznik C nie dołączony.")
+
+    if len(results) > 1:
+        for lang in ('EN', 'PL'):
+            fleet_pdf = f"CLAMAV_FLEET_{ts}_{lang}.pdf"
+            generate_fleet_summary_pdf(lang, results, fleet_pdf)
+            print(f"📊 Fleet summary / Podsumowanie floty [{lang}]: {fleet_pdf}")
 
     print("\n✨ Done.")
 
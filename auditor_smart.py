@@ -3,22 +3,18 @@
 
 import os
 import subprocess
-import yaml
+import config_store
 import datetime
-from fpdf import FPDF
 from fpdf.enums import XPos, YPos
+import wg_telemetry
+import tracing
+from report_toolkit import ReportPDF
 
 # --- CONFIGURATION & CONSTANTS ---
 # --- KONFIGURACJA I STAŁE ---
 
 CONFIG_FILE = 'config.yaml'
 
-FONTS = {
-    'R': "UbuntuMono-Regular.ttf",
-    'B': "UbuntuMono-Bold.ttf",
-    'I': "UbuntuMono-Italic.ttf"
-}
-
 SEP = "|||SECRET_DELIMITER|||"
 REDACT_CHAR = "█"
 
@@ -31,8 +27,12 @@ TEXTS = {
         'sec1': "1. OPERATION METRICS",
         'sec2': "2. SYSTEM HEALTH & RESOURCES",
         'sec3': "3. DOCKER SERVICES & CONTAINERS",
-        'sec4': "4. LOGS & ARTIFACTS",
+        'sec4': "4. VPN TUNNELS (WIREGUARD)",
+        'sec5': "5. LOGS & ARTIFACTS",
         'dock_name': "CONTAINER NAME", 'dock_status': "STATUS", 'dock_ports': "PORTS / INFO",
+        'wg_peer': "PEER", 'wg_hs': "HANDSHAKE", 'wg_total': "RX / TX TOTAL", 'wg_rate': "RX / TX RATE",
+        'wg_endpoint': "ENDPOINT", 'no_wg': "No WireGuard peers detected.",
+        'wg_summary': "Peers: {total} | Stale (no handshake > {limit}s): {stale}",
         'no_dock': "No running containers detected.", 'status_ok': "[ SYSTEM STATUS: ONLINE & SECURE ]",
         'logs_info': "Logs collected: PENDING (See Phase 2)",
         'labels': {
@@ -50,8 +50,12 @@ TEXTS = {
         'sec1': "1. METRYKA OPERACJI",
         'sec2': "2. STATUS ZASOBÓW SYSTEMOWYCH",
         'sec3': "3. USŁUGI DOCKER I KONTENERY",
-        'sec4': "4. LOGI I ARTEFAKTY",
+        'sec4': "4. TUNELE VPN (WIREGUARD)",
+        'sec5': "5. LOGI I ARTEFAKTY",
         'dock_name': "NAZWA KONTENERA", 'dock_status': "STATUS", 'dock_ports': "PORTY / INFO",
+        'wg_peer': "PEER", 'wg_hs': "HANDSHAKE", 'wg_total': "RX / TX ŁĄCZNIE", 'wg_rate': "RX / TX NA SEK.",
+        'wg_endpoint': "ENDPOINT", 'no_wg': "Nie wykryto peerów WireGuard.",
+        'wg_summary': "Peery: {total} | Nieaktywne (brak handshake > {limit}s): {stale}",
         'no_dock': "Nie wykryto uruchomionych kontenerów.", 'status_ok': "[ STATUS SYSTEMU: AKTYWNY I BEZPIECZNY ]",
         'logs_info': "Logi systemowe: OCZEKIWANIE (Patrz Faza 2)",
         'labels': {
@@ -73,8 +77,9 @@ def load_config():
     
     # Load and parse YAML file
     # Wczytaj i przetwórz plik YAML
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return yaml.safe_load(f)
+    return config_store.load(CONFIG_FILE)
 
+@tracing.traced('ssh')
 def run_ssh_command_capture(host_ip, user, command):
     # Prepare SSH command with options
     # Przygotuj komendę SSH z opcjami
@@ -128,7 +133,7 @@ def redact(text, is_public, mode='full'):
 # --- PDF GENERATION CLASS ---
 # --- KLASA GENEROWANIA PDF ---
 
-class PDFReport(FPDF):
+class PDFReport(ReportPDF):
     def __init__(self, vm_name, lang='EN'):
         super().__init__()
         self.vm_name = vm_name
@@ -138,7 +143,7 @@ class PDFReport(FPDF):
     def header(self):
         # Set font and create title
         # Ustaw czcionkę i utwórz tytuł
-        self.set_font('UbuntuMono', 'B', 14)
+        self.set_font(self.report_font, 'B', 14)
         self.cell(0, 10, f"{self.t['title']}: {self.vm_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
         self.line(10, 25, 200, 25)
         self.ln(10)
@@ -147,59 +152,15 @@ class PDFReport(FPDF):
         # Position footer at bottom
         # Ustaw stopkę na dole
         self.set_y(-15)
-        self.set_font('UbuntuMono', 'I', 8)
+        self.set_font(self.report_font, 'I', 8)
         self.cell(0, 10, f"{self.t['footer']} | {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} | {self.lang}", align='C')
 
-    def print_row(self, data, widths, fill=False):
-        # Calculate row height dynamically
-        # Oblicz wysokość wiersza dynamicznie
-        font_size = self.font_size_pt / 72 * 25.4
-        line_height = font_size * 1.5
-        max_lines = 1
-        
-        for i, text in enumerate(data):
-            lines = self.multi_cell(widths[i], line_height, str(text), dry_run=True, output="LINES")
-            max_lines = max(max_lines, len(lines))
-        
-        row_height = max_lines * line_height
-
-        # Add page break if needed
-        # Dodaj podział strony w razie potrzeby
-        if self.get_y() + row_height > self.page_break_trigger:
-            self.add_page()
-
-        x_start, y_start = self.get_x(), self.get_y()
-
-        # Draw background if fill is enabled
-        # Rysuj tło, jeśli wypełnienie jest włączone
-        if fill:
-            self.set_fill_color(220, 220, 220)
-            self.rect(x_start, y_start, sum(widths), row_height, 'F')
-        
-        curr_x = x_start
-        for i, text in enumerate(data):
-            w = widths[i]
-            self.set_xy(curr_x, y_start)
-            self.multi_cell(w, line_height, str(text), border=0, align='L')
-            self.rect(curr_x, y_start, w, row_height)
-            curr_x += w
-
-        self.set_xy(x_start, y_start + row_height)
-
-def generate_pdf(vm_name, evidence, ext_ip, int_ip, lang, is_public):
+@tracing.traced('pdf.report')
+def generate_pdf(vm_name, evidence, ext_ip, int_ip, lang, is_public, vpn_rows=None):
     t = TEXTS[lang]
     l = t['labels']
     pdf = PDFReport(vm_name, lang)
-    
-    try:
-        # Add fonts support
-        # Dodaj obsługę czcionek
-        pdf.add_font('UbuntuMono', '', FONTS['R'])
-        pdf.add_font('UbuntuMono', 'B', FONTS['B'])
-        pdf.add_font('UbuntuMono', 'I', FONTS['I'])
-        font = 'UbuntuMono'
-    except:
-        font = 'Courier'
+    font = pdf.report_font
     
     pdf.add_page()
     pdf.set_font(font, size=10)
@@ -276,11 +237,40 @@ def generate_pdf(vm_name, evidence, ext_ip, int_ip, lang, is_public):
     if not has_cont:
          pdf.cell(190, 6, t['no_dock'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
-    # 4. LOGS
-    # 4. LOGI
+    # 4. VPN
+    # 4. VPN
     pdf.ln(5)
     pdf.set_font(font, 'B', 12)
     pdf.cell(0, 8, t['sec4'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    vpn_rows = vpn_rows or []
+    stale = sum(1 for r in vpn_rows if r['stale'])
+    pdf.set_font(font, '', 10)
+    pdf.cell(0, 6, t['wg_summary'].format(total=len(vpn_rows), stale=stale, limit=wg_telemetry.STALE_AFTER),
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    w_wg = [35, 25, 45, 45, 40]
+    pdf.set_font(font, 'B', 9)
+    pdf.print_row([t['wg_peer'], t['wg_hs'], t['wg_total'], t['wg_rate'], t['wg_endpoint']], w_wg, fill=True)
+
+    pdf.set_font(font, '', 8)
+    for r in vpn_rows:
+        # Stale peers are marked with '!' so they stand out in print
+        # Nieaktywne peery są oznaczone '!', aby wyróżniały się na wydruku
+        handshake = wg_telemetry.human_age(r['handshake_age']) + (" !" if r['stale'] else "")
+        totals = f"{wg_telemetry.human_bytes(r['rx'])} / {wg_telemetry.human_bytes(r['tx'])}"
+        rates = f"{wg_telemetry.human_rate(r['rx_rate'])} / {wg_telemetry.human_rate(r['tx_rate'])}"
+        endpoint = redact(r['endpoint'], is_public, 'ip') if r['endpoint'] else '-'
+        pdf.print_row([r['name'], handshake, totals, rates, endpoint], w_wg)
+
+    if not vpn_rows:
+        pdf.cell(190, 6, t['no_wg'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # 5. LOGS
+    # 5. LOGI
+    pdf.ln(5)
+    pdf.set_font(font, 'B', 12)
+    pdf.cell(0, 8, t['sec5'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     pdf.set_font(font, '', 10)
     pdf.cell(0, 5, t['logs_info'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     pdf.ln(5)
@@ -302,6 +292,7 @@ def generate_pdf(vm_name, evidence, ext_ip, int_ip, lang, is_public):
     # Save file and notify user
     # Zapisz plik i powiadom użytkownika
     pdf.output(filename)
+    tracing.add(bytes_out=os.path.getsize(filename))
     vis = "🙈 PUBLIC" if is_public else "🔒 PRIVATE"
     print(f"✅ Generated [{lang}][{vis}]: {filename}")
     print(f"✅ Wygenerowano [{lang}][{vis}]: {filename}")
@@ -356,7 +347,8 @@ def main():
         f"echo '{SEP}MEMORY'; free -h | grep Mem; "
         f"echo '{SEP}GCP_ZONE'; curl -s -H 'Metadata-Flavor: Google' http://metadata.google.internal/computeMetadata/v1/instance/zone | rev | cut -d/ -f1 | rev; "
         f"echo '{SEP}GCP_MACHINE'; curl -s -H 'Metadata-Flavor: Google' http://metadata.google.internal/computeMetadata/v1/instance/machine-type | rev | cut -d/ -f1 | rev; "
-        f"echo '{SEP}DOCKER'; sudo docker ps -a --no-trunc --format '{{{{.Names}}}}|{{{{.Status}}}}|{{{{.Ports}}}}'"
+        f"echo '{SEP}DOCKER'; sudo docker ps -a --no-trunc --format '{{{{.Names}}}}|{{{{.Status}}}}|{{{{.Ports}}}}'; "
+        f"echo '{SEP}WG_DUMP'; {wg_telemetry.DUMP_COMMAND}"
     )
 
     print(f"\n🚀 Auditing {vm['name']}...")
@@ -369,13 +361,17 @@ def main():
         return
 
     evidence = parse_output(raw)
+
+    # WireGuard peers are stored in the telemetry series too, so rates are relative to the last sample
+    # Peery WireGuard trafiają też do szeregu telemetrii, więc przepustowość liczona jest od ostatniej próbki
+    vpn_rows = wg_telemetry.record(key, evidence.get('WG_DUMP', ''))
     
     print("\n📄 Generating Reports (4 variants)...")
     print("\n📄 Generowanie Raportów (4 warianty)...")
     
     for is_public in [False, True]:
-        generate_pdf(vm['name'], evidence, ext_ip, int_ip, 'EN', is_public)
-        generate_pdf(vm['name'], evidence, ext_ip, int_ip, 'PL', is_public)
+        generate_pdf(vm['name'], evidence, ext_ip, int_ip, 'EN', is_public, vpn_rows)
+        generate_pdf(vm['name'], evidence, ext_ip, int_ip, 'PL', is_public, vpn_rows)
 
     print("\n" + "=" * 60)
     print("✅ PROCESS COMPLETE")
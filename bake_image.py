@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === GOLDEN IMAGE BAKER (v1.0) ===
+# === WYPALANIE ZŁOTEGO OBRAZU (v1.0) ===
+# =====================================================================================
+#
+# English: Builds a versioned custom GCP image with WireGuard, Docker, ClamAV (with current
+#          signatures), the setup.py dependencies and the verified TAK archive preinstalled.
+#          A temporary builder VM is created from the stock base image, provisioned over
+#          'gcloud compute ssh' with the installers' own script builders, generalized and
+#          turned into an image in the 'blox-tak-golden' family. The image is recorded in
+#          GLOBAL_SETTINGS.vm.disk_image, so new VMs boot with everything in place; the
+#          installers detect the baked packages and only do the per-server part (keys,
+#          wg0.conf, docker group, clamd start).
+# Polski:  Buduje wersjonowany własny obraz GCP z preinstalowanym WireGuard, Dockerem,
+#          ClamAV (z aktualnymi sygnaturami), zależnościami setup.py i zweryfikowanym
+#          archiwum TAK. Tymczasowa maszyna budująca powstaje z bazowego obrazu, jest
+#          przygotowywana przez 'gcloud compute ssh' skryptami samych instalatorów,
+#          uogólniana i zamieniana w obraz z rodziny 'blox-tak-golden'. Obraz trafia do
+#          GLOBAL_SETTINGS.vm.disk_image, więc nowe maszyny startują z gotowym zestawem;
+#          instalatory wykrywają wypalone pakiety i wykonują tylko część zależną od serwera
+#          (klucze, wg0.conf, grupa docker, start clamd).
+
+import os
+import sys
+import time
+import datetime
+import subprocess
+import config_store
+import deploy_assets
+import install_clamav
+import install_docker
+import install_wireguard
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+CONFIG_FILE = 'config.yaml'
+
+IMAGE_FAMILY = 'blox-tak-golden'
+BUILDER_PREFIX = 'blox-tak-image-builder'
+KEEP_IMAGES = 3
+SSH_READY_TIMEOUT = 300   # seconds / sekundy
+
+# English: Packages setup.py installs before running setup.sh
+# Polski: Pakiety instalowane przez setup.py przed uruchomieniem setup.sh
+SETUP_PACKAGES = 'net-tools zip unzip curl'
+
+
+# =====================================================================================
+# === HELPER FUNCTIONS ===
+# === FUNKCJE POMOCNICZE ===
+# =====================================================================================
+
+@tracing.traced('local_cmd')
+def run_command(command, capture_output=False):
+    """
+    English: Runs a local command; streams output or returns (code, stdout lines).
+    Polski:  Uruchamia lokalne polecenie; strumieniuje wyjście lub zwraca (kod, linie stdout).
+    """
+    try:
+        if capture_output:
+            res = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
+            return res.returncode, [l for l in res.stdout.strip().split('\n') if l]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                   encoding='utf-8')
+        for line in process.stdout:
+            print(f"   {line.rstrip()}")
+        return process.wait(), []
+    except FileNotFoundError:
+        print(f"❌ ERROR: Command '{command[0]}' not found. / BŁĄD: Nie znaleziono polecenia '{command[0]}'.")
+        return 1, []
+
+
+def build_bake_script():
+    """
+    English: One remote script: packages from the installers, signatures, TAK archive,
+             then generalization so cloud-init runs again on every VM made from the image.
+    Polski:  Jeden zdalny skrypt: pakiety z instalatorów, sygnatury, archiwum TAK, a potem
+             uogólnienie, aby cloud-init uruchomił się ponownie na każdej maszynie z obrazu.
+    """
+    clamav = ' && '.join(install_clamav.build_package_commands() + [
+        "sudo systemctl enable clamav-freshclam clamav-daemon",
+    ])
+    return f"""
+set -e
+echo "--- Waiting for cloud-init / Oczekiwanie na cloud-init ---"
+sudo cloud-init status --wait > /dev/null || true
+# sudo's env_reset drops an exported DEBIAN_FRONTEND, so every 'sudo apt-get' below (the installers'
+# scripts included) gets it on the sudo command line, and keeps changed config files without asking
+# env_reset w sudo usuwa wyeksportowany DEBIAN_FRONTEND, więc każde 'sudo apt-get' poniżej (także ze
+# skryptów instalatorów) dostaje go w linii polecenia sudo i zachowuje zmienione pliki konfiguracyjne
+sudo() {{
+    if [ "$1" = apt-get ]; then
+        shift
+        command sudo DEBIAN_FRONTEND=noninteractive apt-get \
+            -o Dpkg::Options::=--force-confdef -o Dpkg::Options::=--force-confold "$@"
+    else
+        command sudo "$@"
+    fi
+}}
+
+echo "--- Base packages / Pakiety bazowe ---"
+sudo apt-get update -y && sudo apt-get upgrade -y && sudo apt-get install -y {SETUP_PACKAGES}
+{install_wireguard.build_package_script()}
+{install_docker.build_package_script()}
+echo "--- ClamAV + signatures / ClamAV + sygnatury ---"
+{clamav}
+
+echo "--- TAK archive / Archiwum TAK ---"
+{deploy_assets.build_bake_command()}
+
+echo "--- Generalizing / Uogólnianie ---"
+sudo apt-get clean
+sudo cloud-init clean --logs
+sudo truncate -s 0 /etc/machine-id
+sudo rm -f /var/lib/dbus/machine-id
+sudo rm -f /home/*/.ssh/authorized_keys
+echo "✨ Bake finished / Wypalanie zakończone ✨"
+"""
+
+
+def wait_for_ssh(builder, project, zone):
+    # Fresh VMs refuse SSH until the guest agent has set up the key
+    # Nowe maszyny odrzucają SSH, dopóki agent gościa nie ustawi klucza
+    deadline = time.time() + SSH_READY_TIMEOUT
+    while time.time() < deadline:
+        code, _ = run_command(['gcloud', 'compute', 'ssh', builder, f'--project={project}', f'--zone={zone}',
+                               '--quiet', '--command=true'], capture_output=True)
+        if code == 0:
+            return True
+        time.sleep(10)
+    return False
+
+
+def prune_images(project, keep_name):
+    """
+    English: Deletes all but the newest KEEP_IMAGES images of the family (never keep_name).
+    Polski:  Usuwa wszystkie poza KEEP_IMAGES najnowszymi obrazami rodziny (nigdy keep_name).
+    """
+    code, names = run_command(['gcloud', 'compute', 'images', 'list', f'--project={project}',
+                               f'--filter=family={IMAGE_FAMILY}', '--sort-by=~creationTimestamp',
+                               '--format=value(name)'], capture_output=True)
+    if code != 0:
+        return
+    for name in [n for n in names if n != keep_name][KEEP_IMAGES - 1:]:
+        print(f"🧹 Deleting old image / Usuwanie starego obrazu: {name}")
+        run_command(['gcloud', 'compute', 'images', 'delete', name, f'--project={project}', '--quiet'])
+
+
+def record_image(image_path, base_image, description):
+    """
+    English: Sets vm.disk_image to the new image and remembers the stock base image.
+    Polski:  Ustawia vm.disk_image na nowy obraz i zapamiętuje bazowy obraz systemu.
+    """
+    def mutate(data):
+        vm = data.setdefault('GLOBAL_SETTINGS', {}).setdefault('vm', {})
+        vm['base_disk_image'] = base_image
+        vm['disk_image'] = image_path
+        vm['golden_image'] = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'description': description,
+        }
+    config_store.update(mutate, CONFIG_FILE)
+
+
+# =====================================================================================
+# === MAIN SCRIPT LOGIC ===
+# === GŁÓWNA LOGIKA SKRYPTU ===
+# =====================================================================================
+
+def main():
+    os.system("clear || cls")
+    print("=" * 60)
+    print("=== GOLDEN IMAGE BAKER (v1.0) ===")
+    print("=== WYPALANIE ZŁOTEGO OBRAZU (v1.0) ===")
+    print("=" * 60)
+
+    if not os.path.exists(CONFIG_FILE):
+        print(f"❌ Config file '{CONFIG_FILE}' not found.")
+        print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
+        return 1
+    config = config_store.snapshot(CONFIG_FILE)
+    project, zone = config.gcp.project_id, config.gcp.zone
+    vm_raw = (config.raw.get('GLOBAL_SETTINGS') or {}).get('vm') or {}
+    # Always bake on top of the stock image, never on a previous golden image
+    # Zawsze wypalaj na bazowym obrazie systemu, nigdy na poprzednim złotym obrazie
+    base_image = vm_raw.get('base_disk_image') or config.vm.disk_image
+    if not all([project, zone, base_image]):
+        print("❌ ERROR: gcp.project_id, gcp.zone or vm.disk_image missing in config.yaml.")
+        print("❌ BŁĄD: Brak gcp.project_id, gcp.zone lub vm.disk_image w config.yaml.")
+        return 1
+
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    image_name = f"{IMAGE_FAMILY}-{stamp}"
+    builder = f"{BUILDER_PREFIX}-{stamp}"
+    description = (f"WireGuard, Docker, ClamAV, TAK {deploy_assets.GITHUB_RELEASE_TAG}; "
+                   f"base {base_image.rsplit('/', 1)[-1]}")
+
+    print(f"\n🖼️  Base image / Obraz bazowy: {base_image}")
+    print(f"🆕 New image / Nowy obraz:     {image_name}")
+    confirm = input("\nContinue? / Kontynuować? [y/t/N]: ").strip().lower()
+    if confirm not in ['y', 't']:
+        print("Operation cancelled / Operacja anulowana.")
+        return 0
+
+    # --- Krok 1: Maszyna budująca ---
+    print(f"\n--- Step 1: Creating builder VM '{builder}' ---")
+    print(f"--- Krok 1: Tworzenie maszyny budującej '{builder}' ---")
+    code, _ = run_command([
+        'gcloud', 'compute', 'instances', 'create', builder, f'--project={project}', f'--zone={zone}',
+        f'--machine-type={config.vm.machine_type or "e2-standard-4"}', f'--image={base_image}',
+        f'--boot-disk-size={config.vm.disk_size_gb or 40}GB', f'--boot-disk-type={config.vm.disk_type or "pd-ssd"}',
+        '--shielded-secure-boot', '--shielded-vtpm', '--shielded-integrity-monitoring',
+    ])
+    if code != 0:
+        print("❌ Builder VM could not be created. / Nie udało się utworzyć maszyny budującej.")
+        return 1
+
+    image_created = False
+    try:
+        # --- Krok 2: Instalacja i uogólnienie ---
+        print("\n--- Step 2: Provisioning the builder ---")
+        print("--- Krok 2: Przygotowanie maszyny budującej ---")
+        if not wait_for_ssh(builder, project, zone):
+            print("❌ Builder VM is not reachable over SSH. / Maszyna budująca nie odpowiada przez SSH.")
+            return 1
+        code, _ = run_command(['gcloud', 'compute', 'ssh', builder, f'--project={project}', f'--zone={zone}',
+                               '--quiet', '--', build_bake_script()])
+        if code != 0:
+            print(f"❌ Provisioning failed (exit {code}). / Przygotowanie nie powiodło się (kod {code}).")
+            return 1
+
+        # --- Krok 3: Obraz z zatrzymanego dysku ---
+        print("\n--- Step 3: Creating the image ---")
+        print("--- Krok 3: Tworzenie obrazu ---")
+        run_command(['gcloud', 'compute', 'instances', 'stop', builder, f'--project={project}', f'--zone={zone}',
+                     '--quiet'])
+        code, _ = run_command([
+            'gcloud', 'compute', 'images', 'create', image_name, f'--project={project}',
+            f'--source-disk={builder}', f'--source-disk-zone={zone}', f'--family={IMAGE_FAMILY}',
+            f'--description={description}',
+        ])
+        if code != 0:
+            print("❌ Image creation failed. / Tworzenie obrazu nie powiodło się.")
+            return 1
+        image_created = True
+    finally:
+        # --- Krok 4: Sprzątanie maszyny budującej ---
+        print(f"\n🧹 Deleting builder VM / Usuwanie maszyny budującej: {builder}")
+        run_command(['gcloud', 'compute', 'instances', 'delete', builder, f'--project={project}',
+                     f'--zone={zone}', '--quiet'])
+
+    if image_created:
+        image_path = f"projects/{project}/global/images/{image_name}"
+        record_image(image_path, base_image, description)
+        prune_images(project, image_name)
+        print("\n" + "*" * 60)
+        print(f"✅ GLOBAL_SETTINGS.vm.disk_image = {image_path}")
+        print("✅ New VMs will boot with the preinstalled stack.")
+        print("✅ Nowe maszyny wystartują z preinstalowanym zestawem.")
+        print("*" * 60)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
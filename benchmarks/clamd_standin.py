@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === CLAMD STAND-IN ===
+# === ZAMIENNIK CLAMD ===
+# =====================================================================================
+#
+# English: A small clamd for run_benchmarks.py: a Unix socket answering PING, VERSION and
+#          INSTREAM like clamav-daemon. Streams longer than StreamMaxLength (clamd's default
+#          25M) are cut off with clamd's 'INSTREAM size limit exceeded' error, and a block
+#          holding the EICAR test string is reported as FOUND. Everything else is OK.
+# Polski:  Mały clamd dla run_benchmarks.py: gniazdo Unix odpowiadające na PING, VERSION i
+#          INSTREAM jak clamav-daemon. Strumienie dłuższe niż StreamMaxLength (domyślnie 25M
+#          w clamd) są przerywane błędem clamd 'INSTREAM size limit exceeded', a blok
+#          zawierający testowy ciąg EICAR jest zgłaszany jako FOUND. Wszystko inne to OK.
+
+import os
+import struct
+import threading
+import socketserver
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+STREAM_MAX_LENGTH = 25 * 1024 * 1024
+VERSION = 'ClamAV 1.0.0/27000/stand-in'
+EICAR = b'EICAR-STANDARD-ANTIVIRUS-TEST-FILE'
+SIZE_LIMIT_REPLY = 'INSTREAM size limit exceeded. ERROR'
+
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError('stream closed / strumień zamknięty')
+        data += block
+    return data
+
+
+def _recv_command(sock):
+    # English: 'z' commands end with NUL, 'n' commands with a newline
+    # Polski: Polecenia 'z' kończą się znakiem NUL, polecenia 'n' nową linią
+    prefix = _recv_exact(sock, 1)
+    end = b'\0' if prefix == b'z' else b'\n'
+    data = b''
+    while not data.endswith(end):
+        data += _recv_exact(sock, 1)
+    return data[:-1].decode('ascii', 'replace'), end
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            command, end = _recv_command(self.request)
+            if command == 'PING':
+                reply = 'PONG'
+            elif command == 'VERSION':
+                reply = VERSION
+            elif command == 'INSTREAM':
+                reply = self._instream()
+            else:
+                reply = 'UNKNOWN COMMAND'
+            self.request.sendall(reply.encode('utf-8') + end)
+        except OSError:
+            pass
+
+    def _instream(self):
+        total, found = 0, False
+        while True:
+            size = struct.unpack('>I', _recv_exact(self.request, 4))[0]
+            if not size:
+                break
+            total += size
+            if total > self.server.stream_max:
+                self.server.count('limit')
+                return SIZE_LIMIT_REPLY
+            found = EICAR in _recv_exact(self.request, size) or found
+        self.server.count('found' if found else 'ok')
+        return 'stream: Win.Test.EICAR_HDB-1 FOUND' if found else 'stream: OK'
+
+
+class StandInClamd(socketserver.ThreadingUnixStreamServer):
+    """
+    English: Serves on 'path' from a daemon thread; 'scans' counts INSTREAM results
+             ('ok', 'found', 'limit').
+    Polski:  Obsługuje 'path' z wątku w tle; 'scans' zlicza wyniki INSTREAM
+             ('ok', 'found', 'limit').
+    """
+    daemon_threads = True
+
+    def __init__(self, path, stream_max=STREAM_MAX_LENGTH):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        self.path = path
+        self.stream_max = stream_max
+        self.scans = {'ok': 0, 'found': 0, 'limit': 0}
+        self._lock = threading.Lock()
+
+    def count(self, result):
+        with self._lock:
+            self.scans[result] += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === BENCHMARK DATASETS ===
+# === ZBIORY DANYCH BENCHMARKÓW ===
+# =====================================================================================
+#
+# English: Synthetic inputs for run_benchmarks.py: a fake server tree (syslog, auth.log,
+#          dmesg, Docker containers with logs, /etc/wireguard with many peers), local pcapng
+#          captures and multi-page audit reports. Text is cycled from a pool of randomly
+#          generated 1 MB blocks, so multi-GB files are written at disk speed while still
+#          compressing like real logs (gzip cannot see across the blocks).
+# Polski:  Syntetyczne wejścia dla run_benchmarks.py: fałszywe drzewo serwera (syslog,
+#          auth.log, dmesg, kontenery Dockera z logami, /etc/wireguard z wieloma peerami),
+#          lokalne przechwyty pcapng i wielostronicowe raporty audytu. Tekst jest powtarzany
+#          z puli losowo wygenerowanych bloków 1 MB, więc wielogigabajtowe pliki zapisują się
+#          z szybkością dysku, a kompresują jak prawdziwe logi (gzip nie widzi między blokami).
+
+import os
+import sys
+import time
+import base64
+import random
+import struct
+import shutil
+import tarfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import wg_peers  # noqa: E402
+import peer_registry  # noqa: E402
+
+MB = 1024 * 1024
+POOL_BLOCKS = 16
+
+# --- PROFILES ---
+# --- PROFILE ---
+
+# English: Sizes in MB; 'peers' already on the server, 'enroll' added by the peer wizard
+# Polski: Rozmiary w MB; 'peers' już na serwerze, 'enroll' dodawane przez kreator peerów
+PROFILES = {
+    'small': {
+        'syslog_mb': 32, 'auth_mb': 8, 'dmesg_mb': 1,
+        'containers': 3, 'container_log_mb': 4, 'tak_log_mb': 8,
+        'pcaps': 4, 'pcap_mb': 16,
+        'peers': 200, 'enroll': 50, 'eud_subnet': '10.0.0.0/20',
+        'report_pages': 50,
+    },
+    'large': {
+        'syslog_mb': 2048, 'auth_mb': 512, 'dmesg_mb': 4,
+        'containers': 6, 'container_log_mb': 256, 'tak_log_mb': 1024,
+        'pcaps': 8, 'pcap_mb': 512,
+        'peers': 2000, 'enroll': 500, 'eud_subnet': '10.0.0.0/20',
+        'report_pages': 1000,
+    },
+}
+
+VM_KEY = 'VM1'
+VM_NAME = 'bench-tak-vm1'
+ADMIN_USER = 'blox_tak_server_admin'
+
+SYSLOG_SOURCES = ['systemd[1]', 'kernel', 'dockerd[812]', 'containerd[640]', 'CRON[2231]', 'wg-quick[933]']
+AUTH_SOURCES = ['sshd[1544]', 'sudo', 'systemd-logind[601]', 'CRON[2231]']
+
+
+# --- TEXT LOGS ---
+# --- LOGI TEKSTOWE ---
+
+def _token(rng, length):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(length))
+
+
+def _log_block(rng, sources, host, size=MB):
+    lines, written = [], 0
+    stamp = time.time() - rng.randint(0, 30 * 86400)
+    while written < size:
+        stamp += rng.random() * 2
+        when = time.strftime('%b %d %H:%M:%S', time.localtime(stamp))
+        line = (f"{when} {host} {rng.choice(sources)}: {_token(rng, rng.randint(6, 14))} "
+                f"id={rng.randint(1, 99999)} {_token(rng, rng.randint(20, 90))}\n")
+        lines.append(line)
+        written += len(line)
+    return ''.join(lines).encode('utf-8')[:size]
+
+
+def write_log(path, size_mb, sources, seed):
+    """
+    English: Writes size_mb of syslog-style lines cycled from a pool of random 1 MB blocks.
+    Polski:  Zapisuje size_mb linii w stylu syslog powtarzanych z puli losowych bloków 1 MB.
+    """
+    rng = random.Random(seed)
+    pool = [_log_block(rng, sources, VM_NAME) for _ in range(min(POOL_BLOCKS, max(1, int(size_mb))))]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        for i in range(int(size_mb)):
+            f.write(pool[rng.randrange(len(pool))] if i >= len(pool) else pool[i])
+
+
+# --- PCAPNG ---
+
+def _block(block_type, body):
+    body += b'\0' * (-len(body) % 4)
+    length = 12 + len(body)
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+def write_pcapng(path, size_mb, seed):
+    """
+    English: Valid pcapng (SHB, one Ethernet IDB, EPBs with random 60-1514 byte frames).
+    Polski:  Poprawny pcapng (SHB, jeden IDB Ethernet, EPB z losowymi ramkami 60-1514 bajtów).
+    """
+    rng = random.Random(seed)
+    payload = os.urandom(4 * MB)
+    target = int(size_mb * MB)
+    stamp = int(time.time() * 1e6)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        written = f.write(_block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        written += f.write(_block(0x00000001, struct.pack('<HHI', 1, 0, 65535)))
+        chunk = []
+        while written < target:
+            size = rng.randint(60, 1514)
+            start = rng.randrange(len(payload) - size)
+            stamp += rng.randint(10, 5000)
+            block = _block(0x00000006, struct.pack('<IIIII', 0, stamp >> 32, stamp & 0xFFFFFFFF, size, size)
+                           + payload[start:start + size])
+            chunk.append(block)
+            written += len(block)
+            if len(chunk) >= 4096:
+                f.write(b''.join(chunk))
+                chunk = []
+        f.write(b''.join(chunk))
+
+
+# --- WIREGUARD ---
+
+def _fake_key(rng):
+    return base64.b64encode(bytes(rng.getrandbits(8) for _ in range(32))).decode('ascii')
+
+
+def write_wireguard(wg_dir, peers, eud_subnet, seed):
+    """
+    English: wg0.conf with the admin peer plus `peers` EUD peers, the matching 'wg show dump'
+             (wg0.dump, read by the fake wg) and server_public.key.
+    Polski:  wg0.conf z peerem admina i `peers` peerami EUD, pasujący 'wg show dump'
+             (wg0.dump, czytany przez fałszywe wg) oraz server_public.key.
+    """
+    rng = random.Random(seed)
+    os.makedirs(wg_dir, exist_ok=True)
+    registry = peer_registry.PeerRegistry(os.devnull, eud_subnet)
+    server_private, server_public = _fake_key(rng), _fake_key(rng)
+    conf = {
+        'interface': f"[Interface]\nAddress = 10.200.0.1/24\nListenPort = 51820\nPrivateKey = {server_private}\n",
+        'peers': [wg_peers.make_peer('ADMIN', _fake_key(rng), '10.100.0.1/32')],
+    }
+    for _ in range(peers):
+        public_key = _fake_key(rng)
+        record = registry.allocate(public_key)
+        conf['peers'].append(wg_peers.make_peer(record['name'], public_key, f"{record['ip']}/32"))
+
+    now = int(time.time())
+    dump = [f"{server_private}\t{server_public}\t51820\toff"]
+    for peer in conf['peers']:
+        endpoint = f"198.51.100.{rng.randint(1, 254)}:{rng.randint(1024, 65535)}"
+        dump.append(f"{peer['public_key']}\t(none)\t{endpoint}\t{peer['allowed_ips']}\t{now - rng.randint(0, 900)}"
+                    f"\t{rng.randint(0, 10 ** 9)}\t{rng.randint(0, 10 ** 9)}\t25")
+
+    with open(os.path.join(wg_dir, 'wg0.conf'), 'w', encoding='utf-8') as f:
+        f.write(wg_peers.render_wg_conf(conf))
+    with open(os.path.join(wg_dir, 'wg0.dump'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(dump) + '\n')
+    with open(os.path.join(wg_dir, 'server_public.key'), 'w', encoding='utf-8') as f:
+        f.write(server_public + '\n')
+
+
+# --- DOCKER ---
+
+def write_containers(docker_dir, count, log_mb, tak_log_mb, seed):
+    """
+    English: Container directories for the fake docker: name, status, ports, stdout log and,
+             for the TAK server container, /opt/tak/logs inside 'fs/'.
+    Polski:  Katalogi kontenerów dla fałszywego dockera: nazwa, status, porty, log stdout oraz,
+             dla kontenera serwera TAK, /opt/tak/logs wewnątrz 'fs/'.
+    """
+    rng = random.Random(seed)
+    names = ['tak-server-tak-1', 'tak-server-db-1'] + [f"sidecar-{i}" for i in range(max(0, count - 2))]
+    for i, name in enumerate(names[:count]):
+        path = os.path.join(docker_dir, f"{rng.getrandbits(48):012x}")
+        os.makedirs(path, exist_ok=True)
+        for field, value in (('name', name), ('status', f"Up {rng.randint(1, 40)} days"),
+                             ('ports', f"0.0.0.0:{8443 + i}->{8443 + i}/tcp")):
+            with open(os.path.join(path, field), 'w', encoding='utf-8') as f:
+                f.write(value + '\n')
+        write_log(os.path.join(path, 'log'), log_mb, SYSLOG_SOURCES, seed + i)
+        if 'tak-server-tak' in name:
+            logs = os.path.join(path, 'fs', 'opt', 'tak', 'logs')
+            write_log(os.path.join(logs, 'takserver-messaging.log'), tak_log_mb * 3 // 4, ['messaging'], seed + 100)
+            write_log(os.path.join(logs, 'takserver-api.log'), tak_log_mb // 4, ['api'], seed + 101)
+
+
+# --- REPORTS ---
+
+def write_report(path, pages):
+    """
+    English: A multi-page audit-style PDF with the repo font (input of the PDF merges).
+    Polski:  Wielostronicowy PDF w stylu audytu z czcionką repozytorium (wejście scalania PDF).
+    """
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_font('UbuntuMono', '', os.path.join(REPO_DIR, 'UbuntuMono-Regular.ttf'))
+    pdf.set_font('UbuntuMono', '', 9)
+    rng = random.Random(pages)
+    for page in range(pages):
+        pdf.add_page()
+        pdf.cell(0, 8, f"{VM_NAME} - audit page {page + 1}", new_x='LMARGIN', new_y='NEXT')
+        for _ in range(40):
+            pdf.cell(0, 5, f"{_token(rng, 12)}  {rng.randint(0, 10 ** 6):>8}  {_token(rng, 50)}",
+                     new_x='LMARGIN', new_y='NEXT')
+    pdf.output(path)
+
+
+def report_names():
+    # English: The four auditor_smart variants, with a fixed timestamp
+    # Polski: Cztery warianty auditor_smart, ze stałym znacznikiem czasu
+    return [f"{prefix}_{VM_NAME}_20250101_0000_{lang}{suffix}.pdf" for prefix, lang, suffix in (
+        ('REPORT', 'EN', ''), ('REPORT', 'EN', '_PUBLIC'), ('RAPORT', 'PL', ''), ('RAPORT', 'PL', '_PUBLICZNY'))]
+
+
+# --- BUILD ---
+# --- BUDOWANIE ---
+
+def build(workdir, profile):
+    """
+    English: Generates every dataset of a profile under workdir/pristine (once per workdir;
+             a '.done' marker records the profile). Returns the pristine directory.
+    Polski:  Generuje wszystkie zbiory danych profilu w workdir/pristine (raz na katalog
+             roboczy; znacznik '.done' zapisuje profil). Zwraca katalog pristine.
+    """
+    spec = PROFILES[profile]
+    pristine = os.path.join(workdir, 'pristine')
+    marker = os.path.join(pristine, '.done')
+    if os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            if f.read().strip() == profile:
+                return pristine
+        shutil.rmtree(pristine)
+
+    server = os.path.join(pristine, 'server')
+    print(f"🧪 Generating '{profile}' datasets / Generowanie zbiorów danych '{profile}' in {pristine}...")
+    write_log(os.path.join(server, 'var', 'log', 'syslog'), spec['syslog_mb'], SYSLOG_SOURCES, 1)
+    write_log(os.path.join(server, 'var', 'log', 'auth.log'), spec['auth_mb'], AUTH_SOURCES, 2)
+    write_log(os.path.join(server, 'var', 'log', 'dmesg'), spec['dmesg_mb'], ['kernel'], 3)
+    write_containers(os.path.join(server, 'docker'), spec['containers'], spec['container_log_mb'],
+                     spec['tak_log_mb'], 4)
+    write_wireguard(os.path.join(server, 'etc', 'wireguard'), spec['peers'], spec['eud_subnet'], 5)
+    for i in range(spec['pcaps']):
+        write_pcapng(os.path.join(pristine, 'pcap', f"sensor_{i % 2 + 1}", f"capture_{i:03d}.pcapng"),
+                     spec['pcap_mb'], 10 + i)
+    os.makedirs(os.path.join(pristine, 'reports'), exist_ok=True)
+    for name in report_names():
+        write_report(os.path.join(pristine, 'reports', name), spec['report_pages'])
+    write_report(os.path.join(pristine, 'reports', 'appendix.pdf'), max(1, spec['report_pages'] // 10))
+    # English: A log_collector-style archive for the evidence bundle cases
+    # Polski: Archiwum w stylu log_collector dla przypadków paczki dowodowej
+    with tarfile.open(os.path.join(pristine, 'logs.tar.gz'), 'w:gz', compresslevel=1) as tar:
+        tar.add(os.path.join(server, 'var', 'log'), arcname='harvest_20250101_000000/system')
+
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(profile)
+    return pristine
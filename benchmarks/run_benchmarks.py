@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === BENCHMARK HARNESS (LOCAL SSH / GCLOUD / TERRAFORM STAND-INS) ===
+# === HARNESS BENCHMARKÓW (LOKALNE ZAMIENNIKI SSH / GCLOUD / TERRAFORM) ===
+# =====================================================================================
+#
+# English: Times the workflows end-to-end without GCP. shims/ is put first on PATH:
+#          - ssh / scp run "remote" commands locally in a sandbox server tree (absolute
+#            server paths are remapped into it, remote_bin/ provides sudo, docker, wg,
+#            wg-quick, ip, dmesg and the metadata curl); with --container they run in a
+#            Docker container through 'docker exec' / 'docker cp' instead;
+#          - gcloud / terraform replay recordings/*.json (recorded API latency is scaled by
+#            --latency, 0 by default, so only local work is measured).
+#          Datasets (datasets.py) are generated once per profile in the work directory and
+#          every case starts from a pristine copy. The median of --repeat runs is compared
+#          with thresholds.json; any regression or failed case gives exit code 1.
+#
+#          python3 benchmarks/run_benchmarks.py [--profile small|large] [--repeat 3]
+#                  [--case NAME ...] [--json results.json] [--record] [--container NAME]
+#
+# Polski:  Mierzy czas przepływów od początku do końca bez GCP. shims/ jest pierwszy w PATH:
+#          - ssh / scp wykonują polecenia "zdalne" lokalnie w piaskownicy drzewa serwera
+#            (bezwzględne ścieżki serwera są do niej przemapowane, remote_bin/ dostarcza
+#            sudo, docker, wg, wg-quick, ip, dmesg i curl metadanych); z --container
+#            wykonują się zamiast tego w kontenerze Dockera przez 'docker exec' / 'docker cp';
+#          - gcloud / terraform odtwarzają recordings/*.json (nagrane opóźnienie API jest
+#            skalowane przez --latency, domyślnie 0, więc mierzona jest tylko praca lokalna).
+#          Zbiory danych (datasets.py) są generowane raz na profil w katalogu roboczym, a każdy
+#          przypadek startuje z nienaruszonej kopii. Mediana z --repeat przebiegów jest
+#          porównywana z thresholds.json; regresja lub nieudany przypadek daje kod wyjścia 1.
+
+import os
+import sys
+import glob
+import json
+import math
+import re
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import datasets  # noqa: E402
+import clamd_standin  # noqa: E402
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+SHIMS_DIR = os.path.join(BENCH_DIR, 'shims')
+THRESHOLDS_FILE = os.path.join(BENCH_DIR, 'thresholds.json')
+WORK_DIR = os.path.join(BENCH_DIR, '.work')
+FONT_FILES = ('UbuntuMono-Regular.ttf', 'UbuntuMono-Bold.ttf', 'UbuntuMono-Italic.ttf', 'UbuntuMono-BoldItalic.ttf')
+
+# English: --record writes median * RECORD_MARGIN (rounded up to 0.1 s) as the new threshold
+# Polski: --record zapisuje medianę * RECORD_MARGIN (w górę do 0.1 s) jako nowy próg
+RECORD_MARGIN = 1.5
+ELAPSED_MARKER = '@@elapsed'
+# English: Socket of the clamd stand-in (in the work directory) used for the pre-packaging scan
+# Polski: Gniazdo zamiennika clamd (w katalogu roboczym) używane do skanu przed spakowaniem
+CLAMD_SOCKET = 'clamd.sock'
+
+# English: Font styles rendered across page breaks by the report_tables case
+# Polski: Style czcionki renderowane przez podziały stron w przypadku report_tables
+REPORT_STYLES = ('', 'B', 'I', 'BI', 'BU')
+# English: Steps of the remote_batch case; the odd ones end on an unterminated prompt
+# Polski: Kroki przypadku remote_batch; nieparzyste kończą się niezakończonym monitem
+BATCH_STEPS = 20
+INTERNAL_IP = '10.186.0.11'
+
+
+# =====================================================================================
+# === WORK DIRECTORY ===
+# === KATALOG ROBOCZY ===
+# =====================================================================================
+
+def write_config(workdir, spec):
+    """
+    English: config.yaml of the benchmark: config-example.yaml with one VM (VM1), the pcap
+             directories of the dataset and the clamd stand-in.
+    Polski:  config.yaml benchmarku: config-example.yaml z jedną VM (VM1), katalogami pcap
+             ze zbioru danych i zamiennikiem clamd.
+    """
+    with open(os.path.join(REPO_DIR, 'config-example.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config.pop('VM0', None)
+    config['LOCAL_PATHS'] = {
+        'pcap_directories': sorted(glob.glob(os.path.join(workdir, 'pristine', 'pcap', '*'))),
+        'evidence_output_dir': 'evidence',
+        'clamd_address': os.path.join(workdir, CLAMD_SOCKET),
+    }
+    config['GLOBAL_SETTINGS']['gcp']['project_id'] = 'blox-bench'
+    config['GLOBAL_SETTINGS']['vpn']['eud_subnet'] = spec['eud_subnet']
+    config[datasets.VM_KEY] = {
+        'name': datasets.VM_NAME,
+        'password': 'bench-password',
+        'ssh_public_key': 'ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIBenchBenchBenchBenchBenchBenchBenchBench bench',
+        'external_ip': '203.0.113.11',
+        'internal_ip': INTERNAL_IP,
+        'user': datasets.ADMIN_USER,
+    }
+    with open(os.path.join(workdir, 'config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+
+
+def prepare_workdir(workdir, profile):
+    # English: Datasets, fonts (the scripts open them relative to the working directory), config
+    # Polski: Zbiory danych, czcionki (skrypty otwierają je względem katalogu roboczego), konfiguracja
+    os.makedirs(workdir, exist_ok=True)
+    datasets.build(workdir, profile)
+    for name in FONT_FILES:
+        link = os.path.join(workdir, name)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(REPO_DIR, name), link)
+    write_config(workdir, datasets.PROFILES[profile])
+
+
+def shim_env(workdir, latency, container):
+    env = dict(os.environ)
+    env['PATH'] = f"{SHIMS_DIR}{os.pathsep}{env.get('PATH', '')}"
+    env['BLOX_BENCH_ROOT'] = os.path.join(workdir, 'server')
+    env['BLOX_BENCH_LATENCY'] = str(latency)
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['TERM'] = env.get('TERM') or 'dumb'
+    if container:
+        env['BLOX_BENCH_CONTAINER'] = container
+    else:
+        env.pop('BLOX_BENCH_CONTAINER', None)
+    return env
+
+
+# --- RESET HELPERS ---
+# --- FUNKCJE PRZYWRACANIA ---
+
+def _remove(workdir, *patterns):
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(workdir, pattern)):
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def reset_server(workdir, container=None):
+    """
+    English: Fresh server tree: hard links to the pristine logs (read-only for the workflows),
+             real copies of /etc/wireguard (rewritten by the peer wizard).
+    Polski:  Świeże drzewo serwera: dowiązania twarde do nienaruszonych logów (tylko do odczytu
+             dla przepływów), prawdziwe kopie /etc/wireguard (nadpisywane przez kreator peerów).
+    """
+    source = os.path.join(workdir, 'pristine', 'server')
+    target = os.path.join(workdir, 'server')
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(source, target, copy_function=os.link,
+                    ignore=lambda d, names: ['wireguard'] if os.path.basename(d) == 'etc' else [])
+    shutil.copytree(os.path.join(source, 'etc', 'wireguard'), os.path.join(target, 'etc', 'wireguard'))
+    if container:
+        for sub in ('var/log', 'etc/wireguard'):
+            subprocess.run(['docker', 'exec', container, 'mkdir', '-p', f"/{sub}"], check=True)
+            subprocess.run(['docker', 'cp', f"{os.path.join(target, sub)}/.", f"{container}:/{sub}"], check=True)
+
+
+def reset_reports(workdir):
+    _remove(workdir, '*PORT_*.pdf', '*.tmp_merged', 'tmp_manifest_*.pdf', 'temp_appendix_*.pdf')
+    for name in datasets.report_names():
+        shutil.copyfile(os.path.join(workdir, 'pristine', 'reports', name), os.path.join(workdir, name))
+
+
+def reset_evidence(workdir):
+    _remove(workdir, 'evidence', 'EVIDENCE_*.zip', 'EVIDENCE_*.zip.sha256')
+    logs = os.path.join(workdir, 'evidence', datasets.VM_NAME, 'logs')
+    os.makedirs(logs)
+    os.link(os.path.join(workdir, 'pristine', 'logs.tar.gz'), os.path.join(logs, 'logs_20250101_000000.tar.gz'))
+
+
+def pdf_pages(path):
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+# =====================================================================================
+# === CASES ===
+# === PRZYPADKI ===
+# =====================================================================================
+#
+# English: Each case: prepare(ctx) (not timed), then either a script run with stdin answers
+#          ('script') or a function of this file run in a subprocess via --call ('call'),
+#          then check(ctx, output) -> error message or None.
+# Polski:  Każdy przypadek: prepare(ctx) (bez pomiaru), potem uruchomienie skryptu z
+#          odpowiedziami na stdin ('script') lub funkcji tego pliku w podprocesie przez
+#          --call ('call'), potem check(ctx, wyjście) -> komunikat błędu lub None.
+
+def _prepare_auditor(ctx):
+    reset_server(ctx['workdir'], ctx['container'])
+    _remove(ctx['workdir'], '*PORT_*.pdf', 'wg_telemetry')
+
+
+def _check_auditor(ctx, output):
+    reports = glob.glob(os.path.join(ctx['workdir'], f"*PORT_{datasets.VM_NAME}_*.pdf"))
+    if len(reports) != 4:
+        return f"expected 4 reports, found {len(reports)}"
+    return None
+
+
+def _prepare_collector(ctx):
+    reset_server(ctx['workdir'], ctx['container'])
+    reset_reports(ctx['workdir'])
+    _remove(ctx['workdir'], 'evidence')
+
+
+def _check_collector(ctx, output):
+    archives = glob.glob(os.path.join(ctx['workdir'], 'evidence', datasets.VM_NAME, 'logs', '*.tar.gz'))
+    if len(archives) != 1:
+        return f"expected 1 log archive, found {len(archives)}"
+    if 'Updated 4 reports' not in output:
+        return "reports were not updated"
+    return None
+
+
+def _prepare_finisher(ctx):
+    reset_reports(ctx['workdir'])
+    reset_evidence(ctx['workdir'])
+
+
+def _check_bundle(ctx, output):
+    bundles = glob.glob(os.path.join(ctx['workdir'], 'EVIDENCE_*.zip'))
+    if len(bundles) != 1 or not os.path.exists(bundles[0] + '.sha256'):
+        return "evidence bundle or its checksum missing"
+    import zipfile
+    with zipfile.ZipFile(bundles[0]) as zf:
+        names = zf.namelist()
+        manifest = zf.read('ARTIFACT_MANIFEST.txt').decode('utf-8') if 'ARTIFACT_MANIFEST.txt' in names else ''
+    expected = 4 + ctx['spec']['pcaps'] + 1 + 2
+    if len(names) != expected:
+        return f"expected {expected} bundle members, found {len(names)}"
+    # English: Every artifact goes through the clamd stand-in; only streams over StreamMaxLength fail
+    # Polski: Każdy artefakt przechodzi przez zamiennik clamd; tylko strumienie ponad StreamMaxLength zawodzą
+    if 'Scanner:      clamd @' not in manifest:
+        return "artifacts were not scanned by the clamd stand-in"
+    for size, verdict in re.findall(r"^[0-9a-f]{64}\s+(\d+)\s+(\w+)", manifest, re.MULTILINE):
+        wanted = 'ERROR' if int(size) > clamd_standin.STREAM_MAX_LENGTH else 'OK'
+        if verdict != wanted:
+            return f"artifact of {size} bytes scanned {verdict}, expected {wanted}"
+    return None
+
+
+def _prepare_merge(ctx):
+    reset_reports(ctx['workdir'])
+
+
+def _check_merge(ctx, output):
+    pages = ctx['spec']['report_pages']
+    expected = pages + max(1, pages // 10)
+    actual = pdf_pages(os.path.join(ctx['workdir'], datasets.report_names()[0]))
+    if actual != expected:
+        return f"expected {expected} pages, found {actual}"
+    return None
+
+
+def _prepare_peers(ctx):
+    reset_server(ctx['workdir'], ctx['container'])
+    _remove(ctx['workdir'], 'wg_registry', 'EUD_BATCH_*', 'QR_EUD*.png')
+
+
+def _check_peers(ctx, output):
+    enroll = ctx['spec']['enroll']
+    codes = glob.glob(os.path.join(ctx['workdir'], 'EUD_BATCH_*', 'QR_*.png'))
+    if len(codes) != enroll:
+        return f"expected {enroll} QR codes, found {len(codes)}"
+    if ctx['container']:
+        return None
+    with open(os.path.join(ctx['workdir'], 'server', 'etc', 'wireguard', 'wg0.conf'), 'r', encoding='utf-8') as f:
+        peers = f.read().count('[Peer]')
+    if peers != ctx['spec']['peers'] + 1 + enroll:
+        return f"server wg0.conf has {peers} peers"
+    return None
+
+
+def _prepare_snapshot(ctx):
+    pass
+
+
+def _check_snapshot(ctx, output):
+    return None if 'snapshot: snap-tak-cold-' in output else "no snapshot name returned"
+
+
+def _check_report_tables(ctx, output):
+    # English: Every style must survive page breaks (add_page() restores it as a TextEmphasis flag)
+    # Polski: Każdy styl musi przetrwać podział strony (add_page() przywraca go jako flagę TextEmphasis)
+    styles = re.findall(r"^style '(\w*)' pages (\d+)$", output, re.MULTILINE)
+    if len(styles) != len(REPORT_STYLES):
+        return f"expected {len(REPORT_STYLES)} styles, rendered {len(styles)}"
+    if any(int(pages) < 3 for _, pages in styles):
+        return "a style did not cross a page break"
+    return None
+
+
+def _check_remote_batch(ctx, output):
+    # English: An '@@step end' marker after a prompt (no newline) must still finish its step
+    # Polski: Znacznik '@@step end' po monicie (bez nowej linii) nadal musi kończyć swój krok
+    statuses = re.search(r"^statuses: (.*)$", output, re.MULTILINE)
+    if not statuses:
+        return "run_batch returned no results"
+    if statuses.group(1).split() != ['ok'] * BATCH_STEPS:
+        return f"steps not finished: {statuses.group(1)}"
+    return None
+
+
+def _prepare_terraform(ctx):
+    tf_dir = os.path.join(ctx['workdir'], 'terraform')
+    _remove(ctx['workdir'], 'terraform', '.tf_inputs')
+    os.makedirs(tf_dir)
+    shutil.copyfile(os.path.join(REPO_DIR, 'main.tf'), os.path.join(tf_dir, 'main.tf'))
+
+
+def _check_terraform(ctx, output):
+    if 'results: 0 0' not in output:
+        return "plan_and_apply did not succeed twice"
+    if 'nothing to do' not in output:
+        return "second run was not skipped"
+    return None
+
+
+CASES = [
+    {'name': 'auditor_smart', 'kind': 'script', 'script': 'auditor_smart.py',
+     'stdin': lambda ctx: f"{datasets.VM_KEY}\n", 'prepare': _prepare_auditor, 'check': _check_auditor},
+    {'name': 'log_collector', 'kind': 'script', 'script': 'log_collector.py',
+     'stdin': lambda ctx: f"{datasets.VM_KEY}\n", 'prepare': _prepare_collector, 'check': _check_collector},
+    {'name': 'report_finisher', 'kind': 'script', 'script': 'report_finisher.py',
+     'stdin': lambda ctx: "1\nn\n", 'prepare': _prepare_finisher, 'check': _check_bundle},
+    {'name': 'master_bundle', 'kind': 'call', 'prepare': _prepare_finisher, 'check': _check_bundle},
+    {'name': 'merge_collector', 'kind': 'call', 'prepare': _prepare_merge, 'check': _check_merge},
+    {'name': 'merge_finisher', 'kind': 'call', 'prepare': _prepare_merge, 'check': _check_merge},
+    {'name': 'peer_provisioning', 'kind': 'script', 'script': 'configure_peer_android.py',
+     'stdin': lambda ctx: f"{datasets.VM_KEY}\n1\n{ctx['spec']['enroll']}\n",
+     'prepare': _prepare_peers, 'check': _check_peers},
+    {'name': 'snapshot_lifecycle', 'kind': 'call', 'prepare': _prepare_snapshot, 'check': _check_snapshot},
+    {'name': 'terraform_plan', 'kind': 'call', 'prepare': _prepare_terraform, 'check': _check_terraform},
+    {'name': 'report_tables', 'kind': 'call', 'prepare': _prepare_snapshot, 'check': _check_report_tables},
+    {'name': 'remote_batch', 'kind': 'call', 'prepare': _prepare_snapshot, 'check': _check_remote_batch},
+]
+
+
+# --- IN-PROCESS CALLS (run in the work directory by --call) ---
+# --- WYWOŁANIA W PROCESIE (uruchamiane w katalogu roboczym przez --call) ---
+
+def call_master_bundle():
+    import report_finisher
+    reports = sorted(glob.glob("*PORT_*.pdf"))
+    pcaps = report_finisher.get_pcap_full_paths()
+    snap_data = {'name': 'snap-bench', 'time': '2025-01-01 00:00:00', 'status': 'READY',
+                 'size': '1.00 GB (Real) / 40 GB (Disk)', 'link': 'N/A'}
+    start = time.perf_counter()
+    report_finisher.create_master_bundle(reports, pcaps, snap_data, datasets.VM_KEY, datasets.VM_NAME)
+    return time.perf_counter() - start
+
+
+def call_merge_collector():
+    import log_collector
+    start = time.perf_counter()
+    log_collector.merge_pdfs(datasets.report_names()[0], os.path.join('pristine', 'reports', 'appendix.pdf'))
+    return time.perf_counter() - start
+
+
+def call_merge_finisher():
+    import report_finisher
+    start = time.perf_counter()
+    report_finisher.update_pdf_inplace(datasets.report_names()[0], os.path.join('pristine', 'reports', 'appendix.pdf'))
+    return time.perf_counter() - start
+
+
+def call_snapshot_lifecycle():
+    import report_finisher
+    start = time.perf_counter()
+    name = report_finisher.manage_vm_lifecycle(datasets.VM_NAME, 'blox-bench', 'europe-central2-c')
+    elapsed = time.perf_counter() - start
+    print(f"snapshot: {name}")
+    return elapsed
+
+
+def call_report_tables():
+    from report_toolkit import ReportPDF
+    rows = [(f"/var/log/docker_internal/{i:06d}/container-json.log", str(i * 37)) for i in range(400)]
+    start = time.perf_counter()
+    for style in REPORT_STYLES:
+        pdf = ReportPDF()
+        pdf.add_page()
+        pdf.set_font(pdf.report_font, style, 10)
+        for i in range(60):
+            pdf.cell(0, 6, f"line {i} zażółć", new_x='LMARGIN', new_y='NEXT')
+        pdf.print_rows(rows, (140, 50))
+        pdf.output(os.devnull)
+        print(f"style {style!r} pages {pdf.pages_count}")
+    return time.perf_counter() - start
+
+
+def call_remote_batch():
+    import remote_steps
+    steps = [remote_steps.Step(f"step{i}", False,
+                               f"seq 1 200\nprintf 'Continue? [y/N] '" if i % 2 else "seq 1 200")
+             for i in range(BATCH_STEPS)]
+    start = time.perf_counter()
+    # English: The transport delivers the output in one burst, like a buffered SSH channel
+    # Polski: Transport oddaje wyjście jednym blokiem, jak buforowany kanał SSH
+    results = remote_steps.run_batch(['bash', '-c', 'out=$(bash -c "$0"); printf "%s\\n" "$out"'], steps)
+    elapsed = time.perf_counter() - start
+    print(f"\nstatuses: {' '.join(result.status for result in results)}")
+    return elapsed
+
+
+def call_terraform_plan():
+    import config_store
+    import terraform_plan
+    config = config_store.load('config.yaml')
+    var_file = terraform_plan.write_var_file(terraform_plan.single_vm_var_file(datasets.VM_KEY),
+                                             terraform_plan.single_vm_vars(config, datasets.VM_KEY))
+    start = time.perf_counter()
+    first = terraform_plan.plan_and_apply(var_file, chdir='terraform')
+    second = terraform_plan.plan_and_apply(var_file, chdir='terraform')
+    elapsed = time.perf_counter() - start
+    print(f"results: {first} {second}")
+    return elapsed
+
+
+# =====================================================================================
+# === RUNNER ===
+# === URUCHAMIANIE ===
+# =====================================================================================
+
+def run_case(case, ctx):
+    """
+    English: One timed run; returns (seconds, error or None).
+    Polski:  Jeden mierzony przebieg; zwraca (sekundy, błąd lub None).
+    """
+    case['prepare'](ctx)
+    if case['kind'] == 'script':
+        command = [sys.executable, os.path.join(REPO_DIR, case['script'])]
+        stdin = case['stdin'](ctx)
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--call', case['name']]
+        stdin = ''
+    start = time.perf_counter()
+    res = subprocess.run(command, cwd=ctx['workdir'], env=ctx['env'], input=stdin, capture_output=True,
+                         text=True, encoding='utf-8', errors='replace')
+    elapsed = time.perf_counter() - start
+    output = res.stdout + res.stderr
+
+    for line in res.stdout.splitlines():
+        if line.startswith(ELAPSED_MARKER):
+            elapsed = float(line.split()[1])
+    if res.returncode != 0:
+        return elapsed, f"exit code {res.returncode}: {output.strip()[-300:]}"
+    return elapsed, case['check'](ctx, output)
+
+
+def load_thresholds():
+    try:
+        with open(THRESHOLDS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_thresholds(thresholds):
+    with open(THRESHOLDS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(thresholds, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def print_results(results):
+    print(f"\n{'CASE / PRZYPADEK':<20} {'MEDIAN':>9} {'MIN':>9} {'LIMIT':>9}  STATUS")
+    print("-" * 64)
+    for r in results:
+        limit = f"{r['threshold']:.1f}s" if r['threshold'] else '-'
+        median = f"{r['median']:.2f}s" if r['median'] is not None else '-'
+        best = f"{r['min']:.2f}s" if r['min'] is not None else '-'
+        icon = {'ok': '✅', 'regression': '🐢', 'failed': '❌', 'no-limit': 'ℹ️ '}[r['status']]
+        print(f"{r['name']:<20} {median:>9} {best:>9} {limit:>9}  {icon} {r['status']}")
+        if r['error']:
+            print(f"   {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks with local SSH/gcloud/terraform stand-ins / "
+                                                 "Benchmarki z lokalnymi zamiennikami SSH/gcloud/terraform")
+    parser.add_argument('--profile', choices=sorted(datasets.PROFILES), default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', action='append', choices=[c['name'] for c in CASES])
+    parser.add_argument('--workdir', help="default / domyślnie: benchmarks/.work/<profile>")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="scale of recorded gcloud/terraform latency / skala nagranych opóźnień")
+    parser.add_argument('--container', help="run ssh/scp in this Docker container / ssh/scp w tym kontenerze")
+    parser.add_argument('--json', help="write results to this file / zapisz wyniki do pliku")
+    parser.add_argument('--record', action='store_true',
+                        help="store medians as new thresholds / zapisz mediany jako nowe progi")
+    parser.add_argument('--call', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.call:
+        # English: Child process of a 'call' case, already in the work directory
+        # Polski: Proces potomny przypadku 'call', już w katalogu roboczym
+        elapsed = globals()[f"call_{args.call}"]()
+        print(f"{ELAPSED_MARKER} {elapsed:.6f}")
+        return 0
+
+    workdir = os.path.abspath(args.workdir or os.path.join(WORK_DIR, args.profile))
+    prepare_workdir(workdir, args.profile)
+    ctx = {
+        'workdir': workdir,
+        'spec': datasets.PROFILES[args.profile],
+        'env': shim_env(workdir, args.latency, args.container),
+        'container': args.container,
+    }
+    thresholds = load_thresholds()
+    limits = thresholds.get(args.profile, {})
+
+    clamd = clamd_standin.StandInClamd(os.path.join(workdir, CLAMD_SOCKET)).start()
+    results = []
+    for case in CASES:
+        if args.case and case['name'] not in args.case:
+            continue
+        print(f"⏱️  {case['name']} ({args.profile}, x{args.repeat})...")
+        times, error = [], None
+        for _ in range(args.repeat):
+            elapsed, error = run_case(case, ctx)
+            if error:
+                break
+            times.append(elapsed)
+        threshold = limits.get(case['name'])
+        median = statistics.median(times) if times else None
+        if error:
+            status = 'failed'
+        elif not threshold:
+            status = 'no-limit'
+        else:
+            status = 'regression' if median > threshold else 'ok'
+        results.append({'name': case['name'], 'profile': args.profile, 'times': times, 'median': median,
+                        'min': min(times) if times else None, 'threshold': threshold, 'status': status,
+                        'error': error})
+
+    clamd.stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.record:
+        for r in results:
+            if r['median'] is not None:
+                limits[r['name']] = math.ceil(r['median'] * RECORD_MARGIN * 10) / 10
+        thresholds[args.profile] = limits
+        save_thresholds(thresholds)
+        print(f"💾 Thresholds saved / Zapisano progi: {THRESHOLDS_FILE}")
+
+    if any(r['status'] in ('failed', 'regression') for r in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === BENCHMARK SHIM HELPERS ===
+# === FUNKCJE POMOCNICZE ZAŚLEPEK BENCHMARKU ===
+# =====================================================================================
+#
+# English: Shared code of the fake ssh / scp / gcloud / terraform commands. "Remote" commands
+#          run locally against a sandbox root (BLOX_BENCH_ROOT): absolute server paths
+#          (/var/log, /etc/wireguard, /home, /opt) are remapped into it and remote_bin/
+#          (sudo, docker, wg, ...) comes first on PATH. With BLOX_BENCH_CONTAINER set they run
+#          in that container through 'docker exec' instead, without remapping.
+# Polski:  Wspólny kod fałszywych poleceń ssh / scp / gcloud / terraform. Polecenia "zdalne"
+#          wykonują się lokalnie w piaskownicy (BLOX_BENCH_ROOT): bezwzględne ścieżki serwera
+#          (/var/log, /etc/wireguard, /home, /opt) są do niej przemapowywane, a remote_bin/
+#          (sudo, docker, wg, ...) jest pierwszy w PATH. Przy ustawionym BLOX_BENCH_CONTAINER
+#          wykonują się w tym kontenerze przez 'docker exec', bez przemapowania.
+
+import os
+import re
+import json
+import time
+import subprocess
+
+SHIM_DIR = os.path.dirname(os.path.abspath(__file__))
+REMOTE_BIN = os.path.join(SHIM_DIR, 'remote_bin')
+
+# English: ssh/scp options that take a value
+# Polski: Opcje ssh/scp przyjmujące wartość
+VALUE_OPTIONS = set('bcDEeFIiJLlmOoPpQRSWw')
+
+_SERVER_PATH = re.compile(r'(?<![\w./~-])/(?=(?:var/log|etc/wireguard|home|opt)(?:/|\b))')
+
+
+def sandbox_root():
+    return os.environ.get('BLOX_BENCH_ROOT', '')
+
+
+def container():
+    return os.environ.get('BLOX_BENCH_CONTAINER', '')
+
+
+def remap(text):
+    # English: '/var/log/syslog' -> '<root>/var/log/syslog' (sandbox mode only)
+    # Polski: '/var/log/syslog' -> '<root>/var/log/syslog' (tylko tryb piaskownicy)
+    root = sandbox_root()
+    if not root or container():
+        return text
+    return _SERVER_PATH.sub(root.rstrip('/') + '/', text)
+
+
+def split_ssh_args(args):
+    """
+    English: (destination, command words) from ssh arguments; options are skipped.
+    Polski:  (cel, słowa polecenia) z argumentów ssh; opcje są pomijane.
+    """
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '--':
+            i += 1
+            break
+        if arg.startswith('-') and len(arg) > 1:
+            if arg[-1] in VALUE_OPTIONS and len(arg) == 2:
+                i += 2
+            else:
+                i += 1
+            continue
+        break
+    if i >= len(args):
+        return None, []
+    return args[i], args[i + 1:]
+
+
+def run_remote(user, command, stdin=None):
+    """
+    English: Runs a remote command string; returns the exit code (output goes to our stdout/err).
+    Polski:  Uruchamia zdalny ciąg poleceń; zwraca kod wyjścia (wyjście trafia na nasze stdout/err).
+    """
+    if container():
+        return subprocess.call(['docker', 'exec', '-i', '-u', user or 'root', container(), 'bash', '-c', command],
+                               stdin=stdin)
+    root = sandbox_root()
+    home = os.path.join(root, 'home', user or 'root')
+    os.makedirs(home, exist_ok=True)
+    env = dict(os.environ, HOME=home, PATH=f"{REMOTE_BIN}:{os.environ.get('PATH', '')}", BLOX_BENCH_ROOT=root)
+    return subprocess.call(['bash', '-c', remap(command)], cwd=home, env=env, stdin=stdin)
+
+
+def load_recordings(name):
+    path = os.path.join(os.environ.get('BLOX_BENCH_RECORDINGS', os.path.join(SHIM_DIR, '..', 'recordings')), name)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def replay(entry):
+    """
+    English: Prints a recorded response ({'stdout', 'exit', 'delay_ms'}) and returns its exit code.
+    Polski:  Drukuje nagraną odpowiedź ({'stdout', 'exit', 'delay_ms'}) i zwraca jej kod wyjścia.
+    """
+    delay = entry.get('delay_ms', 0) * float(os.environ.get('BLOX_BENCH_LATENCY', '1'))
+    if delay:
+        time.sleep(delay / 1000.0)
+    stdout = entry.get('stdout', '')
+    if not isinstance(stdout, str):
+        stdout = json.dumps(stdout, indent=2)
+    if stdout:
+        print(stdout)
+    return int(entry.get('exit', 0))
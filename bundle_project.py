@@ -21,16 +21,32 @@ DIRECTORIES_TO_EXCLUDE = {
     '__pycache__',
     '.terraform',
     'terraform.tfstate.d',
-    'gcp_tak_certs'
+    'gcp_tak_certs',
+    'wg_registry',
+    'wg_telemetry',
+    '.config_cache',
+    '.tf_inputs',
+    '.tf_plans',
+    'traces'
 }
 
+# Directory prefixes to exclude (e.g., EUD_BATCH_* folders with client private keys).
+# Prefiksy katalogów do wykluczenia (np. foldery EUD_BATCH_* z kluczami prywatnymi klientów).
+DIRECTORY_PREFIXES_TO_EXCLUDE = (
+    'EUD_BATCH_',
+)
+
 # List of specific files to exclude (e.g., configuration files with passwords).
 # Lista konkretnych plików do wykluczenia (np. pliki konfiguracyjne z hasłami).
 FILES_TO_EXCLUDE = {
     'token.json',
     'client_secret.json',
     'config.yaml',
-    '.terraform.lock.hcl'
+    'config.yaml.lock',
+    '.terraform.lock.hcl',
+    'fleet.auto.tfvars.json',
+    'terraform.tfstate',
+    'terraform.tfstate.backup'
 }
 
 # List of file extensions to be ignored.
@@ -82,7 +98,7 @@ def bundle_project_files():
             bundle_file.write("=" * 40 + "\n\n")
 
             for root, dirs, files in os.walk(project_root, topdown=True):
-                dirs[:] = [d for d in dirs if d not in DIRECTORIES_TO_EXCLUDE]
+                dirs[:] = [d for d in dirs if d not in DIRECTORIES_TO_EXCLUDE and not d.startswith(DIRECTORY_PREFIXES_TO_EXCLUDE)]
 
                 for filename in sorted(files):
                     # --- ZMIANA: Sprawdzanie dynamicznej nazwy pliku wyjściowego ---
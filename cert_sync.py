@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === TAK CERTIFICATE SYNC & EXPIRY INDEX (v1.0) ===
+# === SYNCHRONIZACJA CERTYFIKATÓW TAK I INDEKS WAŻNOŚCI (v1.0) ===
+# =====================================================================================
+#
+# English: Copies a server's TAK certificates (tak/certs/files) to gcp_tak_certs/<VM_KEY>/ in
+#          one SSH round trip. The local fingerprints are sent on stdin; the server hashes its
+#          files, reads each certificate's expiry once (openssl x509 -enddate), prints the
+#          index and streams a tar of only the new or rotated files, which is extracted
+#          locally (regular files only, mode 600). The index is kept in
+#          gcp_tak_certs/<VM_KEY>/.cert_index.json, so rotation can be planned from it without
+#          opening the certificates again. Several servers are synced in parallel.
+# Polski:  Kopiuje certyfikaty TAK serwera (tak/certs/files) do gcp_tak_certs/<KLUCZ_VM>/ w
+#          jednym przebiegu SSH. Lokalne odciski są wysyłane na stdin; serwer liczy skróty
+#          swoich plików, raz odczytuje datę ważności każdego certyfikatu (openssl x509
+#          -enddate), drukuje indeks i przesyła tar tylko nowych lub wymienionych plików, który
+#          jest rozpakowywany lokalnie (tylko zwykłe pliki, uprawnienia 600). Indeks jest
+#          przechowywany w gcp_tak_certs/<KLUCZ_VM>/.cert_index.json, więc wymianę można
+#          zaplanować na jego podstawie bez ponownego otwierania certyfikatów. Kilka serwerów
+#          jest synchronizowanych równolegle.
+
+import os
+import sys
+import json
+import shlex
+import hashlib
+import tarfile
+import tempfile
+import datetime
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import config_store
+import remote_steps
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+CONFIG_FILE = 'config.yaml'
+
+LOCAL_CERTS_BASE_PATH = 'gcp_tak_certs'
+INDEX_FILENAME = '.cert_index.json'
+REMOTE_CERTS_SUBDIR = 'tak-server/tak/certs/files'
+MAX_PARALLEL_SYNCS = 4
+EXPIRY_WARNING_DAYS = 30
+
+CERT_PREFIX = b'@@cert '
+TAR_MARKER = b'@@tar\n'
+
+
+def remote_cert_dir(admin_user):
+    return f"/home/{admin_user}/{REMOTE_CERTS_SUBDIR}"
+
+
+def local_cert_dir(server_key):
+    return os.path.join(LOCAL_CERTS_BASE_PATH, server_key)
+
+
+# =====================================================================================
+# === INDEX ===
+# === INDEKS ===
+# =====================================================================================
+
+def load_index(server_key):
+    try:
+        with open(os.path.join(local_cert_dir(server_key), INDEX_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'server': server_key, 'synced': None, 'files': {}}
+
+
+def save_index(server_key, index):
+    path = os.path.join(local_cert_dir(server_key), INDEX_FILENAME)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _sha256(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def known_fingerprints(server_key, index):
+    """
+    English: {name: sha256} of the indexed files still present and unchanged locally; anything
+             else is fetched again.
+    Polski:  {nazwa: sha256} plików z indeksu, które lokalnie nadal są i się nie zmieniły;
+             wszystko inne jest pobierane ponownie.
+    """
+    directory = local_cert_dir(server_key)
+    return {name: entry['sha256'] for name, entry in index.get('files', {}).items()
+            if _sha256(os.path.join(directory, name)) == entry['sha256']}
+
+
+def parse_enddate(value):
+    # 'Jan  1 00:00:00 2027 GMT' -> '2027-01-01T00:00:00+00:00'; None when not a certificate
+    # 'Jan  1 00:00:00 2027 GMT' -> '2027-01-01T00:00:00+00:00'; None, gdy to nie certyfikat
+    try:
+        parsed = datetime.datetime.strptime(' '.join(value.split()), '%b %d %H:%M:%S %Y %Z')
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=datetime.timezone.utc).isoformat()
+
+
+# =====================================================================================
+# === REMOTE SYNC ===
+# === SYNCHRONIZACJA ZDALNA ===
+# =====================================================================================
+
+def build_remote_script(cert_dir):
+    """
+    English: Reads '<sha256>  <name>' lines of the local copy on stdin, prints one
+             '@@cert <sha256>\t<enddate>\t<name>' line per file, '@@tar' and then a tar of the
+             files not in the local copy.
+    Polski:  Czyta linie '<sha256>  <nazwa>' lokalnej kopii ze stdin, drukuje jedną linię
+             '@@cert <sha256>\t<enddate>\t<nazwa>' na plik, '@@tar', a potem tar plików,
+             których nie ma w lokalnej kopii.
+    """
+    script = f"""
+set -e
+cd {shlex.quote(cert_dir)}
+known="$(cat)"
+changed=()
+for f in *; do
+    [ -f "$f" ] || continue
+    h=$(sha256sum -- "$f" | cut -d' ' -f1)
+    end=$(openssl x509 -enddate -noout -in "$f" 2> /dev/null | cut -d= -f2 || true)
+    printf '{CERT_PREFIX.decode()}%s\\t%s\\t%s\\n' "$h" "$end" "$f"
+    grep -qxF "$h  $f" <<< "$known" || changed+=("$f")
+done
+printf '{TAR_MARKER.decode().strip()}\\n'
+if [ ${{#changed[@]}} -gt 0 ]; then tar -cf - -- "${{changed[@]}}"; fi
+"""
+    return f"sudo bash -c {shlex.quote(script)}"
+
+
+def _extract(stream, directory, expected):
+    # Only regular files with plain names from the requested set / Tylko zwykłe pliki o prostych nazwach z żądanego zbioru
+    fetched = []
+    with tarfile.open(fileobj=stream, mode='r|') as archive:
+        for member in archive:
+            if not member.isfile() or os.path.basename(member.name) != member.name or member.name not in expected:
+                continue
+            target = os.path.join(directory, member.name)
+            tmp = f"{target}.tmp"
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(archive.extractfile(member).read())
+            os.replace(tmp, target)
+            fetched.append(member.name)
+    return fetched
+
+
+@tracing.traced('cert.sync')
+def sync_server(server_key, user, host_ip, cert_dir):
+    """
+    English: Syncs one server. Returns (fetched names, removed names, index) or None on error.
+    Polski:  Synchronizuje jeden serwer. Zwraca (pobrane nazwy, usunięte nazwy, indeks) lub None przy błędzie.
+    """
+    directory = local_cert_dir(server_key)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    index = load_index(server_key)
+    known = known_fingerprints(server_key, index)
+    command = remote_steps.ssh_transport(user, host_ip) + [build_remote_script(cert_dir)]
+    errors = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors)
+    except FileNotFoundError:
+        print("❌ ERROR: Command 'ssh' not found. / BŁĄD: Nie znaleziono polecenia 'ssh'.")
+        return None
+    process.stdin.write(''.join(f"{sha}  {name}\n" for name, sha in known.items()).encode('utf-8'))
+    process.stdin.close()
+
+    remote = {}
+    for line in iter(process.stdout.readline, b''):
+        if line == TAR_MARKER:
+            break
+        if line.startswith(CERT_PREFIX):
+            sha, end, name = line[len(CERT_PREFIX):].decode('utf-8', 'replace').rstrip('\n').split('\t', 2)
+            remote[name] = {'sha256': sha, 'not_after': parse_enddate(end)}
+    else:
+        process.wait()
+        errors.seek(0)
+        print(f"❌ [{server_key}] Sync failed / Synchronizacja nieudana: "
+              f"{errors.read().decode('utf-8', 'replace').strip()[-300:]}")
+        return None
+
+    expected = {name for name, entry in remote.items() if known.get(name) != entry['sha256']}
+    fetched = _extract(process.stdout, directory, expected) if expected else []
+    process.stdout.read()
+    if process.wait() != 0 or set(fetched) != expected:
+        print(f"❌ [{server_key}] Sync incomplete / Synchronizacja niepełna: {sorted(expected - set(fetched))}")
+        return None
+
+    # Files removed on the server are removed locally too / Pliki usunięte na serwerze są usuwane także lokalnie
+    removed = sorted(set(index.get('files', {})) - set(remote))
+    for name in removed:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    index = {'server': server_key, 'synced': datetime.datetime.now().isoformat(timespec='seconds'), 'files': remote}
+    save_index(server_key, index)
+    return fetched, removed, index
+
+
+# =====================================================================================
+# === EXPIRY REPORT ===
+# === RAPORT WAŻNOŚCI ===
+# =====================================================================================
+
+def expiring(index, days=EXPIRY_WARNING_DAYS, now=None):
+    """
+    English: [(not_after, name)] of the certificates expiring within 'days', soonest first.
+    Polski:  [(not_after, nazwa)] certyfikatów wygasających w ciągu 'days', najbliższe najpierw.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    limit = (now + datetime.timedelta(days=days)).isoformat()
+    return sorted((entry['not_after'], name) for name, entry in index.get('files', {}).items()
+                  if entry.get('not_after') and entry['not_after'] <= limit)
+
+
+def print_report(server_key, index, days=EXPIRY_WARNING_DAYS):
+    certs = [e for e in index.get('files', {}).values() if e.get('not_after')]
+    soon = expiring(index, days)
+    print(f"   [{server_key}] {len(index.get('files', {}))} files / plików, {len(certs)} certificates / certyfikatów")
+    if certs:
+        print(f"   [{server_key}] Next expiry / Najbliższe wygaśnięcie: {min(e['not_after'] for e in certs)}")
+    for not_after, name in soon:
+        print(f"   ⚠️  [{server_key}] {name} expires / wygasa {not_after}")
+
+
+# =====================================================================================
+# === MAIN SCRIPT LOGIC ===
+# === GŁÓWNA LOGIKA SKRYPTU ===
+# =====================================================================================
+
+def main():
+    os.system("clear || cls")
+    print("=" * 60)
+    print("=== TAK CERTIFICATE SYNC (v1.0) ===")
+    print("=== SYNCHRONIZACJA CERTYFIKATÓW TAK (v1.0) ===")
+    print("=" * 60)
+
+    if not os.path.exists(CONFIG_FILE):
+        print(f"❌ Config file '{CONFIG_FILE}' not found.")
+        print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
+        return 1
+    config = config_store.snapshot(CONFIG_FILE)
+    admin_user = config.vm.admin_user
+    vms = {k: v for k, v in config.vms.items() if v.internal_ip}
+
+    print("\nAvailable Servers / Dostępne Serwery:")
+    for key, vm in vms.items():
+        print(f" [{key}] {vm.name}")
+    choice = input("\nSelect VM Key(s), comma separated, or ALL / Wybierz Klucz(e) VM, po przecinku, lub ALL:\n> ").strip().upper()
+    keys = list(vms) if choice == 'ALL' else [k.strip() for k in choice.split(',') if k.strip()]
+    if not keys or any(k not in vms for k in keys):
+        print("Operation cancelled / Operacja anulowana.")
+        return 1
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SYNCS, len(keys))) as pool:
+        results = list(pool.map(lambda k: (k, sync_server(k, admin_user, vms[k].internal_ip,
+                                                           remote_cert_dir(admin_user))), keys))
+
+    failed = 0
+    print("\n" + "=" * 60)
+    for key, result in results:
+        if result is None:
+            failed += 1
+            continue
+        fetched, removed, index = result
+        print(f"✅ [{key}] {len(fetched)} fetched / pobranych, {len(removed)} removed / usuniętych, "
+              f"{len(index['files']) - len(fetched)} unchanged / bez zmian")
+        print_report(key, index)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
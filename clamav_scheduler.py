@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === CLAMAV THROTTLED SCAN SCHEDULER (v1.0) ===
+# === HARMONOGRAM DŁAWIONEGO SKANOWANIA CLAMAV (v1.0) ===
+# =====================================================================================
+#
+# English: Builds the remote bash script used by auditor_clamav.py in "throttled" mode.
+#          The scan is split into chunks (top-level directories, large trees split one
+#          level deeper) and every finished chunk is checkpointed on the VM, so the audit
+#          can be spread across several maintenance windows. clamd itself is limited with
+#          cgroup v2 properties (CPUQuota/IOWeight) or, if systemd refuses, with
+#          renice/ionice. While a chunk runs, the CPU quota is adapted (AIMD) to the host
+#          load and to the TAK Server TLS handshake latency.
+# Polski:  Buduje zdalny skrypt bash używany przez auditor_clamav.py w trybie "dławionym".
+#          Skan jest dzielony na fragmenty (katalogi główne, duże drzewa o poziom głębiej),
+#          a każdy ukończony fragment jest zapisywany w punkcie kontrolnym na VM, dzięki
+#          czemu audyt można rozłożyć na kilka okien serwisowych. Sam clamd jest ograniczany
+#          właściwościami cgroup v2 (CPUQuota/IOWeight) lub, gdy systemd odmówi, przez
+#          renice/ionice. W trakcie fragmentu limit CPU jest dostosowywany (AIMD) do
+#          obciążenia hosta i opóźnienia uzgadniania TLS serwera TAK.
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+STATE_DIR = '/var/lib/blox-clamav'
+MARKER = '@@'
+
+# English: Defaults, overridable in config.yaml under GLOBAL_SETTINGS.clamav.
+# Polski:  Wartości domyślne, nadpisywane w config.yaml w GLOBAL_SETTINGS.clamav.
+SCHEDULER_DEFAULTS = {
+    'cpu_quota': 100,            # % of one core for clamav-daemon / % jednego rdzenia dla clamav-daemon
+    'min_cpu_quota': 10,         # floor when backing off / dolna granica przy wycofywaniu
+    'io_weight': 10,             # cgroup IOWeight (1-10000, default 100) / waga IO cgroup
+    'max_load': 0.75,            # 1-min load per core / obciążenie 1-min na rdzeń
+    'max_tak_latency_ms': 300,   # TAK TLS handshake latency / opóźnienie uzgadniania TLS TAK
+    'tak_probe_port': 8443,      # 0 disables the probe / 0 wyłącza sondę
+    'probe_interval_s': 10,
+    'window_minutes': 120,       # 0 = no window / 0 = bez okna
+    'max_parallel_scans': 4,     # fleet sweep concurrency / równoległość skanu floty
+}
+
+# English: Trees that are split into their children to keep chunks short.
+# Polski:  Drzewa dzielone na podkatalogi, aby fragmenty były krótkie.
+SPLIT_TREES = ['/usr', '/var', '/home', '/opt', '/srv', '/root']
+
+# English: Virtual filesystems are never chunked (they only produce access errors).
+# Polski:  Wirtualne systemy plików nie są skanowane (generują tylko błędy dostępu).
+SKIP_TREES = ['/proc', '/sys', '/dev', '/run']
+
+
+def get_scheduler_settings(config):
+    """
+    English: Merges GLOBAL_SETTINGS.clamav from config.yaml over the defaults.
+    Polski:  Nakłada GLOBAL_SETTINGS.clamav z config.yaml na wartości domyślne.
+    """
+    settings = dict(SCHEDULER_DEFAULTS)
+    user_settings = ((config or {}).get('GLOBAL_SETTINGS', {}) or {}).get('clamav', {}) or {}
+    for key in SCHEDULER_DEFAULTS:
+        if key in user_settings and user_settings[key] is not None:
+            settings[key] = user_settings[key]
+
+    # CPUQuota may be written as '50%' in YAML
+    # CPUQuota może być zapisane w YAML jako '50%'
+    for key in ('cpu_quota', 'min_cpu_quota'):
+        settings[key] = int(str(settings[key]).rstrip('%'))
+    settings['min_cpu_quota'] = max(1, min(settings['min_cpu_quota'], settings['cpu_quota']))
+    return settings
+
+
+def build_throttled_scan_script(settings):
+    """
+    English: Returns the remote script for one throttled scan session. The session resumes
+             from the checkpoint, stops at the end of the maintenance window and prints
+             '@@SCAN_PAUSED' or '@@SCAN_COMPLETE' followed by the accumulated clamdscan log.
+    Polski:  Zwraca zdalny skrypt jednej sesji dławionego skanu. Sesja wznawia pracę od
+             punktu kontrolnego, kończy się wraz z oknem serwisowym i wypisuje
+             '@@SCAN_PAUSED' lub '@@SCAN_COMPLETE', a po nim zebrany log clamdscan.
+    """
+    s = settings
+    split_case = '|'.join(SPLIT_TREES)
+    skip_case = '|'.join(SKIP_TREES)
+
+    return f"""
+set -u
+shopt -s dotglob nullglob
+STATE={STATE_DIR}
+SVC=clamav-daemon.service
+MAX_QUOTA={s['cpu_quota']}
+MIN_QUOTA={s['min_cpu_quota']}
+IO_WEIGHT={s['io_weight']}
+MAX_LOAD={s['max_load']}
+MAX_LAT={s['max_tak_latency_ms']}
+TAK_PORT={s['tak_probe_port']}
+INTERVAL={s['probe_interval_s']}
+WINDOW={int(s['window_minutes']) * 60}
+START=$(date +%s)
+QUOTA=$MAX_QUOTA
+
+sudo mkdir -p $STATE
+if ! sudo systemctl is-active --quiet $SVC; then
+    echo "{MARKER}SCAN_ERROR clamav-daemon is not running"
+    exit 2
+fi
+
+# --- Chunk list (built once per scan, reused on resume) ---
+if ! sudo test -s $STATE/chunks; then
+    for top in /*; do
+        [ -L "$top" ] && continue
+        case "$top" in
+            {skip_case}) continue ;;
+            # Listed as root: /root (0700) and other private trees are unreadable to the admin user
+            {split_case}) sudo find "$top" -mindepth 1 -maxdepth 1 ! -type l | sort ;;
+            *) echo "$top" ;;
+        esac
+    done | sudo tee $STATE/chunks > /dev/null
+    sudo rm -f $STATE/done $STATE/scan.log $STATE/chunk.log
+    sudo touch $STATE/done
+    echo "{MARKER}SCAN_NEW chunks=$(sudo wc -l < $STATE/chunks)"
+else
+    echo "{MARKER}SCAN_RESUME done=$(sudo wc -l < $STATE/done) chunks=$(sudo wc -l < $STATE/chunks)"
+fi
+
+# --- cgroup limits on clamd (renice/ionice fallback) ---
+apply_limits() {{
+    if ! sudo systemctl set-property --runtime $SVC CPUQuota=${{QUOTA}}% IOWeight=$IO_WEIGHT > /dev/null 2>&1; then
+        for pid in $(pidof clamd); do
+            sudo renice -n 19 -p $pid > /dev/null 2>&1
+            sudo ionice -c 3 -p $pid > /dev/null 2>&1
+        done
+    fi
+}}
+restore_limits() {{
+    sudo systemctl set-property --runtime $SVC CPUQuota= IOWeight= > /dev/null 2>&1
+    for pid in $(pidof clamd); do
+        sudo renice -n 0 -p $pid > /dev/null 2>&1
+        sudo ionice -c 2 -n 4 -p $pid > /dev/null 2>&1
+    done
+}}
+trap restore_limits EXIT
+
+# --- Pressure probe: load per core and TAK TLS handshake latency ---
+under_pressure() {{
+    read L1 _ < /proc/loadavg
+    LAT=0
+    if [ "$TAK_PORT" -gt 0 ]; then
+        LAT=$(curl -sk -o /dev/null --max-time 5 -w '%{{time_appconnect}}' https://127.0.0.1:$TAK_PORT/ 2>/dev/null \\
+              | awk '{{printf "%d", $1 * 1000}}')
+        LAT=${{LAT:-0}}
+    fi
+    awk -v l="$L1" -v c="$(nproc)" -v m="$MAX_LOAD" -v lat="$LAT" -v ml="$MAX_LAT" \\
+        'BEGIN {{ exit !((l / c > m) || (lat > ml)) }}'
+}}
+
+# --- AIMD: halve the quota under pressure, add 10 points when calm ---
+adapt() {{
+    OLD=$QUOTA
+    if under_pressure; then
+        QUOTA=$(( QUOTA / 2 )); [ $QUOTA -lt $MIN_QUOTA ] && QUOTA=$MIN_QUOTA
+    else
+        QUOTA=$(( QUOTA + 10 )); [ $QUOTA -gt $MAX_QUOTA ] && QUOTA=$MAX_QUOTA
+    fi
+    if [ $QUOTA -ne $OLD ]; then
+        apply_limits
+        echo "{MARKER}THROTTLE quota=${{QUOTA}}% load=$L1 tak_ms=$LAT"
+    fi
+}}
+
+window_open() {{
+    [ "$WINDOW" -eq 0 ] || [ $(( $(date +%s) - START )) -lt "$WINDOW" ]
+}}
+
+apply_limits
+while read -r chunk <&3; do
+    sudo grep -qxF -- "$chunk" $STATE/done && continue
+    if ! window_open; then
+        echo "{MARKER}SCAN_PAUSED done=$(sudo wc -l < $STATE/done) chunks=$(sudo wc -l < $STATE/chunks)"
+        exit 0
+    fi
+    # Back off before starting a chunk while the server is busy
+    BACKOFF=5
+    while under_pressure && window_open; do
+        QUOTA=$MIN_QUOTA; apply_limits
+        echo "{MARKER}BACKOFF ${{BACKOFF}}s load=$L1 tak_ms=$LAT"
+        sleep $BACKOFF
+        BACKOFF=$(( BACKOFF * 2 )); [ $BACKOFF -gt 120 ] && BACKOFF=120
+    done
+    # The window may have closed while backing off - do not start another chunk
+    if ! window_open; then
+        echo "{MARKER}SCAN_PAUSED done=$(sudo wc -l < $STATE/done) chunks=$(sudo wc -l < $STATE/chunks)"
+        exit 0
+    fi
+    echo "{MARKER}CHUNK $chunk"
+    sudo rm -f $STATE/chunk.log
+    sudo clamdscan --multiscan --fdpass --log=$STATE/chunk.log -- "$chunk" > /dev/null 2>&1 &
+    SCAN_PID=$!
+    while kill -0 $SCAN_PID 2> /dev/null; do
+        sleep $INTERVAL
+        kill -0 $SCAN_PID 2> /dev/null && adapt
+    done
+    wait $SCAN_PID; rc=$?
+    # Checkpoint only a scanned chunk: 0 clean, 1 found, 2 per-file errors while clamd stays up.
+    # Otherwise the chunk stays pending (its partial log is dropped) and the next run rescans it.
+    if [ $rc -ge 2 ] && ! {{ [ $rc -eq 2 ] && sudo systemctl is-active --quiet $SVC; }}; then
+        echo "{MARKER}SCAN_ERROR chunk=$chunk exit=$rc done=$(sudo wc -l < $STATE/done) chunks=$(sudo wc -l < $STATE/chunks)"
+        exit 2
+    fi
+    sudo cat $STATE/chunk.log 2> /dev/null | sudo tee -a $STATE/scan.log > /dev/null
+    echo "$chunk" | sudo tee -a $STATE/done > /dev/null
+done 3< <(sudo cat $STATE/chunks)
+
+echo "{MARKER}SCAN_COMPLETE"
+sudo cat $STATE/scan.log
+sudo mv $STATE/scan.log $STATE/scan.log.last
+sudo rm -f $STATE/chunks $STATE/done $STATE/chunk.log
+"""
+
+
+def build_reset_script():
+    """
+    English: Returns the remote command that discards an unfinished throttled scan.
+    Polski:  Zwraca zdalne polecenie, które porzuca niedokończony dławiony skan.
+    """
+    return f"sudo rm -f {STATE_DIR}/chunks {STATE_DIR}/done {STATE_DIR}/scan.log {STATE_DIR}/chunk.log && echo '{MARKER}SCAN_RESET'"
+
+
+def parse_marker(line):
+    """
+    English: Recognises a scheduler marker line. Returns (text, status) where status is
+             'complete', 'paused', 'error' or None, or None for regular clamdscan lines.
+    Polski:  Rozpoznaje linię znacznika harmonogramu. Zwraca (tekst, status), gdzie status to
+             'complete', 'paused', 'error' lub None, albo None dla zwykłych linii clamdscan.
+    """
+    if not line.startswith(MARKER):
+        return None
+    text = line[len(MARKER):].strip()
+    status = None
+    if text.startswith('SCAN_COMPLETE'): status = 'complete'
+    elif text.startswith('SCAN_PAUSED'): status = 'paused'
+    elif text.startswith('SCAN_ERROR'): status = 'error'
+    return text, status
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === CLAMD PROTOCOL CLIENT (v1.0) ===
+# === KLIENT PROTOKOŁU CLAMD (v1.0) ===
+# =====================================================================================
+#
+# English: Minimal clamd client (PING, VERSION, INSTREAM) over a Unix or TCP socket.
+#          INSTREAM sessions accept data incrementally, so a file can be scanned from the
+#          same buffers that are already being read for zipping and hashing.
+# Polski:  Minimalny klient clamd (PING, VERSION, INSTREAM) przez gniazdo Unix lub TCP.
+#          Sesje INSTREAM przyjmują dane przyrostowo, więc plik może być skanowany z tych
+#          samych buforów, które są już czytane do pakowania i liczenia sumy kontrolnej.
+
+import shlex
+import socket
+import struct
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+DEFAULT_SOCKET = '/var/run/clamav/clamd.ctl'
+DEFAULT_TCP_PORT = 3310
+
+# English: clamd's default StreamMaxLength is 25M; every chunk is sent as <len><data>.
+# Polski:  Domyślny StreamMaxLength clamd to 25M; każdy fragment wysyłany jest jako <dł><dane>.
+MAX_CHUNK = 1024 * 1024
+
+
+class ClamdError(Exception):
+    """
+    English: Raised when clamd cannot be reached or answers with a protocol error.
+    Polski:  Zgłaszany, gdy clamd jest nieosiągalny lub odpowiada błędem protokołu.
+    """
+
+
+def parse_address(address):
+    """
+    English: Accepts '/path/to/clamd.ctl', 'unix:///path', 'tcp://host:port' or 'host:port'.
+             Returns (family, target) for socket.connect().
+    Polski:  Przyjmuje '/ścieżka/clamd.ctl', 'unix:///ścieżka', 'tcp://host:port' lub 'host:port'.
+             Zwraca (rodzina, cel) dla socket.connect().
+    """
+    address = (address or DEFAULT_SOCKET).strip()
+    if address.startswith('unix://'):
+        return socket.AF_UNIX, address[len('unix://'):]
+    if address.startswith('/'):
+        return socket.AF_UNIX, address
+    if address.startswith('tcp://'):
+        address = address[len('tcp://'):]
+    host, _, port = address.rpartition(':')
+    if not host:
+        host, port = port, DEFAULT_TCP_PORT
+    return socket.AF_INET, (host, int(port))
+
+
+def parse_reply(reply):
+    """
+    English: Splits a clamd scan reply into (status, detail): ('OK', None),
+             ('FOUND', signature) or ('ERROR', message).
+    Polski:  Dzieli odpowiedź skanu clamd na (status, szczegóły): ('OK', None),
+             ('FOUND', sygnatura) lub ('ERROR', komunikat).
+    """
+    _, _, verdict = reply.rpartition('stream: ') if 'stream: ' in reply else ('', '', reply)
+    verdict = verdict.strip()
+    if verdict == 'OK':
+        return 'OK', None
+    if verdict.endswith(' FOUND'):
+        return 'FOUND', verdict[:-len(' FOUND')].strip()
+    if verdict.endswith(' ERROR'):
+        return 'ERROR', verdict[:-len(' ERROR')].strip()
+    return 'ERROR', verdict or 'empty reply'
+
+
+class InstreamSession:
+    """
+    English: One INSTREAM scan. Call send() with consecutive blocks, then finish().
+             If clamd drops the stream early (e.g. StreamMaxLength), further send() calls
+             are ignored and finish() reports clamd's reply.
+    Polski:  Jeden skan INSTREAM. Wywołuj send() z kolejnymi blokami, potem finish().
+             Jeśli clamd przerwie strumień (np. StreamMaxLength), kolejne send() są
+             ignorowane, a finish() zwraca odpowiedź clamd.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.bytes_sent = 0
+        self.broken = False
+        self.sock.sendall(b'zINSTREAM\0')
+
+    def send(self, data):
+        if self.broken or not data:
+            return
+        view = memoryview(data)
+        try:
+            for offset in range(0, len(view), MAX_CHUNK):
+                chunk = view[offset:offset + MAX_CHUNK]
+                self.sock.sendall(struct.pack('>I', len(chunk)))
+                self.sock.sendall(chunk)
+                self.bytes_sent += len(chunk)
+        except OSError:
+            self.broken = True
+
+    def finish(self):
+        try:
+            if not self.broken:
+                self.sock.sendall(struct.pack('>I', 0))
+            return parse_reply(_recv_reply(self.sock))
+        except OSError as e:
+            return 'ERROR', str(e)
+        finally:
+            self.sock.close()
+
+
+def _recv_reply(sock):
+    # Replies are NUL-terminated ('z' command prefix)
+    # Odpowiedzi kończą się znakiem NUL (prefiks polecenia 'z')
+    data = b''
+    while not data.endswith(b'\0'):
+        block = sock.recv(4096)
+        if not block:
+            break
+        data += block
+    return data.rstrip(b'\0').decode('utf-8', errors='replace')
+
+
+class ClamdClient:
+    """
+    English: Connection factory for a clamd daemon; every command uses a fresh connection.
+    Polski:  Fabryka połączeń do demona clamd; każde polecenie używa nowego połączenia.
+    """
+    def __init__(self, address=None, timeout=30):
+        self.address = address or DEFAULT_SOCKET
+        self.family, self.target = parse_address(self.address)
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.target)
+        except OSError as e:
+            sock.close()
+            raise ClamdError(f"cannot connect to clamd at {self.address}: {e}")
+        return sock
+
+    def _command(self, command):
+        sock = self._connect()
+        try:
+            sock.sendall(b'z' + command + b'\0')
+            return _recv_reply(sock)
+        except OSError as e:
+            raise ClamdError(f"clamd command {command.decode()} failed: {e}")
+        finally:
+            sock.close()
+
+    def ping(self):
+        try:
+            return self._command(b'PING') == 'PONG'
+        except ClamdError:
+            return False
+
+    def version(self):
+        return self._command(b'VERSION')
+
+    def instream(self):
+        sock = self._connect()
+        try:
+            return InstreamSession(sock)
+        except OSError as e:
+            sock.close()
+            raise ClamdError(f"clamd INSTREAM failed: {e}")
+
+    def scan_bytes(self, data):
+        session = self.instream()
+        session.send(data)
+        return session.finish()
+
+
+def build_remote_wait_command(timeout_s=300, socket_path=DEFAULT_SOCKET):
+    """
+    English: Returns a shell command for the VM that polls clamd with PING until it answers
+             PONG (signature DB loaded) or the timeout expires (exit code 1).
+    Polski:  Zwraca polecenie powłoki dla VM, które odpytuje clamd przez PING aż odpowie
+             PONG (baza sygnatur załadowana) lub minie limit czasu (kod wyjścia 1).
+    """
+    code = (
+        "import socket, sys, time\n"
+        f"deadline = time.time() + {int(timeout_s)}\n"
+        "start = time.time()\n"
+        "while time.time() < deadline:\n"
+        "    try:\n"
+        "        with socket.socket(socket.AF_UNIX) as s:\n"
+        "            s.settimeout(5)\n"
+        f"            s.connect({socket_path!r})\n"
+        "            s.sendall(b'zPING\\0')\n"
+        "            if s.recv(16).startswith(b'PONG'):\n"
+        "                print('clamd ready after %ds' % (time.time() - start))\n"
+        "                sys.exit(0)\n"
+        "    except OSError:\n"
+        "        pass\n"
+        "    time.sleep(2)\n"
+        "print('clamd not ready after %ds' % (time.time() - start))\n"
+        "sys.exit(1)\n"
+    )
+    return f"sudo python3 -c {shlex.quote(code)}"
@@ -9,7 +9,9 @@
 import os
 import subprocess
 import yaml
+import config_store
 import sys
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -21,6 +23,7 @@ CONFIG_FILE = 'config.yaml'
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
+@tracing.traced('ssh')
 def run_ssh_command(host_ip, user, command, interactive=False):
     """
     English: Runs a command on a remote machine over VPN.
@@ -61,8 +64,7 @@ def load_config():
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading configuration file '{CONFIG_FILE}': {e}")
         print(f"❌ Błąd ładowania pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
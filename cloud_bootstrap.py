@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === CLOUD-INIT FIRST-BOOT BOOTSTRAP (v1.0) ===
+# === BOOTSTRAP PIERWSZEGO STARTU PRZEZ CLOUD-INIT (v1.0) ===
+# =====================================================================================
+#
+# English: Builds the first-boot script that cloud-init runs on a new VM (cloud-init.yaml.tftpl):
+#          WireGuard keys and interface, Docker, TAK assets (baked copy or download, sha256
+#          checked) and ClamAV - the same scripts the installers send over SSH. Progress and
+#          the result are published as guest attributes (blox/step, blox/status) and written
+#          to /var/lib/blox/bootstrap.done. deploy_vm.py polls the attributes with gcloud, so
+#          the VM provisions itself while booting and no SSH session is needed until it is ready.
+#          Enabled with GLOBAL_SETTINGS.vm.cloud_init_bootstrap; otherwise the plain user-data
+#          (admin user, password, sshd) is used as before.
+# Polski:  Buduje skrypt pierwszego startu uruchamiany przez cloud-init na nowej maszynie
+#          (cloud-init.yaml.tftpl): klucze i interfejs WireGuard, Docker, zasoby TAK (wypalona
+#          kopia lub pobranie, sprawdzany sha256) i ClamAV - te same skrypty, które instalatory
+#          wysyłają przez SSH. Postęp i wynik są publikowane jako atrybuty gościa (blox/step,
+#          blox/status) i zapisywane w /var/lib/blox/bootstrap.done. deploy_vm.py odpytuje
+#          atrybuty przez gcloud, więc maszyna konfiguruje się sama podczas startu i do chwili
+#          gotowości nie jest potrzebna żadna sesja SSH. Włączane przez
+#          GLOBAL_SETTINGS.vm.cloud_init_bootstrap; w przeciwnym razie używane jest zwykłe
+#          user-data (użytkownik admin, hasło, sshd) jak dotąd.
+
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import deploy_assets
+import install_clamav
+import install_docker
+import install_wireguard
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+GUEST_NAMESPACE = 'blox'
+MARKER_PATH = '/var/lib/blox/bootstrap.done'
+LOG_PATH = '/var/log/blox-bootstrap.log'
+READY_TIMEOUT = 30 * 60   # seconds / sekundy
+POLL_INTERVAL = 15        # seconds / sekundy
+MAX_PARALLEL_POLLS = 8
+
+STATUS_OK = 'ok'
+FAILED_PREFIX = 'failed:'
+
+
+def is_enabled(config):
+    vm = ((config.get('GLOBAL_SETTINGS') or {}).get('vm') or {})
+    return bool(vm.get('cloud_init_bootstrap'))
+
+
+def wg_address(config, vm_key):
+    """
+    English: Server WireGuard address for the VM, passed as instance metadata (blox-wg-address).
+    Polski:  Adres WireGuard serwera dla maszyny, przekazywany jako metadane instancji (blox-wg-address).
+    """
+    vpn = ((config.get('GLOBAL_SETTINGS') or {}).get('vpn') or {})
+    return install_wireguard.server_address(vpn, vm_key) or ''
+
+
+# --- SCRIPT ---
+# --- SKRYPT ---
+
+def build_steps(admin_user):
+    """
+    English: [(name, bash script)] in run order. WireGuard reads its address from the metadata
+             server at boot, so one script serves every VM.
+    Polski:  [(nazwa, skrypt bash)] w kolejności uruchamiania. WireGuard czyta swój adres z serwera
+             metadanych przy starcie, więc jeden skrypt obsługuje każdą maszynę.
+    """
+    assets = (f"cd /home/{admin_user}\n"
+              f"{deploy_assets.build_remote_command()}\n"
+              f"chown -R {admin_user}: {deploy_assets.TAK_SERVER_DIRNAME}")
+    return [
+        ('wireguard', 'if [ -z "$WG_ADDRESS" ]; then echo "no blox-wg-address, skipped"; exit 0; fi\n'
+                      + install_wireguard.build_install_script('${WG_ADDRESS}')),
+        ('docker', install_docker.build_install_script(admin_user)),
+        ('assets', assets),
+        ('clamav', install_clamav.build_install_commands()),
+    ]
+
+
+def build_script(admin_user):
+    """
+    English: The complete /usr/local/sbin/blox-bootstrap.sh. Each step is read from a quoted
+             heredoc and run in its own 'bash -e' (stdin closed); the first failing step ends
+             the run with status 'failed:<step>'. Step durations go to blox/time_<step>.
+    Polski:  Kompletny /usr/local/sbin/blox-bootstrap.sh. Każdy krok jest czytany z cytowanego
+             heredoc i uruchamiany we własnym 'bash -e' (zamknięte stdin); pierwszy nieudany
+             krok kończy przebieg statusem 'failed:<krok>'. Czasy kroków trafiają do blox/time_<krok>.
+    """
+    lines = [
+        '#!/bin/bash',
+        '# Generated by cloud_bootstrap.py - run once by cloud-init on first boot',
+        '# Wygenerowany przez cloud_bootstrap.py - uruchamiany raz przez cloud-init przy pierwszym starcie',
+        f'LOG={LOG_PATH}',
+        f'MARKER={MARKER_PATH}',
+        'MD=http://metadata.google.internal/computeMetadata/v1/instance',
+        'exec >> "$LOG" 2>&1',
+        'attr() { curl -sf -X PUT --data "$2" -H "Metadata-Flavor: Google" '
+        f'"$MD/guest-attributes/{GUEST_NAMESPACE}/$1" > /dev/null || true; }}',
+        'finish() { mkdir -p "$(dirname "$MARKER")"; echo "$1 $(date -u +%FT%TZ)" > "$MARKER"; attr status "$1"; }',
+        'step() {',
+        '    attr step "$1"',
+        '    echo "=== [$(date -u +%T)] $1 ==="',
+        '    local started=$SECONDS script',
+        '    script="$(cat)"',
+        f'    if ! bash -e -c "$script" < /dev/null; then finish "{FAILED_PREFIX}$1"; exit 1; fi',
+        '    attr "time_$1" "$((SECONDS - started))"',
+        '}',
+        'export WG_ADDRESS="$(curl -sf -H "Metadata-Flavor: Google" "$MD/attributes/blox-wg-address" || true)"',
+        'export DEBIAN_FRONTEND=noninteractive',
+        'attr status running',
+    ]
+    for name, script in build_steps(admin_user):
+        lines += [f'step {name} <<\'BLOX_STEP\'', script.strip('\n'), 'BLOX_STEP']
+    lines.append(f'finish {STATUS_OK}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- READINESS ---
+# --- GOTOWOŚĆ ---
+
+def read_status(vm_name, project, zone):
+    """
+    English: One 'get-guest-attributes' call -> {'status': ..., 'step': ..., 'time_<step>': ...}.
+             Empty until the script published its first attribute.
+    Polski:  Jedno wywołanie 'get-guest-attributes' -> {'status': ..., 'step': ..., 'time_<krok>': ...}.
+             Puste, dopóki skrypt nie opublikuje pierwszego atrybutu.
+    """
+    command = ['gcloud', 'compute', 'instances', 'get-guest-attributes', vm_name, f'--project={project}',
+               f'--zone={zone}', f'--query-path={GUEST_NAMESPACE}/', '--format=value(key,value)']
+    try:
+        res = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
+    except FileNotFoundError:
+        return {}
+    if res.returncode != 0:
+        return {}
+    attributes = {}
+    for line in res.stdout.splitlines():
+        key, _, value = line.partition('\t')
+        if key:
+            attributes[key.strip()] = value.strip()
+    return attributes
+
+
+def is_finished(status):
+    return status == STATUS_OK or (status or '').startswith(FAILED_PREFIX)
+
+
+def wait_until_ready(vms, project, zone, timeout=READY_TIMEOUT):
+    """
+    English: Polls all VMs ({key: {'name', 'zone'}}) in parallel until each reports ok/failed or
+             the timeout passes. Prints step changes. Returns {key: status} ('timeout' if unknown).
+    Polski:  Odpytuje równolegle wszystkie maszyny ({klucz: {'name', 'zone'}}), aż każda zgłosi
+             ok/failed lub minie limit czasu. Drukuje zmiany kroków. Zwraca {klucz: status}
+             ('timeout', jeśli nieznany).
+    """
+    print(f"\n⏳ Waiting for first-boot bootstrap / Oczekiwanie na bootstrap pierwszego startu ({len(vms)} VM)...")
+    results = {}
+    seen = {}
+    started = time.time()
+    pending = dict(vms)
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_POLLS, len(vms) or 1)) as pool:
+        while pending and time.time() - started < timeout:
+            keys = list(pending)
+            statuses = pool.map(lambda k: read_status(pending[k]['name'], project, pending[k].get('zone') or zone), keys)
+            for key, attributes in zip(keys, statuses):
+                progress = (attributes.get('status'), attributes.get('step'))
+                if attributes and progress != seen.get(key):
+                    seen[key] = progress
+                    print(f"   [{key}] {progress[1] or '-'}: {progress[0]} ({time.time() - started:.0f}s)")
+                if is_finished(attributes.get('status')):
+                    results[key] = attributes['status']
+                    del pending[key]
+            if pending:
+                time.sleep(POLL_INTERVAL)
+    for key in pending:
+        results[key] = 'timeout'
+    return results
+
+
+def print_results(results):
+    for key, status in results.items():
+        if status == STATUS_OK:
+            print(f"✅ [{key}] Bootstrap finished / Bootstrap zakończony")
+        else:
+            print(f"❌ [{key}] Bootstrap {status} - see {LOG_PATH} / zob. {LOG_PATH}")
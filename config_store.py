@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === CONFIG.YAML STATE STORE (v1.0) ===
+# === MAGAZYN STANU CONFIG.YAML (v1.0) ===
+# =====================================================================================
+#
+# English: Shared read/write access to config.yaml. Reads are parsed once with the libyaml
+#          C loader (when PyYAML was built with it) and cached by file mtime/size. Writes
+#          take an exclusive lock on config.yaml.lock, re-read the file, change only the
+#          keys involved and swap the new file in atomically (temp file + fsync + rename),
+#          so parallel scripts do not lose each other's updates and a crash never leaves
+#          a truncated inventory behind. A validated copy of the parsed file is also kept
+#          in .config_cache/ keyed by the file's sha256, so a new process skips YAML parsing
+#          entirely while config.yaml is unchanged; snapshot() exposes typed accessors.
+# Polski:  Wspólny odczyt i zapis config.yaml. Odczyt jest parsowany raz loaderem C libyaml
+#          (jeśli PyYAML go zawiera) i buforowany wg mtime/rozmiaru pliku. Zapis bierze
+#          wyłączną blokadę na config.yaml.lock, ponownie czyta plik, zmienia tylko dotknięte
+#          klucze i atomowo podmienia plik (plik tymczasowy + fsync + zmiana nazwy), więc
+#          równoległe skrypty nie gubią swoich zmian, a awaria nie zostawia uciętej inwentaryzacji.
+#          Zwalidowana kopia sparsowanego pliku jest też trzymana w .config_cache/ pod kluczem
+#          sha256 pliku, więc nowy proces pomija parsowanie YAML, dopóki config.yaml się nie
+#          zmieni; snapshot() udostępnia typowane akcesory.
+
+import os
+import sys
+import copy
+import hashlib
+import marshal
+import tempfile
+import contextlib
+from collections import namedtuple
+import yaml
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+CONFIG_FILE = 'config.yaml'
+LOCK_SUFFIX = '.lock'
+CACHE_DIR = '.config_cache'
+CACHE_FORMAT = 1
+
+_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# English: {absolute path: [mtime_ns, size, parsed data, Snapshot or None]}
+# Polski:  {ścieżka bezwzględna: [mtime_ns, rozmiar, sparsowane dane, Snapshot lub None]}
+_cache = {}
+
+
+class ConfigError(yaml.YAMLError):
+    """
+    English: config.yaml parsed, but its structure is invalid. Subclasses yaml.YAMLError so
+             the scripts' existing error handling reports it.
+    Polski:  config.yaml sparsowany, ale jego struktura jest błędna. Dziedziczy po
+             yaml.YAMLError, więc obecna obsługa błędów w skryptach go zgłasza.
+    """
+
+
+# --- TYPED ACCESSORS ---
+# --- TYPOWANE AKCESORY ---
+
+GcpSettings = namedtuple('GcpSettings', 'project_id region zone', defaults=(None, None, None))
+VmSettings = namedtuple('VmSettings', 'machine_type disk_image disk_size_gb disk_type admin_user',
+                        defaults=(None, None, None, None, 'blox_tak_server_admin'))
+VpnSettings = namedtuple('VpnSettings', 'server_subnet admin_ip eud_subnet_prefix eud_subnet',
+                         defaults=(None, None, None, None))
+LocalPaths = namedtuple('LocalPaths', 'pcap_directories evidence_output_dir clamd_address',
+                        defaults=((), 'evidence', None))
+VmEntry = namedtuple('VmEntry', 'key name password ssh_public_key external_ip internal_ip zone instance_id boot_disk',
+                     defaults=(None,) * 7)
+Snapshot = namedtuple('Snapshot', 'raw gcp vm vpn local_paths vms')
+
+
+def _section(mapping, name, where):
+    value = mapping.get(name)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ConfigError(f"'{where}{name}' must be a mapping")
+    return value
+
+
+def _pick(cls, mapping):
+    return cls(**{f: mapping[f] for f in cls._fields if mapping.get(f) is not None})
+
+
+def validate(data):
+    """
+    English: Structural check run once per file content (results are cached with the data).
+    Polski:  Kontrola struktury wykonywana raz na treść pliku (wynik buforowany z danymi).
+    """
+    if not isinstance(data, dict):
+        raise ConfigError("config.yaml must be a mapping at the top level")
+    _section(data, 'LOCAL_CONFIG', '')
+    _section(data, 'LOCAL_PATHS', '')
+    global_settings = _section(data, 'GLOBAL_SETTINGS', '')
+    for name in ('gcp', 'vm', 'vpn', 'clamav', 'apt_cache'):
+        _section(global_settings, name, 'GLOBAL_SETTINGS.')
+    for key, entry in data.items():
+        if isinstance(entry, dict) and 'name' in entry and not isinstance(entry['name'], str):
+            raise ConfigError(f"'{key}.name' must be a string")
+    return data
+
+
+def _build_snapshot(data):
+    global_settings = data.get('GLOBAL_SETTINGS') or {}
+    paths = data.get('LOCAL_PATHS') or {}
+    local_paths = _pick(LocalPaths, paths)._replace(
+        pcap_directories=tuple(os.path.expanduser(p) for p in paths.get('pcap_directories') or ()))
+    vms = {key: VmEntry(key=key, **{f: entry.get(f) for f in VmEntry._fields[1:]})
+           for key, entry in data.items() if isinstance(entry, dict) and 'name' in entry}
+    return Snapshot(
+        raw=data,
+        gcp=_pick(GcpSettings, global_settings.get('gcp') or {}),
+        vm=_pick(VmSettings, global_settings.get('vm') or {}),
+        vpn=_pick(VpnSettings, global_settings.get('vpn') or {}),
+        local_paths=local_paths,
+        vms=vms,
+    )
+
+
+# --- ON-DISK PARSE CACHE ---
+# --- BUFOR PARSOWANIA NA DYSKU ---
+
+def _cache_digest(raw):
+    # The key covers the cache format and the interpreter version (marshal is version specific)
+    # Klucz obejmuje format bufora i wersję interpretera (marshal zależy od wersji)
+    header = f"{CACHE_FORMAT}:{sys.version_info[0]}.{sys.version_info[1]}:".encode('ascii')
+    return hashlib.sha256(header + raw).hexdigest()
+
+
+def _cache_path(full, digest):
+    return os.path.join(os.path.dirname(full), CACHE_DIR, f"{os.path.basename(full)}.{digest}.marshal")
+
+
+def _read_disk_cache(full, digest):
+    try:
+        with open(_cache_path(full, digest), 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_disk_cache(full, digest, data):
+    """
+    English: Stores the validated data with marshal (plain types only; content with e.g.
+             YAML dates is simply not cached). The directory is 0700 and the file 0600
+             because the data includes VM passwords; older entries for the file are removed.
+    Polski:  Zapisuje zwalidowane dane przez marshal (tylko proste typy; treść np. z datami
+             YAML po prostu nie jest buforowana). Katalog ma 0700, a plik 0600, bo dane
+             zawierają hasła VM; starsze wpisy dla tego pliku są usuwane.
+    """
+    try:
+        blob = marshal.dumps(data)
+    except ValueError:
+        return
+    target = _cache_path(full, digest)
+    directory = os.path.dirname(target)
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blob)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, target)
+        prefix = f"{os.path.basename(full)}."
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name != os.path.basename(target):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(directory, name))
+    except OSError:
+        pass
+
+
+# --- READ PATH ---
+# --- ODCZYT ---
+
+def _parse(full):
+    with open(full, 'rb') as f:
+        raw = f.read()
+    digest = _cache_digest(raw)
+    data = _read_disk_cache(full, digest)
+    if data is None:
+        data = validate(yaml.load(raw.decode('utf-8'), Loader=_LOADER) or {})
+        _write_disk_cache(full, digest, data)
+    return data
+
+
+def _entry(path):
+    full = os.path.abspath(path)
+    try:
+        st = os.stat(full)
+    except FileNotFoundError:
+        _cache.pop(full, None)
+        return None
+    cached = _cache.get(full)
+    if not cached or cached[:2] != [st.st_mtime_ns, st.st_size]:
+        cached = [st.st_mtime_ns, st.st_size, _parse(full), None]
+        _cache[full] = cached
+    return cached
+
+
+def load(path=CONFIG_FILE):
+    """
+    English: Returns a private copy of the parsed file, or None if it does not exist.
+             The file is only re-read when its mtime or size changed, and only re-parsed
+             when its content hash is not in .config_cache/. yaml.YAMLError (including
+             ConfigError) and OSError propagate to the caller.
+    Polski:  Zwraca prywatną kopię sparsowanego pliku lub None, jeśli plik nie istnieje.
+             Plik jest czytany ponownie tylko po zmianie mtime lub rozmiaru, a parsowany
+             tylko, gdy skrótu jego treści nie ma w .config_cache/. yaml.YAMLError (w tym
+             ConfigError) i OSError są przekazywane do wywołującego.
+    """
+    cached = _entry(path)
+    return copy.deepcopy(cached[2]) if cached else None
+
+
+def snapshot(path=CONFIG_FILE):
+    """
+    English: Typed, shared view of the file (Snapshot of named tuples), or None if the file
+             does not exist. Built once per file version; snapshot.raw must not be modified.
+    Polski:  Typowany, współdzielony widok pliku (Snapshot z krotek nazwanych) lub None, jeśli
+             plik nie istnieje. Budowany raz na wersję pliku; snapshot.raw nie wolno zmieniać.
+    """
+    cached = _entry(path)
+    if not cached:
+        return None
+    if cached[3] is None:
+        cached[3] = _build_snapshot(cached[2])
+    return cached[3]
+
+
+# --- WRITE PATH ---
+# --- ZAPIS ---
+
+@contextlib.contextmanager
+def locked(path=CONFIG_FILE):
+    """
+    English: Exclusive inter-process lock for path (held on a separate .lock file, because
+             the data file itself is replaced on every write).
+    Polski:  Wyłączna blokada międzyprocesowa dla path (na osobnym pliku .lock, bo sam plik
+             danych jest podmieniany przy każdym zapisie).
+    """
+    with open(os.path.abspath(path) + LOCK_SUFFIX, 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(path, data):
+    full = os.path.abspath(path)
+    directory = os.path.dirname(full)
+    # The file holds VM passwords: keep its mode, default to owner-only for a new file
+    # Plik zawiera hasła VM: zachowaj jego uprawnienia, nowy plik tylko dla właściciela
+    try:
+        mode = os.stat(full).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o600
+    validate(data)
+    raw = yaml.dump(data, Dumper=_DUMPER, default_flow_style=False, sort_keys=False).encode('utf-8')
+    fd, tmp = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, full)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    st = os.stat(full)
+    data = copy.deepcopy(data)
+    _cache[full] = [st.st_mtime_ns, st.st_size, data, None]
+    _write_disk_cache(full, _cache_digest(raw), data)
+
+
+def update(mutate, path=CONFIG_FILE):
+    """
+    English: Read-modify-write under the lock. mutate(data) changes the freshly read dict
+             in place; returning False skips the write. Returns the resulting data.
+    Polski:  Odczyt-modyfikacja-zapis pod blokadą. mutate(data) zmienia świeżo wczytany
+             słownik w miejscu; zwrócenie False pomija zapis. Zwraca wynikowe dane.
+    """
+    with locked(path):
+        data = load(path) or {}
+        if mutate(data) is not False:
+            _write_atomic(path, data)
+        return data
+
+
+def update_key(key, fields, path=CONFIG_FILE):
+    """
+    English: Merges fields into the top-level mapping 'key' (created if missing).
+    Polski:  Scala fields z mapą najwyższego poziomu 'key' (tworzoną, jeśli jej brak).
+    """
+    def mutate(data):
+        entry = data.get(key)
+        data[key] = dict(entry, **fields) if isinstance(entry, dict) else dict(fields)
+    return update(mutate, path)
+
+
+def set_key(key, value, path=CONFIG_FILE):
+    def mutate(data):
+        data[key] = value
+    return update(mutate, path)
+
+
+def delete_key(key, path=CONFIG_FILE):
+    """
+    English: Removes a top-level key. Returns True if it existed.
+    Polski:  Usuwa klucz najwyższego poziomu. Zwraca True, jeśli istniał.
+    """
+    removed = []
+
+    def mutate(data):
+        if key not in data:
+            return False
+        del data[key]
+        removed.append(key)
+    update(mutate, path)
+    return bool(removed)
+
+
+def reserve_keys(prefix, values, path=CONFIG_FILE):
+    """
+    English: Atomically picks the next free '<prefix><n>' keys (above the highest used), one
+             per value, and stores the values under them in a single write, so parallel
+             deployments never get the same key. Returns the keys in order.
+    Polski:  Atomowo wybiera następne wolne klucze '<prefix><n>' (powyżej najwyższego), po
+             jednym na wartość, i zapisuje wartości pod nimi jednym zapisem, więc równoległe
+             wdrożenia nigdy nie dostaną tego samego klucza. Zwraca klucze w kolejności.
+    """
+    chosen = []
+
+    def mutate(data):
+        numbers = [int(k[len(prefix):]) for k in data
+                   if isinstance(k, str) and k.startswith(prefix) and k[len(prefix):].isdigit()]
+        start = max(numbers) + 1 if numbers else 1
+        for offset, value in enumerate(values):
+            key = f"{prefix}{start + offset}"
+            data[key] = value
+            chosen.append(key)
+    update(mutate, path)
+    return chosen
+
+
+def reserve_key(prefix, value, path=CONFIG_FILE):
+    return reserve_keys(prefix, [value], path)[0]
@@ -11,6 +11,12 @@ import subprocess
 import yaml
 import sys
 import shlex
+import tempfile
+import shutil
+import wg_peers
+import wg_keys
+import config_store
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -22,6 +28,7 @@ CONFIG_FILE = 'config.yaml'
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
+@tracing.traced('local_cmd')
 def run_command_local(command, password=None, capture_output=False, shell=False):
     """
     English: Executes a command on the local machine.
@@ -54,10 +61,11 @@ def run_command_local(command, password=None, capture_output=False, shell=False)
         return 1, [] if capture_output else None
 
 
-def run_command_remote(vm_name, remote_command_str, user, project_id, zone, capture_output=False):
+@tracing.traced('gcloud.ssh')
+def run_command_remote(vm_name, remote_command_str, user, project_id, zone, capture_output=False, command_input=None):
     """
-    English: Executes a command on a remote GCloud VM via SSH.
-    Polski:  Wykonuje polecenie na zdalnej maszynie GCloud przez SSH.
+    English: Executes a command on a remote GCloud VM via SSH, optionally feeding stdin.
+    Polski:  Wykonuje polecenie na zdalnej maszynie GCloud przez SSH, opcjonalnie z stdin.
     """
     gcloud_ssh_command = [
         'gcloud', 'compute', 'ssh',
@@ -71,13 +79,14 @@ def run_command_remote(vm_name, remote_command_str, user, project_id, zone, capt
     try:
         process = subprocess.Popen(
             gcloud_ssh_command,
+            stdin=subprocess.PIPE if command_input is not None else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
             encoding='utf-8',
             shell=False
         )
-        stdout, stderr = process.communicate()
+        stdout, stderr = process.communicate(input=command_input)
         if stdout:
             if capture_output:
                 return process.returncode, stdout.strip().split('\n')
@@ -102,22 +111,20 @@ def load_config():
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading config file '{CONFIG_FILE}': {e}")
         print(f"❌ Błąd ładowania pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
         return None
 
 
-def save_config(config_data):
+def save_vm_fields(vm_key, fields):
     """
-    English: Saves the configuration data back to the YAML file.
-    Polski:  Zapisuje dane konfiguracyjne z powrotem do pliku YAML.
+    English: Merges fields into the VM entry; only that key is rewritten (locked, atomic).
+    Polski:  Scala pola z wpisem maszyny; nadpisywany jest tylko ten klucz (z blokadą, atomowo).
     """
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            yaml.dump(config_data, f, default_flow_style=False, sort_keys=False)
+        config_store.update_key(vm_key, fields, CONFIG_FILE)
         print(f"✅ Configuration saved to '{CONFIG_FILE}'.")
         print(f"✅ Konfiguracja zapisana w '{CONFIG_FILE}'.")
     except (IOError, yaml.YAMLError) as e:
@@ -125,6 +132,28 @@ def save_config(config_data):
         print(f"❌ Błąd zapisu pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
 
 
+def install_root_files(directory, files, password):
+    """
+    English: Writes {filename: content} into a root-owned directory with a single 'sudo -S'
+             call. Files are staged in a private (0700) temp dir and installed with mode 600.
+    Polski:  Zapisuje {nazwa_pliku: treść} do katalogu należącego do roota jednym wywołaniem
+             'sudo -S'. Pliki są przygotowywane w prywatnym (0700) katalogu tymczasowym
+             i instalowane z uprawnieniami 600.
+    """
+    staging = tempfile.mkdtemp(prefix='blox-wg-')
+    try:
+        steps = [f"mkdir -p {shlex.quote(directory)}", f"chmod 700 {shlex.quote(directory)}"]
+        for name, content in files.items():
+            staged = os.path.join(staging, name)
+            with open(os.open(staged, os.O_WRONLY | os.O_CREAT, 0o600), 'w', encoding='utf-8') as f:
+                f.write(content)
+            steps.append(f"install -m 600 {shlex.quote(staged)} {shlex.quote(os.path.join(directory, name))}")
+        code, _ = run_command_local(['sudo', '-S', '-p', '', 'sh', '-c', ' && '.join(steps)], password=password)
+        return code
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC (ZMODYFIKOWANA / MODIFIED) ===
 # =====================================================================================
@@ -179,45 +208,50 @@ def main():
         return
 
     vm_name = vms[vm_key]['name']
+    ZONE = vms[vm_key].get('zone') or ZONE
 
     # --- Krok 3: Pobierz informacje o serwerze (IP, klucz publiczny) ---
     print(f"\n🔄 Retrieving server information for '{vm_name}'...")
     print(f"🔄 Pobieranie informacji o serwerze dla '{vm_name}'...")
 
-    code, server_public_key_lines = run_command_remote(vm_name, "sudo cat /etc/wireguard/server_public.key", ADMIN_USER,
-                                                       PROJECT_ID, ZONE, capture_output=True)
-    if code != 0 or not server_public_key_lines:
+    # One call returns the server key together with the current wg0.conf
+    # Jedno wywołanie zwraca klucz serwera razem z aktualnym wg0.conf
+    code, fetch_lines = run_command_remote(vm_name, wg_peers.FETCH_COMMAND, ADMIN_USER,
+                                           PROJECT_ID, ZONE, capture_output=True)
+    conf_sha, server_public_key, server_conf_text, _ = wg_peers.parse_fetch_output('\n'.join(fetch_lines or []))
+    if code != 0 or not server_public_key:
         print(f"❌ ERROR: Failed to retrieve server public key from '{vm_name}'.")
         print(f"❌ BŁĄD: Nie udało się pobrać klucza publicznego serwera z '{vm_name}'.")
         return
-    server_public_key = server_public_key_lines[0]
+    server_conf = wg_peers.parse_wg_conf(server_conf_text)
     print(f"✅ Server Public Key / Klucz publiczny serwera: {server_public_key}")
 
-    get_ext_ip_cmd = ['gcloud', 'compute', 'instances', 'describe', vm_name, f'--project={PROJECT_ID}',
-                      f'--zone={ZONE}', '--format=get(networkInterfaces[0].accessConfigs[0].natIP)']
-    code, server_external_ip_lines = run_command_local(get_ext_ip_cmd, capture_output=True)
-    if code != 0 or not server_external_ip_lines:
-        print(f"❌ ERROR: Could not fetch server's external IP for '{vm_name}'.")
-        print(f"❌ BŁĄD: Nie można było pobrać zewnętrznego adresu IP serwera dla '{vm_name}'.")
-        return
-    server_external_ip = server_external_ip_lines[0]
-    print(f"✅ Server External IP / Zewnętrzny adres IP serwera: {server_external_ip}")
-
-    get_int_ip_cmd = ['gcloud', 'compute', 'instances', 'describe', vm_name, f'--project={PROJECT_ID}',
-                      f'--zone={ZONE}', '--format=get(networkInterfaces[0].networkIP)']
-    code, server_internal_ip_lines = run_command_local(get_int_ip_cmd, capture_output=True)
-    if code != 0 or not server_internal_ip_lines:
-        print(f"❌ ERROR: Could not fetch server's internal IP for '{vm_name}'.")
-        print(f"❌ BŁĄD: Nie można było pobrać wewnętrznego adresu IP serwera dla '{vm_name}'.")
-        return
-    server_internal_ip = server_internal_ip_lines[0]
-    print(f"✅ Server Internal IP / Wewnętrzny adres IP serwera: {server_internal_ip}")
-
-    print(f"\n🔄 Updating '{CONFIG_FILE}' with new IP addresses...")
-    print(f"🔄 Aktualizacja '{CONFIG_FILE}' nowymi adresami IP...")
-    config[vm_key]['external_ip'] = server_external_ip
-    config[vm_key]['internal_ip'] = server_internal_ip
-    save_config(config)
+    # IPs recorded by deploy_vm from the Terraform outputs; gcloud only for older entries
+    # Adresy IP zapisane przez deploy_vm z wyjść Terraform; gcloud tylko dla starszych wpisów
+    server_external_ip = vms[vm_key].get('external_ip')
+    server_internal_ip = vms[vm_key].get('internal_ip')
+    if server_external_ip and server_internal_ip:
+        print(f"✅ Server External IP / Zewnętrzny adres IP serwera: {server_external_ip} ({CONFIG_FILE})")
+        print(f"✅ Server Internal IP / Wewnętrzny adres IP serwera: {server_internal_ip} ({CONFIG_FILE})")
+    else:
+        get_ips_cmd = ['gcloud', 'compute', 'instances', 'describe', vm_name, f'--project={PROJECT_ID}',
+                       f'--zone={ZONE}',
+                       '--format=value(networkInterfaces[0].accessConfigs[0].natIP,networkInterfaces[0].networkIP)']
+        code, ip_lines = run_command_local(get_ips_cmd, capture_output=True)
+        ips = ip_lines[0].split() if code == 0 and ip_lines else []
+        if len(ips) != 2:
+            print(f"❌ ERROR: Could not fetch server's IP addresses for '{vm_name}'.")
+            print(f"❌ BŁĄD: Nie można było pobrać adresów IP serwera dla '{vm_name}'.")
+            return
+        server_external_ip, server_internal_ip = ips
+        print(f"✅ Server External IP / Zewnętrzny adres IP serwera: {server_external_ip}")
+        print(f"✅ Server Internal IP / Wewnętrzny adres IP serwera: {server_internal_ip}")
+
+        print(f"\n🔄 Updating '{CONFIG_FILE}' with new IP addresses...")
+        print(f"🔄 Aktualizacja '{CONFIG_FILE}' nowymi adresami IP...")
+        config[vm_key]['external_ip'] = server_external_ip
+        config[vm_key]['internal_ip'] = server_internal_ip
+        save_vm_fields(vm_key, {'external_ip': server_external_ip, 'internal_ip': server_internal_ip})
 
     # --- Krok 4: Generuj lokalne klucze admina ---
     base_client_path = '/etc/wireguard/'
@@ -226,45 +260,35 @@ def main():
     private_key_path = os.path.join(client_keys_path, 'admin_private.key')
     public_key_path = os.path.join(client_keys_path, 'admin_public.key')
 
-    print(f"\n🔄 Generating WireGuard admin keys in '{client_keys_path}'...")
-    print(f"🔄 Generowanie kluczy admina WireGuard w '{client_keys_path}'...")
-    run_command_local(f"sudo -S mkdir -p {client_keys_path}", password=local_password, shell=True)
-    run_command_local(f"sudo -S wg genkey | sudo -S tee {private_key_path} > /dev/null", password=local_password,
-                      shell=True)
-    run_command_local(f"sudo -S cat {private_key_path} | sudo -S wg pubkey | sudo -S tee {public_key_path} > /dev/null",
-                      password=local_password, shell=True)
-
-    code, client_public_key_lines = run_command_local(f"sudo -S cat {public_key_path}", password=local_password,
-                                                      capture_output=True, shell=True)
-    if code != 0 or not client_public_key_lines: return
-    client_public_key = client_public_key_lines[0]
+    # Keys are generated in-process; nothing touches disk until the server accepted the peer
+    # Klucze generowane są w procesie; nic nie trafia na dysk, zanim serwer przyjmie peera
+    print(f"\n🔄 Generating WireGuard admin keys...")
+    print(f"🔄 Generowanie kluczy admina WireGuard...")
+    client_private_key, client_public_key = wg_keys.generate_keypair()
     print(f"✅ Admin Public Key / Klucz publiczny admina: {client_public_key}")
 
-    code, client_private_key_lines = run_command_local(f"sudo -S cat {private_key_path}", password=local_password,
-                                                       capture_output=True, shell=True)
-    if code != 0 or not client_private_key_lines: return
-    client_private_key = client_private_key_lines[0]
-
     # --- Krok 5: Dodaj peera admina do serwera WireGuard ---
     print(f"\n🔄 Adding admin peer to WireGuard configuration on '{vm_name}'...")
     print(f"🔄 Dodawanie peera admina do konfiguracji WireGuard na '{vm_name}'...")
 
     admin_vpn_ip_no_mask = ADMIN_VPN_IP.split('/')[0]
-    peer_config_content = f"\\n# Peer: Admin for {vm_key}\\n[Peer]\\nPublicKey = {client_public_key}\\nAllowedIPs = {admin_vpn_ip_no_mask}/32\\n"
-    remote_command = f"sudo printf '{peer_config_content}' | sudo tee -a /etc/wireguard/wg0.conf"
-    code, _ = run_command_remote(vm_name, remote_command, ADMIN_USER, PROJECT_ID, ZONE)
-    if code != 0: return
-
-    print(f"✅ Admin peer ({admin_vpn_ip_no_mask}) added to server's WireGuard configuration.")
-    print(f"✅ Peer admina ({admin_vpn_ip_no_mask}) dodany do konfiguracji serwera.")
-
-    # --- Krok 6: Zrestartuj WireGuard na serwerze i utwórz lokalną konfigurację ---
-    print(f"\n🔄 Restarting WireGuard service on '{vm_name}'...")
-    print(f"🔄 Ponowne uruchamianie usługi WireGuard na '{vm_name}'...")
-    code, _ = run_command_remote(vm_name, "sudo systemctl restart wg-quick@wg0", ADMIN_USER, PROJECT_ID, ZONE)
-    if code != 0: return
-    print(f"✅ WireGuard service restarted on '{vm_name}'.")
-    print(f"✅ Usługa WireGuard pomyślnie ponownie uruchomiona na '{vm_name}'.")
+    # Re-running the wizard replaces the previous admin key instead of adding a duplicate
+    # Ponowne uruchomienie kreatora podmienia poprzedni klucz admina zamiast go dublować
+    desired_conf = wg_peers.with_peers(server_conf, [
+        wg_peers.make_peer(f"Admin for {vm_key}", client_public_key, f"{admin_vpn_ip_no_mask}/32")
+    ])
+    wg_peers.print_diff(wg_peers.diff_peers(server_conf, desired_conf))
+
+    # --- Krok 6: Zastosuj zmianę na żywo (bez restartu tunelu) i utwórz lokalną konfigurację ---
+    code, _ = run_command_remote(vm_name, wg_peers.build_apply_command(conf_sha, server_conf, desired_conf), ADMIN_USER, PROJECT_ID, ZONE,
+                                 command_input=wg_peers.render_wg_conf(desired_conf))
+    if code != 0:
+        print(f"❌ ERROR: Failed to apply WireGuard peer set on '{vm_name}' (server config left unchanged).")
+        print(f"❌ BŁĄD: Nie udało się zastosować zbioru peerów WireGuard na '{vm_name}' (konfiguracja serwera bez zmian).")
+        return
+
+    print(f"✅ Admin peer ({admin_vpn_ip_no_mask}) applied live on '{vm_name}' (no tunnel restart).")
+    print(f"✅ Peer admina ({admin_vpn_ip_no_mask}) zastosowany na żywo na '{vm_name}' (bez restartu tunelu).")
 
     print(f"\n🔄 Creating WireGuard admin configuration file at '{client_conf_path}'...")
     print(f"🔄 Tworzenie pliku konfiguracyjnego admina WireGuard w '{client_conf_path}'...")
@@ -286,12 +310,18 @@ AllowedIPs = {allowed_ips_for_peer}
 PersistentKeepalive = 25
 """.strip()
 
-    write_client_conf_cmd = f"echo '{client_conf_content}' | sudo -S tee {client_conf_path} > /dev/null"
-    code, _ = run_command_local(write_client_conf_cmd, password=local_password, shell=True)
-    if code != 0: return
+    code = install_root_files(client_keys_path, {
+        os.path.basename(private_key_path): client_private_key + '\n',
+        os.path.basename(public_key_path): client_public_key + '\n',
+        os.path.basename(client_conf_path): client_conf_content + '\n',
+    }, local_password)
+    if code != 0:
+        print(f"❌ ERROR: Failed to write admin keys and configuration to '{client_keys_path}'.")
+        print(f"❌ BŁĄD: Nie udało się zapisać kluczy i konfiguracji admina w '{client_keys_path}'.")
+        return
 
-    print(f"✅ WireGuard admin configuration saved to '{client_conf_path}'.")
-    print(f"✅ Konfiguracja admina WireGuard zapisana w '{client_conf_path}'.")
+    print(f"✅ WireGuard admin keys and configuration saved to '{client_keys_path}'.")
+    print(f"✅ Klucze i konfiguracja admina WireGuard zapisane w '{client_keys_path}'.")
     print("\n✨ Admin peer configuration completed successfully! ✨")
     print("✨ Konfiguracja peera admina zakończona pomyślnie! ✨")
     print(f"\nTo enable the client, run / Aby włączyć klienta, uruchom:")
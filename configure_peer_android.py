@@ -12,6 +12,13 @@ import yaml
 import sys
 import json
 import re
+import datetime
+import wg_peers
+import wg_keys
+import qr_code
+import peer_registry
+import config_store
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -24,16 +31,17 @@ QR_CODE_PATH = './'
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
-def run_ssh_command(host_ip, user, command):
+@tracing.traced('ssh')
+def run_ssh_command(host_ip, user, command, command_input=None):
     """
-    English: Executes a command on a remote machine using standard ssh.
-    Polski:  Uruchamia polecenie na zdalnej maszynie używając standardowego ssh.
+    English: Executes a command on a remote machine using standard ssh, optionally feeding stdin.
+    Polski:  Uruchamia polecenie na zdalnej maszynie używając standardowego ssh, opcjonalnie z stdin.
     """
     full_command = ['ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10', f'{user}@{host_ip}', command]
     try:
-        process = subprocess.Popen(full_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                   encoding='utf-8')
-        stdout, stderr = process.communicate()
+        process = subprocess.Popen(full_command, stdin=subprocess.PIPE if command_input is not None else None,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
+        stdout, stderr = process.communicate(input=command_input)
         if process.returncode != 0:
             print(f"❌ Error executing SSH command on {host_ip}: {stderr.strip()}")
             print(f"❌ Błąd wykonania polecenia SSH na {host_ip}: {stderr.strip()}")
@@ -44,25 +52,6 @@ def run_ssh_command(host_ip, user, command):
         return 1, ""
 
 
-def run_local_command(command, command_input=None):
-    """
-    English: Executes a local command, optionally with input data.
-    Polski:  Uruchamia lokalne polecenie, opcjonalnie z danymi wejściowymi.
-    """
-    try:
-        process = subprocess.run(command, input=command_input, capture_output=True, text=True, encoding='utf-8',
-                                 check=True)
-        return process.returncode, process.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error executing local command '{' '.join(e.cmd)}': {e.stderr.strip()}")
-        print(f"❌ Błąd wykonania lokalnego polecenia '{' '.join(e.cmd)}': {e.stderr.strip()}")
-        return e.returncode, ""
-    except Exception as e:
-        print(f"❌ An unexpected error occurred: {e}")
-        print(f"❌ Wystąpił nieoczekiwany błąd: {e}")
-        return 1, ""
-
-
 def load_config():
     """
     English: Loads the main configuration file.
@@ -73,25 +62,99 @@ def load_config():
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f) or {}
+        return config_store.load(CONFIG_FILE) or {}
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading config file '{CONFIG_FILE}': {e}")
         print(f"❌ Błąd ładowania pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
         return None
 
 
-def save_config(config_data):
+# =====================================================================================
+# === BULK PROVISIONING & LIVE APPLY (v2.1) ===
+# === MASOWE DODAWANIE PEERÓW I ZMIANY NA ŻYWO (v2.1) ===
+# =====================================================================================
+
+def build_client_config(client_private_key, client_vpn_ip, server_public_key, server_external_ip, allowed_ips):
+    return f"""[Interface]
+PrivateKey = {client_private_key}
+Address = {client_vpn_ip}/32
+DNS = 8.8.8.8
+
+[Peer]
+PublicKey = {server_public_key}
+Endpoint = {server_external_ip}:51820
+AllowedIPs = {allowed_ips}
+PersistentKeepalive = 25
+"""
+
+
+@tracing.traced('wg.fetch')
+def fetch_server_peers(host_ip, user):
     """
-    English: Saves configuration data back to the YAML file.
-    Polski:  Zapisuje dane konfiguracyjne z powrotem do pliku YAML.
+    English: One SSH call: returns (sha256, server_public_key, parsed wg0.conf, runtime peers)
+             or None. Runtime peers come from 'wg show dump'; when the interface is down
+             they fall back to the peers listed in wg0.conf.
+    Polski:  Jedno wywołanie SSH: zwraca (sha256, klucz_publiczny_serwera, sparsowany wg0.conf,
+             peery w działaniu) lub None. Peery w działaniu pochodzą z 'wg show dump'; gdy
+             interfejs nie działa, brane są peery zapisane w wg0.conf.
     """
-    try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            yaml.dump(config_data, f, default_flow_style=False, sort_keys=False)
-    except (IOError, yaml.YAMLError) as e:
-        print(f"❌ Error saving config file '{CONFIG_FILE}': {e}")
-        print(f"❌ Błąd zapisu pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
+    code, output = run_ssh_command(host_ip, user, wg_peers.FETCH_COMMAND)
+    if code != 0: return None
+    sha, server_public_key, text, dump = wg_peers.parse_fetch_output(output)
+    if not sha or not server_public_key: return None
+    conf = wg_peers.parse_wg_conf(text)
+    runtime = peer_registry.parse_wg_dump(dump) or {p['public_key']: p['allowed_ips'] for p in conf['peers']}
+    return sha, server_public_key, conf, runtime
+
+
+@tracing.traced('wg.apply')
+def apply_server_peers(host_ip, user, sha, old_conf, new_conf):
+    """
+    English: Pushes the desired wg0.conf in one SSH call; the server swaps the file atomically
+             and applies the peer diff and its routes live with 'wg syncconf' (no tunnel restart).
+    Polski:  Wysyła docelowy wg0.conf jednym wywołaniem SSH; serwer atomowo podmienia plik
+             i stosuje różnicę peerów i ich trasy na żywo przez 'wg syncconf' (bez restartu tunelu).
+    """
+    wg_peers.print_diff(wg_peers.diff_peers(old_conf, new_conf))
+    code, _ = run_ssh_command(host_ip, user, wg_peers.build_apply_command(sha, old_conf, new_conf),
+                              command_input=wg_peers.render_wg_conf(new_conf))
+    if code == 3:
+        print("❌ wg0.conf changed on the server in the meantime - run the wizard again.")
+        print("❌ wg0.conf zmienił się w międzyczasie na serwerze - uruchom kreator ponownie.")
+    return code == 0
+
+
+def remove_euds(host_ip, user, conf_sha, server_conf, registry):
+    """
+    English: Lists EUD peers on the server, removes the selected ones live and revokes them
+             in the registry, which frees their addresses for reuse.
+    Polski:  Wyświetla peery EUD na serwerze, usuwa na żywo wybrane i odwołuje je w rejestrze,
+             co zwalnia ich adresy do ponownego użycia.
+    """
+    euds = [p for p in server_conf['peers'] if (p.get('name') or '').startswith('EUD')]
+    if not euds:
+        print("ℹ️  No EUD peers on this server / Brak peerów EUD na tym serwerze.")
+        return
+    print("\nEUD peers on server / Peery EUD na serwerze:")
+    for p in euds:
+        print(f"  - {p['name']} ({p.get('allowed_ips')})")
+    names = [n.strip().upper() for n in input(
+        "\nEnter EUD names to remove (comma separated):\nPodaj nazwy EUD do usunięcia (po przecinku):\n> ").split(',') if n.strip()]
+    known = {p['name'].upper(): p['name'] for p in euds}
+    missing = [n for n in names if n not in known]
+    if not names or missing:
+        print(f"❌ Unknown peer(s) / Nieznane peery: {', '.join(missing) or '-'}")
+        return
+
+    desired = wg_peers.without_peers(server_conf, [known[n] for n in names])
+    if apply_server_peers(host_ip, user, conf_sha, server_conf, desired):
+        for n in names:
+            registry.revoke(known[n], reason='removed via configure_peer_android')
+        registry.save()
+        print(f"✅ Removed live / Usunięto na żywo: {', '.join(known[n] for n in names)}")
+    else:
+        print("❌ ERROR: Failed to remove peers (server config left unchanged).")
+        print("❌ BŁĄD: Nie udało się usunąć peerów (konfiguracja serwera bez zmian).")
 
 
 # =====================================================================================
@@ -122,7 +185,7 @@ def main():
     ADMIN_USER = vm_settings.get('admin_user', 'blox_tak_server_admin')
     PROJECT_ID = gcp_settings.get('project_id')
     ZONE = gcp_settings.get('zone')
-    EUD_SUBNET_PREFIX = vpn_settings.get('eud_subnet_prefix')
+    EUD_SUBNET = peer_registry.get_eud_subnet(vpn_settings)
     SERVER_SUBNET_CIDR = vpn_settings.get('server_subnet')
 
     # --- Krok 2: Wybierz serwer ---
@@ -170,88 +233,130 @@ def main():
     server_vpn_ip = f"{server_ip_prefix}{vm_number}"
     print(f"ℹ️  Server address on the VPN network / Adres serwera w sieci VPN: {server_vpn_ip}")
 
-    # Automatyczne generowanie nazwy i IP klienta
-    last_octet = server_data.get('last_eud_octet', 0)
-    new_octet = last_octet + 1
-    client_name = f"EUD{new_octet}"
-    client_vpn_ip = f"{EUD_SUBNET_PREFIX}{new_octet}"
-
-    print(f"\n🚀 Configuring new peer '{client_name}' with IP {client_vpn_ip} for server '{instance_name}'...")
-    print(f"🚀 Konfiguracja nowego peera '{client_name}' z IP {client_vpn_ip} dla serwera '{instance_name}'...")
-
-    # --- Krok 4: Konfiguracja na serwerze przez SSH ---
-    print("\n--- Step 4: Retrieving server's public key ---")
-    print("--- Krok 4: Pobieranie klucza publicznego serwera ---")
-    code, server_public_key = run_ssh_command(ssh_host_ip, ADMIN_USER, "sudo cat /etc/wireguard/server_public.key")
-    if code != 0 or not server_public_key:
-        print("❌ ERROR: Failed to retrieve server's public key.")
-        print("❌ BŁĄD: Nie udało się pobrać klucza publicznego serwera.")
+    # --- Krok 3b: Tryb pracy ---
+    mode = input("\n[1] Add EUD(s) / Dodaj EUD  [2] Remove EUD(s) / Usuń EUD  [1]:\n> ").strip() or "1"
+    if mode not in ("1", "2"):
+        print("❌ Invalid selection / Nieprawidłowy wybór.")
+        return
+
+    # --- Krok 4: Stan serwera (klucz publiczny + wg0.conf) ---
+    print("\n--- Step 4: Reading server's WireGuard state ---")
+    print("--- Krok 4: Odczyt stanu WireGuard serwera ---")
+    state = fetch_server_peers(ssh_host_ip, ADMIN_USER)
+    if not state:
+        print("❌ ERROR: Failed to read server's WireGuard configuration.")
+        print("❌ BŁĄD: Nie udało się odczytać konfiguracji WireGuard serwera.")
+        return
+    conf_sha, server_public_key, server_conf, server_peers = state
+    print(f"✅ {len(server_conf['peers'])} peer(s) on server / peerów na serwerze.")
+
+    # --- Krok 4b: Rejestr peerów (wg_registry/<KLUCZ>.json) ---
+    try:
+        registry = peer_registry.load_registry(server_key, EUD_SUBNET)
+    except ValueError as e:
+        print(f"❌ ERROR / BŁĄD: {e}")
+        return
+    report = registry.reconcile(server_peers, {p['public_key']: p['name'] for p in server_conf['peers'] if p.get('name')})
+    if report['imported']:
+        print(f"ℹ️  Imported {len(report['imported'])} existing peer(s) into the registry / "
+              f"Zaimportowano {len(report['imported'])} istniejących peerów do rejestru.")
+    for record in report['missing']:
+        print(f"⚠️  {record['name']} ({record['ip']}) is in the registry but not on the server / "
+              f"jest w rejestrze, ale nie na serwerze.")
+    for record in report['conflicts']:
+        print(f"⚠️  Conflict / Konflikt: {record['name']} {record['ip']} ({record['public_key'][:8]}...)")
+    print(f"ℹ️  {EUD_SUBNET}: {len(registry.peers)} registered, {registry.free_count()} free / "
+          f"zarejestrowanych {len(registry.peers)}, wolnych {registry.free_count()}.")
+
+    if mode == "2":
+        remove_euds(ssh_host_ip, ADMIN_USER, conf_sha, server_conf, registry)
+        return
+
+    count_input = input("\nHow many EUDs to enroll? [1]:\nIle urządzeń EUD dodać? [1]:\n> ").strip() or "1"
+    if not count_input.isdigit() or int(count_input) < 1:
+        print("❌ Invalid number / Nieprawidłowa liczba.")
         return
-    print("✅ Server public key retrieved / Klucz publiczny serwera pobrany.")
+    count = int(count_input)
 
+    if count > registry.free_count():
+        print(f"❌ ERROR: Not enough free addresses in {EUD_SUBNET} ({registry.free_count()} left).")
+        print(f"❌ BŁĄD: Brak wolnych adresów w {EUD_SUBNET} (pozostało {registry.free_count()}).")
+        return
+
+    # --- Krok 5: Generowanie kluczy lokalnie i przydział adresów z rejestru ---
     print("\n--- Step 5: Generating client keys ---")
-    print("--- Krok 5: Generowanie kluczy dla klienta ---")
-    code, client_private_key = run_local_command(['wg', 'genkey'])
-    if code != 0: return
-    code, client_public_key = run_local_command(['wg', 'pubkey'], command_input=client_private_key)
-    if code != 0: return
-    print("✅ Client keys generated / Klucze klienta wygenerowane.")
-
-    print("\n--- Step 6: Adding peer to server config ---")
-    print("--- Krok 6: Dodawanie peera do konfiguracji serwera ---")
-    peer_config_content = f"printf '\\n# Peer: {client_name}\\n[Peer]\\nPublicKey = {client_public_key}\\nAllowedIPs = {client_vpn_ip}/32\\n'"
-    remote_command = f"sudo bash -c \"{peer_config_content} >> /etc/wireguard/wg0.conf\""
-    code, _ = run_ssh_command(ssh_host_ip, ADMIN_USER, remote_command)
-    if code != 0: return
-    print("✅ Peer added to server configuration / Peer dodany do konfiguracji serwera.")
-
-    print("\n--- Step 7: Restarting WireGuard service ---")
-    print("--- Krok 7: Restartowanie usługi WireGuard ---")
-    code, _ = run_ssh_command(ssh_host_ip, ADMIN_USER, "sudo systemctl restart wg-quick@wg0")
-    if code != 0: return
-    print("✅ WireGuard service restarted / Usługa WireGuard zrestartowana.")
-
-    # --- Krok 8: Generowanie kodu QR ---
-    print("\n--- Step 8: Creating QR code ---")
-    print("--- Krok 8: Tworzenie kodu QR ---")
+    print("--- Krok 5: Generowanie kluczy dla klientów ---")
+    peers = []
+    for priv, pub in wg_keys.generate_keypairs(count):
+        record = registry.allocate(pub)
+        peers.append({'name': record['name'], 'ip': record['ip'], 'private_key': priv, 'public_key': pub})
+    print(f"✅ {count} client key pair(s) generated / Wygenerowano {count} par kluczy klientów.")
+
+    print(f"\n🚀 Configuring {count} new peer(s) {peers[0]['name']}..{peers[-1]['name']} for server '{instance_name}'...")
+    print(f"🚀 Konfiguracja {count} nowych peerów {peers[0]['name']}..{peers[-1]['name']} dla serwera '{instance_name}'...")
+
+    # --- Krok 6: Jedna transakcja na serwerze ---
+    print("\n--- Step 6: Applying peers live (no tunnel restart) ---")
+    print("--- Krok 6: Stosowanie peerów na żywo (bez restartu tunelu) ---")
+    desired = wg_peers.with_peers(server_conf, [
+        wg_peers.make_peer(p['name'], p['public_key'], f"{p['ip']}/32") for p in peers
+    ])
+    if not apply_server_peers(ssh_host_ip, ADMIN_USER, conf_sha, server_conf, desired):
+        print("❌ ERROR: Failed to add peers (server config left unchanged).")
+        print("❌ BŁĄD: Nie udało się dodać peerów (konfiguracja serwera bez zmian).")
+        return
+    print(f"✅ {count} peer(s) added live / Dodano na żywo {count} peerów.")
+
+    # The peers exist on the server now, so the registry is saved even if a QR fails
+    # Peery istnieją już na serwerze, więc rejestr jest zapisywany nawet przy błędzie QR
+    registry.save()
+    print(f"✅ Registry updated / Zaktualizowano rejestr: {os.path.abspath(registry.path)}")
+
+    # --- Krok 7: Generowanie kodów QR i plików .conf ---
+    print("\n--- Step 7: Creating QR codes ---")
+    print("--- Krok 7: Tworzenie kodów QR ---")
 
     # Domyślny tryb SPLIT TUNNEL (dostęp tylko do serwera przez jego IP wewn. i wewn. VPN)
     allowed_ips = f"{ssh_host_ip}/32, {server_vpn_ip}/32"
     print(f"ℹ️  Default client configuration with server-only access (AllowedIPs = {allowed_ips})")
     print(f"ℹ️  Domyślna konfiguracja klienta z dostępem tylko do serwera (AllowedIPs = {allowed_ips})")
 
-    client_conf_content = f"""[Interface]
-PrivateKey = {client_private_key}
-Address = {client_vpn_ip}/32
-DNS = 8.8.8.8
-
-[Peer]
-PublicKey = {server_public_key}
-Endpoint = {server_external_ip}:51820
-AllowedIPs = {allowed_ips}
-PersistentKeepalive = 25
-"""
-    qr_filename = os.path.join(QR_CODE_PATH, f"QR_{client_name}_{server_key}.png")
-    code, _ = run_local_command(['qrencode', '-o', qr_filename, '-t', 'PNG'], command_input=client_conf_content)
-
-    if code == 0:
-        print("\n" + "=" * 60)
+    output_dir = QR_CODE_PATH
+    if count > 1:
+        ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_dir = os.path.join(QR_CODE_PATH, f"EUD_BATCH_{server_key}_{ts}")
+        os.makedirs(output_dir, exist_ok=True)
+
+    qr_failed = []
+    for peer in peers:
+        client_conf_content = build_client_config(peer['private_key'], peer['ip'], server_public_key,
+                                                  server_external_ip, allowed_ips)
+        if count > 1:
+            conf_filename = os.path.join(output_dir, f"{peer['name']}_{server_key}.conf")
+            with open(conf_filename, 'w', encoding='utf-8') as f:
+                f.write(client_conf_content)
+            os.chmod(conf_filename, 0o600)
+        qr_filename = os.path.join(output_dir, f"QR_{peer['name']}_{server_key}.png")
+        try:
+            qr_code.save_png(client_conf_content, qr_filename)
+        except (OSError, ValueError) as e:
+            print(f"❌ {peer['name']}: {e}")
+            qr_failed.append(peer['name'])
+
+    print("\n" + "=" * 60)
+    if not qr_failed:
         print("✨ FINISHED SUCCESSFULLY! / ZAKOŃCZONO POMYŚLNIE! ✨")
-        print(f"✅ QR code saved to file / Kod QR został zapisany w pliku: {os.path.abspath(qr_filename)}")
+        if count == 1:
+            print(f"✅ QR code saved to file / Kod QR został zapisany w pliku: {os.path.abspath(qr_filename)}")
+        else:
+            print(f"✅ {count} QR codes and configs saved to / {count} kodów QR i konfiguracji zapisano w: {os.path.abspath(output_dir)}")
         print("\nEnglish: Now open the WireGuard app on your phone, press '+' and select 'Scan from QR code'.")
         print(
             "Polski:  Teraz otwórz aplikację WireGuard na swoim telefonie, naciśnij '+' i wybierz 'Skanuj z kodu QR'.")
-
-        config[server_key]['last_eud_octet'] = new_octet
-        save_config(config)
-        print(f"\n✅ Updated 'last_eud_octet' counter for '{server_key}' to {new_octet} in the config file.")
-        print(f"✅ Zaktualizowano licznik 'last_eud_octet' dla '{server_key}' na {new_octet} w pliku konfiguracyjnym.")
-        print("=" * 60)
     else:
-        print(
-            "\n❌ ERROR: Failed to generate QR code. Make sure 'qrencode' is installed (`sudo apt-get install qrencode`).")
-        print(
-            "❌ BŁĄD: Nie udało się wygenerować kodu QR. Upewnij się, że program 'qrencode' jest zainstalowany (`sudo apt-get install qrencode`).")
+        print(f"\n❌ ERROR: Failed to generate QR code(s) for: {', '.join(qr_failed)}.")
+        print(f"❌ BŁĄD: Nie udało się wygenerować kodów QR dla: {', '.join(qr_failed)}.")
+    print("=" * 60)
 
 
 if __name__ == '__main__':
@@ -7,8 +7,10 @@
 # =====================================================================================
 
 import os
-import subprocess
 import yaml
+import config_store
+import apt_cache
+import remote_steps
 import sys
 import re
 
@@ -27,53 +29,15 @@ TAK_SERVER_DIRNAME = "tak-server"
 # Suma kontrolna SHA-256 dla bezpieczeństwa
 EXPECTED_SHA256 = "2ba3d95828ac4d727b2f2413ad344ec3dc63affcc26278fa7de68f9c6f223bd0"
 
+# Verified archive kept in the golden image (bake_image.py)
+# Zweryfikowane archiwum przechowywane w złotym obrazie (bake_image.py)
+BAKED_ASSETS_DIR = "/opt/blox-assets"
+
 # =====================================================================================
 # === HELPER FUNCTIONS ===
 # === FUNKCJE POMOCNICZE ===
 # =====================================================================================
 
-def run_ssh_command(host_ip, user, command):
-    # Prepare SSH command with timeout and safety flags
-    # Przygotuj komendę SSH z limitem czasu i flagami bezpieczeństwa
-    full_command = [
-        'ssh',
-        '-o', 'StrictHostKeyChecking=no',
-        '-o', 'ConnectTimeout=10',
-        f'{user}@{host_ip}',
-        command
-    ]
-    
-    # Print execution status
-    # Drukuj status wykonania
-    print(f"\n🔄 Executing remote command on '{host_ip}'...")
-    print(f"🔄 Wykonywanie zdalnego polecenia na '{host_ip}'...")
-
-    try:
-        process = subprocess.Popen(
-            full_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding='utf-8',
-            bufsize=1
-        )
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                print(f"    [{host_ip}] > {output.strip()}")
-
-        returncode = process.poll()
-        if returncode != 0:
-            print(f"❌ Error executing SSH command (exit code: {returncode}).")
-            print(f"❌ Błąd wykonania polecenia SSH (kod wyjścia: {returncode}).")
-        return returncode
-    except Exception as e:
-        print(f"❌ Unexpected SSH error: {e}")
-        print(f"❌ Nieoczekiwany błąd SSH: {e}")
-        return 1
-
 def load_config():
     # Load the main configuration file from disk
     # Wczytaj główny plik konfiguracyjny z dysku
@@ -82,13 +46,75 @@ def load_config():
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading config: {e}")
         print(f"❌ Błąd ładowania konfiguracji: {e}")
         return None
 
+# =====================================================================================
+# === REMOTE COMMANDS ===
+# === ZDALNE KOMENDY ===
+# =====================================================================================
+
+def build_bake_command():
+    # Download and verify the archive once into the image; deploys only copy it
+    # Pobierz i zweryfikuj archiwum raz do obrazu; wdrożenia tylko je kopiują
+    return " && ".join([
+        f"sudo mkdir -p {BAKED_ASSETS_DIR}",
+        f"sudo curl -fL -o {BAKED_ASSETS_DIR}/{TAK_ZIP_FILENAME} '{GITHUB_ASSET_URL}'",
+        f"echo '{EXPECTED_SHA256}  {BAKED_ASSETS_DIR}/{TAK_ZIP_FILENAME}' | sha256sum -c",
+    ])
+
+def build_step_commands():
+    # {step: [commands]} in run order; commands of one step are connected by logical AND
+    # {krok: [komendy]} po kolei; komendy jednego kroku są połączone logicznym AND
+    return {
+        # 1. Install basic tools (already present on the golden image)
+        # 1. Instalacja podstawowych narzędzi (obecne już w złotym obrazie)
+        'tools': [
+            "(command -v unzip > /dev/null && command -v curl > /dev/null || "
+            "(sudo apt-get update -y && sudo apt-get install -y unzip curl))",
+        ],
+
+        # 2. Copy the baked archive or download from GitHub (to HOME directory), then verify checksum
+        # 2. Skopiuj wypalone archiwum lub pobierz z GitHuba (do katalogu domowego), potem sprawdź sumę kontrolną
+        'archive': [
+            f"(cp {BAKED_ASSETS_DIR}/{TAK_ZIP_FILENAME} {TAK_ZIP_FILENAME} 2>/dev/null || "
+            f"curl -L -o {TAK_ZIP_FILENAME} '{GITHUB_ASSET_URL}')",
+            f"echo '{EXPECTED_SHA256}  {TAK_ZIP_FILENAME}' > check.sha256",
+            f"sha256sum -c check.sha256",
+        ],
+
+        # 3. Unzip directly in HOME directory (Archive contains 'tak-server/' folder already)
+        # 3. Rozpakuj bezpośrednio w katalogu domowym (Archiwum samo w sobie ma folder 'tak-server/')
+        # 4. Straighten structure (just in case the zip unzips to tak-server/tak-server) & Set permissions
+        # 4. Zabezpieczenie przed podwójnym folderem (jeśli wystąpi) i nadawanie uprawnień
+        'unpack': [
+            f"unzip -o {TAK_ZIP_FILENAME}",
+            f"[ -d \"{TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME}\" ] && mv {TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME}/* {TAK_SERVER_DIRNAME}/ 2>/dev/null && rmdir {TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME} 2>/dev/null || true",
+            f"chmod +x {TAK_SERVER_DIRNAME}/scripts/*.sh 2>/dev/null || true",
+        ],
+
+        # 5. Cleanup and verify
+        # 5. Sprzątanie i weryfikacja
+        'cleanup': [
+            f"rm -f check.sha256 {TAK_ZIP_FILENAME}",
+            f"ls -F {TAK_SERVER_DIRNAME}",
+        ],
+    }
+
+def build_remote_command():
+    # All steps as one command chain (cloud-init bootstrap)
+    # Wszystkie kroki jako jeden ciąg komend (bootstrap cloud-init)
+    return " && ".join(cmd for cmds in build_step_commands().values() for cmd in cmds)
+
+def build_steps(proxy=None):
+    # Steps for remote_steps.run_batch (the download always runs; the apt proxy goes first when enabled)
+    # Kroki dla remote_steps.run_batch (pobieranie zawsze się wykonuje; proxy apt najpierw, gdy włączone)
+    steps = [remote_steps.Step(name, False, " && ".join(cmds)) for name, cmds in build_step_commands().items()]
+    return apt_cache.with_proxy(steps, proxy)
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC ===
 # === GŁÓWNA LOGIKA SKRYPTU ===
@@ -146,38 +172,14 @@ def main():
     print(f"\n🚀 Preparing machine '{instance_name}'...")
     print(f"🚀 Przygotowywanie maszyny '{instance_name}'...")
 
-    # Remote command chain
-    # Ciąg zdalnych komend
-    remote_commands = [
-        # 1. Update and install basic tools
-        # 1. Aktualizacja i instalacja podstawowych narzędzi
-        "sudo apt-get update -y && sudo apt-get install -y unzip curl",
-        
-        # 2. Download from GitHub and verify checksum (to HOME directory)
-        # 2. Pobierz z GitHuba do katalogu domowego i sprawdź sumę kontrolną
-        f"curl -L -o {TAK_ZIP_FILENAME} '{GITHUB_ASSET_URL}'",
-        f"echo '{EXPECTED_SHA256}  {TAK_ZIP_FILENAME}' > check.sha256",
-        f"sha256sum -c check.sha256",
-        
-        # 3. Unzip directly in HOME directory (Archive contains 'tak-server/' folder already)
-        # 3. Rozpakuj bezpośrednio w katalogu domowym (Archiwum samo w sobie ma folder 'tak-server/')
-        f"unzip -o {TAK_ZIP_FILENAME}",
-        
-        # 4. Straighten structure (just in case the zip unzips to tak-server/tak-server) & Set permissions
-        # 4. Zabezpieczenie przed podwójnym folderem (jeśli wystąpi) i nadawanie uprawnień
-        f"[ -d \"{TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME}\" ] && mv {TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME}/* {TAK_SERVER_DIRNAME}/ 2>/dev/null && rmdir {TAK_SERVER_DIRNAME}/{TAK_SERVER_DIRNAME} 2>/dev/null || true",
-        f"chmod +x {TAK_SERVER_DIRNAME}/scripts/*.sh 2>/dev/null || true",
-        
-        # 5. Cleanup and verify
-        # 5. Sprzątanie i weryfikacja
-        f"rm -f check.sha256 {TAK_ZIP_FILENAME}",
-        f"ls -F {TAK_SERVER_DIRNAME}"
-    ]
-    
-    # Execute commands connected by logical AND
-    # Wykonaj komendy połączone logicznym AND
-    full_remote_command = " && ".join(remote_commands)
-    return_code = run_ssh_command(ssh_host_ip, server_user, full_remote_command)
+    # Remote steps in one SSH session (uses the copy baked into the golden image when present; apt via the fleet cache)
+    # Zdalne kroki w jednej sesji SSH (używa kopii wypalonej w złotym obrazie, jeśli jest; apt przez bufor floty)
+    print(f"\n🔄 Executing remote steps on '{ssh_host_ip}'...")
+    print(f"🔄 Wykonywanie zdalnych kroków na '{ssh_host_ip}'...")
+    results = remote_steps.run_batch(remote_steps.ssh_transport(server_user, ssh_host_ip),
+                                     build_steps(apt_cache.proxy_url(servers)))
+    remote_steps.print_results(results, prefix='   ')
+    return_code = 0 if remote_steps.batch_ok(results) else 1
 
     # Print final status report
     # Drukuj końcowy raport statusu
@@ -10,6 +10,11 @@ import os
 import subprocess
 import datetime
 import yaml
+import config_store
+import cloud_bootstrap
+import terraform_fleet
+import terraform_plan
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -22,6 +27,7 @@ SSH_KEY_FILE = os.path.expanduser('~/.ssh/id_ed25519_sk.pub')
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
+@tracing.traced('local_cmd')
 def run_command(command, capture_output=False):
     """
     English: Helper function to run system commands and print their output in real-time.
@@ -54,16 +60,15 @@ def run_command(command, capture_output=False):
 
 def load_config():
     """
-    English: Loads the entire config.yaml file.
-    Polski:  Wczytuje cały plik config.yaml.
+    English: Loads config.yaml as a typed snapshot (config_store.Snapshot).
+    Polski:  Wczytuje config.yaml jako typowany snapshot (config_store.Snapshot).
     """
     if not os.path.exists(CONFIG_FILE):
         print(f"❌ Config file '{CONFIG_FILE}' not found.")
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.snapshot(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading config file '{CONFIG_FILE}': {e}")
         print(f"❌ Błąd ładowania pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
@@ -91,54 +96,47 @@ def get_ssh_key():
         return None
 
 
-def get_next_vm_key():
+def reserve_next_vm_key():
     """
-    English: Checks config.yaml and returns the next available key (e.g., VM3 if VM1 and VM2 exist).
-    Polski:  Sprawdza config.yaml i zwraca następny dostępny klucz (np. VM3, jeśli istnieje VM1 i VM2).
+    English: Reserves the next available key in config.yaml (e.g., VM3 if VM1 and VM2 exist).
+             The placeholder entry has no 'name', so other scripts ignore it until the VM exists.
+    Polski:  Rezerwuje następny dostępny klucz w config.yaml (np. VM3, jeśli istnieje VM1 i VM2).
+             Wpis zastępczy nie ma 'name', więc inne skrypty go pomijają, dopóki maszyna nie powstanie.
     """
-    if not os.path.exists(CONFIG_FILE):
-        return 'VM1'
-    try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f) or {}
-        vm_keys = [k for k in config_data.keys() if isinstance(k, str) and k.startswith('VM')]
-        if not vm_keys:
-            return 'VM1'
-        last_num = max([int(k.replace('VM', '')) for k in vm_keys])
-        return f'VM{last_num + 1}'
-    except (IOError, yaml.YAMLError, ValueError):
-        return 'VM1'
+    return config_store.reserve_key('VM', {'status': 'provisioning'}, CONFIG_FILE)
 
 
-def generate_credentials():
+def generate_credentials(suffix=''):
     """
-    English: Generates a unique, GCP-compliant VM name and a password.
-    Polski:  Generuje unikalną, zgodną z GCP nazwę maszyny wirtualnej oraz hasło.
+    English: Generates a unique, GCP-compliant VM name and a password. The optional suffix
+             (e.g. 'vm3') keeps names unique when several VMs are created in the same second.
+    Polski:  Generuje unikalną, zgodną z GCP nazwę maszyny wirtualnej oraz hasło. Opcjonalny
+             sufiks (np. 'vm3') zapewnia unikalność, gdy kilka VM powstaje w tej samej sekundzie.
     """
     now = datetime.datetime.now()
     timestamp_for_name = now.strftime('%Y-%m-%d-%H-%M-%S')
     vm_name = f'blox-tak-server-vm-{timestamp_for_name}'
+    if suffix:
+        vm_name = f'{vm_name}-{suffix}'
     timestamp_for_password = now.strftime('%Y-%m-%d_%H-%M-%S')
     password = f'*P@ssw0rd_*_{timestamp_for_password}*'
     return vm_name, password
 
 
-def update_config_file(vm_key, vm_name, password, ssh_key):
+def update_config_file(vm_key, vm_name, password, ssh_key, outputs=None):
     """
-    English: Updates config.yaml, saving the name, password, and SSH key of the machine.
-    Polski:  Aktualizuje config.yaml, zapisując nazwę, hasło i klucz SSH maszyny.
+    English: Updates config.yaml, saving the name, password, and SSH key of the machine,
+             plus zone, instance ID, IPs and boot disk from the Terraform outputs.
+    Polski:  Aktualizuje config.yaml, zapisując nazwę, hasło i klucz SSH maszyny oraz
+             strefę, ID instancji, adresy IP i dysk startowy z wyjść Terraform.
     """
-    config_data = {}
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f) or {}
-    config_data[vm_key] = {
+    entry = {
         'name': vm_name,
         'password': password,
         'ssh_public_key': ssh_key
     }
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        yaml.dump(config_data, f, default_flow_style=False, sort_keys=False)
+    entry.update(terraform_plan.inventory_fields(outputs))
+    config_store.set_key(vm_key, entry, CONFIG_FILE)
 
     print("\n" + "*" * 60)
     print(f"✅ Configuration file '{CONFIG_FILE}' successfully updated with data for {vm_key}.")
@@ -146,6 +144,121 @@ def update_config_file(vm_key, vm_name, password, ssh_key):
     print("*" * 60)
 
 
+def wait_for_bootstrap(vms):
+    """
+    English: Waits for the cloud-init bootstrap of new VMs ({key: name}) and stores the
+             result as 'bootstrap' in their config.yaml entries. Returns True when all are ok.
+    Polski:  Czeka na bootstrap cloud-init nowych maszyn ({klucz: nazwa}) i zapisuje wynik jako
+             'bootstrap' w ich wpisach config.yaml. Zwraca True, gdy wszystkie są gotowe.
+    """
+    config = config_store.snapshot(CONFIG_FILE)
+    results = cloud_bootstrap.wait_until_ready(
+        {k: {'name': name, 'zone': config.vms[k].zone if k in config.vms else None} for k, name in vms.items()},
+        config.gcp.project_id, config.gcp.zone)
+
+    def mutate(data):
+        for key, status in results.items():
+            if isinstance(data.get(key), dict):
+                data[key]['bootstrap'] = status
+    config_store.update(mutate, CONFIG_FILE)
+
+    print()
+    cloud_bootstrap.print_results(results)
+    ok = all(status == cloud_bootstrap.STATUS_OK for status in results.values())
+    if ok:
+        print("ℹ️  WireGuard, Docker, TAK assets and ClamAV are installed - continue with configure_peer.py.")
+        print("ℹ️  WireGuard, Docker, zasoby TAK i ClamAV są zainstalowane - kontynuuj od configure_peer.py.")
+    return ok
+
+
+# =====================================================================================
+# === FLEET MODE (fleet/main.tf, for_each) ===
+# === TRYB FLOTY (fleet/main.tf, for_each) ===
+# =====================================================================================
+
+def deploy_fleet():
+    """
+    English: Creates N VMs in one Terraform plan in the shared fleet state. Keys are reserved
+             up front; afterwards every VM that exists in the state is written to config.yaml
+             (name, credentials, IPs) in one update and unused reservations are dropped.
+    Polski:  Tworzy N maszyn w jednym planie Terraform we wspólnym stanie floty. Klucze są
+             rezerwowane z góry; potem każda maszyna istniejąca w stanie jest zapisywana do
+             config.yaml (nazwa, dane logowania, IP) jednym zapisem, a niewykorzystane
+             rezerwacje są usuwane.
+    """
+    if not terraform_fleet.is_initialized():
+        print(f"\n❌ ERROR: Terraform is not initialized in '{terraform_fleet.FLEET_DIR}/'.")
+        print(f"   Please run 'terraform -chdir={terraform_fleet.FLEET_DIR} init' first.")
+        print(f"\n❌ BŁĄD: Terraform nie jest zainicjalizowany w '{terraform_fleet.FLEET_DIR}/'.")
+        print(f"   Proszę najpierw uruchomić 'terraform -chdir={terraform_fleet.FLEET_DIR} init'.")
+        return
+
+    ssh_public_key = get_ssh_key()
+    if not ssh_public_key:
+        print("\nAborting due to missing SSH key.")
+        print("Przerywam z powodu braku klucza SSH.")
+        return
+
+    count_input = input("\nHow many VMs to create? [2]:\nIle maszyn utworzyć? [2]:\n> ").strip() or "2"
+    if not count_input.isdigit() or int(count_input) < 1:
+        print("❌ Invalid number / Nieprawidłowa liczba.")
+        return
+    count = int(count_input)
+
+    # --- Rezerwacja kluczy i dane nowych maszyn ---
+    keys = config_store.reserve_keys('VM', [{'status': 'provisioning', 'fleet': True} for _ in range(count)],
+                                     CONFIG_FILE)
+    new_members = {}
+    for key in keys:
+        vm_name, password = generate_credentials(key.lower())
+        new_members[key] = {'name': vm_name, 'password': password, 'ssh_public_key': ssh_public_key, 'fleet': True}
+        print(f"▶️  {key}: {vm_name}")
+
+    terraform_fleet.write_vars(terraform_fleet.build_vars(config_store.load(CONFIG_FILE), add=new_members))
+
+    # --- Jeden równoległy plan dla całej floty ---
+    print(f"\n--- Running Terraform Apply for the fleet ({count} new) ---")
+    print(f"--- Uruchamianie Terraform Apply dla floty ({count} nowych) ---")
+    return_code = terraform_plan.plan_and_apply(terraform_fleet.VARS_FILE, chdir=terraform_fleet.FLEET_DIR,
+                                                parallelism=max(10, count))
+
+    # --- Jeden zapis do config.yaml: wszystko, co istnieje w stanie ---
+    outputs = terraform_fleet.read_outputs()
+
+    def mutate(data):
+        for key, out in outputs.items():
+            entry = dict(new_members[key]) if key in new_members else data.get(key)
+            if not isinstance(entry, dict):
+                continue
+            entry.update(terraform_plan.inventory_fields(out))
+            data[key] = entry
+        for key in keys:
+            if key not in outputs:
+                data.pop(key, None)
+    config_store.update(mutate, CONFIG_FILE)
+
+    created = [k for k in keys if k in outputs]
+    print("\n" + "*" * 60)
+    for key in keys:
+        if key in outputs:
+            print(f"✅ {key}: {outputs[key]['name']}  WAN {outputs[key].get('external_ip')}  LAN {outputs[key].get('internal_ip')}")
+        else:
+            print(f"❌ {key}: not created / nie utworzono")
+    print(f"✅ Configuration file '{CONFIG_FILE}' updated ({len(created)}/{count} new VMs).")
+    print(f"✅ Plik konfiguracyjny '{CONFIG_FILE}' zaktualizowany ({len(created)}/{count} nowych maszyn).")
+    print("*" * 60)
+
+    if created and cloud_bootstrap.is_enabled(config_store.load(CONFIG_FILE)):
+        wait_for_bootstrap({k: outputs[k]['name'] for k in created})
+
+    if return_code == 0 and len(created) == count:
+        print("\n✨ Process completed successfully! ✨")
+        print("✨ Proces zakończony pomyślnie! ✨")
+    else:
+        print(f"\n--- ❌ ERROR: Terraform Apply failed with exit code: {return_code} ---")
+        print(f"--- ❌ BŁĄD: Terraform Apply zakończone z kodem błędu: {return_code} ---")
+
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC (ZMODYFIKOWANA / MODIFIED) ===
 # =====================================================================================
@@ -167,14 +280,19 @@ def main():
         return
 
     # --- Krok 2: Wczytaj ustawienia globalne ---
-    global_settings = config.get('GLOBAL_SETTINGS', {})
-    if not global_settings:
+    if not config.raw.get('GLOBAL_SETTINGS'):
         print("\n❌ ERROR: Section 'GLOBAL_SETTINGS' not found in config.yaml.")
         print("❌ BŁĄD: Sekcja 'GLOBAL_SETTINGS' nie została znaleziona w pliku config.yaml.")
         return
 
-    gcp_settings = global_settings.get('gcp', {})
-    vm_settings = global_settings.get('vm', {})
+
+    mode = input("\n[1] Single VM (workspace) / Pojedyncza VM  [2] Fleet (N VMs, one plan) / Flota [1]:\n> ").strip() or "1"
+    if mode == "2":
+        deploy_fleet()
+        return
+    if mode != "1":
+        print("❌ Invalid selection / Nieprawidłowy wybór.")
+        return
 
     # --- Krok 3: Sprawdź inicjalizację Terraform ---
     if not os.path.isdir('.terraform'):
@@ -192,7 +310,7 @@ def main():
         return
 
     # --- Krok 5: Wygeneruj dane dla nowej maszyny ---
-    vm_key = get_next_vm_key()
+    vm_key = reserve_next_vm_key()
     new_vm_name, new_password = generate_credentials()
 
     print(f"\n▶️  Next available key / Następny dostępny klucz: {vm_key}")
@@ -204,35 +322,30 @@ def main():
     run_command(['terraform', 'workspace', 'new', vm_key])
     run_command(['terraform', 'workspace', 'select', vm_key])
 
-    # --- Krok 7: Wykonaj Terraform Apply z nowymi zmiennymi ---
-    print("\n--- Running Terraform Apply ---")
-    print("--- Uruchamianie Terraform Apply ---")
-    apply_command = [
-        'terraform', 'apply', '-auto-approve',
-        # Zmienne podstawowe
-        f'-var=instance_name={new_vm_name}',
-        f'-var=root_password={new_password}',
-        f'-var=ssh_public_key={ssh_public_key}',
-        # Zmienne z GLOBAL_SETTINGS
-        f'-var=gcp_project_id={gcp_settings.get("project_id")}',
-        f'-var=gcp_region={gcp_settings.get("region")}',
-        f'-var=gcp_zone={gcp_settings.get("zone")}',
-        f'-var=vm_machine_type={vm_settings.get("machine_type")}',
-        f'-var=vm_disk_image={vm_settings.get("disk_image")}',
-        f'-var=vm_disk_size_gb={vm_settings.get("disk_size_gb")}',
-        f'-var=vm_disk_type={vm_settings.get("disk_type")}',
-        f'-var=vm_admin_user={vm_settings.get("admin_user")}',
-    ]
-    return_code, _ = run_command(apply_command)
+    # --- Krok 7: Plik zmiennych z config.yaml, zapisany plan i apply ---
+    vm_entry = {'name': new_vm_name, 'password': new_password, 'ssh_public_key': ssh_public_key}
+    var_file = terraform_plan.write_var_file(
+        terraform_plan.single_vm_var_file(vm_key),
+        terraform_plan.single_vm_vars({'GLOBAL_SETTINGS': config.raw.get('GLOBAL_SETTINGS'), vm_key: vm_entry}, vm_key))
+
+    print("\n--- Running Terraform Plan & Apply ---")
+    print("--- Uruchamianie Terraform Plan i Apply ---")
+    return_code = terraform_plan.plan_and_apply(var_file, workspace=vm_key)
 
     # --- Krok 8: Zaktualizuj plik konfiguracyjny po sukcesie ---
     if return_code == 0:
         print("\n--- ✅ Terraform Apply completed successfully ---")
         print("--- ✅ Terraform Apply zakończone sukcesem ---")
-        update_config_file(vm_key, new_vm_name, new_password, ssh_public_key)
+        # One output read while the VM's workspace is still selected
+        # Jeden odczyt wyjść, póki obszar roboczy maszyny jest wybrany
+        outputs = terraform_plan.read_output('instance')
+        if outputs:
+            print(f"✅ WAN {outputs.get('external_ip')}  LAN {outputs.get('internal_ip')}  ({outputs.get('zone')})")
+        update_config_file(vm_key, new_vm_name, new_password, ssh_public_key, outputs)
     else:
         print(f"\n--- ❌ ERROR: Terraform Apply failed with exit code: {return_code} ---")
         print(f"--- ❌ BŁĄD: Terraform Apply zakończone z kodem błędu: {return_code} ---")
+        config_store.delete_key(vm_key, CONFIG_FILE)
         print("The workspace was not cleaned up. Check the errors above.")
         print("Obszar roboczy nie został wyczyszczony. Sprawdź błędy powyżej.")
 
@@ -241,6 +354,10 @@ def main():
     print("🔄 Przełączam z powrotem na obszar roboczy 'default'...")
     run_command(['terraform', 'workspace', 'select', 'default'])
 
+    # --- Krok 10: Maszyna konfiguruje się sama - czekaj na znacznik gotowości ---
+    if return_code == 0 and cloud_bootstrap.is_enabled(config.raw):
+        wait_for_bootstrap({vm_key: new_vm_name})
+
     if return_code == 0:
         print("\n✨ Process completed successfully! ✨")
         print("✨ Proces zakończony pomyślnie! ✨")
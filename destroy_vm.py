@@ -9,6 +9,10 @@
 import os
 import subprocess
 import yaml
+import config_store
+import terraform_fleet
+import terraform_plan
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -20,6 +24,7 @@ CONFIG_FILE = 'config.yaml'
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
+@tracing.traced('local_cmd')
 def run_command(command):
     """
     English: Helper function to run system commands and print their output in real-time.
@@ -48,8 +53,7 @@ def load_config():
     if not os.path.exists(CONFIG_FILE):
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError):
         return None
 
@@ -59,11 +63,7 @@ def remove_from_config(vm_key_to_delete):
     English: Removes a given key from the config.yaml file.
     Polski:  Usuwa dany klucz z pliku config.yaml.
     """
-    config_data = load_config()
-    if vm_key_to_delete in config_data:
-        del config_data[vm_key_to_delete]
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        yaml.dump(config_data, f, default_flow_style=False, sort_keys=False)
+    config_store.delete_key(vm_key_to_delete, CONFIG_FILE)
 
     print("\n" + "*" * 60)
     print(f"✅ Entry for '{vm_key_to_delete}' has been removed from {CONFIG_FILE}.")
@@ -71,6 +71,33 @@ def remove_from_config(vm_key_to_delete):
     print("*" * 60)
 
 
+def destroy_fleet_member(all_config, vm_key):
+    """
+    English: Removes one VM from the shared fleet state (fleet/main.tf). Two applies:
+             the first clears deletion_protection in place, the second drops the VM from
+             the for_each map, which destroys only that instance.
+    Polski:  Usuwa jedną maszynę ze wspólnego stanu floty (fleet/main.tf). Dwa przebiegi
+             apply: pierwszy wyłącza deletion_protection w miejscu, drugi usuwa maszynę
+             z mapy for_each, co niszczy tylko tę instancję.
+    """
+    if not terraform_fleet.is_initialized():
+        print(f"\n❌ ERROR: Terraform is not initialized in '{terraform_fleet.FLEET_DIR}/'.")
+        print(f"❌ BŁĄD: Terraform nie jest zainicjalizowany w '{terraform_fleet.FLEET_DIR}/'.")
+        return 1
+
+    print("\n--- Step 1/2: Disabling deletion protection ---")
+    print("--- Krok 1/2: Wyłączanie ochrony przed usunięciem ---")
+    terraform_fleet.write_vars(terraform_fleet.build_vars(all_config, unprotect=[vm_key]))
+    return_code = terraform_plan.plan_and_apply(terraform_fleet.VARS_FILE, chdir=terraform_fleet.FLEET_DIR)
+    if return_code != 0:
+        return return_code
+
+    print("\n--- Step 2/2: Removing the VM from the fleet ---")
+    print("--- Krok 2/2: Usuwanie maszyny z floty ---")
+    terraform_fleet.write_vars(terraform_fleet.build_vars(all_config, remove=[vm_key]))
+    return terraform_plan.plan_and_apply(terraform_fleet.VARS_FILE, chdir=terraform_fleet.FLEET_DIR)
+
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC (ZMODYFIKOWANA / MODIFIED) ===
 # =====================================================================================
@@ -123,7 +150,6 @@ def main():
 
     vm_to_delete_data = vms[vm_key]
     vm_name = vm_to_delete_data['name']
-    ssh_key = vm_to_delete_data.get('ssh_public_key', 'dummy-key-for-destroy')
 
     print("\n" + "!" * 60)
     print("!!! WARNING: This operation is irreversible and will permanently delete the VM. !!!")
@@ -135,37 +161,46 @@ def main():
         print("\nOperation cancelled by user / Operacja anulowana przez użytkownika.")
         return
 
-    # --- Krok 3: Uruchom Terraform Destroy z pełnym zestawem zmiennych ---
+    # --- Maszyny floty żyją we wspólnym stanie fleet/ ---
+    if vm_to_delete_data.get('fleet'):
+        return_code = destroy_fleet_member(all_config, vm_key)
+        if return_code == 0:
+            print("\n--- ✅ Fleet VM removed successfully ---")
+            print("--- ✅ Maszyna floty usunięta pomyślnie ---")
+            remove_from_config(vm_key)
+            print("\n✨ Process completed successfully! ✨")
+            print("✨ Proces zakończony pomyślnie! ✨")
+        else:
+            print(f"\n--- ❌ ERROR: Terraform Apply failed with exit code: {return_code} ---")
+            print(f"--- ❌ BŁĄD: Terraform Apply zakończone z kodem błędu: {return_code} ---")
+            print("Check the errors above. The entry in config.yaml was not removed.")
+            print("Sprawdź błędy powyżej. Wpis w config.yaml nie został usunięty.")
+        return
+
+    # --- Krok 3: Uruchom Terraform Destroy z plikiem zmiennych z config.yaml ---
     print(f"\n🔄 Switching to workspace '{vm_key}' for deletion...")
     print(f"🔄 Przełączanie na obszar roboczy '{vm_key}' w celu usunięcia...")
     run_command(['terraform', 'workspace', 'select', vm_key])
 
-    print("\n--- Running Terraform Destroy ---")
-    print("--- Uruchamianie Terraform Destroy ---")
-
-    destroy_command = [
-        'terraform', 'destroy', '-auto-approve',
-        # Zmienne podstawowe
-        f'-var=instance_name={vm_name}',
-        f'-var=root_password=dummy-password',  # Hasło nie jest potrzebne do usunięcia
-        f'-var=ssh_public_key={ssh_key}',
-        # Zmienne z GLOBAL_SETTINGS - konieczne, aby Terraform poprawnie odczytał stan
-        f'-var=gcp_project_id={gcp_settings.get("project_id")}',
-        f'-var=gcp_region={gcp_settings.get("region")}',
-        f'-var=gcp_zone={gcp_settings.get("zone")}',
-        f'-var=vm_machine_type={vm_settings.get("machine_type")}',
-        f'-var=vm_disk_image={vm_settings.get("disk_image")}',
-        f'-var=vm_disk_size_gb={vm_settings.get("disk_size_gb")}',
-        f'-var=vm_disk_type={vm_settings.get("disk_type")}',
-        f'-var=vm_admin_user={vm_settings.get("admin_user")}',
-    ]
-    return_code = run_command(destroy_command)
+    print("\n--- Running Terraform Plan & Destroy ---")
+    print("--- Uruchamianie Terraform Plan i Destroy ---")
+
+    # The same values the VM was created with - no dummy placeholders needed
+    # Te same wartości, z którymi maszyna została utworzona - bez fikcyjnych zastępników
+    entry = dict(vm_to_delete_data)
+    entry.setdefault('password', '')
+    entry.setdefault('ssh_public_key', '')
+    var_file = terraform_plan.write_var_file(
+        terraform_plan.single_vm_var_file(vm_key),
+        terraform_plan.single_vm_vars({'GLOBAL_SETTINGS': global_settings, vm_key: entry}, vm_key))
+    return_code = terraform_plan.plan_and_apply(var_file, workspace=vm_key, destroy=True)
 
     # --- Krok 4: Posprzątaj po udanym usunięciu ---
     if return_code == 0:
         print("\n--- ✅ Terraform Destroy completed successfully ---")
         print("--- ✅ Terraform Destroy zakończone sukcesem ---")
         remove_from_config(vm_key)
+        os.remove(var_file)
 
         print("\n🧹 Cleaning up workspace...")
         print("🧹 Sprzątanie obszaru roboczego...")
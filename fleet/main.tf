@@ -0,0 +1,190 @@
+# =====================================================================================
+# === TERRAFORM FLEET CONFIGURATION FOR GOOGLE CLOUD VMS (v1.0 - for_each) ===
+# === KONFIGURACJA TERRAFORM FLOTY MASZYN W GOOGLE CLOUD (v1.0 - for_each) ===
+# =====================================================================================
+#
+# English: All VMs marked 'fleet: true' in config.yaml live in this single state and are
+#          created/destroyed in one parallel plan. Inputs are written by deploy_vm.py to
+#          fleet.auto.tfvars.json (git-ignored, contains passwords). Single VMs created the
+#          classic way stay in the root main.tf workspaces.
+# Polski:  Wszystkie maszyny oznaczone 'fleet: true' w config.yaml są w tym jednym stanie
+#          i są tworzone/usuwane w jednym równoległym planie. Wejścia zapisuje deploy_vm.py
+#          do fleet.auto.tfvars.json (ignorowany przez git, zawiera hasła). Pojedyncze VM
+#          tworzone klasycznie pozostają w obszarach roboczych głównego main.tf.
+
+terraform {
+  required_version = ">= 1.3.0"
+  required_providers {
+    google = {
+      source  = "hashicorp/google"
+      version = ">= 4.25.0"
+    }
+  }
+}
+
+# --- Zmienne wejściowe / Input Variables ---
+
+# English: Map of config.yaml key -> instance name. Kept non-sensitive because it drives for_each.
+#          destroy_vm.py clears deletion_protection for a member before removing it from the map.
+# Polski:  Mapa klucz config.yaml -> nazwa instancji. Niewrażliwa, bo steruje for_each.
+#          destroy_vm.py wyłącza deletion_protection członka, zanim usunie go z mapy.
+variable "instances" {
+  description = "Fleet members keyed by config.yaml key. / Członkowie floty wg klucza config.yaml."
+  type = map(object({
+    name                = string
+    deletion_protection = optional(bool, true)
+    wg_address          = optional(string, "")
+  }))
+}
+
+variable "instance_secrets" {
+  description = "Per-instance admin password and SSH key. / Hasło admina i klucz SSH dla każdej instancji."
+  type = map(object({
+    root_password  = string
+    ssh_public_key = string
+  }))
+  sensitive = true
+}
+
+# Zmienne z GLOBAL_SETTINGS.gcp
+variable "gcp_project_id" {
+  description = "Google Cloud Project ID. / ID projektu w Google Cloud."
+  type        = string
+}
+variable "gcp_region" {
+  description = "Google Cloud Region. / Region w Google Cloud."
+  type        = string
+}
+variable "gcp_zone" {
+  description = "Google Cloud Zone. / Strefa w Google Cloud."
+  type        = string
+}
+
+# Zmienne z GLOBAL_SETTINGS.vm
+variable "vm_machine_type" {
+  description = "The machine type for the VM. / Typ maszyny dla VM."
+  type        = string
+}
+variable "vm_disk_image" {
+  description = "The boot disk image for the VM. / Obraz dysku startowego dla VM."
+  type        = string
+}
+variable "vm_disk_size_gb" {
+  description = "The boot disk size in GB. / Rozmiar dysku startowego w GB."
+  type        = number
+}
+variable "vm_disk_type" {
+  description = "The boot disk type. / Typ dysku startowego."
+  type        = string
+}
+variable "vm_admin_user" {
+  description = "The username for the admin user on the VM. / Nazwa użytkownika admina na VM."
+  type        = string
+}
+
+# Zmienne bootstrapu cloud-init (cloud_bootstrap.py); puste = zwykłe user-data
+# Cloud-init bootstrap variables (cloud_bootstrap.py); empty = plain user-data
+variable "bootstrap_script" {
+  description = "First-boot script run by cloud-init. / Skrypt pierwszego startu uruchamiany przez cloud-init."
+  type        = string
+  default     = ""
+}
+
+# --- Konfiguracja dostawcy / Provider Configuration ---
+
+provider "google" {
+  project = var.gcp_project_id
+  region  = var.gcp_region
+}
+
+# --- Maszyny floty / Fleet VM Resources ---
+
+resource "google_compute_instance" "tak-server-vm" {
+  for_each = var.instances
+
+  name         = each.value.name
+  zone         = var.gcp_zone
+  machine_type = var.vm_machine_type
+
+  boot_disk {
+    auto_delete = true
+    device_name = each.value.name
+    initialize_params {
+      image = var.vm_disk_image
+      size  = var.vm_disk_size_gb
+      type  = var.vm_disk_type
+    }
+    mode = "READ_WRITE"
+  }
+
+  metadata = {
+    # Dodanie klucza SSH do autoryzowanych kluczy użytkownika
+    ssh-keys = "${var.vm_admin_user}:${var.instance_secrets[each.key].ssh_public_key}"
+
+    # Konfiguracja początkowa maszyny za pomocą cloud-init
+    user-data = templatefile("${path.module}/../cloud-init.yaml.tftpl", {
+      admin_user       = var.vm_admin_user
+      root_password    = var.instance_secrets[each.key].root_password
+      bootstrap_script = var.bootstrap_script
+    })
+
+    # Postęp bootstrapu jako atrybuty gościa / Bootstrap progress as guest attributes
+    enable-guest-attributes = "TRUE"
+    blox-wg-address         = each.value.wg_address
+  }
+
+  network_interface {
+    subnetwork = "projects/${var.gcp_project_id}/regions/${var.gcp_region}/subnetworks/default"
+    access_config {
+      network_tier = "PREMIUM"
+    }
+  }
+
+  scheduling {
+    automatic_restart   = true
+    on_host_maintenance = "MIGRATE"
+    preemptible         = false
+    provisioning_model  = "STANDARD"
+  }
+
+  shielded_instance_config {
+    enable_integrity_monitoring = true
+    enable_secure_boot          = true
+    enable_vtpm                 = true
+  }
+
+  deletion_protection = each.value.deletion_protection
+  can_ip_forward      = false
+  enable_display      = false
+  hostname            = "takserver.local"
+  tags                = ["tak-server"]
+
+  labels = {
+    goog-ec-src         = "vm_add-tf"
+    goog-ops-agent-policy = "v2-x86-template-1-4-0"
+  }
+
+  # Re-baking the golden image (bake_image.py) changes vm_disk_image; existing VMs keep their disk
+  # Ponowne wypalenie złotego obrazu (bake_image.py) zmienia vm_disk_image; istniejące maszyny zachowują dysk
+  lifecycle {
+    ignore_changes = [boot_disk[0].initialize_params[0].image]
+  }
+}
+
+# --- Wyjścia / Outputs ---
+# English: Read once by deploy_vm.py ('terraform output -json') and written back to config.yaml.
+# Polski:  Odczytywane raz przez deploy_vm.py ('terraform output -json') i zapisywane do config.yaml.
+
+output "instances" {
+  description = "Name, zone, IPs and disk per fleet member. / Nazwa, strefa, adresy IP i dysk każdego członka floty."
+  value = {
+    for key, vm in google_compute_instance.tak-server-vm : key => {
+      name        = vm.name
+      zone        = vm.zone
+      instance_id = vm.instance_id
+      internal_ip = vm.network_interface[0].network_ip
+      external_ip = vm.network_interface[0].access_config[0].nat_ip
+      boot_disk   = vm.boot_disk[0].source
+    }
+  }
+}
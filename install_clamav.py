@@ -3,17 +3,49 @@
 
 import os
 import subprocess
-import yaml
+import config_store
+import remote_steps
+import apt_cache
 import sys
 import time
+import shutil
+import getpass
+import threading
+import urllib.request
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from clamd_client import build_remote_wait_command
+import tracing
 
 # --- CONFIGURATION ---
 CONFIG_FILE = 'config.yaml'
 
+# English: Defaults for the private signature mirror (GLOBAL_SETTINGS.clamav.mirror).
+# Polski: Domyślne ustawienia prywatnego mirrora sygnatur (GLOBAL_SETTINGS.clamav.mirror).
+MIRROR_DEFAULTS = {
+    'enabled': False,
+    'db_dir': '~/.cvdupdate/database',
+    'port': 8000,
+    'persistent': True,
+    'refresh_hours': 4,
+}
+# English: systemd units of the persistent mirror on the admin machine
+# Polski: Jednostki systemd trwałego mirrora na maszynie admina
+MIRROR_SERVICE = 'blox-clamav-mirror'
+MIRROR_UNIT_DIR = '/etc/systemd/system'
+MIRROR_READY_TIMEOUT = 15   # seconds / sekundy
+# English: Official mirror kept in freshclam.conf as the fallback
+# Polski: Oficjalny mirror zostawiony w freshclam.conf jako zapasowy
+DEFAULT_DATABASE_MIRROR = 'database.clamav.net'
+CLAMD_READY_TIMEOUT = 300   # seconds / sekundy
+MAX_PARALLEL_INSTALLS = 4
+
 def load_config():
     if not os.path.exists(CONFIG_FILE): return None
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return yaml.safe_load(f)
+    return config_store.load(CONFIG_FILE)
 
+@tracing.traced('ssh')
 def run_ssh_command(host_ip, user, command):
     # English: Execute a command via SSH
     # Polski: Wykonaj polecenie przez SSH
@@ -33,6 +65,228 @@ def run_ssh_command(host_ip, user, command):
         print(f"❌ SSH ERROR: {e}")
         return 1
 
+# --- PRIVATE MIRROR ---
+# --- PRYWATNY MIRROR ---
+
+def get_mirror_settings(config):
+    # English: Merge GLOBAL_SETTINGS.clamav.mirror over defaults
+    # Polski: Nałóż GLOBAL_SETTINGS.clamav.mirror na wartości domyślne
+    settings = dict(MIRROR_DEFAULTS)
+    clamav = (config.get('GLOBAL_SETTINGS', {}) or {}).get('clamav', {}) or {}
+    settings.update({k: v for k, v in (clamav.get('mirror') or {}).items() if v is not None})
+    settings['db_dir'] = os.path.expanduser(settings['db_dir'])
+    settings['port'] = int(settings['port'])
+    settings['refresh_hours'] = max(1, int(settings['refresh_hours']))
+    return settings
+
+def sync_mirror(db_dir):
+    # English: Refresh the local signature copy once with cvdupdate (pip install cvdupdate)
+    # Polski: Odśwież lokalną kopię sygnatur jednorazowo przez cvdupdate (pip install cvdupdate)
+    if not shutil.which('cvd'):
+        print("❌ 'cvd' not found. Install it with: pip install cvdupdate")
+        print("❌ Nie znaleziono 'cvd'. Zainstaluj: pip install cvdupdate")
+        return False
+    os.makedirs(db_dir, exist_ok=True)
+    print(f"\n🔄 Syncing signature mirror: {db_dir}")
+    print(f"🔄 Synchronizacja mirrora sygnatur: {db_dir}")
+    if subprocess.run(['cvd', 'config', 'set', '--dbdir', db_dir]).returncode != 0: return False
+    return subprocess.run(['cvd', 'update']).returncode == 0
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # English: Keep the per-request access log out of the installer output
+    # Polski: Nie zaśmiecaj wyjścia instalatora logiem każdego żądania
+    def log_message(self, format, *args):
+        pass
+
+def start_mirror_server(db_dir, bind_ip, port):
+    # English: Serve the database over HTTP on the admin VPN address for the duration of the install
+    # Polski: Udostępnij bazę przez HTTP na adresie VPN admina na czas instalacji
+    handler = functools.partial(QuietHandler, directory=db_dir)
+    server = ThreadingHTTPServer((bind_ip, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🌐 Mirror served at http://{bind_ip}:{port}")
+    print(f"🌐 Mirror dostępny pod http://{bind_ip}:{port}")
+    return server
+
+def build_mirror_service_script(db_dir, bind_ip, port, user, refresh_hours, python=None, cvd=None):
+    """
+    English: Root script installing the mirror as systemd units on the admin machine: an HTTP
+             server on bind_ip (restarted until the VPN address exists) and a timer running
+             'cvd update' every refresh_hours, so VMs keep getting signature updates after the install.
+    Polski:  Skrypt roota instalujący mirror jako jednostki systemd na maszynie admina: serwer HTTP
+             na bind_ip (restartowany, dopóki adres VPN nie istnieje) i timer uruchamiający
+             'cvd update' co refresh_hours, więc VM dostają aktualizacje sygnatur także po instalacji.
+    """
+    python = python or sys.executable
+    cvd = cvd or shutil.which('cvd') or 'cvd'
+    return f"""
+set -e
+echo "--- Installing signature mirror service / Instalacja usługi mirrora sygnatur ---"
+cat > {MIRROR_UNIT_DIR}/{MIRROR_SERVICE}.service <<'BLOX_MIRROR'
+# Generated by install_clamav.py / Wygenerowany przez install_clamav.py
+[Unit]
+Description=Blox ClamAV signature mirror (http://{bind_ip}:{port})
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+User={user}
+ExecStart={python} -m http.server {port} --bind {bind_ip} --directory {db_dir}
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+BLOX_MIRROR
+cat > {MIRROR_UNIT_DIR}/{MIRROR_SERVICE}-update.service <<'BLOX_MIRROR'
+# Generated by install_clamav.py / Wygenerowany przez install_clamav.py
+[Unit]
+Description=Blox ClamAV signature mirror refresh (cvd update)
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+Type=oneshot
+User={user}
+ExecStart={cvd} update
+BLOX_MIRROR
+cat > {MIRROR_UNIT_DIR}/{MIRROR_SERVICE}-update.timer <<'BLOX_MIRROR'
+# Generated by install_clamav.py / Wygenerowany przez install_clamav.py
+[Unit]
+Description=Blox ClamAV signature mirror refresh every {refresh_hours}h
+
+[Timer]
+OnBootSec=15min
+OnUnitActiveSec={refresh_hours}h
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+BLOX_MIRROR
+systemctl daemon-reload
+systemctl enable {MIRROR_SERVICE}.service {MIRROR_SERVICE}-update.timer
+systemctl restart {MIRROR_SERVICE}.service {MIRROR_SERVICE}-update.timer
+echo "✅ Signature mirror service on {bind_ip}:{port}"
+"""
+
+def install_mirror_service(config, mirror, bind_ip):
+    # English: Install the persistent mirror and wait until it answers; False when it cannot be set up
+    # Polski: Zainstaluj trwały mirror i poczekaj, aż odpowie; False, gdy nie da się go uruchomić
+    script = build_mirror_service_script(mirror['db_dir'], bind_ip, mirror['port'],
+                                         getpass.getuser(), mirror['refresh_hours'])
+    password = (config.get('LOCAL_CONFIG', {}) or {}).get('password')
+    if apt_cache.run_local_sudo(script, password) != 0:
+        return False
+    deadline = time.time() + MIRROR_READY_TIMEOUT
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://{bind_ip}:{mirror['port']}/", timeout=2):
+                return True
+        except OSError:
+            time.sleep(1)
+    return False
+
+def build_step_commands(mirror_url=None, persistent=True):
+    # English: {step: [commands]} in run order; 'mirror' is empty without a mirror URL and 'release'
+    #          (back to DatabaseMirror after a temporary mirror) is empty unless it is temporary
+    # Polski: {krok: [komendy]} po kolei; 'mirror' jest pusty bez adresu mirrora, a 'release'
+    #         (powrót do DatabaseMirror po tymczasowym mirrorze) jest pusty, gdy mirror nie jest tymczasowy
+    keep_database_mirror = (f"(grep -q '^DatabaseMirror' /etc/clamav/freshclam.conf || echo 'DatabaseMirror "
+                            f"{DEFAULT_DATABASE_MIRROR}' | sudo tee -a /etc/clamav/freshclam.conf > /dev/null)")
+    return {
+        'packages': [
+            "(dpkg -s clamav-daemon > /dev/null 2>&1 || "
+            "(sudo apt-get update -qq && sudo apt-get install clamav clamav-daemon -y))",
+        ],
+        'mirror': [
+            "sudo sed -i '/^PrivateMirror/d' /etc/clamav/freshclam.conf",
+            keep_database_mirror,
+            f"echo 'PrivateMirror {mirror_url}' | sudo tee -a /etc/clamav/freshclam.conf > /dev/null",
+        ] if mirror_url else [],
+        'signatures': [
+            "sudo systemctl stop clamav-freshclam",
+            "sudo freshclam",
+        ],
+        'release': [
+            "sudo sed -i '/^PrivateMirror/d' /etc/clamav/freshclam.conf",
+            keep_database_mirror,
+            "sudo systemctl try-restart clamav-freshclam",
+        ] if mirror_url and not persistent else [],
+        'services': [
+            "sudo systemctl start clamav-freshclam",
+            "sudo systemctl enable clamav-daemon",
+            "sudo systemctl restart clamav-daemon",
+            "echo '⏳ Waiting for clamd (PING/PONG)...'",
+            build_remote_wait_command(CLAMD_READY_TIMEOUT),
+            "sudo systemctl status clamav-daemon --no-pager | grep 'Active:'"
+        ],
+    }
+
+def build_package_commands(mirror_url=None, persistent=True):
+    # English: Packages + signatures; apt is skipped when clamav-daemon is already installed (golden image)
+    # Polski: Pakiety + sygnatury; apt jest pomijany, gdy clamav-daemon jest już zainstalowany (złoty obraz)
+    steps = build_step_commands(mirror_url, persistent)
+    return ["export LC_ALL=C"] + steps['packages'] + steps['mirror'] + steps['signatures'] + steps['release']
+
+def build_install_commands(mirror_url=None, persistent=True):
+    # English: Commands for Clean Install (PrivateMirror when a mirror URL is given)
+    # Polski: Komendy Czystej Instalacji (PrivateMirror, gdy podano adres mirrora)
+    cmds = build_package_commands(mirror_url, persistent) + build_step_commands(mirror_url, persistent)['services']
+    return " && ".join(cmds)
+
+# --- STATE PROBE ---
+# --- SONDA STANU ---
+
+def build_probe_checks(mirror_url=None):
+    checks = {
+        'package': remote_steps.has_package('clamav-daemon'),
+        'signatures': "ls /var/lib/clamav/main.c[lv]d /var/lib/clamav/daily.c[lv]d > /dev/null && echo 1 || echo 0",
+        'clamd': remote_steps.service_state('clamav-daemon'),
+        'clamd_enabled': "systemctl is-enabled clamav-daemon",
+        'freshclam': remote_steps.service_state('clamav-freshclam'),
+    }
+    if mirror_url:
+        checks['mirror'] = f"grep -qx 'PrivateMirror {mirror_url}' /etc/clamav/freshclam.conf && echo 1 || echo 0"
+        checks['private_mirror'] = "grep -q '^PrivateMirror' /etc/clamav/freshclam.conf && echo 1 || echo 0"
+        checks['database_mirror'] = "grep -q '^DatabaseMirror' /etc/clamav/freshclam.conf && echo 1 || echo 0"
+    return checks
+
+def build_steps(state, mirror_url=None, persistent=True):
+    # English: A changed mirror refreshes the signatures; a signature refresh (stops freshclam) restarts the services.
+    #          A temporary mirror is only used to fetch missing signatures and is released afterwards.
+    # Polski: Zmieniony mirror odświeża sygnatury; odświeżenie sygnatur (zatrzymuje freshclam) restartuje usługi.
+    #         Tymczasowy mirror służy tylko do pobrania brakujących sygnatur i jest potem zwalniany.
+    signatures = state.get('signatures') == '1'
+    done = {'packages': state.get('package') == '1'}
+    if not mirror_url:
+        done['mirror'] = True
+    elif persistent:
+        done['mirror'] = state.get('mirror') == '1' and state.get('database_mirror') == '1'
+    else:
+        done['mirror'] = done['packages'] and signatures
+    done['signatures'] = done['packages'] and done['mirror'] and signatures
+    done['release'] = (not mirror_url or persistent or
+                       (done['signatures'] and state.get('private_mirror') == '0' and state.get('database_mirror') == '1'))
+    done['services'] = (done['signatures'] and done['release'] and state.get('clamd') == 'active'
+                        and state.get('clamd_enabled') == 'enabled' and state.get('freshclam') == 'active')
+    return [remote_steps.Step(name, done[name], " && ".join(["export LC_ALL=C"] + cmds))
+            for name, cmds in build_step_commands(mirror_url, persistent).items() if cmds]
+
+def install_on_vm(key, vm, mirror_url, proxy=None, persistent=True):
+    # English: One probe, then only the missing steps in one SSH session
+    # Polski: Jedna sonda, potem tylko brakujące kroki w jednej sesji SSH
+    start = time.time()
+    user = vm.get('admin_user', 'blox_tak_server_admin')
+    state = remote_steps.probe(['ssh', '-o', 'StrictHostKeyChecking=no', f"{user}@{vm['internal_ip']}"],
+                               build_probe_checks(mirror_url))
+    if state is None:
+        return key, vm['name'], 1, time.time() - start
+    steps = apt_cache.with_proxy(build_steps(state, mirror_url, persistent), proxy)
+    remote_steps.print_plan(steps, prefix=f"   [{key}] ")
+    script = remote_steps.build_script(steps)
+    code = run_ssh_command(vm['internal_ip'], user, script) if script else 0
+    return key, vm['name'], code, time.time() - start
+
 def main():
     os.system("clear || cls")
     print("=" * 60)
@@ -46,33 +300,52 @@ def main():
     vms = {k: v for k, v in config.items() if isinstance(v, dict) and 'name' in v}
     print("\nAvailable Servers / Dostępne Serwery:")
     for k, v in vms.items(): print(f" [{k}] {v['name']}")
-    
-    key = input("\nSelect VM Key / Wybierz Klucz VM:\n> ").strip().upper()
-    if key not in vms: return
-    vm = vms[key]
-    
-    # English: Commands for Clean Install
-    # Polski: Komendy Czystej Instalacji
-    cmds = [
-        "export LC_ALL=C",
-        "sudo apt-get update -qq",
-        "sudo apt-get install clamav clamav-daemon -y",
-        "sudo systemctl stop clamav-freshclam",
-        "sudo freshclam",
-        "sudo systemctl start clamav-freshclam",
-        "sudo systemctl enable clamav-daemon",
-        "sudo systemctl restart clamav-daemon",
-        "echo '⏳ Waiting for DB load (15s)...'",
-        "sleep 15",
-        "sudo systemctl status clamav-daemon --no-pager | grep 'Active:'"
-    ]
-
-    full_cmd = " && ".join(cmds)
-    if run_ssh_command(vm['internal_ip'], vm.get('admin_user', 'blox_tak_server_admin'), full_cmd) == 0:
-        print("\n✅ ClamAV Installed Successfully.")
-        print("✅ ClamAV Zainstalowany Pomyślnie.")
-    else:
-        print("\n❌ Installation Failed.")
+
+    choice = input("\nSelect VM Key(s), comma separated, or ALL / Wybierz Klucz(e) VM, po przecinku, lub ALL:\n> ").strip().upper()
+    keys = list(vms) if choice == 'ALL' else [k.strip() for k in choice.split(',') if k.strip()]
+    if not keys or any(k not in vms for k in keys): return
+
+    mirror = get_mirror_settings(config)
+    server = None
+    mirror_url = None
+    persistent = False
+    if mirror['enabled']:
+        admin_ip = ((config.get('GLOBAL_SETTINGS', {}) or {}).get('vpn', {}) or {}).get('admin_ip', '')
+        bind_ip = admin_ip.split('/')[0]
+        if not bind_ip or not sync_mirror(mirror['db_dir']):
+            print("❌ Mirror unavailable. Aborting.")
+            print("❌ Mirror niedostępny. Przerywam.")
+            return
+        if mirror['persistent']:
+            persistent = install_mirror_service(config, mirror, bind_ip)
+            if not persistent:
+                print("⚠️ Mirror service not running; using a temporary mirror and restoring DatabaseMirror afterwards.")
+                print("⚠️ Usługa mirrora nie działa; używam tymczasowego mirrora i przywracam potem DatabaseMirror.")
+        if not persistent:
+            try:
+                server = start_mirror_server(mirror['db_dir'], bind_ip, mirror['port'])
+            except OSError as e:
+                print(f"❌ Cannot bind {bind_ip}:{mirror['port']} (is the VPN up?): {e}")
+                print(f"❌ Nie można nasłuchiwać na {bind_ip}:{mirror['port']} (czy VPN działa?): {e}")
+                return
+        mirror_url = f"http://{bind_ip}:{mirror['port']}"
+
+    proxy = apt_cache.proxy_url(config)
+    try:
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_INSTALLS, len(keys))) as pool:
+            results = list(pool.map(lambda k: install_on_vm(k, vms[k], mirror_url, proxy, persistent), keys))
+    finally:
+        if server: server.shutdown()
+
+    failed = 0
+    print("\n" + "=" * 60)
+    for key, name, code, elapsed in results:
+        if code == 0:
+            print(f"✅ [{key}] {name}: ClamAV Installed Successfully / Zainstalowany Pomyślnie ({elapsed:.0f}s)")
+        else:
+            failed += 1
+            print(f"❌ [{key}] {name}: Installation Failed / Instalacja Nieudana (exit {code})")
+    if failed: sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -9,7 +9,11 @@
 import os
 import subprocess
 import yaml
+import config_store
 import sys
+import remote_steps
+import apt_cache
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -31,14 +35,14 @@ def load_config():
         print(f"❌ BŁĄD: Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ ERROR: Error loading config file: {e}")
         print(f"❌ BŁĄD: Błąd ładowania pliku konfiguracyjnego: {e}")
         return None
 
 
+@tracing.traced('ssh')
 def run_ssh_command(host_ip, user, command):
     """
     English: Runs a command on a remote machine via SSH and streams the output.
@@ -75,6 +79,92 @@ def run_ssh_command(host_ip, user, command):
         return 1
 
 
+# =====================================================================================
+# === REMOTE SCRIPTS / SKRYPTY ZDALNE ===
+# =====================================================================================
+
+def build_package_script(docker_repo=apt_cache.DOCKER_REPO_HTTPS):
+    """
+    English: Docker Engine from Docker's apt repository (docker_repo: see apt_cache.docker_repo).
+             Skipped when 'docker' is already present (golden image, see bake_image.py).
+    Polski:  Docker Engine z repozytorium apt Dockera (docker_repo: zob. apt_cache.docker_repo).
+             Pomijane, gdy 'docker' już jest (złoty obraz, zob. bake_image.py).
+    """
+    return f"""
+    echo "--- Starting Docker installation ---"
+    if command -v docker > /dev/null; then
+        echo "Docker already installed / Docker już zainstalowany"
+    else
+        # 1. Update package index and install dependencies
+        sudo apt-get update
+        sudo apt-get install -y ca-certificates curl
+
+        # 2. Add Docker's official GPG key
+        sudo install -m 0755 -d /etc/apt/keyrings
+        sudo curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc
+        sudo chmod a+r /etc/apt/keyrings/docker.asc
+
+        # 3. Set up the repository
+        echo \\
+          "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] {docker_repo} \\
+          $(. /etc/os-release && echo $VERSION_CODENAME) stable" | \\
+          sudo tee /etc/apt/sources.list.d/docker.list > /dev/null
+
+        # 4. Install Docker Engine
+        sudo apt-get update
+        sudo apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
+    fi
+    """
+
+
+def build_step_scripts(admin_user, docker_repo=apt_cache.DOCKER_REPO_HTTPS):
+    """
+    English: {step: bash} for package, service and docker group, in run order.
+    Polski:  {krok: bash} dla pakietu, usługi i grupy docker, po kolei.
+    """
+    return {
+        'package': build_package_script(docker_repo),
+        'service': """
+    sudo systemctl enable --now docker
+    """,
+        # 5. Add user to the 'docker' group
+        'group': f"""
+    sudo usermod -aG docker {admin_user}
+    """,
+    }
+
+
+def build_install_script(admin_user):
+    """
+    English: Package install plus adding the admin user to the 'docker' group.
+    Polski:  Instalacja pakietów i dodanie użytkownika admina do grupy 'docker'.
+    """
+    return ("\n    set -e\n" + ''.join(build_step_scripts(admin_user).values()) +
+            "\n    echo \"✅ Docker installed successfully.\"\n")
+
+
+# --- STATE PROBE ---
+# --- SONDA STANU ---
+
+def build_probe_checks(admin_user):
+    return {
+        'docker': remote_steps.has_command('docker'),
+        'compose': "docker compose version > /dev/null && echo 1 || echo 0",
+        'active': remote_steps.service_state('docker'),
+        'group': remote_steps.in_group(admin_user, 'docker'),
+    }
+
+
+def build_steps(state, admin_user, docker_repo=apt_cache.DOCKER_REPO_HTTPS):
+    scripts = build_step_scripts(admin_user, docker_repo)
+    done = {
+        'package': state.get('docker') == '1' and state.get('compose') == '1',
+        'service': state.get('active') == 'active',
+        'group': state.get('group') == '1',
+    }
+    return [remote_steps.Step(name, done[name], script) for name, script in scripts.items()]
+
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC (ZMODYFIKOWANA / MODIFIED) ===
 # =====================================================================================
@@ -129,37 +219,23 @@ def main():
 
     print(f"\nℹ️  Connecting to VM via internal IP / Łączę z maszyną przez wewnętrzny adres IP: {ssh_host_ip}")
 
-    # --- Krok 3: Przygotuj i uruchom skrypt instalacyjny ---
-    docker_install_script = f"""
-    set -e
-    echo "--- Starting Docker installation ---"
-
-    # 1. Update package index and install dependencies
-    sudo apt-get update
-    sudo apt-get install -y ca-certificates curl
-
-    # 2. Add Docker's official GPG key
-    sudo install -m 0755 -d /etc/apt/keyrings
-    sudo curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc
-    sudo chmod a+r /etc/apt/keyrings/docker.asc
-
-    # 3. Set up the repository
-    echo \\
-      "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu \\
-      $(. /etc/os-release && echo $VERSION_CODENAME) stable" | \\
-      sudo tee /etc/apt/sources.list.d/docker.list > /dev/null
-
-    # 4. Install Docker Engine
-    sudo apt-get update
-    sudo apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
-
-    # 5. Add user to the 'docker' group
-    sudo usermod -aG docker {ADMIN_USER}
-
-    echo "✅ Docker installed successfully."
-    """
+    # --- Krok 3: Sprawdź stan jedną sondą i uruchom tylko brakujące kroki ---
+    transport = ['ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10', f'{ADMIN_USER}@{ssh_host_ip}']
+    state = remote_steps.probe(transport, build_probe_checks(ADMIN_USER))
+    if state is None:
+        print(f"❌ ERROR: Could not reach '{ssh_host_ip}'. / BŁĄD: Brak połączenia z '{ssh_host_ip}'.")
+        return
+    proxy = apt_cache.proxy_url(config)
+    steps = apt_cache.with_proxy(build_steps(state, ADMIN_USER, apt_cache.docker_repo(proxy)), proxy)
+    remote_steps.print_plan(steps, prefix='   ')
 
-    return_code = run_ssh_command(ssh_host_ip, ADMIN_USER, docker_install_script)
+    docker_install_script = remote_steps.build_script(steps)
+    if docker_install_script:
+        return_code = run_ssh_command(ssh_host_ip, ADMIN_USER, docker_install_script)
+    else:
+        print("\n✅ Docker is already installed and running - nothing to do.")
+        print("✅ Docker jest już zainstalowany i działa - nic do zrobienia.")
+        return_code = 0
 
     print("\n" + "=" * 60)
     if return_code == 0:
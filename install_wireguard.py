@@ -9,8 +9,13 @@
 import os
 import subprocess
 import yaml
+import config_store
 import sys
 import re
+import hashlib
+import remote_steps
+import apt_cache
+import tracing
 
 # --- Configuration ---
 # --- Konfiguracja ---
@@ -22,6 +27,7 @@ CONFIG_FILE = 'config.yaml'
 # === FUNKCJE POMOCNICZE (no changes) ===
 # =====================================================================================
 
+@tracing.traced('local_cmd')
 def run_command(command, capture_output=False, shell=False):
     """
     English: Runs system commands and handles their output.
@@ -60,14 +66,164 @@ def load_config():
         print(f"❌ Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ Error loading config file '{CONFIG_FILE}': {e}")
         print(f"❌ Błąd ładowania pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
         return None
 
 
+# =====================================================================================
+# === REMOTE SCRIPTS / SKRYPTY ZDALNE ===
+# =====================================================================================
+
+def server_address(vpn_settings, vm_key):
+    """
+    English: Server VPN address with mask for a VM key: VM<n> -> <server_subnet prefix>.<n>/<mask>.
+             Returns None when the key has no number or server_subnet is missing.
+    Polski:  Adres VPN serwera z maską dla klucza maszyny: VM<n> -> <prefiks server_subnet>.<n>/<maska>.
+             Zwraca None, gdy klucz nie ma numeru lub brakuje server_subnet.
+    """
+    vm_number_match = re.search(r'\d+', vm_key)
+    server_subnet_cidr = vpn_settings.get('server_subnet')  # np. '10.200.0.0/24'
+    if not vm_number_match or not server_subnet_cidr:
+        return None
+    ip_prefix = '.'.join(server_subnet_cidr.split('.')[:3]) + '.'  # np. '10.200.0.'
+    subnet_mask = server_subnet_cidr.split('/')[1]  # np. '24'
+    return f"{ip_prefix}{vm_number_match.group(0)}/{subnet_mask}"
+
+
+def build_package_script():
+    """
+    English: Installs the WireGuard package. Skipped when 'wg' is already present (golden image,
+             see bake_image.py); used on its own when baking the image.
+    Polski:  Instaluje pakiet WireGuard. Pomijane, gdy 'wg' już jest (złoty obraz, zob.
+             bake_image.py); używane samodzielnie podczas wypalania obrazu.
+    """
+    return """
+        echo "--- Installing WireGuard / Instalacja WireGuard ---"
+        if command -v wg > /dev/null; then
+            echo "WireGuard already installed / WireGuard już zainstalowany"
+        else
+            sudo apt-get update -y && sudo apt-get install -y wireguard
+        fi
+    """
+
+
+def interface_lines(server_vpn_ip_with_mask):
+    """
+    English: The non-secret [Interface] lines of wg0.conf (PrivateKey is added on the server).
+    Polski:  Niesekretne linie [Interface] pliku wg0.conf (PrivateKey dodawany jest na serwerze).
+    """
+    return [
+        f"Address = {server_vpn_ip_with_mask}",
+        "ListenPort = 51820",
+        "PostUp = iptables -A FORWARD -i %i -j ACCEPT; iptables -t nat -A POSTROUTING -o ens4 -j MASQUERADE",
+        "PostDown = iptables -D FORWARD -i %i -j ACCEPT; iptables -t nat -D POSTROUTING -o ens4 -j MASQUERADE",
+    ]
+
+
+def interface_sha256(server_vpn_ip_with_mask):
+    # Same bytes as the 'iface' probe: the grep'ed lines, each ending with a newline
+    # Te same bajty co sonda 'iface': wyfiltrowane linie, każda zakończona nową linią
+    text = ''.join(line + '\n' for line in interface_lines(server_vpn_ip_with_mask))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def build_step_scripts(server_vpn_ip_with_mask):
+    """
+    English: {step: bash} for package, keys, config, forwarding and service, in run order.
+    Polski:  {krok: bash} dla pakietu, kluczy, konfiguracji, przekierowania i usługi, po kolei.
+    """
+    address, listen_port, post_up, post_down = interface_lines(server_vpn_ip_with_mask)
+    return {
+        'package': build_package_script(),
+        # An existing wg0.conf keeps its PrivateKey (peers know its public key): the key files are
+        # rebuilt from it; a new key is generated only when there is neither a config nor a key
+        # Istniejący wg0.conf zachowuje swój PrivateKey (peery znają jego klucz publiczny): pliki
+        # kluczy są z niego odtwarzane; nowy klucz powstaje tylko bez konfiguracji i bez klucza
+        'keys': """
+        echo "--- Server keys / Klucze serwera ---"
+        umask 077
+        CONF_KEY=$(sudo sed -n 's/^PrivateKey[[:space:]]*=[[:space:]]*\\([^[:space:]]*\\).*/\\1/p' /etc/wireguard/wg0.conf 2> /dev/null | head -n 1)
+        if [ -n "$CONF_KEY" ]; then
+            echo "Restoring key files from wg0.conf / Odtwarzanie plików kluczy z wg0.conf"
+            echo "$CONF_KEY" | sudo tee /etc/wireguard/server_private.key > /dev/null
+        elif ! sudo test -s /etc/wireguard/server_private.key; then
+            echo "Generating server keys / Generowanie kluczy serwera"
+            sudo wg genkey | sudo tee /etc/wireguard/server_private.key > /dev/null
+        fi
+        sudo cat /etc/wireguard/server_private.key | sudo wg pubkey | sudo tee /etc/wireguard/server_public.key > /dev/null
+        sudo chmod 600 /etc/wireguard/server_private.key /etc/wireguard/server_public.key
+    """,
+        'config': f"""
+        echo "--- Creating server config with IP {server_vpn_ip_with_mask} ---"
+        PRIVATE_KEY=$(sudo cat /etc/wireguard/server_private.key)
+        echo "[Interface]
+{address}
+{listen_port}
+PrivateKey = ${{PRIVATE_KEY}}
+{post_up}
+{post_down}" | sudo tee /etc/wireguard/wg0.conf > /dev/null
+    """,
+        'forwarding': """
+        echo "--- Enabling IP forwarding / Włączenie przekierowywania IP ---"
+        sudo sysctl -w net.ipv4.ip_forward=1
+        grep -qx 'net.ipv4.ip_forward=1' /etc/sysctl.conf || echo 'net.ipv4.ip_forward=1' | sudo tee -a /etc/sysctl.conf
+    """,
+        'service': """
+        echo "--- Starting WireGuard service / Uruchomienie usługi WireGuard ---"
+        sudo systemctl enable wg-quick@wg0
+        sudo systemctl start wg-quick@wg0
+    """,
+    }
+
+
+def build_install_script(server_vpn_ip_with_mask):
+    """
+    English: Full per-server install on a fresh machine (all steps, used by cloud_bootstrap.py).
+    Polski:  Pełna instalacja na nowej maszynie (wszystkie kroki, używane przez cloud_bootstrap.py).
+    """
+    steps = build_step_scripts(server_vpn_ip_with_mask)
+    return ("\n        set -e\n" + ''.join(steps.values()) +
+            "\n        echo \"✨ WireGuard installation completed successfully! / "
+            "Instalacja WireGuard zakończona pomyślnie! ✨\"\n")
+
+
+# --- STATE PROBE ---
+# --- SONDA STANU ---
+
+PROBE_CHECKS = {
+    'wg': remote_steps.has_command('wg'),
+    'private_key': remote_steps.has_path('/etc/wireguard/server_private.key'),
+    'public_key': remote_steps.has_path('/etc/wireguard/server_public.key'),
+    'conf': remote_steps.has_path('/etc/wireguard/wg0.conf'),
+    'iface': "sudo grep -E '^(Address|ListenPort|PostUp|PostDown) =' /etc/wireguard/wg0.conf | sha256sum | cut -d' ' -f1",
+    'forward': "sysctl -n net.ipv4.ip_forward",
+    'forward_persist': "grep -qx 'net.ipv4.ip_forward=1' /etc/sysctl.conf && echo 1 || echo 0",
+    'active': remote_steps.service_state('wg-quick@wg0'),
+    'enabled': "systemctl is-enabled wg-quick@wg0",
+}
+
+
+def build_steps(state, server_vpn_ip_with_mask):
+    """
+    English: Steps with 'satisfied' from the probe. Existing keys and an existing wg0.conf
+             (which holds the peers) are never replaced; missing key files are rebuilt from it.
+    Polski:  Kroki z 'satisfied' z sondy. Istniejące klucze i istniejący wg0.conf (zawierający
+             peery) nigdy nie są zastępowane; brakujące pliki kluczy są z niego odtwarzane.
+    """
+    scripts = build_step_scripts(server_vpn_ip_with_mask)
+    done = {
+        'package': state.get('wg') == '1',
+        'keys': state.get('private_key') == '1' and state.get('public_key') == '1',
+        'config': state.get('conf') == '1',
+        'forwarding': state.get('forward') == '1' and state.get('forward_persist') == '1',
+        'service': state.get('active') == 'active' and state.get('enabled') == 'enabled',
+    }
+    return [remote_steps.Step(name, done[name], script) for name, script in scripts.items()]
+
+
 # =====================================================================================
 # === MAIN SCRIPT LOGIC (ZMODYFIKOWANA / MODIFIED) ===
 # =====================================================================================
@@ -119,65 +275,43 @@ def main():
     vm_name = vms[vm_key]['name']
 
     # --- Krok 3: Przygotuj adresację IP z pliku konfiguracyjnego ---
-    vm_number_match = re.search(r'\d+', vm_key)
-    if not vm_number_match:
+    server_vpn_ip_with_mask = server_address(vpn_settings, vm_key)  # np. '10.200.0.1/24'
+    if not server_vpn_ip_with_mask:
         print(f"❌ ERROR: Cannot determine server number from key '{vm_key}'. Key must contain a number (e.g., VM1).")
         print(f"❌ BŁĄD: Nie można ustalić numeru serwera z klucza '{vm_key}'. Klucz musi zawierać cyfrę (np. VM1).")
         return
-    vm_number = vm_number_match.group(0)
-
-    server_subnet_cidr = vpn_settings.get('server_subnet')  # np. '10.200.0.0/24'
-    ip_prefix = '.'.join(server_subnet_cidr.split('.')[:3]) + '.'  # np. '10.200.0.'
-    subnet_mask = server_subnet_cidr.split('/')[1]  # np. '24'
-
-    server_vpn_ip = f"{ip_prefix}{vm_number}"  # np. '10.200.0.1'
-    server_vpn_ip_with_mask = f"{server_vpn_ip}/{subnet_mask}"  # np. '10.200.0.1/24'
 
     print(f"\n🚀 Starting WireGuard installation on '{vm_name}'...")
     print(f"🚀 Rozpoczynanie instalacji WireGuard na '{vm_name}'...")
     print(f"   Server VPN IP will be set to / Adres IP serwera VPN zostanie ustawiony na: {server_vpn_ip_with_mask}")
 
-    # --- Krok 4: Uruchom skrypt instalacyjny na zdalnej maszynie ---
-    install_script = f"""
-        set -e
-        echo "--- Installing WireGuard / Instalacja WireGuard ---"
-        sudo apt-get update -y && sudo apt-get install -y wireguard
-
-        echo "--- Generating server keys / Generowanie kluczy serwera ---"
-        sudo wg genkey | sudo tee /etc/wireguard/server_private.key | sudo wg pubkey | sudo tee /etc/wireguard/server_public.key > /dev/null
-        sudo chmod 600 /etc/wireguard/server_private.key /etc/wireguard/server_public.key
-
-        echo "--- Creating server config with IP {server_vpn_ip_with_mask} ---"
-        PRIVATE_KEY=$(sudo cat /etc/wireguard/server_private.key)
-        echo "[Interface]
-Address = {server_vpn_ip_with_mask}
-ListenPort = 51820
-PrivateKey = ${{PRIVATE_KEY}}
-PostUp = iptables -A FORWARD -i %i -j ACCEPT; iptables -t nat -A POSTROUTING -o ens4 -j MASQUERADE
-PostDown = iptables -D FORWARD -i %i -j ACCEPT; iptables -t nat -D POSTROUTING -o ens4 -j MASQUERADE" | sudo tee /etc/wireguard/wg0.conf > /dev/null
-
-        echo "--- Enabling IP forwarding / Włączenie przekierowywania IP ---"
-        sudo sysctl -w net.ipv4.ip_forward=1
-        echo 'net.ipv4.ip_forward=1' | sudo tee -a /etc/sysctl.conf
-
-        echo "--- Starting WireGuard service / Uruchomienie usługi WireGuard ---"
-        sudo systemctl enable wg-quick@wg0
-        sudo systemctl start wg-quick@wg0
-
-        echo "✨ WireGuard installation completed successfully! / Instalacja WireGuard zakończona pomyślnie! ✨"
-    """
-
-    gcloud_ssh_command = [
+    # --- Krok 4: Sprawdź stan serwera jedną sondą ---
+    transport = [
         'gcloud', 'compute', 'ssh',
         f'{ADMIN_USER}@{vm_name}',
         f'--project={PROJECT_ID}',
         f'--zone={ZONE}',
         '--quiet',
         '--',
-        install_script
     ]
+    state = remote_steps.probe(transport, PROBE_CHECKS)
+    if state is None:
+        print(f"❌ ERROR: Could not reach '{vm_name}'. / BŁĄD: Brak połączenia z '{vm_name}'.")
+        return
+    steps = apt_cache.with_proxy(build_steps(state, server_vpn_ip_with_mask), apt_cache.proxy_url(config))
+    remote_steps.print_plan(steps, prefix='   ')
+    if state.get('conf') == '1' and state.get('iface') != interface_sha256(server_vpn_ip_with_mask):
+        print("⚠️  wg0.conf [Interface] differs from config.yaml - left unchanged (it holds the peers).")
+        print("⚠️  [Interface] w wg0.conf różni się od config.yaml - pozostawiony bez zmian (zawiera peery).")
+
+    # --- Krok 5: Uruchom tylko brakujące kroki ---
+    install_script = remote_steps.build_script(steps)
+    if not install_script:
+        print(f"\n✅ WireGuard on '{vm_name}' is already installed and running - nothing to do.")
+        print(f"✅ WireGuard na '{vm_name}' jest już zainstalowany i działa - nic do zrobienia.")
+        return
 
-    code, _ = run_command(gcloud_ssh_command)
+    code, _ = run_command(transport + [install_script])
 
     if code == 0:
         print(f"\n✅ WireGuard installation on '{vm_name}' completed successfully!")
@@ -3,14 +3,15 @@
 
 import os
 import subprocess
-import yaml
+import config_store
 import datetime
 import glob
 import tarfile
 from pathlib import Path
-from fpdf import FPDF
 from fpdf.enums import XPos, YPos
 from pypdf import PdfReader, PdfWriter
+import tracing
+from report_toolkit import ReportPDF
 
 # --- CONFIGURATION & CONSTANTS ---
 # --- KONFIGURACJA I STAŁE ---
@@ -18,12 +19,6 @@ from pypdf import PdfReader, PdfWriter
 CONFIG_FILE = 'config.yaml'
 EVIDENCE_DIR = 'evidence'
 
-FONTS = {
-    'R': "UbuntuMono-Regular.ttf",
-    'B': "UbuntuMono-Bold.ttf",
-    'I': "UbuntuMono-Italic.ttf"
-}
-
 # --- TRANSLATIONS ---
 # --- TŁUMACZENIA ---
 
@@ -68,8 +63,9 @@ def load_config():
     
     # Load and parse YAML file
     # Wczytaj i przetwórz plik YAML
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return yaml.safe_load(f)
+    return config_store.load(CONFIG_FILE)
 
+@tracing.traced('local_cmd')
 def run_local_command(command):
     try:
         # Execute shell command locally
@@ -94,80 +90,31 @@ def get_file_hash(filepath):
 # --- PDF CLASS ---
 # --- KLASA PDF ---
 
-class EvidencePDF(FPDF):
+class EvidencePDF(ReportPDF):
     def __init__(self, vm_name, lang):
         super().__init__()
         self.vm_name = vm_name
         self.lang = lang
         self.t = TEXTS[lang]
-        
-        try:
-            self.add_font('UbuntuMono', '', FONTS['R'])
-            self.add_font('UbuntuMono', 'B', FONTS['B'])
-            self.add_font('UbuntuMono', 'I', FONTS['I'])
-            self.font_family = 'UbuntuMono'
-        except:
-            self.font_family = 'Courier'
 
     def header(self):
-        self.set_font(self.font_family, 'B', 14)
+        self.set_font(self.report_font, 'B', 14)
         self.cell(0, 10, self.t['header'], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
         self.line(10, 20, 200, 20)
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        self.set_font(self.font_family, 'I', 8)
+        self.set_font(self.report_font, 'I', 8)
         self.cell(0, 10, f"{self.t['footer']} | {datetime.datetime.now().strftime('%Y-%m-%d')}", align='C')
 
-    def print_row_grid(self, col1_text, col2_text, w1, w2, fill=False):
-        # Calculate row height for text wrapping
-        # Oblicz wysokość wiersza dla zawijania tekstu
-        font_size = self.font_size_pt / 72 * 25.4
-        line_height = font_size * 1.5
-        
-        # Check how many lines the text will occupy
-        # Sprawdź ile linii zajmie tekst
-        lines1 = self.multi_cell(w1, line_height, str(col1_text), dry_run=True, output="LINES")
-        lines2 = self.multi_cell(w2, line_height, str(col2_text), dry_run=True, output="LINES")
-        
-        max_lines = max(len(lines1), len(lines2))
-        row_height = max_lines * line_height
-
-        # Check for page break
-        # Sprawdź podział strony
-        if self.get_y() + row_height > self.page_break_trigger:
-            self.add_page()
-
-        x_start, y_start = self.get_x(), self.get_y()
-
-        if fill:
-            self.set_fill_color(220, 220, 220)
-            self.rect(x_start, y_start, w1 + w2, row_height, 'F')
-        
-        # Column 1 (File Name - Wrapped)
-        # Kolumna 1 (Nazwa pliku - zawijana)
-        self.set_xy(x_start, y_start)
-        self.multi_cell(w1, line_height, str(col1_text), border=0, align='L')
-        
-        # Column 2 (Size)
-        # Kolumna 2 (Rozmiar)
-        self.set_xy(x_start + w1, y_start)
-        self.multi_cell(w2, line_height, str(col2_text), border=0, align='L')
-
-        # Draw borders on top
-        # Rysuj obramowania na wierzchu
-        self.rect(x_start, y_start, w1, row_height)
-        self.rect(x_start + w1, y_start, w2, row_height)
-
-        self.set_xy(x_start, y_start + row_height)
-
+@tracing.traced('pdf.manifest')
 def create_manifest_pdf(vm_name, archive_path, file_list, lang, is_public, output_pdf):
     # Initialize PDF and fonts
     # Inicjalizuj PDF i czcionki
     pdf = EvidencePDF(vm_name, lang)
     t = TEXTS[lang]
-    font = pdf.font_family
+    font = pdf.report_font
 
     pdf.add_page()
     pdf.set_font(font, '', 10)
@@ -198,10 +145,9 @@ def create_manifest_pdf(vm_name, archive_path, file_list, lang, is_public, outpu
     pdf.print_row_grid(t['filename'], t['size'], w_name, w_size, fill=True)
     
     pdf.set_font(font, '', 9)
-    for fname, fsize in file_list:
-        # Use full filename and grid for wrapping
-        # Użyj pełnej nazwy i siatki do zawijania
-        pdf.print_row_grid(fname, str(fsize), w_name, w_size, fill=False)
+    # Stream full filenames through the table layout (one wrap pass per row)
+    # Strumieniuj pełne nazwy plików przez układ tabeli (jedno zawijanie na wiersz)
+    pdf.print_rows(((fname, str(fsize)) for fname, fsize in file_list), (w_name, w_size))
 
     pdf.ln(10)
     
@@ -221,8 +167,10 @@ def create_manifest_pdf(vm_name, archive_path, file_list, lang, is_public, outpu
     pdf.multi_cell(0, 5, t['legal_text'], border=1, align='L')
 
     pdf.output(output_pdf)
+    tracing.add(bytes_out=os.path.getsize(output_pdf))
     return output_pdf
 
+@tracing.traced('pdf.merge')
 def merge_pdfs(original_report, appendix_pdf):
     # Merge original report with appendix
     # Scal oryginalny raport z załącznikiem
@@ -237,6 +185,7 @@ def merge_pdfs(original_report, appendix_pdf):
 
         with open(original_report, "wb") as f_out:
             writer.write(f_out)
+        tracing.add(bytes_out=os.path.getsize(original_report))
         print(f"      📎 Merged logs manifest into: {os.path.basename(original_report)}")
         print(f"      📎 Scalono manifest logów do: {os.path.basename(original_report)}")
     except Exception as e:
@@ -321,26 +270,29 @@ def main():
     
     ssh_cmd = ['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{internal_ip}', remote_harvest_script(ts)]
     
-    try:
-        result = subprocess.run(ssh_cmd, capture_output=True, text=True)
-        if "READY:" not in result.stdout:
-            print(f"❌ Harvest failed: {result.stderr}")
-            print(f"❌ Zbieranie nieudane: {result.stderr}")
+    with tracing.span('harvest', host=internal_ip):
+        try:
+            result = subprocess.run(ssh_cmd, capture_output=True, text=True)
+            if "READY:" not in result.stdout:
+                print(f"❌ Harvest failed: {result.stderr}")
+                print(f"❌ Zbieranie nieudane: {result.stderr}")
+                return
+            remote_file = result.stdout.split("READY:")[1].strip().split()[0]
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print(f"❌ Błąd: {e}")
             return
-        remote_file = result.stdout.split("READY:")[1].strip().split()[0]
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        print(f"❌ Błąd: {e}")
-        return
 
     # --- 2. DOWNLOAD ---
     # --- 2. POBIERANIE ---
     print(f"[2/4] Downloading archive...")
     print(f"[2/4] Pobieranie archiwum...")
     
-    scp_cmd = f"scp -o StrictHostKeyChecking=no {user}@{internal_ip}:{remote_file} {local_archive_name}"
-    if not run_local_command(scp_cmd): return
-    subprocess.run(['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{internal_ip}', f'sudo rm -f {remote_file}'])
+    with tracing.span('download', host=internal_ip) as span:
+        scp_cmd = f"scp -o StrictHostKeyChecking=no {user}@{internal_ip}:{remote_file} {local_archive_name}"
+        if not run_local_command(scp_cmd): return
+        span.add(bytes_in=os.path.getsize(local_archive_name))
+        subprocess.run(['ssh', '-o', 'StrictHostKeyChecking=no', f'{user}@{internal_ip}', f'sudo rm -f {remote_file}'])
 
     # --- 3. ANALYZE ---
     # --- 3. ANALIZA ---
@@ -349,7 +301,7 @@ def main():
     
     file_list = []
     try:
-        with tarfile.open(local_archive_name, "r:gz") as tar:
+        with tracing.span('analyze'), tarfile.open(local_archive_name, "r:gz") as tar:
             for member in tar.getmembers():
                 if member.isfile():
                     file_list.append((member.name, member.size))
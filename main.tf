@@ -68,6 +68,19 @@ variable "vm_admin_user" {
   type        = string
 }
 
+# Zmienne bootstrapu cloud-init (cloud_bootstrap.py); puste = zwykłe user-data
+# Cloud-init bootstrap variables (cloud_bootstrap.py); empty = plain user-data
+variable "bootstrap_script" {
+  description = "First-boot script run by cloud-init. / Skrypt pierwszego startu uruchamiany przez cloud-init."
+  type        = string
+  default     = ""
+}
+variable "wg_address" {
+  description = "Server WireGuard address with mask. / Adres WireGuard serwera z maską."
+  type        = string
+  default     = ""
+}
+
 # --- Konfiguracja dostawcy / Provider Configuration ---
 
 provider "google" {
@@ -98,27 +111,15 @@ resource "google_compute_instance" "tak-server-vm" {
     ssh-keys = "${var.vm_admin_user}:${var.ssh_public_key}"
 
     # Konfiguracja początkowa maszyny za pomocą cloud-init
-    user-data = <<-EOT
-      #cloud-config
-
-      # Stwórz nowego użytkownika z uprawnieniami sudo
-      users:
-        - name: ${var.vm_admin_user}
-          sudo: ALL=(ALL) NOPASSWD:ALL
-          groups: [adm, sudo]
-          shell: /bin/bash
-
-      # Ustaw hasło dla nowego użytkownika
-      chpasswd:
-        list: |
-          ${var.vm_admin_user}:${var.root_password}
-        expire: False
-
-      # Rekomendacja: Wyłącz logowanie hasłem, skoro mamy klucze SSH
-      runcmd:
-        - [ sed, -i, -e, 's/^#?PasswordAuthentication .*/PasswordAuthentication no/g', /etc/ssh/sshd_config ]
-        - [ systemctl, restart, sshd ]
-    EOT
+    user-data = templatefile("${path.module}/cloud-init.yaml.tftpl", {
+      admin_user       = var.vm_admin_user
+      root_password    = var.root_password
+      bootstrap_script = var.bootstrap_script
+    })
+
+    # Postęp bootstrapu jako atrybuty gościa / Bootstrap progress as guest attributes
+    enable-guest-attributes = "TRUE"
+    blox-wg-address         = var.wg_address
   }
 
   network_interface {
@@ -151,4 +152,28 @@ resource "google_compute_instance" "tak-server-vm" {
     goog-ec-src         = "vm_add-tf"
     goog-ops-agent-policy = "v2-x86-template-1-4-0"
   }
-}
\ No newline at end of file
+
+  # Re-baking the golden image (bake_image.py) changes vm_disk_image; existing VMs keep their disk
+  # Ponowne wypalenie złotego obrazu (bake_image.py) zmienia vm_disk_image; istniejące maszyny zachowują dysk
+  lifecycle {
+    ignore_changes = [boot_disk[0].initialize_params[0].image]
+  }
+}
+# --- Wyjścia / Outputs ---
+# English: Read once by deploy_vm.py ('terraform output -json instance') and written into the
+#          VM entry of config.yaml, so later wizards need no 'gcloud compute instances describe'.
+# Polski:  Odczytywane raz przez deploy_vm.py ('terraform output -json instance') i zapisywane
+#          we wpisie maszyny w config.yaml, więc kolejne kreatory nie potrzebują 'gcloud compute
+#          instances describe'.
+
+output "instance" {
+  description = "Name, zone, IPs and disk of the VM. / Nazwa, strefa, adresy IP i dysk maszyny."
+  value = {
+    name        = google_compute_instance.tak-server-vm.name
+    zone        = google_compute_instance.tak-server-vm.zone
+    instance_id = google_compute_instance.tak-server-vm.instance_id
+    internal_ip = google_compute_instance.tak-server-vm.network_interface[0].network_ip
+    external_ip = google_compute_instance.tak-server-vm.network_interface[0].access_config[0].nat_ip
+    boot_disk   = google_compute_instance.tak-server-vm.boot_disk[0].source
+  }
+}
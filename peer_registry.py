@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === WIREGUARD PEER REGISTRY & IP ALLOCATOR (v1.0) ===
+# === REJESTR PEERÓW WIREGUARD I ALOKATOR IP (v1.0) ===
+# =====================================================================================
+#
+# English: Local per-server registry of EUD peers (wg_registry/<VM_KEY>.json). Addresses
+#          come from a bitmap over the EUD subnet (any prefix length), so freed and revoked
+#          addresses are reused. Peers are indexed by name, public key and IP. The registry
+#          is reconciled against 'wg show wg0 dump' from the server.
+# Polski:  Lokalny rejestr peerów EUD dla każdego serwera (wg_registry/<KLUCZ_VM>.json).
+#          Adresy pochodzą z mapy bitowej podsieci EUD (dowolna długość prefiksu), więc
+#          zwolnione i odwołane adresy są używane ponownie. Peery są indeksowane po nazwie,
+#          kluczu publicznym i IP. Rejestr jest uzgadniany z 'wg show wg0 dump' z serwera.
+
+import datetime
+import ipaddress
+import json
+import os
+import re
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+REGISTRY_DIR = 'wg_registry'
+NAME_PREFIX = 'EUD'
+
+_FREE_BYTE = re.compile(rb'[^\xff]')
+
+
+def get_eud_subnet(vpn_settings):
+    """
+    English: Returns vpn.eud_subnet, or the /24 implied by the legacy eud_subnet_prefix ('10.0.0.').
+    Polski:  Zwraca vpn.eud_subnet lub /24 wynikające ze starego eud_subnet_prefix ('10.0.0.').
+    """
+    subnet = vpn_settings.get('eud_subnet')
+    if not subnet:
+        prefix = vpn_settings.get('eud_subnet_prefix', '10.0.0.')
+        subnet = f"{prefix.rstrip('.')}.0/24"
+    return str(ipaddress.ip_network(subnet, strict=False))
+
+
+def parse_wg_dump(dump_text):
+    """
+    English: Parses 'wg show <if> dump' into {public_key: allowed_ips}; the interface line
+             (4 fields) is skipped.
+    Polski:  Parsuje 'wg show <if> dump' do {klucz_publiczny: allowed_ips}; linia interfejsu
+             (4 pola) jest pomijana.
+    """
+    peers = {}
+    for line in (dump_text or '').splitlines():
+        fields = line.split('\t')
+        if len(fields) >= 8:
+            peers[fields[0]] = fields[3]
+    return peers
+
+
+class PeerRegistry:
+    """
+    English: Active peers live in self.peers (name -> record) with by_key / by_ip indexes;
+             revoked peers are kept in self.revoked for the audit trail.
+    Polski:  Aktywne peery są w self.peers (nazwa -> rekord) z indeksami by_key / by_ip;
+             odwołane peery trafiają do self.revoked jako ślad audytowy.
+    """
+
+    def __init__(self, path, subnet):
+        self.path = path
+        self.network = ipaddress.ip_network(subnet, strict=False)
+        self.peers = {}
+        self.by_key = {}
+        self.by_ip = {}
+        self.revoked = []
+        self._size = self.network.num_addresses
+        self._bitmap = bytearray((self._size + 7) // 8)
+        self._hint = 0
+        # Network and broadcast addresses are never handed out (except /31, /32)
+        # Adresy sieci i rozgłoszeniowy nigdy nie są przydzielane (poza /31, /32)
+        if self._size > 2:
+            self._mark(0)
+            self._mark(self._size - 1)
+
+    # --- Bitmap ---
+
+    def _mark(self, offset):
+        self._bitmap[offset >> 3] |= 1 << (offset & 7)
+
+    def _clear(self, offset):
+        self._bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+        self._hint = min(self._hint, offset >> 3)
+
+    def _is_set(self, offset):
+        return self._bitmap[offset >> 3] >> (offset & 7) & 1 == 1
+
+    def _offset(self, ip):
+        address = ipaddress.ip_address(ip)
+        if address not in self.network:
+            raise ValueError(f"{ip} is outside {self.network}")
+        return int(address) - int(self.network.network_address)
+
+    def _address(self, offset):
+        return str(self.network.network_address + offset)
+
+    def _first_free(self):
+        match = _FREE_BYTE.search(self._bitmap, self._hint)
+        if not match:
+            return None
+        byte_index = match.start()
+        self._hint = byte_index
+        value = self._bitmap[byte_index]
+        bit = (~value & (value + 1)).bit_length() - 1
+        offset = byte_index * 8 + bit
+        return offset if offset < self._size else None
+
+    def free_count(self):
+        used = sum(bin(b).count('1') for b in self._bitmap)
+        return self._size - used
+
+    # --- Records ---
+
+    def _index(self, record):
+        self.peers[record['name']] = record
+        self.by_key[record['public_key']] = record
+        self.by_ip[record['ip']] = record
+        self._mark(self._offset(record['ip']))
+
+    def _unindex(self, record):
+        self.peers.pop(record['name'], None)
+        self.by_key.pop(record['public_key'], None)
+        self.by_ip.pop(record['ip'], None)
+        self._clear(self._offset(record['ip']))
+
+    def get(self, name_key_or_ip):
+        return (self.peers.get(name_key_or_ip) or self.by_key.get(name_key_or_ip)
+                or self.by_ip.get(name_key_or_ip))
+
+    def allocate(self, public_key, name=None):
+        """
+        English: Assigns the lowest free address. Default name is EUD<host offset>, which
+                 matches the old EUD<last octet> naming on a /24.
+        Polski:  Przydziela najniższy wolny adres. Domyślna nazwa to EUD<przesunięcie hosta>,
+                 co na /24 odpowiada dawnemu nazewnictwu EUD<ostatni oktet>.
+        """
+        if public_key in self.by_key:
+            raise ValueError(f"public key already registered as {self.by_key[public_key]['name']}")
+        offset = self._first_free()
+        if offset is None:
+            raise ValueError(f"no free addresses left in {self.network}")
+        name = name or f"{NAME_PREFIX}{offset}"
+        if name in self.peers:
+            raise ValueError(f"peer name {name} already in use")
+        record = {
+            'name': name,
+            'public_key': public_key,
+            'ip': self._address(offset),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        self._index(record)
+        return record
+
+    def release(self, name_key_or_ip):
+        record = self.get(name_key_or_ip)
+        if record:
+            self._unindex(record)
+        return record
+
+    def revoke(self, name_key_or_ip, reason=''):
+        """
+        English: Removes the peer, frees its address and keeps a revocation record.
+        Polski:  Usuwa peera, zwalnia jego adres i zachowuje wpis o odwołaniu.
+        """
+        record = self.release(name_key_or_ip)
+        if record:
+            self.revoked.append(dict(record, revoked=datetime.datetime.now().isoformat(timespec='seconds'),
+                                     reason=reason))
+        return record
+
+    # --- Reconciliation ---
+
+    def reconcile(self, server_peers, names=None):
+        """
+        English: Compares the registry with {public_key: allowed_ips} from the server.
+                 Server peers with an address in the EUD subnet that the registry does not
+                 know are imported (named from wg0.conf comments when available). Returns
+                 {'imported', 'missing', 'conflicts'}; 'missing' peers are only reported.
+        Polski:  Porównuje rejestr z {klucz_publiczny: allowed_ips} z serwera. Peery serwera
+                 z adresem w podsieci EUD nieznane rejestrowi są importowane (nazwane według
+                 komentarzy wg0.conf, jeśli są). Zwraca {'imported', 'missing', 'conflicts'};
+                 brakujące peery są tylko raportowane.
+        """
+        names = names or {}
+        report = {'imported': [], 'missing': [], 'conflicts': []}
+        for public_key, allowed_ips in server_peers.items():
+            if public_key in self.by_key:
+                continue
+            ip = None
+            for cidr in (allowed_ips or '').split(','):
+                cidr = cidr.strip()
+                if not cidr or cidr == '(none)':
+                    continue
+                net = ipaddress.ip_network(cidr, strict=False)
+                if net.num_addresses == 1 and net.network_address in self.network:
+                    ip = str(net.network_address)
+                    break
+            if ip is None:
+                continue
+            name = names.get(public_key) or f"{NAME_PREFIX}{self._offset(ip)}"
+            if ip in self.by_ip or name in self.peers:
+                report['conflicts'].append({'name': name, 'public_key': public_key, 'ip': ip})
+                continue
+            record = {'name': name, 'public_key': public_key, 'ip': ip, 'created': 'imported'}
+            self._index(record)
+            report['imported'].append(record)
+        report['missing'] = [r for r in self.peers.values() if r['public_key'] not in server_peers]
+        return report
+
+    # --- Persistence ---
+
+    def to_dict(self):
+        return {
+            'subnet': str(self.network),
+            'peers': sorted(self.peers.values(), key=lambda r: self._offset(r['ip'])),
+            'revoked': self.revoked,
+        }
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def registry_path(server_key):
+    return os.path.join(REGISTRY_DIR, f"{server_key}.json")
+
+
+def load_registry(server_key, subnet):
+    """
+    English: Loads wg_registry/<server_key>.json or returns an empty registry. A stored
+             subnet that differs from config.yaml is rejected to avoid renumbering peers.
+    Polski:  Wczytuje wg_registry/<klucz_serwera>.json lub zwraca pusty rejestr. Zapisana
+             podsieć inna niż w config.yaml jest odrzucana, aby nie przenumerować peerów.
+    """
+    path = registry_path(server_key)
+    registry = PeerRegistry(path, subnet)
+    if not os.path.exists(path):
+        return registry
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if ipaddress.ip_network(data.get('subnet', subnet)) != registry.network:
+        raise ValueError(f"registry {path} uses {data.get('subnet')}, config.yaml says {subnet}")
+    for record in data.get('peers', []):
+        registry._index(record)
+    registry.revoked = data.get('revoked', [])
+    return registry
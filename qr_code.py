@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === QR CODE ENCODER (v1.0) ===
+# === KODER KODÓW QR (v1.0) ===
+# =====================================================================================
+#
+# English: Dependency-free QR Code Model 2 encoder (byte mode, versions 1-40, all error
+#          correction levels) with PNG (zlib) and SVG output. Replaces the external
+#          'qrencode' binary for WireGuard client configs; defaults match qrencode
+#          (level L, 3 px modules, 4 module quiet zone).
+# Polski:  Koder QR Code Model 2 bez zależności (tryb bajtowy, wersje 1-40, wszystkie
+#          poziomy korekcji) z wyjściem PNG (zlib) i SVG. Zastępuje zewnętrzny program
+#          'qrencode' dla konfiguracji klientów WireGuard; domyślne ustawienia jak w
+#          qrencode (poziom L, moduły 3 px, margines 4 moduły).
+
+import functools
+import itertools
+import re
+import struct
+import zlib
+import tracing
+
+# --- TABLES (ISO/IEC 18004) ---
+# --- TABELE (ISO/IEC 18004) ---
+
+ECC_LEVELS = {'L': 0, 'M': 1, 'Q': 2, 'H': 3}
+_FORMAT_BITS = {'L': 1, 'M': 0, 'Q': 3, 'H': 2}
+
+_ECC_CODEWORDS_PER_BLOCK = (
+    (-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    (-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+)
+_NUM_ERROR_CORRECTION_BLOCKS = (
+    (-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    (-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    (-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    (-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+)
+
+_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+# --- REED-SOLOMON OVER GF(256), POLY 0x11D ---
+
+_EXP = [0] * 512
+_LOG = [0] * 256
+_v = 1
+for _i in range(255):
+    _EXP[_i] = _v
+    _LOG[_v] = _i
+    _v <<= 1
+    if _v & 0x100:
+        _v ^= 0x11D
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+
+
+def _gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _rs_divisor(degree):
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_mul(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_mul(root, 0x02)
+    return result
+
+
+def _rs_remainder(data, divisor):
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        if factor:
+            for i, coef in enumerate(divisor):
+                result[i] ^= _gf_mul(coef, factor)
+    return result
+
+
+# --- CAPACITY ---
+# --- POJEMNOŚĆ ---
+
+def _raw_data_modules(version):
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        num_align = version // 7 + 2
+        result -= (25 * num_align - 10) * num_align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _data_codewords(version, ecl):
+    e = ECC_LEVELS[ecl]
+    return _raw_data_modules(version) // 8 - _ECC_CODEWORDS_PER_BLOCK[e][version] * _NUM_ERROR_CORRECTION_BLOCKS[e][version]
+
+
+def _alignment_positions(version):
+    if version == 1:
+        return []
+    num_align = version // 7 + 2
+    step = 26 if version == 32 else (version * 4 + num_align * 2 + 1) // (num_align * 2 - 2) * 2
+    size = version * 4 + 17
+    return [6] + [size - 7 - i * step for i in range(num_align - 1)][::-1]
+
+
+# --- ENCODER ---
+# --- KODER ---
+
+class _Builder:
+    def __init__(self, version, ecl):
+        self.version = version
+        self.ecl = ecl
+        self.size = version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.function = [[False] * self.size for _ in range(self.size)]
+        self._draw_function_patterns()
+
+    def _set(self, x, y, dark):
+        self.modules[y][x] = dark
+        self.function[y][x] = True
+
+    def _draw_function_patterns(self):
+        size = self.size
+        for i in range(size):
+            self._set(6, i, i % 2 == 0)
+            self._set(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self._set(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self._set(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        self.draw_format_bits(0)
+        if self.version >= 7:
+            rem = self.version
+            for _ in range(12):
+                rem = (rem << 1) ^ ((rem >> 11) * 0x1F25)
+            bits = self.version << 12 | rem
+            for i in range(18):
+                bit = (bits >> i) & 1 == 1
+                a, b = size - 11 + i % 3, i // 3
+                self._set(a, b, bit)
+                self._set(b, a, bit)
+
+    def draw_format_bits(self, mask):
+        data = _FORMAT_BITS[self.ecl] << 3 | mask
+        rem = data
+        for _ in range(10):
+            rem = (rem << 1) ^ ((rem >> 9) * 0x537)
+        bits = (data << 10 | rem) ^ 0x5412
+        bit = lambda i: (bits >> i) & 1 == 1
+        size = self.size
+        for i in range(6):
+            self._set(8, i, bit(i))
+        self._set(8, 7, bit(6))
+        self._set(8, 8, bit(7))
+        self._set(7, 8, bit(8))
+        for i in range(9, 15):
+            self._set(14 - i, 8, bit(i))
+        for i in range(8):
+            self._set(size - 1 - i, 8, bit(i))
+        for i in range(8, 15):
+            self._set(8, size - 15 + i, bit(i))
+        self._set(8, size - 8, True)
+
+    def draw_codewords(self, codewords):
+        size = self.size
+        i = 0
+        total = len(codewords) * 8
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = ((right + 1) & 2) == 0
+            for vert in range(size):
+                y = size - 1 - vert if upward else vert
+                for j in range(2):
+                    x = right - j
+                    if not self.function[y][x] and i < total:
+                        self.modules[y][x] = (codewords[i >> 3] >> (7 - (i & 7))) & 1 == 1
+                        i += 1
+            right -= 2
+
+    def masked_rows(self, mask):
+        # Rows as '0'/'1' strings; the mask only touches non-function modules
+        # Wiersze jako napisy '0'/'1'; maska zmienia tylko moduły niefunkcyjne
+        patterns = _mask_rows(self.size, mask)
+        rows = []
+        for row, frow, pattern in zip(self.modules, self.function, patterns):
+            bits = int(''.join('1' if d else '0' for d in row), 2)
+            fn = int(''.join('1' if f else '0' for f in frow), 2)
+            rows.append(format(bits ^ (pattern & ~fn), f'0{self.size}b'))
+        return rows
+
+
+@functools.lru_cache(maxsize=None)
+def _mask_rows(size, mask):
+    fn = _MASKS[mask]
+    return tuple(int(''.join('1' if fn(x, y) else '0' for x in range(size)), 2) for y in range(size))
+
+
+def _interleave(data, version, ecl):
+    e = ECC_LEVELS[ecl]
+    num_blocks = _NUM_ERROR_CORRECTION_BLOCKS[e][version]
+    ecc_len = _ECC_CODEWORDS_PER_BLOCK[e][version]
+    raw_codewords = _raw_data_modules(version) // 8
+    num_short = num_blocks - raw_codewords % num_blocks
+    short_len = raw_codewords // num_blocks
+    divisor = _rs_divisor(ecc_len)
+
+    blocks = []
+    k = 0
+    for i in range(num_blocks):
+        dat = data[k:k + short_len - ecc_len + (0 if i < num_short else 1)]
+        k += len(dat)
+        ecc = _rs_remainder(dat, divisor)
+        if i < num_short:
+            dat = dat + [0]
+        blocks.append(dat + ecc)
+
+    result = []
+    for i in range(len(blocks[0])):
+        for j, block in enumerate(blocks):
+            if i != short_len - ecc_len or j >= num_short:
+                result.append(block[i])
+    return result
+
+
+_LONG_RUN = re.compile(r'0{5,}|1{5,}')
+
+
+def _penalty(rows):
+    size = len(rows)
+    score = 0
+    columns = [''.join(col) for col in zip(*rows)]
+
+    for line in itertools.chain(rows, columns):
+        # N1: runs of 5+ same-colour modules / serie 5+ modułów tego samego koloru
+        for run in _LONG_RUN.findall(line):
+            score += len(run) - 2
+        # N3: finder-like 1:1:3:1:1 with 4 light modules on a side (outside counts as light)
+        padded = '0000' + line + '0000'
+        for pattern in ('10111010000', '00001011101'):
+            start = padded.find(pattern)
+            while start != -1:
+                score += 40
+                start = padded.find(pattern, start + 1)
+
+    # N2: 2x2 blocks of one colour / bloki 2x2 jednego koloru
+    as_int = [int(r, 2) for r in rows]
+    pair_mask = (1 << (size - 1)) - 1
+    for upper, lower in zip(as_int, as_int[1:]):
+        same_h_upper = ~(upper ^ (upper >> 1)) & pair_mask
+        same_h_lower = ~(lower ^ (lower >> 1)) & pair_mask
+        same_v = ~(upper ^ lower) & pair_mask
+        score += 3 * bin(same_h_upper & same_h_lower & same_v).count('1')
+
+    # N4: dark/light balance / proporcja ciemnych i jasnych
+    total = size * size
+    dark = sum(r.count('1') for r in rows)
+    k = (abs(dark * 20 - total * 10) + total - 1) // total - 1
+    score += k * 10
+    return score
+
+
+def encode(data, ecl='L', mask=None):
+    """
+    English: Encodes text or bytes (byte mode) and returns the module matrix as a list of
+             rows of booleans (True = dark). The smallest version that fits is used; the mask
+             with the lowest penalty is chosen unless `mask` (0-7) is given.
+    Polski:  Koduje tekst lub bajty (tryb bajtowy) i zwraca macierz modułów jako listę
+             wierszy wartości logicznych (True = ciemny). Używana jest najmniejsza mieszcząca
+             dane wersja; wybierana jest maska o najniższej karze, chyba że podano `mask` (0-7).
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    ecl = ecl.upper()
+    for version in range(1, 41):
+        count_bits = 8 if version <= 9 else 16
+        capacity_bits = _data_codewords(version, ecl) * 8
+        if 4 + count_bits + len(data) * 8 <= capacity_bits:
+            break
+    else:
+        raise ValueError(f"Data too long for a QR code ({len(data)} bytes)")
+
+    bits = [(0b0100 >> i) & 1 for i in range(3, -1, -1)]
+    bits += [(len(data) >> i) & 1 for i in range(count_bits - 1, -1, -1)]
+    for byte in data:
+        bits += [(byte >> i) & 1 for i in range(7, -1, -1)]
+    bits += [0] * min(4, capacity_bits - len(bits))
+    bits += [0] * (-len(bits) % 8)
+    codewords = [int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+    for pad in itertools.cycle((0xEC, 0x11)):
+        if len(codewords) >= capacity_bits // 8:
+            break
+        codewords.append(pad)
+
+    builder = _Builder(version, ecl)
+    builder.draw_codewords(_interleave(codewords, version, ecl))
+
+    candidates = range(8) if mask is None else (mask,)
+    best = None
+    for m in candidates:
+        builder.draw_format_bits(m)
+        rows = builder.masked_rows(m)
+        score = _penalty(rows) if mask is None else 0
+        if best is None or score < best[0]:
+            best = (score, rows)
+    return [[c == '1' for c in row] for row in best[1]]
+
+
+# --- RENDERING ---
+# --- GENEROWANIE OBRAZU ---
+
+def to_png(matrix, scale=3, border=4):
+    """
+    English: Renders the matrix as a 1-bit greyscale PNG and returns the file bytes.
+    Polski:  Generuje macierz jako 1-bitowy PNG w skali szarości i zwraca bajty pliku.
+    """
+    size = len(matrix)
+    width = (size + 2 * border) * scale
+    raw = bytearray()
+    blank = [False] * border
+    for row in [[False] * size] * border + matrix + [[False] * size] * border:
+        pixels = ''.join(('0' if dark else '1') * scale for dark in blank + row + blank)
+        pixels += '1' * (-len(pixels) % 8)
+        line = b'\x00' + int(pixels, 2).to_bytes(len(pixels) // 8, 'big')
+        raw += line * scale
+
+    def chunk(tag, body):
+        return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(tag + body) & 0xFFFFFFFF)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, width, 1, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(bytes(raw), 9))
+            + chunk(b'IEND', b''))
+
+
+def to_svg(matrix, scale=3, border=4):
+    """
+    English: Renders the matrix as a compact SVG (one path, one segment per dark run).
+    Polski:  Generuje macierz jako zwięzły SVG (jedna ścieżka, jeden odcinek na serię).
+    """
+    size = len(matrix) + 2 * border
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        for dark, group in itertools.groupby(row):
+            run = sum(1 for _ in group)
+            if dark:
+                parts.append(f"M{x + border} {y + border}h{run}v1h-{run}z")
+            x += run
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * scale}" height="{size * scale}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/>'
+            f'<path fill="#000" d="{"".join(parts)}"/></svg>\n')
+
+
+@tracing.traced('qr.png')
+def save_png(text, path, ecl='L', scale=3, border=4):
+    with open(path, 'wb') as f:
+        f.write(to_png(encode(text, ecl), scale, border))
+
+
+def save_svg(text, path, ecl='L', scale=3, border=4):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(to_svg(encode(text, ecl), scale, border))
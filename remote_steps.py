@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === REMOTE STATE PROBE & STEP SELECTION (v1.0) ===
+# === SONDA STANU ZDALNEGO I WYBÓR KROKÓW (v1.0) ===
+# =====================================================================================
+#
+# English: Lets the installers check the server first and do only what is missing. One SSH
+#          call runs a batch of checks (package installed, service active, file present, file
+#          hash, ...) and prints '@@probe key=value' lines; each installer turns the result
+#          into a list of steps, each either satisfied or to be run. Only the missing steps are
+#          sent, in a single script, so a re-run on a ready server takes one probe round trip.
+#          run_batch() ships the steps as one script with '@@step begin/end' markers and streams
+#          its output in blocks over one SSH channel, returning a StepResult per step; the SSH
+#          options multiplex the probe, the batch and any scp over one connection.
+# Polski:  Pozwala instalatorom najpierw sprawdzić serwer i wykonać tylko to, czego brakuje.
+#          Jedno wywołanie SSH wykonuje zestaw sprawdzeń (pakiet zainstalowany, usługa aktywna,
+#          plik obecny, skrót pliku, ...) i drukuje linie '@@probe klucz=wartość'; każdy
+#          instalator zamienia wynik na listę kroków, spełnionych lub do wykonania. Wysyłane są
+#          tylko brakujące kroki, jednym skryptem, więc ponowne uruchomienie na gotowym
+#          serwerze to jedna sonda. run_batch() wysyła kroki jako jeden skrypt ze znacznikami
+#          '@@step begin/end' i przesyła jego wyjście blokami jednym kanałem SSH, zwracając
+#          StepResult dla każdego kroku; opcje SSH łączą sondę, partię i ewentualne scp w jedno
+#          połączenie.
+
+import os
+import sys
+import subprocess
+from collections import namedtuple
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+PROBE_PREFIX = '@@probe '
+STEP_PREFIX = b'@@step '
+TAIL_BYTES = 4096
+READ_BLOCK = 64 * 1024
+
+# English: One master connection per host, reused by the probe, the batch and scp for 60 s
+# Polski: Jedno połączenie główne na host, używane przez sondę, partię i scp przez 60 s
+SSH_MULTIPLEX = ['-o', 'ControlMaster=auto', '-o', 'ControlPath=~/.ssh/blox-%C', '-o', 'ControlPersist=60']
+
+# English: satisfied=True means the step is skipped; script is plain bash (run under 'set -e')
+# Polski:  satisfied=True oznacza pominięcie kroku; script to zwykły bash (uruchamiany z 'set -e')
+Step = namedtuple('Step', 'name satisfied script')
+
+# English: status is 'ok', 'failed', 'skipped' (already satisfied) or 'not_run' (after a failure);
+#          seconds is None unless the step finished; tail is the end of its output
+# Polski:  status to 'ok', 'failed', 'skipped' (już spełniony) lub 'not_run' (po błędzie);
+#          seconds jest None, jeśli krok się nie zakończył; tail to koniec jego wyjścia
+StepResult = namedtuple('StepResult', 'name status code seconds tail')
+
+
+def ssh_transport(user, host, tty=False):
+    """
+    English: ssh command prefix for probe() and run_batch(); tty=True for interactive steps.
+    Polski:  Prefiks polecenia ssh dla probe() i run_batch(); tty=True dla kroków interaktywnych.
+    """
+    return (['ssh'] + (['-t'] if tty else []) + ['-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10']
+            + SSH_MULTIPLEX + [f'{user}@{host}'])
+
+
+# --- CHECK BUILDERS ---
+# --- BUDOWANIE SPRAWDZEŃ ---
+# English: Each returns a shell snippet that prints one value.
+# Polski:  Każda zwraca fragment powłoki drukujący jedną wartość.
+
+def has_command(command):
+    return f"command -v {command} > /dev/null && echo 1 || echo 0"
+
+
+def has_package(package):
+    return f"dpkg-query -W -f='${{Status}}' {package} 2> /dev/null | grep -q 'install ok installed' && echo 1 || echo 0"
+
+
+def service_state(unit):
+    return f"systemctl is-active {unit} || true"
+
+
+def has_path(path, sudo=True):
+    return f"{'sudo ' if sudo else ''}test -e {path} && echo 1 || echo 0"
+
+
+def file_sha256(path, sudo=True):
+    return f"{'sudo ' if sudo else ''}sha256sum {path} 2> /dev/null | cut -d' ' -f1"
+
+
+def in_group(user, group):
+    return f"id -nG {user} | tr ' ' '\\n' | grep -qx {group} && echo 1 || echo 0"
+
+
+# --- PROBE ---
+# --- SONDA ---
+
+def build_probe_command(checks):
+    """
+    English: One remote command running all checks ({key: snippet}); errors of a single check
+             only leave its value empty.
+    Polski:  Jedno zdalne polecenie wykonujące wszystkie sprawdzenia ({klucz: fragment}); błąd
+             pojedynczego sprawdzenia daje tylko pustą wartość.
+    """
+    lines = [f'printf "{PROBE_PREFIX}%s=%s\\n" {key} "$({snippet} 2> /dev/null)"' for key, snippet in checks.items()]
+    return '\n'.join(lines)
+
+
+def parse_probe(output):
+    state = {}
+    for line in (output or '').splitlines():
+        if line.startswith(PROBE_PREFIX):
+            key, _, value = line[len(PROBE_PREFIX):].partition('=')
+            state[key] = value.strip()
+    return state
+
+
+@tracing.traced('ssh.probe')
+def probe(transport, checks):
+    """
+    English: Runs the probe over 'transport' (the command prefix before the remote command,
+             e.g. ['ssh', 'user@ip'] or ['gcloud', 'compute', 'ssh', ..., '--']).
+             Returns the state dict, or None when the server could not be reached.
+    Polski:  Uruchamia sondę przez 'transport' (prefiks polecenia przed poleceniem zdalnym,
+             np. ['ssh', 'user@ip'] lub ['gcloud', 'compute', 'ssh', ..., '--']).
+             Zwraca słownik stanu lub None, gdy serwer jest nieosiągalny.
+    """
+    try:
+        res = subprocess.run(transport + [build_probe_command(checks)], capture_output=True, text=True,
+                             encoding='utf-8')
+    except FileNotFoundError:
+        print(f"❌ ERROR: Command '{transport[0]}' not found. / BŁĄD: Nie znaleziono polecenia '{transport[0]}'.")
+        return None
+    state = parse_probe(res.stdout)
+    if res.returncode != 0 and not state:
+        print(f"❌ Probe failed / Sonda nie powiodła się: {res.stderr.strip()[-300:]}")
+        return None
+    return state
+
+
+# --- STEPS ---
+# --- KROKI ---
+
+def missing(steps):
+    return [step for step in steps if not step.satisfied]
+
+
+def print_plan(steps, prefix=''):
+    for step in steps:
+        if step.satisfied:
+            print(f"{prefix}✅ {step.name}: already done / już wykonane")
+        else:
+            print(f"{prefix}▶️  {step.name}: to run / do wykonania")
+
+
+def build_script(steps):
+    """
+    English: One 'set -e' script with the scripts of the missing steps, in order.
+             Returns '' when everything is satisfied.
+    Polski:  Jeden skrypt 'set -e' ze skryptami brakujących kroków, po kolei.
+             Zwraca '', gdy wszystko jest spełnione.
+    """
+    todo = missing(steps)
+    if not todo:
+        return ''
+    parts = ['set -e']
+    for step in todo:
+        parts.append(f'echo "--- {step.name} ---"')
+        parts.append(step.script.strip('\n'))
+    return '\n'.join(parts) + '\n'
+
+
+# --- BATCH EXECUTOR ---
+# --- WYKONAWCA PARTII ---
+
+def build_batch_script(steps):
+    """
+    English: One script running the missing steps in order, each in its own 'bash -e' between
+             '@@step begin <name>' and '@@step end <name> <code> <ms>' lines; the first failure
+             ends the batch. Steps keep the session's stdin (interactive setup.sh).
+    Polski:  Jeden skrypt wykonujący brakujące kroki po kolei, każdy we własnym 'bash -e' między
+             liniami '@@step begin <nazwa>' i '@@step end <nazwa> <kod> <ms>'; pierwszy błąd kończy
+             partię. Kroki zachowują stdin sesji (interaktywny setup.sh).
+    """
+    marker = STEP_PREFIX.decode('ascii')
+    lines = [
+        'export LC_ALL=C',
+        'exec 3<&0',
+        'blox_step() {',
+        '    local name=$1 script started code',
+        '    script="$(cat)"',
+        '    started=$(date +%s%3N)',
+        f'    echo "{marker}begin $name"',
+        '    bash -e -c "$script" <&3 2>&1',
+        '    code=$?',
+        f'    echo "{marker}end $name $code $(( $(date +%s%3N) - started ))"',
+        '    return $code',
+        '}',
+    ]
+    for step in missing(steps):
+        lines += [f"blox_step {step.name} <<'BLOX_STEP' || exit $?", step.script.strip('\n'), 'BLOX_STEP']
+    return '\n'.join(lines) + '\n'
+
+
+class _BatchStream:
+    # English: Passes output through in blocks; only blocks holding a marker are split into lines.
+    #          A marker may follow unterminated output (a prompt) on the same line.
+    # Polski: Przepuszcza wyjście blokami; na linie dzielone są tylko bloki ze znacznikiem.
+    #         Znacznik może wystąpić w tej samej linii po niezakończonym wyjściu (monicie).
+    def __init__(self, out):
+        self.out = out
+        self.pending = b''
+        self.tail = b''
+        self.midline = False
+        self.finished = {}
+
+    def _write(self, data):
+        if data:
+            self.out.write(data)
+            self.tail = (self.tail + data)[-TAIL_BYTES:]
+            self.midline = not data.endswith(b'\n')
+
+    def _status(self, text):
+        self.out.write((('\n' if self.midline else '') + text + '\n').encode('utf-8'))
+        self.midline = False
+
+    def _marker(self, line):
+        fields = line[len(STEP_PREFIX):].decode('utf-8', 'replace').split()
+        if fields[:1] == ['begin'] and len(fields) >= 2:
+            self.tail = b''
+            self._status(f"▶️  [{fields[1]}]")
+        elif fields[:1] == ['end'] and len(fields) >= 4:
+            name, code, ms = fields[1], int(fields[2]), int(fields[3])
+            self.finished[name] = (code, ms / 1000.0, self.tail.decode('utf-8', 'replace'))
+            icon = '✅' if code == 0 else '❌'
+            self._status(f"{icon} [{name}] exit {code} ({ms / 1000.0:.1f}s)")
+
+    @staticmethod
+    def _hold_from(rest):
+        # English: Offset in a partial last line from which it may still become a marker
+        # Polski: Pozycja w niepełnej ostatniej linii, od której może ona jeszcze stać się znacznikiem
+        at = rest.find(STEP_PREFIX)
+        if at >= 0:
+            return at
+        for size in range(min(len(STEP_PREFIX) - 1, len(rest)), 0, -1):
+            if STEP_PREFIX.startswith(rest[-size:]):
+                return len(rest) - size
+        return len(rest)
+
+    def feed(self, chunk):
+        data = self.pending + chunk
+        cut = data.rfind(b'\n') + 1
+        head, rest = data[:cut], data[cut:]
+        # Only the part of a partial last line that may still become a marker is held back (prompts pass)
+        # Wstrzymywana jest tylko część niepełnej linii, która może być znacznikiem (monity przechodzą)
+        hold = self._hold_from(rest)
+        head, self.pending = head + rest[:hold], rest[hold:]
+        if STEP_PREFIX not in head:
+            self._write(head)
+        else:
+            for line in head.splitlines(keepends=True):
+                at = line.find(STEP_PREFIX)
+                if at < 0:
+                    self._write(line)
+                    continue
+                self._write(line[:at].strip(b'\r'))
+                self._marker(line[at:].strip(b'\r\n'))
+        self.out.flush()
+
+    def close(self):
+        self._write(self.pending)
+        self.pending = b''
+        self.out.flush()
+
+
+@tracing.traced('ssh.batch')
+def run_batch(transport, steps):
+    """
+    English: Runs all missing steps as one remote script over 'transport' (see probe()) and
+             returns a StepResult for every step. The output streams to stdout as it arrives.
+    Polski:  Uruchamia wszystkie brakujące kroki jako jeden zdalny skrypt przez 'transport'
+             (zob. probe()) i zwraca StepResult dla każdego kroku. Wyjście płynie na stdout na bieżąco.
+    """
+    if not missing(steps):
+        return [StepResult(step.name, 'skipped', 0, None, '') for step in steps]
+    stream = _BatchStream(getattr(sys.stdout, 'buffer', sys.stdout))
+    sys.stdout.flush()
+    try:
+        process = subprocess.Popen(transport + [build_batch_script(steps)], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+    except FileNotFoundError:
+        print(f"❌ ERROR: Command '{transport[0]}' not found. / BŁĄD: Nie znaleziono polecenia '{transport[0]}'.")
+        exit_code = 127
+    else:
+        fd = process.stdout.fileno()
+        for chunk in iter(lambda: os.read(fd, READ_BLOCK), b''):
+            stream.feed(chunk)
+        stream.close()
+        exit_code = process.wait()
+
+    results = []
+    broken = False
+    for step in steps:
+        if step.satisfied:
+            results.append(StepResult(step.name, 'skipped', 0, None, ''))
+        elif step.name in stream.finished and not broken:
+            code, seconds, tail = stream.finished[step.name]
+            results.append(StepResult(step.name, 'ok' if code == 0 else 'failed', code, seconds, tail))
+            broken = code != 0
+        elif not broken:
+            # Never ended: the connection failed or dropped / Niezakończony: połączenie nieudane lub zerwane
+            results.append(StepResult(step.name, 'failed', exit_code or 255, None,
+                                      stream.tail.decode('utf-8', 'replace')))
+            broken = True
+        else:
+            results.append(StepResult(step.name, 'not_run', None, None, ''))
+            broken = True
+    return results
+
+
+def batch_ok(results):
+    return all(result.status in ('ok', 'skipped') for result in results)
+
+
+def print_results(results, prefix=''):
+    icons = {'ok': '✅', 'failed': '❌', 'skipped': '⏭️ ', 'not_run': '⏸️ '}
+    for result in results:
+        timing = f" {result.seconds:.1f}s" if result.seconds is not None else ''
+        code = f" (exit {result.code})" if result.status == 'failed' else ''
+        print(f"{prefix}{icons[result.status]} {result.name}: {result.status}{code}{timing}")
@@ -6,25 +6,21 @@ import datetime
 import glob
 import subprocess
 import json
-import yaml
+import config_store
 import time
 import zipfile
 import hashlib
-from fpdf import FPDF
 from fpdf.enums import XPos, YPos
 from pypdf import PdfReader, PdfWriter
+from clamd_client import ClamdClient, ClamdError
+import tracing
+from report_toolkit import ReportPDF
 
 # --- CONFIGURATION & CONSTANTS ---
 # --- KONFIGURACJA I STAŁE ---
 
 CONFIG_FILE = 'config.yaml'
 
-FONTS = {
-    'R': "UbuntuMono-Regular.ttf",
-    'B': "UbuntuMono-Bold.ttf",
-    'I': "UbuntuMono-Italic.ttf"
-}
-
 # --- DYNAMIC CONFIG LOADING ---
 # --- DYNAMICZNE ŁADOWANIE KONFIGURACJI ---
 
@@ -33,34 +29,31 @@ def get_config_paths():
     # Wartości domyślne w przypadku braku konfiguracji
     default_pcap = []
     default_evidence = "evidence"
-    
-    if not os.path.exists(CONFIG_FILE):
-        return default_pcap, default_evidence
 
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            cfg = yaml.safe_load(f)
-        
-        paths = cfg.get('LOCAL_PATHS', {})
-        
-        # Load PCAP directories and expand user path (~)
-        # Wczytaj katalogi PCAP i rozwiń ścieżkę użytkownika (~)
-        raw_dirs = paths.get('pcap_directories', default_pcap)
-        clean_dirs = [os.path.expanduser(p) for p in raw_dirs]
-        
-        # Load output directory
-        # Wczytaj katalog wyjściowy
-        ev_dir = paths.get('evidence_output_dir', default_evidence)
-        
-        return clean_dirs, ev_dir
+        # Typed snapshot shared with main(); PCAP paths come back already expanded (~)
+        # Typowany snapshot współdzielony z main(); ścieżki PCAP są już rozwinięte (~)
+        snap = config_store.snapshot(CONFIG_FILE)
     except Exception as e:
         print(f"⚠️ Config Load Error: {e}")
         print(f"⚠️ Błąd ładowania konfiguracji: {e}")
-        return default_pcap, default_evidence
+        return default_pcap, default_evidence, None
+
+    if not snap:
+        return default_pcap, default_evidence, None
+
+    # clamd_address is optional (local clamd for the pre-packaging scan)
+    # clamd_address jest opcjonalny (lokalny clamd do skanu przed spakowaniem)
+    paths = snap.local_paths
+    return list(paths.pcap_directories), paths.evidence_output_dir, paths.clamd_address
 
 # Load global variables dynamically from YAML
 # Załaduj zmienne globalne dynamicznie z YAML
-PCAP_PATHS, EVIDENCE_DIR = get_config_paths()
+PCAP_PATHS, EVIDENCE_DIR, CLAMD_ADDRESS = get_config_paths()
+
+# Read size for the single pass over every artifact (zip + sha256 + clamd)
+# Rozmiar odczytu dla jednego przebiegu po artefakcie (zip + sha256 + clamd)
+PACK_BLOCK_SIZE = 1024 * 1024
 
 # --- TRANSLATIONS ---
 # --- TŁUMACZENIA ---
@@ -105,12 +98,7 @@ TEXTS = {
 # --- HELPER FUNCTIONS ---
 # --- FUNKCJE POMOCNICZE ---
 
-def load_config():
-    # Check if config file exists
-    # Sprawdź, czy plik konfiguracyjny istnieje
-    if not os.path.exists(CONFIG_FILE): return None
-    with open(CONFIG_FILE, 'r') as f: return yaml.safe_load(f)
-
+@tracing.traced('gcloud')
 def run_cmd(cmd):
     # Execute system command safely
     # Wykonaj polecenie systemowe bezpiecznie
@@ -132,6 +120,7 @@ def calculate_hash(file_path):
 # --- GCLOUD LOGIC ---
 # --- LOGIKA GCLOUD ---
 
+@tracing.traced('snapshot')
 def manage_vm_lifecycle(vm_name, project_id, zone):
     # Initialize snapshot naming
     # Inicjalizuj nazewnictwo snapshotu
@@ -170,6 +159,7 @@ def manage_vm_lifecycle(vm_name, project_id, zone):
     run_cmd(['gcloud', 'compute', 'instances', 'start', vm_name, f'--project={project_id}', f'--zone={zone}', '--quiet'])
     return snap_name
 
+@tracing.traced('snapshot.describe')
 def get_snapshot_details(snap_name, project_id):
     print(f"📡 Fetching Snapshot URI & REAL SIZE...")
     print(f"📡 Pobieranie URI Snapshotu i ROZMIARU RZECZYWISTEGO...")
@@ -255,6 +245,93 @@ def get_pcap_list_for_pdf():
 # --- PACKAGING LOGIC ---
 # --- LOGIKA PAKOWANIA ---
 
+def get_clamd_client():
+    # Local clamd is optional: without it the bundle is built unscanned
+    # Lokalny clamd jest opcjonalny: bez niego paczka powstaje bez skanu
+    if not CLAMD_ADDRESS:
+        print("   ℹ️ clamd_address not set in config.yaml - artifacts will not be scanned.")
+        print("   ℹ️ Brak clamd_address w config.yaml - artefakty nie będą skanowane.")
+        return None
+    client = ClamdClient(CLAMD_ADDRESS)
+    if not client.ping():
+        print(f"   ⚠️ clamd not reachable at {CLAMD_ADDRESS} - skipping malware scan.")
+        print(f"   ⚠️ clamd nieosiągalny pod {CLAMD_ADDRESS} - pomijanie skanu.")
+        return None
+    print(f"   🛡️ Pre-packaging scan via clamd ({CLAMD_ADDRESS})")
+    print(f"   🛡️ Skan przed spakowaniem przez clamd ({CLAMD_ADDRESS})")
+    return client
+
+@tracing.traced('bundle.pack')
+def pack_artifact(zf, path, arcname, clamd):
+    # One read per block feeds the zip entry, the SHA256 and the clamd stream
+    # Jeden odczyt bloku zasila wpis zip, SHA256 i strumień clamd
+    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    sha = hashlib.sha256()
+    session, scan_error = None, None
+    if clamd:
+        # clamd may go away after the initial PING - record an ERROR verdict and keep packing
+        # clamd może zniknąć po początkowym PING - zapisz werdykt ERROR i pakuj dalej
+        try:
+            session = clamd.instream()
+        except (ClamdError, OSError) as e:
+            scan_error = str(e)
+
+    with open(path, "rb") as src, zf.open(zinfo, 'w') as dst:
+        for block in iter(lambda: src.read(PACK_BLOCK_SIZE), b""):
+            dst.write(block)
+            sha.update(block)
+            if session: session.send(block)
+
+    if session:
+        try:
+            verdict, detail = session.finish()
+        except (ClamdError, OSError) as e:
+            verdict, detail = "ERROR", str(e)
+    elif scan_error:
+        verdict, detail = "ERROR", scan_error
+    else:
+        verdict, detail = "NOT_SCANNED", None
+    if verdict == "FOUND":
+        print(f"   🦠 MALWARE in {arcname}: {detail}")
+        print(f"   🦠 ZŁOŚLIWE OPROGRAMOWANIE w {arcname}: {detail}")
+    elif verdict == "ERROR":
+        print(f"   ⚠️ Scan error for {arcname}: {detail}")
+        print(f"   ⚠️ Błąd skanu dla {arcname}: {detail}")
+        if 'size limit' in (detail or ''):
+            print("   ℹ️ Raise StreamMaxLength in clamd.conf (default 25M) above the largest artifact.")
+            print("   ℹ️ Podnieś StreamMaxLength w clamd.conf (domyślnie 25M) ponad największy artefakt.")
+
+    tracing.add(bytes_in=zinfo.file_size)
+    return {
+        'arcname': arcname,
+        'size': zinfo.file_size,
+        'sha256': sha.hexdigest(),
+        'verdict': verdict,
+        'detail': detail or ""
+    }
+
+def build_manifest(entries, clamd):
+    # Plain-text manifest stored inside the bundle
+    # Manifest tekstowy zapisywany wewnątrz paczki
+    scanner = f"clamd @ {clamd.address}" if clamd else "none"
+    lines = [
+        "============================================================",
+        "=== BLOX-TAK-SERVER | ARTIFACT MANIFEST ===",
+        "============================================================",
+        f"Scanner:      {scanner}",
+        f"Artifacts:    {len(entries)}",
+        f"Infected:     {sum(1 for e in entries if e['verdict'] == 'FOUND')}",
+        f"Scan errors:  {sum(1 for e in entries if e['verdict'] == 'ERROR')}",
+        "------------------------------------------------------------",
+    ]
+    for e in entries:
+        verdict = f"{e['verdict']} {e['detail']}".strip()
+        lines.append(f"{e['sha256']}  {e['size']:>12}  {verdict:<20}  {e['arcname']}")
+    lines.append("============================================================")
+    return "\n".join(lines) + "\n"
+
+@tracing.traced('bundle')
 def create_master_bundle(reports, pcaps, snap_data, vm_key, vm_name):
     # Generate timestamp and zip name
     # Generuj znacznik czasu i nazwę zip
@@ -265,12 +342,15 @@ def create_master_bundle(reports, pcaps, snap_data, vm_key, vm_name):
     print(f"\n📦 PACKAGING MASTER EVIDENCE: {zip_name}")
     print(f"📦 PAKOWANIE GŁÓWNEGO MATERIAŁU: {zip_name}")
     print(f"   Target: {vm_key} -> {vm_name}")
+
+    clamd = get_clamd_client()
+    manifest = []
     
     with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED) as zf:
         # 1. Reports
         for report in reports:
             if os.path.exists(report):
-                zf.write(report, arcname=f"REPORTS/{os.path.basename(report)}")
+                manifest.append(pack_artifact(zf, report, f"REPORTS/{os.path.basename(report)}", clamd))
                 print(f"   + PDF: {report}")
 
         # 2. PCAP
@@ -278,7 +358,7 @@ def create_master_bundle(reports, pcaps, snap_data, vm_key, vm_name):
             if os.path.exists(pcap_path):
                 src_folder = os.path.basename(os.path.dirname(pcap_path))
                 fname = os.path.basename(pcap_path)
-                zf.write(pcap_path, arcname=f"NETWORK_PCAP/{src_folder}/{fname}")
+                manifest.append(pack_artifact(zf, pcap_path, f"NETWORK_PCAP/{src_folder}/{fname}", clamd))
                 print(f"   + PCAP: {src_folder}/{fname}")
 
         # 3. LOGS
@@ -290,9 +370,9 @@ def create_master_bundle(reports, pcaps, snap_data, vm_key, vm_name):
         if os.path.exists(EVIDENCE_DIR):
             for root, dirs, files in os.walk(EVIDENCE_DIR):
                 for file in files:
-                    if file.endswith(".tar.gz") or file.endswith(".zip"):
+                    if file.endswith((".tar.gz", ".zip", ".log.gz")):
                         full_path = os.path.join(root, file)
-                        zf.write(full_path, arcname=f"SYSTEM_LOGS/{file}")
+                        manifest.append(pack_artifact(zf, full_path, f"SYSTEM_LOGS/{file}", clamd))
                         print(f"   + LOGS: {file}")
                         found_logs = True
         else:
@@ -323,6 +403,24 @@ RECOVERY LINK (DISK_IMAGE):
         zf.writestr("SNAPSHOT_INFO.txt", info_content)
         print("   + INFO: SNAPSHOT_INFO.txt")
 
+        # 5. Manifest (per-artifact SHA256 + scan verdict)
+        # 5. Manifest (SHA256 i werdykt skanu dla każdego artefaktu)
+        zf.writestr("ARTIFACT_MANIFEST.txt", build_manifest(manifest, clamd))
+        print("   + INFO: ARTIFACT_MANIFEST.txt")
+
+    infected = [e for e in manifest if e['verdict'] == 'FOUND']
+    unscanned = [e for e in manifest if e['verdict'] == 'ERROR']
+    if infected:
+        print(f"🦠 WARNING: {len(infected)} infected artifact(s) packed - see ARTIFACT_MANIFEST.txt")
+        print(f"🦠 OSTRZEŻENIE: spakowano {len(infected)} zainfekowany(ch) artefakt(ów) - patrz ARTIFACT_MANIFEST.txt")
+    if unscanned:
+        print(f"⚠️ {len(unscanned)} artifact(s) could not be scanned - see ARTIFACT_MANIFEST.txt")
+        print(f"⚠️ {len(unscanned)} artefakt(ów) nie udało się przeskanować - patrz ARTIFACT_MANIFEST.txt")
+    elif clamd and not infected:
+        print(f"🛡️ All {len(manifest)} artifacts scanned clean.")
+        print(f"🛡️ Wszystkie {len(manifest)} artefakty przeskanowane - czyste.")
+
+    tracing.add(bytes_out=os.path.getsize(zip_name))
     checksum = calculate_hash(zip_name)
     hash_filename = f"{zip_name}.sha256"
     print(f"🔒 PACKAGE SHA-256: {checksum}")
@@ -334,7 +432,7 @@ RECOVERY LINK (DISK_IMAGE):
 # --- PDF GENERATION ---
 # --- GENEROWANIE PDF ---
 
-class FinisherPDF(FPDF):
+class FinisherPDF(ReportPDF):
     def __init__(self, lang, snap_data):
         super().__init__()
         self.lang = lang
@@ -342,27 +440,23 @@ class FinisherPDF(FPDF):
         self.snap = snap_data
 
     def header(self):
-        self.set_font('UbuntuMono', 'B', 14)
+        self.set_font(self.report_font, 'B', 14)
         self.cell(0, 10, self.t['header'], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
         self.line(10, 20, 200, 20)
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        self.set_font('UbuntuMono', 'I', 8)
+        self.set_font(self.report_font, 'I', 8)
         self.cell(0, 10, f"{self.t['footer']} | {datetime.datetime.now().strftime('%Y-%m-%d')}", align='C')
 
+@tracing.traced('pdf.appendix')
 def create_appendix_b(lang, output_pdf, pcap_list_pdf, snap_data):
     # Initialize PDF object
     # Inicjalizuj obiekt PDF
     pdf = FinisherPDF(lang, snap_data)
     t = TEXTS[lang]
-    try:
-        pdf.add_font('UbuntuMono', '', FONTS['R'])
-        pdf.add_font('UbuntuMono', 'B', FONTS['B'])
-        pdf.add_font('UbuntuMono', 'I', FONTS['I'])
-        font = 'UbuntuMono'
-    except: font = 'Courier'
+    font = pdf.report_font
 
     pdf.add_page()
     
@@ -444,6 +538,7 @@ def create_appendix_b(lang, output_pdf, pcap_list_pdf, snap_data):
     pdf.multi_cell(0, 5, t['legal_text'], border=1, align='L')
     pdf.output(output_pdf)
 
+@tracing.traced('pdf.merge')
 def update_pdf_inplace(original_report, appendix_pdf):
     # Merge PDFs and overwrite the original file
     # Scal PDFy i nadpisz oryginalny plik
@@ -470,6 +565,7 @@ def update_pdf_inplace(original_report, appendix_pdf):
         # Replace original with merged
         # Zastąp oryginał scalonym
         os.replace(temp_merged_name, original_report)
+        tracing.add(bytes_out=os.path.getsize(original_report))
         
         print(f"      📎 Updated (In-Place): {os.path.basename(original_report)}")
         print(f"      📎 Zaktualizowano (W miejscu): {os.path.basename(original_report)}")
@@ -492,23 +588,18 @@ def main():
     
     # Load configuration
     # Wczytaj konfigurację
-    config = load_config()
-    if not config: 
+    snap = config_store.snapshot(CONFIG_FILE)
+    if not snap: 
         print("❌ Config file not found!")
         print("❌ Nie znaleziono pliku konfiguracyjnego!")
         return
     
-    gcp_conf = config.get('GLOBAL_SETTINGS', {}).get('gcp', {})
-    project_id = gcp_conf.get('project_id')
-    zone = gcp_conf.get('zone')
+    project_id = snap.gcp.project_id
+    zone = snap.gcp.zone
     
     # --- LIST CANDIDATES ---
     # --- LISTA KANDYDATÓW ---
-    candidates = []
-    for key, val in config.items():
-        if key in ['GLOBAL_SETTINGS', 'LOCAL_CONFIG', 'LOCAL_PATHS']: continue
-        if isinstance(val, dict) and 'name' in val:
-            candidates.append((key, val['name']))
+    candidates = [(key, vm.name) for key, vm in snap.vms.items()]
 
     if not candidates:
         print("❌ No VM found in config!")
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === SHARED PDF REPORT TOOLKIT (v1.0) ===
+# === WSPÓLNY ZESTAW NARZĘDZI RAPORTÓW PDF (v1.0) ===
+# =====================================================================================
+#
+# English: Base class of the audit / evidence / ClamAV / finisher PDFs. The UbuntuMono TTFs
+#          are parsed once per process (fontTools tables, cmap, glyph widths) and every new
+#          document gets a light copy of the parsed font with its own subset state. A style
+#          is attached only when it is first selected with set_font(), so unused styles are
+#          never subset into the file. Glyph-width tables are cached per font for text
+#          measurement. Tables go through TableLayout: every row is wrapped in one pass from
+#          those metrics and drawn straight from the computed lines, so long manifests render
+#          in linear time. Without the TTF files the reports fall back to Courier, as before.
+# Polski:  Klasa bazowa PDF-ów audytu / dowodów / ClamAV / finalizatora. Pliki TTF UbuntuMono
+#          są parsowane raz na proces (tabele fontTools, cmap, szerokości glifów), a każdy
+#          nowy dokument dostaje lekką kopię sparsowanej czcionki z własnym stanem podzbioru.
+#          Styl jest dołączany dopiero przy pierwszym wyborze przez set_font(), więc nieużywane
+#          style nigdy nie trafiają do pliku. Tabele szerokości glifów są buforowane dla każdej
+#          czcionki do pomiaru tekstu. Tabele przechodzą przez TableLayout: każdy wiersz jest
+#          zawijany w jednym przebiegu na podstawie tych metryk i rysowany wprost z wyliczonych
+#          linii, więc długie manifesty renderują się w czasie liniowym. Bez plików TTF raporty
+#          wracają do Courier, jak dotąd.
+
+import os
+import threading
+from io import BytesIO
+from fpdf import FPDF
+from fpdf.enums import TextEmphasis
+
+try:
+    from fpdf.fonts import TTFFont, SubsetMap
+    from fontTools import ttLib
+except ImportError:
+    TTFFont = None
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+FONT_FAMILY = 'UbuntuMono'
+FALLBACK_FAMILY = 'Courier'
+FONT_FILES = {
+    '': "UbuntuMono-Regular.ttf",
+    'B': "UbuntuMono-Bold.ttf",
+    'I': "UbuntuMono-Italic.ttf",
+    'BI': "UbuntuMono-BoldItalic.ttf",
+}
+
+# English: Row line height as a multiple of the font size (as in the original renderers)
+# Polski: Wysokość linii wiersza jako wielokrotność rozmiaru czcionki (jak w dawnych rendererach)
+LINE_SPACING = 1.5
+HEADER_FILL = (220, 220, 220)
+
+_lock = threading.Lock()
+_parsed = {}        # abs path -> (template TTFFont, raw font bytes)
+_widths = {}        # abs path -> (char widths in 1/1000 em, monospace width or None)
+_scratch = None     # FPDF used only to parse the templates / FPDF tylko do parsowania wzorców
+
+
+# --- FONT CACHE ---
+# --- BUFOR CZCIONEK ---
+
+def _style_key(style):
+    # English: 'B' / 'bi' / TextEmphasis (add_page() restores the style as a flag) -> '', 'B', 'I', 'BI'
+    # Polski: 'B' / 'bi' / TextEmphasis (add_page() przywraca styl jako flagę) -> '', 'B', 'I', 'BI'
+    if isinstance(style, TextEmphasis):
+        style = style.style
+    return ''.join(sorted(set(str(style or '').upper()) & {'B', 'I'}))
+
+
+def _template(path):
+    """
+    English: Parsed font for a TTF path, built once per process (thread-safe).
+    Polski:  Sparsowana czcionka dla ścieżki TTF, budowana raz na proces (bezpiecznie wątkowo).
+    """
+    global _scratch
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _parsed:
+            if _scratch is None:
+                _scratch = FPDF()
+            fontkey = f"cache{len(_parsed)}"
+            _scratch.add_font(fontkey, '', path)
+            template = _scratch.fonts[fontkey]
+            with open(path, 'rb') as f:
+                data = f.read()
+            _parsed[path] = (template, data)
+            widths = {char: template.cw[char] for char in template.cmap}
+            distinct = set(widths.values()) - {0}
+            _widths[path] = (widths, distinct.pop() if len(distinct) == 1 else None)
+        return _parsed[path]
+
+
+def _attach(pdf, family, style, path):
+    """
+    English: Registers the cached font in pdf like add_font() would. The copy shares the
+             read-only tables (cmap, widths, descriptor) and gets a fresh lazily-read
+             fontTools object, because fpdf2 subsets that object in place on output.
+    Polski:  Rejestruje zbuforowaną czcionkę w pdf tak jak add_font(). Kopia współdzieli
+             tabele tylko do odczytu (cmap, szerokości, deskryptor) i dostaje świeży, leniwie
+             czytany obiekt fontTools, bo fpdf2 przycina go w miejscu przy zapisie.
+    """
+    fontkey = f"{family.lower()}{style}"
+    if fontkey in pdf.fonts:
+        return
+    if TTFFont is None:
+        pdf.add_font(family, style, path)
+        return
+    template, data = _template(path)
+    try:
+        font = TTFFont.__new__(TTFFont)
+        for slot in TTFFont.__slots__:
+            if hasattr(template, slot):
+                setattr(font, slot, getattr(template, slot))
+        font.i = len(pdf.fonts) + 1
+        font.fontkey = fontkey
+        font.ttfont = ttLib.TTFont(BytesIO(data), recalcTimestamp=False, lazy=True)
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font._hbfont = None
+        font.subset = SubsetMap(font)
+    except (AttributeError, TypeError):
+        # English: Different fpdf2 internals - parse normally
+        # Polski: Inne wnętrze fpdf2 - zwykłe parsowanie
+        pdf.add_font(family, style, path)
+        return
+    pdf.fonts[fontkey] = font
+
+
+def glyph_widths(style=''):
+    """
+    English: (widths, monospace) of a report font style: {codepoint: width in 1/1000 em} and
+             the common advance of a monospace font (None otherwise). Cached per process.
+    Polski:  (szerokości, monospace) stylu czcionki raportu: {kod: szerokość w 1/1000 em} oraz
+             wspólna szerokość znaku czcionki o stałej szerokości (inaczej None). Buforowane.
+    """
+    path = os.path.abspath(FONT_FILES[_style_key(style)])
+    _template(path)
+    return _widths[path]
+
+
+def fonts_available(styles=None):
+    return all(os.path.exists(FONT_FILES[s]) for s in (styles or FONT_FILES))
+
+
+# --- BASE CLASS ---
+# --- KLASA BAZOWA ---
+
+class ReportPDF(FPDF):
+    """
+    English: FPDF with the cached report font. self.report_font is 'UbuntuMono' or the Courier
+             fallback; pass it to set_font() like any family.
+    Polski:  FPDF z buforowaną czcionką raportów. self.report_font to 'UbuntuMono' lub zapasowy
+             Courier; przekazuj go do set_font() jak każdą rodzinę.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.report_font = FONT_FAMILY if fonts_available(('', 'B', 'I')) else FALLBACK_FAMILY
+        self._tables = {}
+
+    def set_font(self, family=None, style='', size=0):
+        # English: Attach a report style on first use (an empty family keeps the current one)
+        # Polski: Dołącz styl raportu przy pierwszym użyciu (pusta rodzina zachowuje bieżącą)
+        name = family or self.font_family
+        if name and name.lower() == FONT_FAMILY.lower() and self.report_font == FONT_FAMILY:
+            key = _style_key(style)
+            if os.path.exists(FONT_FILES[key]):
+                _attach(self, FONT_FAMILY, key, FONT_FILES[key])
+        super().set_font(family, style, size)
+
+    # --- Measurement / Pomiar ---
+
+    def line_height(self):
+        return self.font_size * LINE_SPACING
+
+    def text_width(self, text):
+        """
+        English: Width of text in the current font (user units) from the cached glyph widths.
+        Polski:  Szerokość tekstu w bieżącej czcionce (jednostki użytkownika) z buforowanych szerokości.
+        """
+        if self.font_family != FONT_FAMILY.lower():
+            return self.get_string_width(text)
+        widths, mono = glyph_widths(self.font_style)
+        if mono is not None:
+            units = len(text) * mono
+        else:
+            default = self.current_font.desc.missing_width
+            units = sum(widths.get(ord(c), default) for c in text)
+        return units * self.font_size / 1000
+
+    def mono_width(self):
+        """
+        English: Advance of one character in the current font if it is monospace, else None.
+        Polski:  Szerokość jednego znaku w bieżącej czcionce, jeśli ma stałą szerokość, inaczej None.
+        """
+        if self.font_family == FONT_FAMILY.lower():
+            mono = glyph_widths(self.font_style)[1]
+            return mono * self.font_size / 1000 if mono is not None else None
+        if self.font_family == FALLBACK_FAMILY.lower():
+            return self.get_string_width(' ')
+        return None
+
+    # --- Tables / Tabele ---
+
+    def table(self, widths):
+        # English: One layout per column set, reused across calls
+        # Polski: Jeden układ na zestaw kolumn, używany ponownie między wywołaniami
+        key = tuple(widths)
+        layout = self._tables.get(key)
+        if layout is None:
+            layout = self._tables[key] = TableLayout(self, key)
+        return layout
+
+    def print_row(self, data, widths, fill=False, color=None):
+        """
+        English: One bordered table row; cells wrap and the row takes the tallest cell's height.
+                 A row that does not fit starts a new page.
+        Polski:  Jeden wiersz tabeli z obramowaniem; komórki są zawijane, a wiersz ma wysokość
+                 najwyższej komórki. Wiersz, który się nie mieści, zaczyna nową stronę.
+        """
+        self.table(widths).row(data, fill=fill, color=color)
+
+    def print_rows(self, rows, widths, color=None):
+        # English: Streams any iterable of rows (e.g. a generator over a long file list)
+        # Polski: Strumieniuje dowolny iterowalny zbiór wierszy (np. generator po długiej liście plików)
+        self.table(widths).rows(rows, color=color)
+
+    def print_row_grid(self, col1_text, col2_text, w1, w2, fill=False):
+        self.print_row((col1_text, col2_text), (w1, w2), fill=fill)
+
+
+# --- TABLE LAYOUT ---
+# --- UKŁAD TABELI ---
+
+class TableLayout:
+    """
+    English: Bordered table with fixed column widths. A row is wrapped once (greedy on spaces,
+             long words such as paths are split by character) and drawn from those lines, with
+             no dry-run pass. Column capacities are recomputed only when the font changes.
+    Polski:  Tabela z obramowaniem o stałych szerokościach kolumn. Wiersz jest zawijany raz
+             (zachłannie po spacjach, długie słowa jak ścieżki są dzielone po znakach) i rysowany
+             z tych linii, bez przebiegu próbnego. Pojemności kolumn są przeliczane tylko przy
+             zmianie czcionki.
+    """
+
+    def __init__(self, pdf, widths):
+        self.pdf = pdf
+        self.widths = tuple(widths)
+        self.font = None          # (family, style, size) of the metrics below
+        self.line_height = 0
+        self.char_width = None    # monospace advance, None for proportional fonts
+        self.capacity = ()        # per column: chars (monospace) or user units
+
+    def _metrics(self):
+        pdf = self.pdf
+        font = (pdf.font_family, pdf.font_style, pdf.font_size)
+        if font != self.font:
+            self.font = font
+            self.line_height = pdf.line_height()
+            self.char_width = pdf.mono_width()
+            inner = [w - 2 * pdf.c_margin for w in self.widths]
+            if self.char_width:
+                # English: Small epsilon so an exact fit is not lost to float rounding
+                # Polski: Mały margines, by dokładne dopasowanie nie przepadło przez zaokrąglenie
+                self.capacity = tuple(max(1, int(w / self.char_width + 1e-6)) for w in inner)
+            else:
+                self.capacity = tuple(inner)
+
+    def _fit(self, word, capacity):
+        # English: Number of leading characters of word that fit (at least one)
+        # Polski: Liczba początkowych znaków słowa, które się mieszczą (co najmniej jeden)
+        if self.char_width:
+            return max(1, capacity)
+        width = 0
+        for i, char in enumerate(word):
+            width += self.pdf.text_width(char)
+            if width > capacity:
+                return max(1, i)
+        return len(word)
+
+    def wrap(self, text, capacity):
+        measure = len if self.char_width else self.pdf.text_width
+        lines = []
+        for para in str(text).split('\n'):
+            if measure(para) <= capacity:
+                lines.append(para)
+                continue
+            line = ''
+            for word in para.split(' '):
+                candidate = f"{line} {word}" if line else word
+                if measure(candidate) <= capacity:
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                line = word
+                while measure(line) > capacity:
+                    cut = self._fit(line, capacity)
+                    lines.append(line[:cut])
+                    line = line[cut:]
+            lines.append(line)
+        return lines
+
+    def layout(self, data):
+        """
+        English: (row height, wrapped lines per cell) for one row in the current font.
+        Polski:  (wysokość wiersza, zawinięte linie każdej komórki) dla jednego wiersza w bieżącej czcionce.
+        """
+        self._metrics()
+        cells = [self.wrap(text, cap) for text, cap in zip(data, self.capacity)]
+        return max(1, max(len(lines) for lines in cells)) * self.line_height, cells
+
+    def draw(self, row_height, cells, fill=False, color=None):
+        pdf = self.pdf
+        if pdf.get_y() + row_height > pdf.page_break_trigger:
+            pdf.add_page()
+
+        x_start, y_start = pdf.get_x(), pdf.get_y()
+        if fill:
+            pdf.set_fill_color(*HEADER_FILL)
+            pdf.rect(x_start, y_start, sum(self.widths), row_height, 'F')
+        if color: pdf.set_text_color(*color)
+        # English: Same baseline as cell(): middle of the line plus 0.3 of the font size
+        # Polski: Ta sama linia bazowa co w cell(): środek linii plus 0.3 rozmiaru czcionki
+        baseline = 0.5 * self.line_height + 0.3 * pdf.font_size
+        curr_x = x_start
+        for w, lines in zip(self.widths, cells):
+            y = y_start + baseline
+            for line in lines:
+                if line:
+                    pdf.text(curr_x + pdf.c_margin, y, line)
+                y += self.line_height
+            pdf.rect(curr_x, y_start, w, row_height)
+            curr_x += w
+        if color: pdf.set_text_color(0, 0, 0)
+        pdf.set_xy(x_start, y_start + row_height)
+
+    def row(self, data, fill=False, color=None):
+        self.draw(*self.layout(data), fill=fill, color=color)
+
+    def rows(self, rows, color=None):
+        for data in rows:
+            self.draw(*self.layout(data), color=color)
@@ -7,36 +7,22 @@
 # =====================================================================================
 
 import os
-import subprocess
 import yaml
+import config_store
+import remote_steps
+import apt_cache
+import cert_sync
 import sys
 
 # --- Configuration ---
 # --- Konfiguracja ---
 CONFIG_FILE = 'config.yaml'
-LOCAL_CERTS_BASE_PATH = 'gcp_tak_certs'
 
 
 # =====================================================================================
 # === HELPER FUNCTIONS ===
 # =====================================================================================
 
-def run_command_local(command):
-    """
-    English: Runs a command on the local machine.
-    Polski:  Uruchamia polecenie na lokalnej maszynie.
-    """
-    print(f"\n🔄 Executing local command / Wykonywanie polecenia lokalnego: {' '.join(command)}")
-    try:
-        process = subprocess.run(command, check=True, capture_output=True, text=True)
-        print("✅ Command executed successfully / Polecenie wykonane pomyślnie.")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ ERROR: Command failed / BŁĄD: Polecenie zakończyło się błędem.")
-        print(f"   Stderr: {e.stderr.strip()}")
-        return False
-
-
 def load_config():
     """
     English: Loads the main configuration file.
@@ -47,61 +33,13 @@ def load_config():
         print(f"❌ BŁĄD: Plik konfiguracyjny '{CONFIG_FILE}' nie został znaleziony.")
         return None
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return config_store.load(CONFIG_FILE)
     except (IOError, yaml.YAMLError) as e:
         print(f"❌ ERROR: Could not load configuration file '{CONFIG_FILE}': {e}")
         print(f"❌ BŁĄD: Nie można wczytać pliku konfiguracyjnego '{CONFIG_FILE}': {e}")
         return None
 
 
-def run_ssh_command(host_ip, user, command):
-    """
-    English: Runs a command in a non-interactive SSH session.
-    Polski:  Uruchamia polecenie w sesji SSH (nieinteraktywnie).
-    """
-    ssh_command = ['ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10', f'{user}@{host_ip}', command]
-    print(f"\n🔄 Executing command on '{host_ip}': {command}")
-    print(f"🔄 Wykonywanie polecenia na '{host_ip}': {command}")
-    try:
-        # Use Popen to stream output in real-time
-        process = subprocess.Popen(ssh_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
-                                   encoding='utf-8')
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                print(f"  [{host_ip}] > {output.strip()}")
-        return process.poll()
-    except Exception as e:
-        print(f"❌ An unexpected error occurred during SSH: {e}")
-        print(f"❌ Wystąpił nieoczekiwany błąd podczas SSH: {e}")
-        return 1
-
-
-def run_ssh_interactive(host_ip, user, command):
-    """
-    English: Runs a command in an interactive SSH session.
-    Polski:  Uruchamia polecenie w interaktywnej sesji SSH.
-    """
-    ssh_command = ['ssh', '-t', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10', f'{user}@{host_ip}',
-                   command]
-    print(f"\n🔄 Connecting to '{host_ip}' as '{user}' to run the installation script...")
-    print(f"🔄 Łączenie z '{host_ip}' jako '{user}' w celu uruchomienia skryptu instalacyjnego...")
-    print(f"    COMMAND / POLECENIE: {command}")
-    print("-" * 60)
-    print(">>> Starting interactive SSH session. / Rozpoczynanie interaktywnej sesji SSH. <<<")
-    print("-" * 60)
-    try:
-        process = subprocess.run(ssh_command, check=False)
-        return process.returncode
-    except Exception as e:
-        print(f"\n❌ An unexpected error occurred during SSH: {e}")
-        print(f"❌ Wystąpił nieoczekiwany błąd podczas SSH: {e}")
-        return 1
-
-
 # =====================================================================================
 # === MAIN SCRIPT LOGIC ===
 # =====================================================================================
@@ -153,34 +91,65 @@ def main():
         print(f"❌ BŁĄD: Brak 'internal_ip' dla maszyny '{server_key}'. Połączenie przez VPN jest wymagane.")
         return
 
-    # --- Krok 3: Instalacja zależności na zdalnej maszynie (PRZYWRÓCONY) ---
-    print("\n--- Step 3: Installing dependencies on the remote machine ---")
-    print("--- Krok 3: Instalacja zależności na zdalnej maszynie ---")
-    install_deps_command = "sudo apt-get update && sudo apt-get install -y net-tools zip"
-    if run_ssh_command(ssh_host_ip, ADMIN_USER, install_deps_command) != 0:
-        print("\n❌ Failed to install dependencies. Aborting.")
-        print("❌ Nie udało się zainstalować zależności. Prerywam działanie.")
+    # --- Krok 3: Sprawdź stan serwera jedną sondą ---
+    remote_cert_path = cert_sync.remote_cert_dir(ADMIN_USER)
+    state = remote_steps.probe(remote_steps.ssh_transport(ADMIN_USER, ssh_host_ip), {
+        'net_tools': remote_steps.has_package('net-tools'),
+        'zip': remote_steps.has_package('zip'),
+        'project': remote_steps.has_path(f"{REMOTE_PROJECT_PATH}/scripts/setup.sh", sudo=False),
+        'certs': f"sudo ls -A {remote_cert_path} | head -n 1",
+    })
+    if state is None:
+        print("\n❌ Cannot reach the server. Aborting.")
+        print("❌ Brak połączenia z serwerem. Przerywam działanie.")
+        return
+    if state.get('project') != '1':
+        print(f"\n❌ {REMOTE_PROJECT_PATH}/scripts/setup.sh not found - run deploy_assets.py first.")
+        print(f"❌ Nie znaleziono {REMOTE_PROJECT_PATH}/scripts/setup.sh - najpierw uruchom deploy_assets.py.")
         return
-    print("✅ Dependencies installed successfully. / Zależności zainstalowane pomyślnie.")
 
-    # --- Krok 4: Uruchomienie skryptu setup.sh ---
-    print("\n--- Step 4: Running remote TAK Server installation ---")
-    print("--- Krok 4: Uruchomienie zdalnej instalacji TAK Server ---")
-    remote_command = (f"sudo bash -c 'cd {REMOTE_PROJECT_PATH} && "
-                      f"find scripts/ -type f -name \"*.sh\" -exec chmod +x {{}} \\; && "
-                      f"./scripts/setup.sh'")
-    return_code = run_ssh_interactive(ssh_host_ip, ADMIN_USER, remote_command)
+    run_setup = True
+    if state.get('certs'):
+        # setup.sh regenerates the CA and all certificates - only on explicit request
+        # setup.sh generuje od nowa CA i wszystkie certyfikaty - tylko na wyraźne żądanie
+        print("ℹ️  TAK Server is already set up (certificates present).")
+        print("ℹ️  TAK Server jest już zainstalowany (certyfikaty obecne).")
+        answer = input("Run setup.sh again? / Uruchomić setup.sh ponownie? [y/t/N]: ").strip().lower()
+        run_setup = answer in ['y', 't']
+
+    # --- Krok 4: Zależności i setup.sh w jednej sesji SSH ---
+    print("\n--- Step 4: Installing dependencies and running setup.sh (one SSH session) ---")
+    print("--- Krok 4: Instalacja zależności i uruchomienie setup.sh (jedna sesja SSH) ---")
+    steps = apt_cache.with_proxy([
+        remote_steps.Step('dependencies', state.get('net_tools') == '1' and state.get('zip') == '1',
+                          "sudo apt-get update && sudo apt-get install -y net-tools zip"),
+        remote_steps.Step('setup', not run_setup,
+                          f"sudo bash -c 'cd {REMOTE_PROJECT_PATH} && "
+                          f"find scripts/ -type f -name \"*.sh\" -exec chmod +x {{}} \\; && "
+                          f"./scripts/setup.sh'"),
+    ], apt_cache.proxy_url(config))
+    remote_steps.print_plan(steps, prefix='   ')
+    print("-" * 60)
+    results = remote_steps.run_batch(remote_steps.ssh_transport(ADMIN_USER, ssh_host_ip, tty=True), steps)
+    print("-" * 60)
+    remote_steps.print_results(results, prefix='   ')
+    return_code = 0 if remote_steps.batch_ok(results) else next(
+        r.code or 1 for r in results if r.status not in ('ok', 'skipped'))
 
     # --- Krok 5: Kopiowanie certyfikatów po udanej instalacji ---
     if return_code == 0:
         print("\n--- Step 5: Copying certificates to the local machine ---")
         print("--- Krok 5: Kopiowanie certyfikatów na maszynę lokalną ---")
-        local_cert_path = os.path.join(LOCAL_CERTS_BASE_PATH, server_key)
-        print(f"Creating local directory / Tworzenie lokalnego katalogu: {local_cert_path}")
-        os.makedirs(local_cert_path, exist_ok=True)
-        remote_cert_path = f"{REMOTE_PROJECT_PATH}/tak/certs/files/"
-        scp_command = ["scp", "-r", f"{ADMIN_USER}@{ssh_host_ip}:{remote_cert_path}*", f"{local_cert_path}/"]
-        run_command_local(scp_command)
+        # One tar stream of the new or rotated files only, over the multiplexed SSH connection
+        # Jeden strumień tar tylko z nowymi lub wymienionymi plikami, przez multipleksowane połączenie SSH
+        synced = cert_sync.sync_server(server_key, ADMIN_USER, ssh_host_ip, remote_cert_path)
+        if synced is None:
+            return_code = 1
+        else:
+            fetched, removed, index = synced
+            print(f"✅ {cert_sync.local_cert_dir(server_key)}: {len(fetched)} fetched / pobranych, "
+                  f"{len(removed)} removed / usuniętych")
+            cert_sync.print_report(server_key, index)
     else:
         print("\n--- Step 5 skipped due to installation error. ---")
         print("--- Krok 5 pominięty z powodu błędu instalacji. ---")
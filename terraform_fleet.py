@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === TERRAFORM FLEET INPUTS (v1.0) ===
+# === WEJŚCIA TERRAFORM DLA FLOTY (v1.0) ===
+# =====================================================================================
+#
+# English: Builds the input map for fleet/main.tf from config.yaml entries marked
+#          'fleet: true', writes it to fleet/fleet.auto.tfvars.json and reads the
+#          'instances' output back. Used by deploy_vm.py (fleet mode) and destroy_vm.py.
+# Polski:  Buduje mapę wejściową dla fleet/main.tf z wpisów config.yaml oznaczonych
+#          'fleet: true', zapisuje ją do fleet/fleet.auto.tfvars.json i odczytuje wyjście
+#          'instances'. Używane przez deploy_vm.py (tryb floty) i destroy_vm.py.
+
+import os
+import json
+import tempfile
+import terraform_plan
+import cloud_bootstrap
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+FLEET_DIR = 'fleet'
+VARS_FILE = os.path.join(FLEET_DIR, 'fleet.auto.tfvars.json')
+
+
+def terraform_command(*args):
+    return ['terraform', f'-chdir={FLEET_DIR}', *args]
+
+
+def is_initialized():
+    return os.path.isdir(os.path.join(FLEET_DIR, '.terraform'))
+
+
+def fleet_members(config):
+    """
+    English: {key: entry} for every created fleet VM in the raw config dict.
+    Polski:  {klucz: wpis} dla każdej utworzonej maszyny floty w surowym słowniku konfiguracji.
+    """
+    return {k: v for k, v in config.items() if isinstance(v, dict) and v.get('fleet') and v.get('name')}
+
+
+def build_vars(config, add=None, remove=(), unprotect=()):
+    """
+    English: Terraform variables for the desired fleet: current members, minus 'remove',
+             plus 'add' ({key: {'name', 'password', 'ssh_public_key'}}). Members listed in
+             'unprotect' get deletion_protection = false.
+    Polski:  Zmienne Terraform dla docelowej floty: obecni członkowie, bez 'remove', plus
+             'add' ({klucz: {'name', 'password', 'ssh_public_key'}}). Członkowie z listy
+             'unprotect' dostają deletion_protection = false.
+    """
+    global_settings = config.get('GLOBAL_SETTINGS') or {}
+    gcp = global_settings.get('gcp') or {}
+    vm = global_settings.get('vm') or {}
+
+    members = {k: v for k, v in fleet_members(config).items() if k not in remove}
+    members.update(add or {})
+    admin_user = vm.get('admin_user', 'blox_tak_server_admin')
+    bootstrap = cloud_bootstrap.is_enabled(config)
+
+    return {
+        'gcp_project_id': gcp.get('project_id'),
+        'gcp_region': gcp.get('region'),
+        'gcp_zone': gcp.get('zone'),
+        'vm_machine_type': vm.get('machine_type'),
+        'vm_disk_image': vm.get('disk_image'),
+        'vm_disk_size_gb': vm.get('disk_size_gb'),
+        'vm_disk_type': vm.get('disk_type'),
+        'vm_admin_user': admin_user,
+        'bootstrap_script': cloud_bootstrap.build_script(admin_user) if bootstrap else '',
+        'instances': {
+            k: {'name': m['name'], 'deletion_protection': k not in unprotect,
+                'wg_address': cloud_bootstrap.wg_address(config, k) if bootstrap else ''}
+            for k, m in members.items()
+        },
+        'instance_secrets': {
+            k: {'root_password': m['password'], 'ssh_public_key': m['ssh_public_key']} for k, m in members.items()
+        },
+    }
+
+
+def write_vars(variables):
+    """
+    English: Atomic, owner-only write of fleet.auto.tfvars.json (it holds the passwords).
+    Polski:  Atomowy zapis fleet.auto.tfvars.json tylko dla właściciela (zawiera hasła).
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=FLEET_DIR)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(variables, f, indent=2)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, VARS_FILE)
+
+
+def read_outputs():
+    """
+    English: One 'terraform output -json instances' call -> {key: {name, zone, IPs, disk}}.
+    Polski:  Jedno wywołanie 'terraform output -json instances' -> {klucz: {name, zone, IP, dysk}}.
+    """
+    return terraform_plan.read_output('instances', chdir=FLEET_DIR) or {}
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === TERRAFORM PLAN CACHE & VAR FILES (v1.0) ===
+# === BUFOR PLANÓW TERRAFORM I PLIKI ZMIENNYCH (v1.0) ===
+# =====================================================================================
+#
+# English: Runs 'terraform plan -out' + 'terraform apply <plan>' instead of a blind
+#          'apply -auto-approve'. Inputs come from a generated var file (no -var flags,
+#          no dummy values for destroy). The plan file is keyed by a hash of the inputs
+#          (.tf files, provider lock, var file, workspace, action) and of the state, so
+#          an unapplied plan is reused. After a successful run the input/state hashes are
+#          recorded; within FRESH_SECONDS an identical run is skipped and a changed run
+#          is planned with -refresh=false.
+# Polski:  Uruchamia 'terraform plan -out' + 'terraform apply <plan>' zamiast ślepego
+#          'apply -auto-approve'. Wejścia pochodzą z generowanego pliku zmiennych (bez
+#          flag -var i bez fikcyjnych wartości przy usuwaniu). Plik planu jest kluczowany
+#          skrótem wejść (pliki .tf, blokada dostawców, plik zmiennych, obszar roboczy,
+#          akcja) i stanu, więc niezastosowany plan jest używany ponownie. Po udanym
+#          przebiegu zapisywane są skróty wejść i stanu; w ciągu FRESH_SECONDS identyczny
+#          przebieg jest pomijany, a zmieniony planowany z -refresh=false.
+
+import os
+import glob
+import json
+import time
+import hashlib
+import tempfile
+import subprocess
+import cloud_bootstrap
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+INPUTS_DIR = '.tf_inputs'
+PLANS_DIR = '.tf_plans'
+FRESH_SECONDS = 15 * 60
+
+# English: plan -detailed-exitcode: 0 = no changes, 1 = error, 2 = changes present
+# Polski:  plan -detailed-exitcode: 0 = brak zmian, 1 = błąd, 2 = są zmiany
+PLAN_NO_CHANGES = 0
+PLAN_CHANGES = 2
+
+
+# --- VAR FILES ---
+# --- PLIKI ZMIENNYCH ---
+
+def write_var_file(path, variables):
+    """
+    English: Atomic, owner-only JSON var file (values include passwords).
+    Polski:  Atomowy plik zmiennych JSON tylko dla właściciela (wartości zawierają hasła).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(variables, f, indent=2, sort_keys=True)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, path)
+    return path
+
+
+def single_vm_var_file(vm_key):
+    return os.path.join(INPUTS_DIR, f"{vm_key}.tfvars.json")
+
+
+def single_vm_vars(config, vm_key):
+    """
+    English: Variables of the root main.tf for one VM entry, taken entirely from config.yaml
+             (including the cloud-init bootstrap when vm.cloud_init_bootstrap is set).
+    Polski:  Zmienne głównego main.tf dla jednego wpisu maszyny, w całości z config.yaml
+             (łącznie z bootstrapem cloud-init, gdy ustawiono vm.cloud_init_bootstrap).
+    """
+    global_settings = config.get('GLOBAL_SETTINGS') or {}
+    gcp = global_settings.get('gcp') or {}
+    vm = global_settings.get('vm') or {}
+    entry = config[vm_key]
+    admin_user = vm.get('admin_user', 'blox_tak_server_admin')
+    bootstrap = cloud_bootstrap.is_enabled(config)
+    return {
+        'instance_name': entry['name'],
+        'root_password': entry['password'],
+        'ssh_public_key': entry['ssh_public_key'],
+        'gcp_project_id': gcp.get('project_id'),
+        'gcp_region': gcp.get('region'),
+        'gcp_zone': gcp.get('zone'),
+        'vm_machine_type': vm.get('machine_type'),
+        'vm_disk_image': vm.get('disk_image'),
+        'vm_disk_size_gb': vm.get('disk_size_gb'),
+        'vm_disk_type': vm.get('disk_type'),
+        'vm_admin_user': admin_user,
+        'bootstrap_script': cloud_bootstrap.build_script(admin_user) if bootstrap else '',
+        'wg_address': cloud_bootstrap.wg_address(config, vm_key) if bootstrap else '',
+    }
+
+
+# --- OUTPUTS ---
+# --- WYJŚCIA ---
+
+# English: Output fields persisted into the VM entry of config.yaml
+# Polski:  Pola wyjść zapisywane we wpisie maszyny w config.yaml
+INVENTORY_FIELDS = ('zone', 'instance_id', 'internal_ip', 'external_ip', 'boot_disk')
+
+
+@tracing.traced('terraform.output')
+def read_output(name, chdir='.'):
+    """
+    English: One 'terraform output -json <name>' call; returns the decoded value or None.
+    Polski:  Jedno wywołanie 'terraform output -json <nazwa>'; zwraca zdekodowaną wartość lub None.
+    """
+    base = ['terraform'] if chdir == '.' else ['terraform', f'-chdir={chdir}']
+    try:
+        res = subprocess.run(base + ['output', '-json', name], capture_output=True, text=True, encoding='utf-8')
+    except FileNotFoundError:
+        print("❌ ERROR: Command 'terraform' not found. / BŁĄD: Nie znaleziono polecenia 'terraform'.")
+        return None
+    if res.returncode != 0:
+        print(f"❌ terraform output failed / nie powiodło się: {res.stderr.strip()}")
+        return None
+    try:
+        return json.loads(res.stdout or 'null')
+    except ValueError:
+        return None
+
+
+def inventory_fields(output):
+    """
+    English: The INVENTORY_FIELDS subset of one instance output (missing values skipped).
+    Polski:  Podzbiór INVENTORY_FIELDS z wyjścia jednej instancji (brakujące wartości pominięte).
+    """
+    return {field: output[field] for field in INVENTORY_FIELDS if (output or {}).get(field)}
+
+
+# --- HASHES ---
+# --- SKRÓTY ---
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+    except FileNotFoundError:
+        h.update(b'<missing>')
+    return h.hexdigest()
+
+
+def state_path(chdir='.', workspace='default'):
+    if workspace == 'default':
+        return os.path.join(chdir, 'terraform.tfstate')
+    return os.path.join(chdir, 'terraform.tfstate.d', workspace, 'terraform.tfstate')
+
+
+def input_hash(chdir, var_file, workspace, action):
+    h = hashlib.sha256(f"{workspace}\0{action}\0".encode('utf-8'))
+    for path in sorted(glob.glob(os.path.join(chdir, '*.tf'))) + [os.path.join(chdir, '.terraform.lock.hcl'), var_file]:
+        h.update(os.path.basename(path).encode('utf-8') + b'\0' + _file_digest(path).encode('ascii'))
+    return h.hexdigest()
+
+
+# --- FRESHNESS MARKER ---
+# --- ZNACZNIK ŚWIEŻOŚCI ---
+
+def _plans_dir(chdir):
+    return os.path.join(chdir, PLANS_DIR)
+
+
+def _marker_path(chdir, workspace):
+    return os.path.join(_plans_dir(chdir), f"{workspace}.state.json")
+
+
+def _read_marker(chdir, workspace):
+    try:
+        with open(_marker_path(chdir, workspace), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_marker(chdir, workspace, inputs, state):
+    with open(_marker_path(chdir, workspace), 'w', encoding='utf-8') as f:
+        json.dump({'inputs': inputs, 'state': state, 'time': time.time()}, f)
+
+
+def _drop_plans(chdir, workspace, keep=None):
+    for path in glob.glob(os.path.join(_plans_dir(chdir), f"{workspace}-*.tfplan")):
+        if os.path.abspath(path) != keep:
+            os.remove(path)
+
+
+def forget(chdir='.', workspace='default'):
+    """
+    English: Removes cached plans and the freshness marker of a workspace.
+    Polski:  Usuwa buforowane plany i znacznik świeżości obszaru roboczego.
+    """
+    _drop_plans(chdir, workspace)
+    try:
+        os.remove(_marker_path(chdir, workspace))
+    except FileNotFoundError:
+        pass
+
+
+# --- PLAN & APPLY ---
+# --- PLANOWANIE I ZASTOSOWANIE ---
+
+@tracing.traced('terraform')
+def _run(command):
+    # English: Stream terraform output line by line, like the wizards' run_command
+    # Polski: Przesyłaj wyjście terraform linia po linii, jak run_command kreatorów
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                   encoding='utf-8')
+        for line in process.stdout:
+            print(line.rstrip())
+        return process.wait()
+    except FileNotFoundError:
+        print(f"❌ ERROR: Command '{command[0]}' not found. / BŁĄD: Nie znaleziono polecenia '{command[0]}'.")
+        return 1
+
+
+def plan_and_apply(var_file, workspace='default', chdir='.', destroy=False, parallelism=None):
+    """
+    English: Plans (or reuses a cached plan) and applies it. Returns the exit code (0 = OK,
+             also when there was nothing to change). The workspace must already be selected.
+    Polski:  Planuje (lub używa zbuforowanego planu) i go stosuje. Zwraca kod wyjścia (0 = OK,
+             również gdy nie było nic do zmiany). Obszar roboczy musi być już wybrany.
+    """
+    action = 'destroy' if destroy else 'apply'
+    var_file = os.path.abspath(var_file)
+    plans_dir = _plans_dir(chdir)
+    os.makedirs(plans_dir, mode=0o700, exist_ok=True)
+
+    inputs = input_hash(chdir, var_file, workspace, action)
+    state = _file_digest(state_path(chdir, workspace))
+    marker = _read_marker(chdir, workspace)
+    fresh = bool(marker and marker.get('state') == state and time.time() - marker.get('time', 0) < FRESH_SECONDS)
+
+    if fresh and marker.get('inputs') == inputs:
+        print("✅ Infrastructure already matches these inputs - nothing to do.")
+        print("✅ Infrastruktura już odpowiada tym wejściom - nic do zrobienia.")
+        return 0
+
+    base = ['terraform'] if chdir == '.' else ['terraform', f'-chdir={chdir}']
+    extra = [f'-parallelism={parallelism}'] if parallelism else []
+    plan_file = os.path.abspath(os.path.join(plans_dir, f"{workspace}-{action}-{inputs[:16]}-{state[:12]}.tfplan"))
+
+    if os.path.exists(plan_file):
+        print(f"♻️  Reusing saved plan / Używam zapisanego planu: {os.path.basename(plan_file)}")
+    else:
+        command = base + ['plan', '-input=false', '-detailed-exitcode', f'-var-file={var_file}',
+                          f'-out={plan_file}'] + extra
+        if destroy:
+            command.append('-destroy')
+        if fresh:
+            # State was written by our last successful apply moments ago
+            # Stan został zapisany przez nasze ostatnie udane apply przed chwilą
+            print("⚡ State is fresh - planning with -refresh=false / Stan jest świeży - plan z -refresh=false")
+            command.append('-refresh=false')
+        code = _run(command)
+        if code == PLAN_NO_CHANGES:
+            if os.path.exists(plan_file):
+                os.remove(plan_file)
+            _write_marker(chdir, workspace, inputs, state)
+            print("✅ No changes / Brak zmian.")
+            return 0
+        if code != PLAN_CHANGES:
+            if os.path.exists(plan_file):
+                os.remove(plan_file)
+            return code or 1
+        _drop_plans(chdir, workspace, keep=plan_file)
+
+    code = _run(base + ['apply', '-input=false'] + extra + [plan_file])
+    # A saved plan can only be applied once; a failed apply also changed the state
+    # Zapisany plan można zastosować tylko raz; nieudane apply też zmieniło stan
+    os.remove(plan_file)
+    if code == 0:
+        if destroy:
+            forget(chdir, workspace)
+        else:
+            _write_marker(chdir, workspace, inputs, _file_digest(state_path(chdir, workspace)))
+    return code
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === HOT-PATH TRACING & PHASE TIMING (v1.0) ===
+# === ŚLEDZENIE GORĄCYCH ŚCIEŻEK I CZASY FAZ (v1.0) ===
+# =====================================================================================
+#
+# English: Lightweight spans around SSH calls, local commands, PDF layout, PDF merges and
+#          packaging. Off unless BLOX_TRACE is set; then every span records wall time,
+#          CPU time of this process and of its children (ssh, scp, gcloud...), the number
+#          of subprocesses started and the bytes moved. Spans are appended to
+#          traces/<script>_<timestamp>_<pid>.jsonl as they finish and a summary table is
+#          printed at the end of the run. BLOX_TRACE=chrome also writes a Chrome trace
+#          (.trace.json, open in chrome://tracing or ui.perfetto.dev).
+#          'python3 tracing.py <file.jsonl> [--chrome]' summarizes or converts a saved trace.
+# Polski:  Lekkie spany wokół wywołań SSH, poleceń lokalnych, składu PDF, scalania PDF
+#          i pakowania. Wyłączone, dopóki nie ustawiono BLOX_TRACE; wtedy każdy span
+#          zapisuje czas rzeczywisty, czas CPU tego procesu i jego potomków (ssh, scp,
+#          gcloud...), liczbę uruchomionych podprocesów i przesłane bajty. Spany są
+#          dopisywane do traces/<skrypt>_<znacznik>_<pid>.jsonl w chwili zakończenia, a na
+#          końcu przebiegu drukowana jest tabela podsumowania. BLOX_TRACE=chrome zapisuje
+#          też ślad Chrome (.trace.json, do otwarcia w chrome://tracing lub ui.perfetto.dev).
+#          'python3 tracing.py <plik.jsonl> [--chrome]' podsumowuje lub konwertuje zapisany ślad.
+
+import os
+import sys
+import json
+import time
+import atexit
+import datetime
+import functools
+import itertools
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+TRACE_DIR = 'traces'
+ENV_VAR = 'BLOX_TRACE'
+
+# English: Counters summed into a span and all of its open ancestors
+# Polski: Liczniki sumowane w spanie i wszystkich jego otwartych przodkach
+COUNTERS = ('subprocesses', 'bytes_in', 'bytes_out')
+
+_state = {'enabled': False, 'chrome': False, 'path': None, 'file': None, 'origin': 0.0, 'records': []}
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+
+
+# --- SPANS ---
+# --- SPANY ---
+
+class Span:
+    """
+    English: One timed region. add() increments counters here and in the enclosing spans,
+             set() attaches attributes (host, file, ...) to the trace record.
+    Polski:  Jeden mierzony fragment. add() zwiększa liczniki tutaj i w spanach nadrzędnych,
+             set() dołącza atrybuty (host, plik, ...) do rekordu śladu.
+    """
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.id = next(_ids)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, **counters):
+        span = self
+        while span is not None:
+            for key, value in counters.items():
+                span.counters[key] = span.counters.get(key, 0) + (value or 0)
+            span = span.parent
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    # English: Returned while tracing is off, so call sites never need to check
+    # Polski: Zwracany, gdy śledzenie jest wyłączone, więc wywołania nie muszą sprawdzać
+    def add(self, **counters):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current():
+    """
+    English: The innermost open span of this thread (NULL_SPAN when none or tracing is off).
+    Polski:  Najgłębszy otwarty span tego wątku (NULL_SPAN, gdy brak lub śledzenie wyłączone).
+    """
+    stack = _stack() if _state['enabled'] else None
+    return stack[-1] if stack else NULL_SPAN
+
+
+def add(**counters):
+    current().add(**counters)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    English: with tracing.span('ssh', host=ip) as s: ...; s.add(bytes_in=len(out))
+    Polski:  with tracing.span('ssh', host=ip) as s: ...; s.add(bytes_in=len(out))
+    """
+    if not _state['enabled']:
+        yield NULL_SPAN
+        return
+    stack = _stack()
+    current_span = Span(name, attrs, stack[-1] if stack else None)
+    stack.append(current_span)
+    wall, cpu, children = time.perf_counter(), time.process_time(), os.times()
+    error = None
+    try:
+        yield current_span
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end_children = os.times()
+        record = {
+            'type': 'span',
+            'name': name,
+            'id': current_span.id,
+            'parent': current_span.parent.id if current_span.parent else None,
+            'thread': threading.current_thread().name,
+            'start': round(wall - _state['origin'], 6),
+            'wall': round(time.perf_counter() - wall, 6),
+            'cpu': round(time.process_time() - cpu, 6),
+            'child_cpu': round((end_children.children_user - children.children_user)
+                               + (end_children.children_system - children.children_system), 6),
+        }
+        record.update(current_span.counters)
+        if current_span.attrs:
+            record['attrs'] = current_span.attrs
+        if error:
+            record['error'] = error
+        stack.pop()
+        _emit(record)
+
+
+def traced(name):
+    """
+    English: Decorator: runs every call of the function inside span(name).
+    Polski:  Dekorator: uruchamia każde wywołanie funkcji wewnątrz span(nazwa).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- SUBPROCESS ACCOUNTING ---
+# --- ROZLICZANIE PODPROCESÓW ---
+
+class _TracedPopen(subprocess.Popen):
+    # English: subprocess.run/call/check_output all go through Popen and communicate()
+    # Polski: subprocess.run/call/check_output przechodzą przez Popen i communicate()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        add(subprocesses=1)
+
+    def communicate(self, input=None, timeout=None):
+        stdout, stderr = super().communicate(input, timeout)
+        add(bytes_out=len(input or ''), bytes_in=len(stdout or '') + len(stderr or ''))
+        return stdout, stderr
+
+
+# --- OUTPUT ---
+# --- WYJŚCIE ---
+
+def _emit(record):
+    with _lock:
+        _state['records'].append(record)
+        if _state['file']:
+            _state['file'].write(json.dumps(record, ensure_ascii=False) + '\n')
+            _state['file'].flush()
+
+
+def enable(script=None, chrome=False):
+    """
+    English: Starts tracing for this process (called automatically when BLOX_TRACE is set).
+    Polski:  Włącza śledzenie dla tego procesu (wywoływane automatycznie, gdy ustawiono BLOX_TRACE).
+    """
+    if _state['enabled']:
+        return _state['path']
+    script = script or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(TRACE_DIR, f"{script}_{ts}_{os.getpid()}.jsonl")
+    _state.update(enabled=True, chrome=chrome, path=path, origin=time.perf_counter(),
+                  file=open(path, 'w', encoding='utf-8'))
+    _emit({'type': 'run', 'script': script, 'pid': os.getpid(), 'argv': sys.argv[1:], 'time': time.time()})
+    subprocess.Popen = _TracedPopen
+    atexit.register(finish)
+    return path
+
+
+def finish():
+    """
+    English: Closes the trace file, writes the Chrome trace if requested and prints the summary.
+    Polski:  Zamyka plik śladu, zapisuje ślad Chrome, jeśli zażądano, i drukuje podsumowanie.
+    """
+    if not _state['enabled']:
+        return
+    _state['enabled'] = False
+    with _lock:
+        _state['file'].close()
+        _state['file'] = None
+    spans = [r for r in _state['records'] if r['type'] == 'span']
+    if not spans:
+        return
+    print_summary(spans)
+    print(f"🧭 Trace / Ślad: {_state['path']}")
+    if _state['chrome']:
+        print(f"🧭 Chrome trace / Ślad Chrome: {write_chrome(_state['records'], _state['path'])}")
+
+
+def summarize(spans):
+    """
+    English: Per span name: calls, wall (total / max), CPU, child CPU and counters, slowest first.
+    Polski:  Dla każdej nazwy spanu: wywołania, czas (suma / max), CPU, CPU potomków i liczniki,
+             od najwolniejszych.
+    """
+    rows = {}
+    for record in spans:
+        row = rows.setdefault(record['name'], dict(name=record['name'], calls=0, wall=0.0, max=0.0, cpu=0.0,
+                                                   child_cpu=0.0, errors=0, **dict.fromkeys(COUNTERS, 0)))
+        row['calls'] += 1
+        row['wall'] += record['wall']
+        row['max'] = max(row['max'], record['wall'])
+        row['cpu'] += record['cpu']
+        row['child_cpu'] += record['child_cpu']
+        row['errors'] += 1 if record.get('error') else 0
+        for key in COUNTERS:
+            row[key] += record.get(key, 0)
+    return sorted(rows.values(), key=lambda r: r['wall'], reverse=True)
+
+
+def human_bytes(value):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def print_summary(spans):
+    print("\n" + "=" * 96)
+    print("=== TRACE SUMMARY / PODSUMOWANIE ŚLEDZENIA ===")
+    print(f"{'SPAN':<26} {'CALLS':>5} {'WALL':>9} {'MAX':>9} {'CPU':>8} {'CHILD':>8} {'PROC':>5} "
+          f"{'IN':>10} {'OUT':>10}")
+    print("-" * 96)
+    for r in summarize(spans):
+        flag = f"  ❌ x{r['errors']}" if r['errors'] else ''
+        print(f"{r['name'][:26]:<26} {r['calls']:>5} {r['wall']:>8.2f}s {r['max']:>8.2f}s {r['cpu']:>7.2f}s "
+              f"{r['child_cpu']:>7.2f}s {r['subprocesses']:>5} {human_bytes(r['bytes_in']):>10} "
+              f"{human_bytes(r['bytes_out']):>10}{flag}")
+    print("=" * 96)
+
+
+def write_chrome(records, jsonl_path):
+    """
+    English: Chrome trace event format: one complete ('X') event per span, times in µs.
+    Polski:  Format zdarzeń Chrome: jedno pełne zdarzenie ('X') na span, czasy w µs.
+    """
+    run = next((r for r in records if r['type'] == 'run'), {})
+    threads = {}
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': run.get('pid', 0), 'args': {'name': run.get('script', '')}}]
+    for r in records:
+        if r['type'] != 'span':
+            continue
+        tid = threads.setdefault(r['thread'], len(threads) + 1)
+        args = {key: r[key] for key in ('cpu', 'child_cpu') + COUNTERS}
+        args.update(r.get('attrs', {}))
+        if r.get('error'):
+            args['error'] = r['error']
+        events.append({'name': r['name'], 'ph': 'X', 'pid': run.get('pid', 0), 'tid': tid,
+                       'ts': round(r['start'] * 1e6), 'dur': round(r['wall'] * 1e6), 'args': args})
+    for name, tid in threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': run.get('pid', 0), 'tid': tid, 'args': {'name': name}})
+    path = os.path.splitext(jsonl_path)[0] + '.trace.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# English: Importing this module from a script is enough to honour BLOX_TRACE
+# Polski: Import tego modułu w skrypcie wystarcza, by uwzględnić BLOX_TRACE
+if os.environ.get(ENV_VAR, '').strip().lower() not in ('', '0', 'off', 'no', 'false') and __name__ != "__main__":
+    enable(chrome=os.environ[ENV_VAR].strip().lower() == 'chrome')
+
+
+# --- MAIN EXECUTION ---
+# --- GŁÓWNE WYKONANIE ---
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if len(args) != 1:
+        print("Usage / Użycie: python3 tracing.py <trace.jsonl> [--chrome]")
+        return 1
+    try:
+        records = load(args[0])
+    except (OSError, ValueError) as e:
+        print(f"❌ Cannot read trace / Nie można odczytać śladu: {e}")
+        return 1
+    print_summary([r for r in records if r['type'] == 'span'])
+    if '--chrome' in sys.argv[1:]:
+        print(f"🧭 Chrome trace / Ślad Chrome: {write_chrome(records, args[0])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
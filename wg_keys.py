@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === WIREGUARD KEY GENERATION (v1.0) ===
+# === GENEROWANIE KLUCZY WIREGUARD (v1.0) ===
+# =====================================================================================
+#
+# English: In-process replacement for 'wg genkey' / 'wg pubkey'. Uses the optional
+#          'cryptography' package when installed and falls back to a pure-Python X25519
+#          (RFC 7748) otherwise. Keys are base64 strings, exactly as printed by 'wg'.
+# Polski:  Zamiennik 'wg genkey' / 'wg pubkey' działający w procesie. Używa opcjonalnego
+#          pakietu 'cryptography', jeśli jest zainstalowany, a w przeciwnym razie czystej
+#          implementacji X25519 w Pythonie (RFC 7748). Klucze to napisy base64, dokładnie
+#          takie jak wypisuje 'wg'.
+
+import base64
+import os
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives import serialization
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+# --- X25519 (RFC 7748) ---
+
+_P = 2 ** 255 - 19
+_A24 = 121665
+_BASE_POINT = (9).to_bytes(32, 'little')
+
+
+def _clamp(scalar):
+    k = bytearray(scalar)
+    k[0] &= 248
+    k[31] &= 127
+    k[31] |= 64
+    return bytes(k)
+
+
+def _x25519(scalar, u_bytes):
+    # Montgomery ladder, RFC 7748 section 5
+    # Drabina Montgomery'ego, RFC 7748 sekcja 5
+    k = int.from_bytes(_clamp(scalar), 'little')
+    x1 = int.from_bytes(u_bytes, 'little') & ((1 << 255) - 1)
+    x2, z2, x3, z3 = 1, 0, x1, 1
+    swap = 0
+    for t in range(254, -1, -1):
+        k_t = (k >> t) & 1
+        if swap ^ k_t:
+            x2, x3, z2, z3 = x3, x2, z3, z2
+        swap = k_t
+        a = x2 + z2
+        aa = a * a % _P
+        b = x2 - z2
+        bb = b * b % _P
+        e = aa - bb
+        da = (x3 - z3) * a % _P
+        cb = (x3 + z3) * b % _P
+        x3 = (da + cb) ** 2 % _P
+        z3 = x1 * (da - cb) ** 2 % _P
+        x2 = aa * bb % _P
+        z2 = e * (aa + _A24 * e) % _P
+    if swap:
+        x2, z2 = x3, z3
+    return (x2 * pow(z2, _P - 2, _P) % _P).to_bytes(32, 'little')
+
+
+def _raw_public(private_raw):
+    if HAS_CRYPTOGRAPHY:
+        key = X25519PrivateKey.from_private_bytes(private_raw)
+        return key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return _x25519(private_raw, _BASE_POINT)
+
+
+# --- PUBLIC API ---
+# --- PUBLICZNE API ---
+
+def generate_private_key():
+    """
+    English: Equivalent of 'wg genkey': 32 random bytes, clamped, base64-encoded.
+    Polski:  Odpowiednik 'wg genkey': 32 losowe bajty, przycięte (clamp), w base64.
+    """
+    return base64.b64encode(_clamp(os.urandom(32))).decode('ascii')
+
+
+def public_key(private_key):
+    """
+    English: Equivalent of 'echo <private> | wg pubkey'.
+    Polski:  Odpowiednik 'echo <prywatny> | wg pubkey'.
+    """
+    raw = base64.b64decode(private_key.strip())
+    if len(raw) != 32:
+        raise ValueError("WireGuard private key must be 32 bytes")
+    return base64.b64encode(_raw_public(raw)).decode('ascii')
+
+
+def generate_keypair():
+    private_key = generate_private_key()
+    return private_key, public_key(private_key)
+
+
+def generate_keypairs(count):
+    """
+    English: Returns a list of `count` (private_key, public_key) tuples.
+    Polski:  Zwraca listę `count` krotek (klucz_prywatny, klucz_publiczny).
+    """
+    return [generate_keypair() for _ in range(count)]
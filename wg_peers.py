@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === WIREGUARD PEER SET MANAGER (v1.0) ===
+# === MENEDŻER ZBIORU PEERÓW WIREGUARD (v1.0) ===
+# =====================================================================================
+#
+# English: Parses and renders the server's /etc/wireguard/wg0.conf, computes the change
+#          between the current and the desired peer set, and builds the remote commands that
+#          persist the new file atomically and hot-apply it with 'wg syncconf', adding and
+#          removing the kernel routes of the peers' AllowedIPs like 'wg-quick up' would.
+#          Connected peers keep their sessions - the tunnel is restarted only as a fallback
+#          when the routes cannot be applied.
+# Polski:  Parsuje i generuje plik /etc/wireguard/wg0.conf serwera, wylicza zmianę między
+#          obecnym a docelowym zbiorem peerów i buduje zdalne polecenia, które atomowo
+#          zapisują nowy plik i stosują go na żywo przez 'wg syncconf', dodając i usuwając
+#          trasy jądra dla AllowedIPs peerów tak jak 'wg-quick up'. Połączone peery
+#          zachowują sesje - tunel jest restartowany tylko awaryjnie, gdy tras nie da się
+#          zastosować.
+
+import hashlib
+import shlex
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+WG_DIR = '/etc/wireguard'
+WG_INTERFACE = 'wg0'
+PEER_NAME_PREFIX = '# Peer: '
+
+# English: One call returns the file's sha256, the server public key, the runtime peer
+#          table ('wg show dump', empty when the interface is down) and the file itself.
+# Polski:  Jedno wywołanie zwraca sha256 pliku, klucz publiczny serwera, tablicę peerów
+#          w działaniu ('wg show dump', pusta gdy interfejs nie działa) i sam plik.
+CONF_MARKER = '@@WG_CONF'
+FETCH_COMMAND = (
+    f"sudo bash -c 'cd {WG_DIR} && sha256sum {WG_INTERFACE}.conf | cut -d\" \" -f1 "
+    f"&& cat server_public.key && (wg show {WG_INTERFACE} dump 2> /dev/null || true) "
+    f"&& echo {CONF_MARKER} && cat {WG_INTERFACE}.conf'"
+)
+
+
+# --- PARSING ---
+# --- PARSOWANIE ---
+
+def parse_fetch_output(output):
+    """
+    English: Splits FETCH_COMMAND output into (sha256, server_public_key, wg0.conf text, dump text).
+    Polski:  Dzieli wynik FETCH_COMMAND na (sha256, klucz_publiczny_serwera, treść wg0.conf, zrzut).
+    """
+    lines = output.split('\n')
+    if len(lines) < 3 or CONF_MARKER not in lines:
+        return None, None, None, None
+    marker = lines.index(CONF_MARKER)
+    return lines[0].strip(), lines[1].strip(), '\n'.join(lines[marker + 1:]), '\n'.join(lines[2:marker])
+
+
+def parse_wg_conf(text):
+    """
+    English: Returns {'interface': str, 'peers': [peer, ...]}. Each peer is a dict with
+             name (from the '# Peer: X' comment), public_key, allowed_ips, comments (other
+             leading comment lines) and extra (any other key lines, kept verbatim).
+    Polski:  Zwraca {'interface': str, 'peers': [peer, ...]}. Każdy peer to słownik z nazwą
+             (z komentarza '# Peer: X'), public_key, allowed_ips, comments (inne komentarze
+             przed blokiem) i extra (pozostałe linie klucz = wartość, bez zmian).
+    """
+    interface_lines = []
+    peers = []
+    current = None
+
+    for raw in text.split('\n'):
+        line = raw.rstrip()
+        if line.strip() == '[Peer]':
+            # Trailing comments of the previous block belong to this peer
+            # Końcowe komentarze poprzedniego bloku należą do tego peera
+            owner = current['extra'] if current else interface_lines
+            leading = []
+            while owner and (not owner[-1].strip() or owner[-1].lstrip().startswith('#')):
+                leading.insert(0, owner.pop())
+            current = {'name': None, 'public_key': None, 'allowed_ips': None, 'comments': [], 'extra': []}
+            for comment in leading:
+                comment = comment.strip()
+                if comment.startswith(PEER_NAME_PREFIX):
+                    current['name'] = comment[len(PEER_NAME_PREFIX):].strip()
+                elif comment:
+                    current['comments'].append(comment)
+            peers.append(current)
+            continue
+
+        if current is None:
+            interface_lines.append(line)
+            continue
+
+        key, sep, value = line.partition('=')
+        key = key.strip().lower()
+        if sep and key == 'publickey':
+            current['public_key'] = value.strip()
+        elif sep and key == 'allowedips':
+            current['allowed_ips'] = value.strip()
+        else:
+            current['extra'].append(line)
+
+    for peer in peers:
+        while peer['extra'] and not peer['extra'][-1].strip():
+            peer['extra'].pop()
+
+    return {'interface': '\n'.join(interface_lines).rstrip('\n'), 'peers': peers}
+
+
+def render_peer(peer):
+    """
+    English: Renders one [Peer] stanza in the layout the wizards have always written.
+    Polski:  Generuje jeden blok [Peer] w układzie, który kreatory zawsze zapisywały.
+    """
+    lines = list(peer.get('comments') or [])
+    if peer.get('name'):
+        lines.append(f"{PEER_NAME_PREFIX}{peer['name']}")
+    lines.append('[Peer]')
+    lines.append(f"PublicKey = {peer['public_key']}")
+    if peer.get('allowed_ips'):
+        lines.append(f"AllowedIPs = {peer['allowed_ips']}")
+    lines.extend(peer.get('extra') or [])
+    return '\n'.join(lines) + '\n'
+
+
+def render_wg_conf(conf):
+    text = conf['interface'].rstrip('\n') + '\n'
+    for peer in conf['peers']:
+        text += '\n' + render_peer(peer)
+    return text
+
+
+# --- PEER SET OPERATIONS ---
+# --- OPERACJE NA ZBIORZE PEERÓW ---
+
+def make_peer(name, public_key, allowed_ips):
+    return {'name': name, 'public_key': public_key, 'allowed_ips': allowed_ips, 'comments': [], 'extra': []}
+
+
+def with_peers(conf, new_peers):
+    """
+    English: Returns a copy of conf with new_peers added. An existing peer with the same
+             name or public key is replaced in place (re-enrollment rotates the key).
+    Polski:  Zwraca kopię conf z dodanymi new_peers. Istniejący peer o tej samej nazwie lub
+             kluczu publicznym jest podmieniany w miejscu (ponowna rejestracja zmienia klucz).
+    """
+    peers = list(conf['peers'])
+    by_name = {p['name']: i for i, p in enumerate(peers) if p.get('name')}
+    by_key = {p['public_key']: i for i, p in enumerate(peers)}
+    for new in new_peers:
+        i = by_name.get(new.get('name'), by_key.get(new['public_key']))
+        if i is None:
+            i = len(peers)
+            peers.append(new)
+        else:
+            by_key.pop(peers[i]['public_key'], None)
+            peers[i] = new
+        if new.get('name'):
+            by_name[new['name']] = i
+        by_key[new['public_key']] = i
+    return {'interface': conf['interface'], 'peers': peers}
+
+
+def without_peers(conf, names_or_keys):
+    """
+    English: Returns a copy of conf without the peers matching any name or public key given.
+    Polski:  Zwraca kopię conf bez peerów pasujących do podanych nazw lub kluczy publicznych.
+    """
+    drop = set(names_or_keys)
+    peers = [p for p in conf['peers'] if p.get('name') not in drop and p['public_key'] not in drop]
+    return {'interface': conf['interface'], 'peers': peers}
+
+
+def diff_peers(old_conf, new_conf):
+    """
+    English: Compares peer sets by public key. Returns {'added', 'removed', 'changed'} lists.
+    Polski:  Porównuje zbiory peerów po kluczu publicznym. Zwraca listy {'added', 'removed', 'changed'}.
+    """
+    old = {p['public_key']: p for p in old_conf['peers']}
+    new = {p['public_key']: p for p in new_conf['peers']}
+    return {
+        'added': [new[k] for k in new if k not in old],
+        'removed': [old[k] for k in old if k not in new],
+        'changed': [new[k] for k in new if k in old and render_peer(new[k]) != render_peer(old[k])],
+    }
+
+
+def print_diff(diff):
+    for peer in diff['added']:
+        print(f"   + {peer.get('name') or '?'} ({peer.get('allowed_ips')})")
+    for peer in diff['removed']:
+        print(f"   - {peer.get('name') or '?'} ({peer.get('allowed_ips')})")
+    for peer in diff['changed']:
+        print(f"   ~ {peer.get('name') or '?'} ({peer.get('allowed_ips')})")
+
+
+# --- REMOTE APPLY ---
+# --- ZDALNE ZASTOSOWANIE ---
+
+def conf_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def peer_routes(conf):
+    """
+    English: AllowedIPs CIDRs of all peers, in file order. Default routes (/0) are skipped -
+             wg-quick needs policy routing for those and server peers never use them.
+    Polski:  CIDR-y AllowedIPs wszystkich peerów w kolejności pliku. Trasy domyślne (/0) są
+             pomijane - wg-quick wymaga dla nich routingu regułowego, a peery serwera ich nie używają.
+    """
+    routes = []
+    for peer in conf['peers']:
+        for cidr in (peer.get('allowed_ips') or '').split(','):
+            cidr = cidr.strip()
+            if cidr and not cidr.endswith('/0') and cidr not in routes:
+                routes.append(cidr)
+    return routes
+
+
+def build_apply_command(expected_sha256, old_conf, new_conf):
+    """
+    English: Remote command that reads the new wg0.conf on stdin. It refuses to continue if
+             the file changed since it was fetched (exit 3), validates the candidate with
+             'wg-quick strip', swaps it in with a rename (backup kept as wg0.conf.bak) and
+             hot-applies it with 'wg syncconf' when the interface is up. 'wg syncconf' does
+             not touch routes, so every peer CIDR is (re)installed with 'ip route replace'
+             (idempotent) and the CIDRs that left the file are deleted; if the routes cannot
+             be applied, the tunnel is restarted with wg-quick instead.
+    Polski:  Zdalne polecenie czytające nowy wg0.conf ze stdin. Przerywa, jeśli plik zmienił
+             się od pobrania (kod 3), sprawdza kandydata przez 'wg-quick strip', podmienia go
+             przez zmianę nazwy (kopia w wg0.conf.bak) i stosuje na żywo przez 'wg syncconf',
+             gdy interfejs działa. 'wg syncconf' nie zmienia tras, więc każdy CIDR peera jest
+             (ponownie) instalowany przez 'ip route replace' (idempotentnie), a CIDR-y usunięte
+             z pliku są kasowane; jeśli tras nie da się zastosować, tunel jest restartowany
+             przez wg-quick.
+    """
+    wg = WG_INTERFACE
+    routes = peer_routes(new_conf)
+    stale = [cidr for cidr in peer_routes(old_conf) if cidr not in routes]
+    # One 'ip -batch' process for the whole set, as wg-quick adds one route per AllowedIPs entry
+    # Jeden proces 'ip -batch' dla całego zbioru, tak jak wg-quick dodaje trasę dla każdego wpisu AllowedIPs
+    batch = ''.join(f"route replace {cidr} dev {wg}\n" for cidr in routes)
+    deletes = ''.join(f"    ip route del {cidr} dev {wg} 2> /dev/null || true\n" for cidr in stale)
+    script = f"""set -e
+cd {WG_DIR}
+umask 077
+if [ "$(sha256sum {wg}.conf | cut -d' ' -f1)" != "{expected_sha256}" ]; then
+    echo "{wg}.conf was modified on the server since it was read" >&2
+    exit 3
+fi
+cat > {wg}.new.conf
+wg-quick strip ./{wg}.new.conf > /dev/null
+cp -p {wg}.conf {wg}.conf.bak
+mv {wg}.new.conf {wg}.conf
+if ip link show {wg} > /dev/null 2>&1; then
+    wg syncconf {wg} <(wg-quick strip {wg})
+{deletes}    if ! ip -force -batch - > /dev/null <<'ROUTES'
+{batch}ROUTES
+    then
+        echo "route update failed - restarting wg-quick@{wg}" >&2
+        systemctl restart wg-quick@{wg}
+    fi
+fi
+"""
+    return f"sudo bash -c {shlex.quote(script)}"
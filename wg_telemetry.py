@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================================
+# === WIREGUARD PEER TELEMETRY COLLECTOR (v1.0) ===
+# === KOLEKTOR TELEMETRII PEERÓW WIREGUARD (v1.0) ===
+# =====================================================================================
+#
+# English: Periodically reads 'wg show wg0 dump' from each server and stores per-peer
+#          handshake time, rx/tx counters and endpoint as a compact time series
+#          (wg_telemetry/<VM_KEY>/<YYYYMMDD>.jsonl, one line per sample). Throughput is
+#          computed from consecutive samples; peers without a handshake in STALE_AFTER
+#          seconds are flagged. The same parser feeds the VPN section of auditor_smart.py.
+# Polski:  Okresowo odczytuje 'wg show wg0 dump' z każdego serwera i zapisuje dla każdego
+#          peera czas handshake, liczniki rx/tx i endpoint jako zwarty szereg czasowy
+#          (wg_telemetry/<KLUCZ_VM>/<RRRRMMDD>.jsonl, jedna linia na próbkę). Przepustowość
+#          jest liczona z kolejnych próbek; peery bez handshake przez STALE_AFTER sekund są
+#          oznaczane. Ten sam parser zasila sekcję VPN w auditor_smart.py.
+
+import os
+import json
+import time
+import datetime
+import subprocess
+import config_store
+import peer_registry
+import tracing
+
+# --- CONFIGURATION ---
+# --- KONFIGURACJA ---
+
+CONFIG_FILE = 'config.yaml'
+STORE_DIR = 'wg_telemetry'
+RETENTION_DAYS = 14
+STALE_AFTER = 180           # seconds without a handshake / sekundy bez handshake
+DEFAULT_INTERVAL = 60       # seconds between samples / sekundy między próbkami
+
+# English: Server epoch first (handshake times are server clock), then the peer lines only.
+#          The interface line is dropped on the server because it carries the private key.
+# Polski:  Najpierw epoka serwera (czasy handshake są wg zegara serwera), potem tylko linie
+#          peerów. Linia interfejsu jest odrzucana na serwerze, bo zawiera klucz prywatny.
+DUMP_COMMAND = "date +%s; (sudo wg show wg0 dump 2> /dev/null || true) | tail -n +2"
+
+
+# --- PARSING ---
+# --- PARSOWANIE ---
+
+def parse_dump(dump_text):
+    """
+    English: Parses peer lines of 'wg show <if> dump' into
+             {public_key: {'endpoint', 'allowed_ips', 'handshake', 'rx', 'tx'}}.
+             handshake is a server epoch (0 = never). Interface lines are ignored.
+    Polski:  Parsuje linie peerów z 'wg show <if> dump' do
+             {klucz_publiczny: {'endpoint', 'allowed_ips', 'handshake', 'rx', 'tx'}}.
+             handshake to epoka serwera (0 = nigdy). Linie interfejsu są pomijane.
+    """
+    peers = {}
+    for line in (dump_text or '').splitlines():
+        fields = line.split('\t')
+        if len(fields) < 8:
+            continue
+        try:
+            peers[fields[0]] = {
+                'endpoint': None if fields[2] == '(none)' else fields[2],
+                'allowed_ips': fields[3],
+                'handshake': int(fields[4]),
+                'rx': int(fields[5]),
+                'tx': int(fields[6]),
+            }
+        except ValueError:
+            continue
+    return peers
+
+
+def parse_remote_output(output):
+    """
+    English: Splits DUMP_COMMAND output into (server_epoch, peers).
+    Polski:  Dzieli wynik DUMP_COMMAND na (epoka_serwera, peery).
+    """
+    head, _, rest = (output or '').strip().partition('\n')
+    try:
+        now = int(head.strip())
+    except ValueError:
+        return int(time.time()), parse_dump(output)
+    return now, parse_dump(rest)
+
+
+# --- TIME SERIES STORE ---
+# --- MAGAZYN SZEREGÓW CZASOWYCH ---
+# English: Sample line: {"t": epoch, "p": {public_key: [handshake, rx, tx, endpoint]}}
+# Polski:  Linia próbki: {"t": epoka, "p": {klucz_publiczny: [handshake, rx, tx, endpoint]}}
+
+def _series_dir(server_key):
+    return os.path.join(STORE_DIR, server_key)
+
+
+def to_sample(now, peers):
+    return {'t': now, 'p': {k: [p['handshake'], p['rx'], p['tx'], p['endpoint']] for k, p in peers.items()}}
+
+
+def append_sample(server_key, sample):
+    directory = _series_dir(server_key)
+    os.makedirs(directory, exist_ok=True)
+    day = datetime.datetime.fromtimestamp(sample['t']).strftime('%Y%m%d')
+    with open(os.path.join(directory, f"{day}.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(sample, separators=(',', ':')) + '\n')
+    prune(server_key)
+
+
+def prune(server_key, keep_days=RETENTION_DAYS):
+    # English: Drop whole day files past the retention window
+    # Polski: Usuń całe pliki dzienne spoza okna retencji
+    cutoff = (datetime.date.today() - datetime.timedelta(days=keep_days)).strftime('%Y%m%d')
+    directory = _series_dir(server_key)
+    for name in os.listdir(directory):
+        if name.endswith('.jsonl') and name[:8] < cutoff:
+            os.remove(os.path.join(directory, name))
+
+
+def _last_line(path, block=65536):
+    # English: Read backwards from the end of file until a full line is available
+    # Polski: Czytaj od końca pliku, aż dostępna będzie pełna linia
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            lines = data.rstrip(b'\n').split(b'\n')
+            if len(lines) > 1 or pos == 0:
+                return lines[-1].decode('utf-8')
+    return None
+
+
+def last_sample(server_key):
+    directory = _series_dir(server_key)
+    if not os.path.isdir(directory):
+        return None
+    for name in sorted((n for n in os.listdir(directory) if n.endswith('.jsonl')), reverse=True):
+        line = _last_line(os.path.join(directory, name))
+        if line:
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def load_series(server_key, since=None):
+    """
+    English: Yields stored samples in time order, optionally only those with t >= since.
+    Polski:  Zwraca zapisane próbki w kolejności czasu, opcjonalnie tylko z t >= since.
+    """
+    directory = _series_dir(server_key)
+    if not os.path.isdir(directory):
+        return
+    first_day = datetime.datetime.fromtimestamp(since).strftime('%Y%m%d') if since else ''
+    for name in sorted(n for n in os.listdir(directory) if n.endswith('.jsonl') and n[:8] >= first_day):
+        with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since is None or sample['t'] >= since:
+                    yield sample
+
+
+# --- ANALYSIS ---
+# --- ANALIZA ---
+
+def _rate(curr, prev, dt):
+    # A counter that went down means the interface was re-created; count from zero
+    # Licznik mniejszy niż poprzednio oznacza odtworzenie interfejsu; licz od zera
+    delta = curr - prev if curr >= prev else curr
+    return delta / dt
+
+
+def summarize(now, peers, previous=None, names=None):
+    """
+    English: Returns one row per peer, sorted by name: name, public_key, endpoint,
+             handshake_age (None = never), stale, rx, tx, rx_rate, tx_rate (bytes/s, None
+             without a usable previous sample).
+    Polski:  Zwraca jeden wiersz na peera, posortowane po nazwie: name, public_key, endpoint,
+             handshake_age (None = nigdy), stale, rx, tx, rx_rate, tx_rate (bajty/s, None
+             bez użytecznej poprzedniej próbki).
+    """
+    names = names or {}
+    prev_peers, dt = {}, 0
+    if previous and previous.get('t', now) < now:
+        prev_peers, dt = previous.get('p', {}), now - previous['t']
+    rows = []
+    for key, p in peers.items():
+        age = max(0, now - p['handshake']) if p['handshake'] else None
+        row = {
+            'name': names.get(key) or f"{key[:8]}...",
+            'public_key': key,
+            'endpoint': p['endpoint'],
+            'handshake_age': age,
+            'stale': age is None or age > STALE_AFTER,
+            'rx': p['rx'],
+            'tx': p['tx'],
+            'rx_rate': None,
+            'tx_rate': None,
+        }
+        if key in prev_peers:
+            _, prev_rx, prev_tx, _ = prev_peers[key]
+            row['rx_rate'] = _rate(p['rx'], prev_rx, dt)
+            row['tx_rate'] = _rate(p['tx'], prev_tx, dt)
+        rows.append(row)
+    rows.sort(key=lambda r: r['name'])
+    return rows
+
+
+def peer_names(server_key):
+    """
+    English: {public_key: name} from the peer registry (wg_registry/<VM_KEY>.json), if any.
+    Polski:  {klucz_publiczny: nazwa} z rejestru peerów (wg_registry/<KLUCZ_VM>.json), jeśli jest.
+    """
+    path = peer_registry.registry_path(server_key)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {r['public_key']: r['name'] for r in json.load(f).get('peers', [])}
+
+
+@tracing.traced('telemetry.record')
+def record(server_key, output):
+    """
+    English: Parses DUMP_COMMAND output, stores it as a new sample and returns summary rows
+             with rates against the previous stored sample.
+    Polski:  Parsuje wynik DUMP_COMMAND, zapisuje go jako nową próbkę i zwraca wiersze
+             podsumowania z przepustowością względem poprzedniej zapisanej próbki.
+    """
+    if not (output or '').strip():
+        return []
+    now, peers = parse_remote_output(output)
+    previous = last_sample(server_key)
+    append_sample(server_key, to_sample(now, peers))
+    return summarize(now, peers, previous, peer_names(server_key))
+
+
+# --- FORMATTING ---
+# --- FORMATOWANIE ---
+
+def human_bytes(value):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def human_rate(value):
+    return '-' if value is None else f"{human_bytes(value)}/s"
+
+
+def human_age(seconds):
+    if seconds is None:
+        return 'never'
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 7200:
+        return f"{seconds // 60}m"
+    if seconds < 172800:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 86400}d"
+
+
+def print_rows(server_key, rows):
+    stale = sum(1 for r in rows if r['stale'])
+    print(f"\n[{server_key}] {len(rows)} peer(s), {stale} stale / {len(rows)} peerów, {stale} nieaktywnych")
+    print(f"   {'PEER':<14} {'HANDSHAKE':>10} {'RX':>11} {'TX':>11} {'RX/s':>13} {'TX/s':>13}  ENDPOINT")
+    for r in rows:
+        flag = '⚠️ ' if r['stale'] else '   '
+        print(f"{flag}{r['name']:<14} {human_age(r['handshake_age']):>10} {human_bytes(r['rx']):>11} "
+              f"{human_bytes(r['tx']):>11} {human_rate(r['rx_rate']):>13} {human_rate(r['tx_rate']):>13}  "
+              f"{r['endpoint'] or '-'}")
+
+
+# --- COLLECTOR ---
+# --- KOLEKTOR ---
+
+def load_config():
+    if not os.path.exists(CONFIG_FILE): return None
+    return config_store.load(CONFIG_FILE)
+
+
+@tracing.traced('ssh')
+def fetch_dump(host_ip, user):
+    full_command = ['ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=10', f'{user}@{host_ip}',
+                    DUMP_COMMAND]
+    try:
+        res = subprocess.run(full_command, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"❌ SSH ERROR / BŁĄD SSH [{host_ip}]: {e}")
+        return None
+    if res.returncode != 0:
+        print(f"❌ SSH ERROR / BŁĄD SSH [{host_ip}]: {res.stderr.strip()}")
+        return None
+    return res.stdout
+
+
+def main():
+    os.system("clear || cls")
+    print("=" * 60)
+    print("=== WIREGUARD TELEMETRY COLLECTOR ===")
+    print("=== KOLEKTOR TELEMETRII WIREGUARD ===")
+    print("=" * 60)
+
+    config = load_config()
+    if not config: return
+
+    vms = {k: v for k, v in config.items() if isinstance(v, dict) and 'name' in v and v.get('internal_ip')}
+    print("\nAvailable Servers / Dostępne Serwery:")
+    for k, v in vms.items(): print(f" [{k}] {v['name']}")
+
+    choice = input("\nSelect VM Key(s), comma separated, or ALL / Wybierz Klucz(e) VM, po przecinku, lub ALL:\n> ").strip().upper()
+    keys = list(vms) if choice == 'ALL' else [k.strip() for k in choice.split(',') if k.strip()]
+    if not keys or any(k not in vms for k in keys): return
+
+    interval = input(f"\nInterval in seconds / Interwał w sekundach [{DEFAULT_INTERVAL}]:\n> ").strip()
+    interval = int(interval) if interval.isdigit() and int(interval) > 0 else DEFAULT_INTERVAL
+    samples = input("Number of samples, 0 = until Ctrl+C / Liczba próbek, 0 = do Ctrl+C [1]:\n> ").strip()
+    samples = int(samples) if samples.isdigit() else 1
+
+    taken = 0
+    try:
+        while True:
+            started = time.monotonic()
+            for key in keys:
+                vm = vms[key]
+                output = fetch_dump(vm['internal_ip'], vm.get('admin_user', 'blox_tak_server_admin'))
+                if output is not None:
+                    print_rows(key, record(key, output))
+            taken += 1
+            if samples and taken >= samples:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped / Zatrzymano.")
+
+    print(f"\n✅ Samples stored in / Próbki zapisane w: {os.path.abspath(STORE_DIR)}")
+
+
+if __name__ == "__main__":
+    main()